@@ -16,8 +16,8 @@ AIOS_DIR = Path(__file__).resolve().parent
 DB_PATH = AIOS_DIR / "aios.db"
 
 
-def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(str(DB_PATH))
+def get_conn(db_path: Optional[Path] = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(db_path or DB_PATH), timeout=30)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA foreign_keys=ON")
@@ -25,8 +25,8 @@ def get_conn() -> sqlite3.Connection:
 
 
 @contextmanager
-def db():
-    conn = get_conn()
+def db(db_path: Optional[Path] = None):
+    conn = get_conn(db_path)
     try:
         yield conn
         conn.commit()
@@ -37,9 +37,118 @@ def db():
         conn.close()
 
 
+# 任务队列（替换 task_queue.jsonl，见 task_queue.SQLiteTaskQueue）
+TASK_QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_queue (
+    task_id     TEXT PRIMARY KEY,
+    payload     TEXT NOT NULL,      -- JSON
+    status      TEXT NOT NULL,
+    retry_count INTEGER NOT NULL DEFAULT 0,
+    max_retries INTEGER NOT NULL DEFAULT 3,
+    worker_id   TEXT,
+    started_at  REAL,
+    finished_at REAL,
+    last_heartbeat_at REAL,
+    recovered_at REAL,
+    recovered_by TEXT,
+    recover_reason TEXT,
+    created     REAL NOT NULL,      -- 入队时间
+    lease_expires_at REAL           -- claim_batch 租约到期时间
+);
+CREATE INDEX IF NOT EXISTS idx_tq_status_created ON task_queue(status, created);
+CREATE INDEX IF NOT EXISTS idx_tq_status_heartbeat ON task_queue(status, last_heartbeat_at);
+"""
+
+
+def init_task_queue(conn: sqlite3.Connection) -> None:
+    """创建任务队列表（幂等，旧表补 lease_expires_at 列）"""
+    conn.executescript(TASK_QUEUE_SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(task_queue)")}
+    if "lease_expires_at" not in columns:
+        conn.execute("ALTER TABLE task_queue ADD COLUMN lease_expires_at REAL")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tq_status_lease ON task_queue(status, lease_expires_at)"
+    )
+    # acquire / claim 与 JSONL 后端一致，按 task_id 取
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tq_status_task ON task_queue(status, task_id)"
+    )
+
+
+# 死信队列（替换 dead_letters.jsonl，见 dlq.py）
+DEAD_LETTERS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id     TEXT NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    last_error  TEXT,
+    error_type  TEXT NOT NULL DEFAULT 'unknown',
+    timestamp   TEXT NOT NULL,
+    status      TEXT NOT NULL,      -- pending_review / replayed / discarded
+    metadata    TEXT,               -- JSON
+    resolved_at TEXT,
+    resolved_by TEXT,
+    resolve_reason TEXT
+);
+-- 同一 task_id 最多一条 pending_review（幂等写入）
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dlq_pending_task
+    ON dead_letters(task_id) WHERE status = 'pending_review';
+CREATE INDEX IF NOT EXISTS idx_dlq_status_id ON dead_letters(status, id);
+CREATE INDEX IF NOT EXISTS idx_dlq_task ON dead_letters(task_id, id);
+
+-- 按状态计数（触发器维护，get_dlq_size O(1)）
+CREATE TABLE IF NOT EXISTS dead_letter_counts (
+    status TEXT PRIMARY KEY,
+    n      INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS trg_dlq_insert AFTER INSERT ON dead_letters BEGIN
+    INSERT INTO dead_letter_counts (status, n) VALUES (NEW.status, 1)
+        ON CONFLICT(status) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_dlq_update AFTER UPDATE OF status ON dead_letters
+WHEN OLD.status != NEW.status BEGIN
+    UPDATE dead_letter_counts SET n = n - 1 WHERE status = OLD.status;
+    INSERT INTO dead_letter_counts (status, n) VALUES (NEW.status, 1)
+        ON CONFLICT(status) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_dlq_delete AFTER DELETE ON dead_letters BEGIN
+    UPDATE dead_letter_counts SET n = n - 1 WHERE status = OLD.status;
+END;
+"""
+
+
+def init_dead_letters(conn: sqlite3.Connection) -> None:
+    """创建死信队列表（幂等）"""
+    conn.executescript(DEAD_LETTERS_SCHEMA)
+
+
+# Reality Ledger 动作快照（替换 actions_state.jsonl，见 reality_ledger.py）
+ACTIONS_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS actions_state (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,  -- 创建顺序，list_actions 按此排序
+    action_id   TEXT NOT NULL UNIQUE,
+    status      TEXT NOT NULL,
+    outcome     TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    record      TEXT NOT NULL       -- ActionRecord JSON
+);
+CREATE INDEX IF NOT EXISTS idx_as_status ON actions_state(status, seq);
+CREATE INDEX IF NOT EXISTS idx_as_outcome ON actions_state(outcome, seq);
+CREATE INDEX IF NOT EXISTS idx_as_status_outcome ON actions_state(status, outcome, seq);
+"""
+
+
+def init_actions_state(conn: sqlite3.Connection) -> None:
+    """创建动作快照表（幂等）"""
+    conn.executescript(ACTIONS_STATE_SCHEMA)
+
+
 def init_db():
     """初始化所有表"""
     with db() as conn:
+        init_task_queue(conn)
+        init_dead_letters(conn)
+        init_actions_state(conn)
         conn.executescript("""
         -- 经验库（替换 experience_db_v4.jsonl）
         CREATE TABLE IF NOT EXISTS experience (
@@ -313,11 +422,166 @@ def migrate_jsonl(jsonl_path: Path, table: str):
     return count
 
 
+def migrate_task_queue(jsonl_path: Path, db_path: Optional[Path] = None) -> int:
+    """
+    把 task_queue.jsonl（TaskQueue 的 JSONL 后端）迁移到 task_queue 表
+
+    - 已存在的 task_id 跳过（可重复执行）
+    - created 按旧后端的 acquire 顺序（task_id 排序）生成，保持出队顺序不变
+    """
+    if not jsonl_path.exists():
+        print(f"[MIGRATE] Skip (not found): {jsonl_path.name}")
+        return 0
+
+    records = {}
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if rec.get("task_id"):
+                records[rec["task_id"]] = rec  # 后写覆盖先写
+
+    base = time.time()
+    count = 0
+    with db(db_path) as conn:
+        init_task_queue(conn)
+        for i, task_id in enumerate(sorted(records)):
+            rec = records[task_id]
+            cur = conn.execute("""
+                INSERT OR IGNORE INTO task_queue
+                    (task_id, payload, status, retry_count, max_retries, worker_id,
+                     started_at, finished_at, last_heartbeat_at,
+                     recovered_at, recovered_by, recover_reason, created, lease_expires_at)
+                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+            """, (
+                task_id,
+                json.dumps(rec.get("payload", {}), ensure_ascii=False),
+                rec.get("status", "pending"),
+                rec.get("retry_count", 0),
+                rec.get("max_retries", 3),
+                rec.get("worker_id"),
+                rec.get("started_at"),
+                rec.get("finished_at"),
+                rec.get("last_heartbeat_at"),
+                rec.get("recovered_at"),
+                rec.get("recovered_by"),
+                rec.get("recover_reason"),
+                rec.get("created", base + i * 1e-6),
+                rec.get("lease_expires_at"),
+            ))
+            count += cur.rowcount
+
+    print(f"[MIGRATE] {jsonl_path.name} → task_queue: {count} rows")
+    return count
+
+
+def migrate_dead_letters(jsonl_path: Path, db_path: Optional[Path] = None) -> int:
+    """
+    把 dead_letters.jsonl 迁移到 dead_letters 表
+
+    - 旧版 dlq_operator 用 replayed / discarded 标记（status 仍是 pending_review），
+      迁移时转成对应 status
+    - 同一 task_id 的重复 pending_review 只保留第一条
+    """
+    if not jsonl_path.exists():
+        print(f"[MIGRATE] Skip (not found): {jsonl_path.name}")
+        return 0
+
+    count = 0
+    with db(db_path) as conn:
+        init_dead_letters(conn)
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not rec.get("task_id"):
+                    continue
+                status = rec.get("status", "pending_review")
+                if rec.get("discarded"):
+                    status = "discarded"
+                elif rec.get("replayed"):
+                    status = "replayed"
+                cur = conn.execute("""
+                    INSERT OR IGNORE INTO dead_letters
+                        (task_id, attempts, last_error, error_type, timestamp, status, metadata)
+                    VALUES (?,?,?,?,?,?,?)
+                """, (
+                    rec["task_id"],
+                    rec.get("attempts", 0),
+                    rec.get("last_error"),
+                    rec.get("error_type", "unknown"),
+                    rec.get("timestamp") or time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    status,
+                    json.dumps(rec.get("metadata") or {}, ensure_ascii=False),
+                ))
+                count += cur.rowcount
+
+    print(f"[MIGRATE] {jsonl_path.name} → dead_letters: {count} rows")
+    return count
+
+
+def migrate_actions_state(jsonl_path: Path, db_path: Optional[Path] = None) -> int:
+    """
+    把 actions_state.jsonl（Reality Ledger v0 全量快照）迁移到 actions_state 表
+
+    - 按文件顺序导入（保持 list_actions 的创建顺序）
+    - 已存在的 action_id 跳过（可重复执行）
+    """
+    if not jsonl_path.exists():
+        print(f"[MIGRATE] Skip (not found): {jsonl_path.name}")
+        return 0
+
+    count = 0
+    with db(db_path) as conn:
+        init_actions_state(conn)
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not rec.get("action_id"):
+                    continue
+                cur = conn.execute("""
+                    INSERT OR IGNORE INTO actions_state
+                        (action_id, status, outcome, updated_at, record)
+                    VALUES (?,?,?,?,?)
+                """, (
+                    rec["action_id"],
+                    rec.get("status", "proposed"),
+                    rec.get("outcome", "unknown"),
+                    rec.get("updated_at") or rec.get("created_at") or "",
+                    json.dumps(rec, ensure_ascii=False),
+                ))
+                count += cur.rowcount
+
+    print(f"[MIGRATE] {jsonl_path.name} → actions_state: {count} rows")
+    return count
+
+
 def migrate_all():
     """一键迁移所有旧 JSONL"""
     init_db()
     migrate_jsonl(AIOS_DIR / "experience_db_v4.jsonl", "experience")
     migrate_jsonl(AIOS_DIR / "data" / "rollback" / "config_backups.jsonl", "rollback_backup")
+    migrate_task_queue(AIOS_DIR / "data" / "task_queue.jsonl")
+    # 走 dlq 的迁移：导入后把 dead_letters.jsonl 改名，dlq._conn() 不会再导入一遍
+    try:
+        from . import dlq
+    except ImportError:
+        import dlq
+    dlq._migrate_legacy_file()
+    migrate_actions_state(AIOS_DIR / "data" / "actions_state.jsonl")
     print("[MIGRATE] Done.")
 
 
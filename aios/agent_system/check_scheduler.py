@@ -3,9 +3,9 @@
 import sys
 sys.path.insert(0, r'C:\Users\A\.openclaw\workspace\aios\agent_system')
 
-from task_queue import TaskQueue
+from task_queue import open_task_queue
 
-q = TaskQueue()
+q = open_task_queue()
 
 running = q.list_tasks_by_status('running')
 queued = q.list_tasks_by_status('queued')
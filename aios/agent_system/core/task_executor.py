@@ -20,6 +20,7 @@ import sys
 sys.path.insert(0, str(BASE_DIR))
 from paths import TASK_QUEUE as QUEUE_PATH, TASK_EXECUTIONS as TASK_EXECUTIONS_PATH
 from reality_ledger import transition_action as _transition_action
+from core.task_submitter import complete_claims
 
 # 鈹€鈹€ Dependency pre-check 鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€
 # Maps module name 鈫?pip package name (for error messages)
@@ -124,28 +125,6 @@ TASK_EXECUTIONS_PATH = TASK_EXECUTIONS_PATH  # from paths.py
 QUEUE_PATH = QUEUE_PATH  # from paths.py
 
 
-def _update_task_status(task_id: str, status: str, result: dict) -> None:
-    """Update task status in task_queue.jsonl."""
-    if not QUEUE_PATH.exists():
-        return
-    lines = QUEUE_PATH.read_text(encoding="utf-8").strip().split("\n")
-    new_lines = []
-    for line in lines:
-        if not line.strip():
-            continue
-        try:
-            t = json.loads(line)
-            tid = t.get("id") or t.get("task_id")
-            if tid == task_id:
-                t["status"] = status
-                t["completed_at"] = datetime.now(timezone.utc).isoformat()
-                t["result"] = result
-            new_lines.append(json.dumps(t, ensure_ascii=False))
-        except json.JSONDecodeError:
-            new_lines.append(line)
-    QUEUE_PATH.write_text("\n".join(new_lines) + "\n", encoding="utf-8")
-
-
 def _record_execution(task_id: str, task_type: str, description: str,
                       success: bool, output: str, duration_s: float,
                       agent_id: str, retry_count: int = 0,
@@ -279,7 +258,8 @@ def _real_execute(task: dict) -> dict:
 
 def execute_batch(tasks: list, max_tasks: int = 5,
                   extra_required: dict | None = None,
-                  extra_optional: dict | None = None) -> list:
+                  extra_optional: dict | None = None,
+                  worker_id: str | None = None) -> list:
     """
     Execute a batch of tasks with Memory Retrieval context injection.
 
@@ -289,13 +269,17 @@ def execute_batch(tasks: list, max_tasks: int = 5,
       2. inject hints into prompt
       3. execute (simulate / real spawn)
       4. write_memory_feedback(task_id, memory_ids, helpful, score, reason)
-      5. record to task_executions_v2.jsonl + update queue status
+      5. record to task_executions_v2.jsonl; queue status is collected and
+         written back in one complete_claims() call after the batch
 
     Args:
         tasks: list of task dicts
         max_tasks: cap on tasks processed
         extra_required: additional {module: pip_name} to treat as required
         extra_optional: additional {module: pip_name} to treat as optional
+        worker_id: queue worker that claimed the tasks; queue statuses are
+            written once for the whole batch, only for tasks it still holds
+            (None: match by task id only)
 
     Returns list of result dicts.
     Raises DependencyError before any task runs if a required dep is missing.
@@ -309,7 +293,17 @@ def execute_batch(tasks: list, max_tasks: int = 5,
     )
 
     results = []
-    for task in tasks[:max_tasks]:
+    queue_outcomes = {}  # task_id -> (status, result), written back once per batch
+    try:
+        _execute_tasks(tasks[:max_tasks], results, queue_outcomes)
+    finally:
+        if queue_outcomes:
+            complete_claims(worker_id, queue_outcomes)
+    return results
+
+
+def _execute_tasks(tasks: list, results: list, queue_outcomes: dict) -> None:
+    for task in tasks:
         task_id = task.get("id") or task.get("task_id") or "unknown"
         desc = task.get("description", "")
         task_type = task.get("type", task.get("task_type", ""))
@@ -408,7 +402,7 @@ def execute_batch(tasks: list, max_tasks: int = 5,
                 flush=True,
             )
         else:
-            _update_task_status(task_id, status, {"success": success, "output": output})
+            queue_outcomes[task_id] = (status, {"success": success, "output": output})
 
         # Tracing: execution_finished / execution_failed
         if task_tracer:
@@ -475,6 +469,3 @@ def execute_batch(tasks: list, max_tasks: int = 5,
             f"mem={mem_ctx['used_count']} hints | {round(duration_s*1000)}ms",
             flush=True,
         )
-
-    return results
-
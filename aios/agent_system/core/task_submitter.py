@@ -5,7 +5,14 @@ core/task_submitter.py - Canonical task queue interface (SOURCE OF TRUTH)
 All task submission MUST go through this module.
 All reads/writes go through paths.TASK_QUEUE (data/task_queue.jsonl).
 
-Provides: submit_task, list_tasks, queue_stats
+Provides: submit_task, list_tasks, queue_stats, requeue_tasks,
+          claim_batch, renew_leases, release_claims, complete_claims,
+          reclaim_expired_leases
+
+Consumers claim tasks in batches with a lease (pending -> running, one
+read/rewrite of the queue file per batch under the queue mutex) and renew the
+lease while working. Running tasks whose lease expired are reclaimed by
+reclaim_expired_leases() (retry with zombie_retries + 1, or fail).
 
 NOTE: task_queue.py (TaskQueue class) provides durable locking and recovery
 for the CONSUMER side. Do NOT use TaskQueue.enqueue_task() to submit tasks.
@@ -21,6 +28,7 @@ from collections import defaultdict
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from paths import TASK_QUEUE
+from task_queue import _file_mutex
 
 
 def _task_id(task: dict) -> str:
@@ -79,8 +87,10 @@ def submit_task(
         "created_at": time.time(),
         "metadata": metadata or {},
     }
-    with open(TASK_QUEUE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(task, ensure_ascii=False) + "\n")
+    # 与 claim_batch 的整文件重写互斥，避免追加丢失
+    with _file_mutex(TASK_QUEUE):
+        with open(TASK_QUEUE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(task, ensure_ascii=False) + "\n")
     return task
 
 
@@ -107,3 +117,195 @@ def queue_stats() -> dict:
         "total": len(tasks),
         "by_status": dict(by_status),
     }
+
+
+def requeue_tasks(task_ids: list) -> int:
+    """
+    Put finished/failed tasks back to pending (e.g. DLQ replay), resetting
+    the zombie retry counter. One read/rewrite for the whole batch.
+    Returns the number of tasks requeued (pending/running tasks are left alone).
+    """
+    wanted = set(task_ids)
+    if not wanted:
+        return 0
+    with _file_mutex(TASK_QUEUE):
+        tasks = _load_all()
+        now = time.time()
+        requeued = 0
+        for t in tasks:
+            if _task_id(t) in wanted and t.get("status") not in ("pending", "running"):
+                t["status"] = "pending"
+                t["updated_at"] = now
+                for k in _WORKER_FIELDS + ("zombie_retries", "zombie_note"):
+                    t.pop(k, None)
+                requeued += 1
+        if requeued:
+            _save_all(tasks)
+    return requeued
+
+
+# ── Leases ──────────────────────────────────────────────────────────────────
+
+_WORKER_FIELDS = ("worker_id", "started_at", "last_heartbeat_at", "lease_expires_at")
+
+
+def claim_batch(worker_id: str, n: int, lease_sec: float = 300) -> list:
+    """
+    Claim up to n pending tasks (queue order) with a lease.
+    pending -> running for the whole batch in one read/rewrite of the queue file.
+    Returns the claimed task dicts.
+    """
+    if n <= 0:
+        return []
+    with _file_mutex(TASK_QUEUE):
+        tasks = _load_all()
+        now = time.time()
+        claimed = []
+        for t in tasks:
+            if t.get("status") != "pending":
+                continue
+            t.update(
+                status="running",
+                worker_id=worker_id,
+                started_at=now,
+                last_heartbeat_at=now,
+                lease_expires_at=now + lease_sec,
+                updated_at=now,
+            )
+            claimed.append(t)
+            if len(claimed) >= n:
+                break
+        if claimed:
+            _save_all(tasks)
+    return claimed
+
+
+def renew_leases(worker_id: str, task_ids: list, lease_sec: float = 300) -> list:
+    """
+    Extend the lease of tasks still running under worker_id.
+    Returns the ids that were renewed (tasks reclaimed meanwhile are left out).
+    """
+    wanted = set(task_ids)
+    if not wanted:
+        return []
+    with _file_mutex(TASK_QUEUE):
+        tasks = _load_all()
+        now = time.time()
+        renewed = []
+        for t in tasks:
+            if (_task_id(t) in wanted and t.get("status") == "running"
+                    and t.get("worker_id") == worker_id):
+                t.update(last_heartbeat_at=now, lease_expires_at=now + lease_sec, updated_at=now)
+                renewed.append(_task_id(t))
+        if renewed:
+            _save_all(tasks)
+    return renewed
+
+
+def release_claims(worker_id: str, task_ids: list) -> int:
+    """
+    Hand claimed-but-unstarted tasks back to the queue (running -> pending,
+    no retry counted). Returns the number of tasks released.
+    """
+    wanted = set(task_ids)
+    if not wanted:
+        return 0
+    with _file_mutex(TASK_QUEUE):
+        tasks = _load_all()
+        released = 0
+        for t in tasks:
+            if (_task_id(t) in wanted and t.get("status") == "running"
+                    and t.get("worker_id") == worker_id):
+                t["status"] = "pending"
+                t["updated_at"] = time.time()
+                for k in _WORKER_FIELDS:
+                    t.pop(k, None)
+                released += 1
+        if released:
+            _save_all(tasks)
+    return released
+
+
+def complete_claims(worker_id, outcomes: dict) -> int:
+    """
+    Record the final status of executed tasks in one read/rewrite.
+
+    Args:
+        worker_id: Only tasks still claimed by this worker are updated (a task
+            whose lease expired and was reclaimed is left alone); None matches
+            by id only.
+        outcomes: {task_id: (status, result)}
+
+    Returns the number of tasks updated.
+    """
+    if not outcomes:
+        return 0
+    with _file_mutex(TASK_QUEUE):
+        tasks = _load_all()
+        now = datetime.now(timezone.utc).isoformat()
+        completed = 0
+        for t in tasks:
+            outcome = outcomes.get(_task_id(t))
+            if outcome is None:
+                continue
+            if worker_id is not None and (t.get("status") != "running"
+                                          or t.get("worker_id") != worker_id):
+                continue
+            t["status"], t["result"] = outcome
+            t["completed_at"] = now
+            completed += 1
+        if completed:
+            _save_all(tasks)
+    return completed
+
+
+def reclaim_expired_leases(
+    max_retries: int = 2,
+    legacy_timeout: float = 300,
+    now: float = None,
+) -> dict:
+    """
+    Reclaim running tasks whose lease expired (one read/rewrite for all of them).
+
+    - zombie_retries < max_retries: back to pending, zombie_retries + 1
+    - otherwise: failed
+    Running tasks without a lease (claimed before leases existed) expire
+    legacy_timeout seconds after updated_at / created_at.
+
+    Returns:
+        {"retried": [task, ...], "failed": [task, ...]}
+    """
+    result = {"retried": [], "failed": []}
+    if not TASK_QUEUE.exists():
+        return result
+    now = now or time.time()
+    with _file_mutex(TASK_QUEUE):
+        tasks = _load_all()
+        for t in tasks:
+            if t.get("status") != "running":
+                continue
+            expires = t.get("lease_expires_at")
+            if expires is None:
+                expires = t.get("updated_at", t.get("created_at", 0)) + legacy_timeout
+            if expires > now:
+                continue
+
+            overdue_hr = (now - t.get("started_at", t.get("updated_at", expires))) / 3600
+            retries = t.get("zombie_retries", 0)
+            for k in _WORKER_FIELDS:
+                t.pop(k, None)
+            t["updated_at"] = now
+            if retries < max_retries:
+                t["status"] = "pending"
+                t["zombie_retries"] = retries + 1
+                t["zombie_note"] = f"lease expired after {overdue_hr:.1f}h, retry #{retries + 1}"
+                result["retried"].append(t)
+            else:
+                t["status"] = "failed"
+                t["zombie_note"] = (
+                    f"permanently failed after {max_retries} retries, last age {overdue_hr:.1f}h"
+                )
+                result["failed"].append(t)
+        if result["retried"] or result["failed"]:
+            _save_all(tasks)
+    return result
@@ -3,26 +3,92 @@
 Dead Letter Queue (DLQ) - 重试耗尽任务的兜底队列
 
 核心职责：
-1. 重试耗尽（attempts >= max）→ 写入 dead_letters.jsonl
+1. 重试耗尽（attempts >= max）→ 写入 DLQ
 2. 非可重试错误（logic_error）→ 直接写入 DLQ
-3. 人工介入通道（replay/discard）
+3. 人工介入通道（replay/discard，见 dlq_operator.py）+ 批量 requeue / purge
 
 硬约束：
 - DLQ 漏记率 = 0（每次写入必须有审计日志）
-- append-only（不可修改历史记录）
+- 历史记录只改状态不改内容（purge 除外）
 - 幂等保证（同一 task_id 不重复写入）
+
+存储：aios.db 的 dead_letters 表（见 aios_store.DEAD_LETTERS_SCHEMA）
+- task_id → pending_review 的唯一索引：幂等检查是一次索引查找，不再扫描全文件
+- dead_letter_counts 由触发器维护：get_dlq_size() O(1)
+- get_dlq_entries 按 (status, id) 索引分页
+旧的 dead_letters.jsonl 首次使用时自动导入，并改名为 dead_letters.jsonl.migrated。
 """
 
 import json
+import os
+import threading
 import time
-from pathlib import Path
-from typing import Optional
+from typing import Iterable, List, Optional
 
+import aios_store
 from paths import DEAD_LETTERS, DLQ_AUDIT
+from task_queue import _file_mutex
+
+try:
+    from pipeline_timer import record_dlq_enqueue_latency
+except ImportError:  # pragma: no cover - 计时是可选的
+    def record_dlq_enqueue_latency(task_id: str, duration_ms: float):
+        pass
 
 # ── 配置 ──────────────────────────────────────────────────────────────────────
-DLQ_FILE = DEAD_LETTERS
+DLQ_FILE = DEAD_LETTERS          # 旧版 JSONL（只用于迁移）
 DLQ_AUDIT_FILE = DLQ_AUDIT
+DLQ_DB = aios_store.DB_PATH
+
+_local = threading.local()
+_ID_CHUNK = 500  # IN (...) 每批的变量个数
+
+
+def _conn():
+    """当前线程的连接（autocommit）；首次打开时建表并导入旧 JSONL"""
+    key = (os.getpid(), str(DLQ_DB))
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.key != key:
+        conn = aios_store.get_conn(DLQ_DB)
+        conn.isolation_level = None
+        conn.execute("PRAGMA synchronous=NORMAL")
+        aios_store.init_dead_letters(conn)
+        _migrate_legacy_file()
+        _local.conn = conn
+        _local.key = key
+    return conn
+
+
+def _migrate_legacy_file() -> None:
+    if not DLQ_FILE.exists():
+        return
+    with _file_mutex(DLQ_FILE):
+        if DLQ_FILE.exists():  # 其他进程可能已经迁移
+            aios_store.migrate_dead_letters(DLQ_FILE, DLQ_DB)
+            os.replace(DLQ_FILE, DLQ_FILE.with_suffix(".jsonl.migrated"))
+
+
+def _row_to_entry(row) -> dict:
+    entry = {
+        "id": row["id"],
+        "task_id": row["task_id"],
+        "attempts": row["attempts"],
+        "last_error": row["last_error"],
+        "error_type": row["error_type"],
+        "timestamp": row["timestamp"],
+        "status": row["status"],
+        "metadata": json.loads(row["metadata"]) if row["metadata"] else {},
+    }
+    if row["status"] in ("replayed", "discarded"):
+        entry[row["status"]] = True  # 兼容旧版 replayed / discarded 标记
+        entry["resolved_at"] = row["resolved_at"]
+        entry["resolved_by"] = row["resolved_by"]
+        entry["resolve_reason"] = row["resolve_reason"]
+    return entry
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
 
 
 def enqueue_dead_letter(
@@ -34,123 +100,243 @@ def enqueue_dead_letter(
 ) -> bool:
     """
     将任务写入 DLQ。
-    
+
     Args:
         task_id: 任务 ID
         attempts: 已尝试次数
         last_error: 最后一次错误信息
         error_type: 错误类型（timeout/dependency_error/logic_error/resource_exhausted/unknown）
         metadata: 额外元数据（可选）
-    
+
     Returns:
         True - 写入成功
         False - 任务已在 DLQ 中（幂等保证）
     """
     _t_start = time.monotonic()
-
-    # 幂等检查：避免重复写入
-    if _is_in_dlq(task_id):
-        _elapsed = (time.monotonic() - _t_start) * 1000
-        record_dlq_enqueue_latency(task_id, _elapsed)
-        return False
-    
-    entry = {
+    added = enqueue_dead_letters([{
         "task_id": task_id,
         "attempts": attempts,
         "last_error": last_error,
         "error_type": error_type,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
-        "status": "pending_review",
-        "metadata": metadata or {}
-    }
-    
-    # 写入 DLQ
-    with open(DLQ_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-    
-    # 审计日志
-    _write_audit("enqueue", task_id, f"attempts={attempts}, error_type={error_type}")
+        "metadata": metadata,
+    }]) == 1
+    record_dlq_enqueue_latency(task_id, (time.monotonic() - _t_start) * 1000)
+    return added
+
+
+def enqueue_dead_letters(entries: Iterable[dict]) -> int:
+    """
+    批量写入 DLQ（一个事务 + 一次审计追加），已在 DLQ 中的 task_id 跳过。
+
+    Args:
+        entries: [{"task_id", "attempts", "last_error", "error_type"?, "metadata"?}, ...]
+
+    Returns:
+        实际写入的条数
+    """
+    conn = _conn()
+    timestamp = _now()
+    audits = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for e in entries:
+            error_type = e.get("error_type", "unknown")
+            cur = conn.execute("""
+                INSERT OR IGNORE INTO dead_letters
+                    (task_id, attempts, last_error, error_type, timestamp, status, metadata)
+                VALUES (?, ?, ?, ?, ?, 'pending_review', ?)
+            """, (
+                e["task_id"], e.get("attempts", 0), e.get("last_error"), error_type,
+                timestamp, json.dumps(e.get("metadata") or {}, ensure_ascii=False),
+            ))
+            if cur.rowcount:
+                audits.append((e["task_id"], f"attempts={e.get('attempts', 0)}, error_type={error_type}"))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
 
-    _elapsed = (time.monotonic() - _t_start) * 1000
-    record_dlq_enqueue_latency(task_id, _elapsed)
-    
-    return True
+    _write_audit_many("enqueue", audits)
+    return len(audits)
 
 
 def _is_in_dlq(task_id: str) -> bool:
-    """检查任务是否已在 DLQ 中"""
-    if not DLQ_FILE.exists():
-        return False
-    
-    with open(DLQ_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                entry = json.loads(line)
-                if entry.get("task_id") == task_id and entry.get("status") == "pending_review":
-                    return True
-            except json.JSONDecodeError:
-                continue
-    return False
+    """检查任务是否已在 DLQ 中（待处理）"""
+    return _conn().execute(
+        "SELECT 1 FROM dead_letters WHERE task_id = ? AND status = 'pending_review'",
+        (task_id,),
+    ).fetchone() is not None
 
 
 def _write_audit(action: str, task_id: str, details: str):
     """写入审计日志（append-only）"""
-    audit_entry = {
-        "action": action,
-        "task_id": task_id,
-        "details": details,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
-        "operator": "system"
-    }
-    
+    _write_audit_many(action, [(task_id, details)])
+
+
+def _write_audit_many(action: str, items: List[tuple], operator: str = "system"):
+    """批量写入审计日志（一次追加）"""
+    if not items:
+        return
+    timestamp = _now()
     with open(DLQ_AUDIT_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(audit_entry, ensure_ascii=False) + "\n")
+        f.write("".join(
+            json.dumps({
+                "action": action,
+                "task_id": task_id,
+                "details": details,
+                "timestamp": timestamp,
+                "operator": operator,
+            }, ensure_ascii=False) + "\n"
+            for task_id, details in items
+        ))
 
 
-def get_dlq_size() -> int:
-    """获取 DLQ 中待处理任务数量"""
-    if not DLQ_FILE.exists():
-        return 0
-    
-    count = 0
-    with open(DLQ_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                entry = json.loads(line)
-                if entry.get("status") == "pending_review":
-                    count += 1
-            except json.JSONDecodeError:
-                continue
-    return count
+def get_dlq_size(status: str = "pending_review") -> int:
+    """获取 DLQ 中某状态的任务数量（计数表，O(1)）"""
+    row = _conn().execute(
+        "SELECT n FROM dead_letter_counts WHERE status = ?", (status,)
+    ).fetchone()
+    return row["n"] if row else 0
 
 
-def get_dlq_entries(status: str = "pending_review") -> list[dict]:
-    """获取 DLQ 中的任务列表"""
-    if not DLQ_FILE.exists():
-        return []
-    
-    entries = []
-    with open(DLQ_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                entry = json.loads(line)
-                if entry.get("status") == status:
-                    entries.append(entry)
-            except json.JSONDecodeError:
+def get_dlq_entries(
+    status: str = "pending_review",
+    limit: Optional[int] = None,
+    after_id: int = 0,
+) -> list[dict]:
+    """
+    获取 DLQ 中的任务列表（按写入顺序）
+
+    分页：传入上一页最后一条的 id 作为 after_id
+        page = get_dlq_entries(limit=100)
+        page = get_dlq_entries(limit=100, after_id=page[-1]["id"])
+    """
+    rows = _conn().execute(
+        "SELECT * FROM dead_letters WHERE status = ? AND id > ? ORDER BY id LIMIT ?",
+        (status, after_id, -1 if limit is None else limit),
+    ).fetchall()
+    return [_row_to_entry(r) for r in rows]
+
+
+def get_dlq_entry(task_id: str) -> Optional[dict]:
+    """某个任务最新的一条 DLQ 记录（任意状态）"""
+    row = _conn().execute(
+        "SELECT * FROM dead_letters WHERE task_id = ? ORDER BY id DESC LIMIT 1", (task_id,)
+    ).fetchone()
+    return _row_to_entry(row) if row else None
+
+
+def _resolve(
+    to_status: str,
+    task_ids: Optional[List[str]],
+    error_type: Optional[str],
+    operator: str,
+    reason: Optional[str],
+) -> list[dict]:
+    """pending_review → replayed / discarded（一个事务），返回被处理的条目"""
+    conn = _conn()
+    where = "status = 'pending_review'"
+    params: list = []
+    if error_type is not None:
+        where += " AND error_type = ?"
+        params.append(error_type)
+    chunks = (
+        [None] if task_ids is None
+        else [task_ids[i:i + _ID_CHUNK] for i in range(0, len(task_ids), _ID_CHUNK)]
+    )
+
+    resolved = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for chunk in chunks:
+            sql, chunk_params = where, list(params)
+            if chunk is not None:
+                sql += " AND task_id IN ({})".format(", ".join("?" * len(chunk)))
+                chunk_params += list(chunk)
+            rows = conn.execute(
+                f"SELECT * FROM dead_letters WHERE {sql} ORDER BY id", chunk_params
+            ).fetchall()
+            if not rows:
                 continue
-    return entries
+            ids = [r["id"] for r in rows]
+            marks = ", ".join("?" * len(ids))
+            conn.execute(
+                "UPDATE dead_letters SET status = ?, resolved_at = ?, resolved_by = ?, "
+                f"resolve_reason = ? WHERE id IN ({marks})",
+                [to_status, _now(), operator, reason] + ids,
+            )
+            resolved.extend(_row_to_entry(r) for r in conn.execute(
+                f"SELECT * FROM dead_letters WHERE id IN ({marks}) ORDER BY id", ids
+            ))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    action = "replay" if to_status == "replayed" else "discard"
+    _write_audit_many(action, [(e["task_id"], reason or "") for e in resolved], operator=operator)
+    return resolved
+
+
+def requeue_dead_letters(
+    task_ids: Optional[List[str]] = None,
+    error_type: Optional[str] = None,
+    operator: str = "system",
+    reason: Optional[str] = None,
+) -> list[dict]:
+    """
+    批量标记为 replayed（task_ids / error_type 为 None 表示不过滤）。
+    返回被标记的条目；重新提交到任务队列由调用方完成（见 dlq_operator.replay_many）。
+    """
+    return _resolve("replayed", task_ids, error_type, operator, reason)
+
+
+def discard_dead_letters(
+    task_ids: Optional[List[str]] = None,
+    error_type: Optional[str] = None,
+    operator: str = "system",
+    reason: Optional[str] = None,
+) -> list[dict]:
+    """批量标记为 discarded，返回被标记的条目"""
+    return _resolve("discarded", task_ids, error_type, operator, reason)
+
+
+def purge_dead_letters(
+    statuses: Iterable[str] = ("replayed", "discarded"),
+    before: Optional[str] = None,
+    operator: str = "system",
+) -> int:
+    """
+    物理删除已处理的条目（默认 replayed / discarded，pending_review 不会被删除）
+
+    Args:
+        statuses: 要删除的状态
+        before: 只删除 timestamp 早于该时间的条目（ISO 格式，可选）
+
+    Returns:
+        删除条数
+    """
+    statuses = [s for s in statuses if s != "pending_review"]
+    if not statuses:
+        return 0
+    sql = "DELETE FROM dead_letters WHERE status IN ({})".format(", ".join("?" * len(statuses)))
+    params = list(statuses)
+    if before is not None:
+        sql += " AND timestamp < ?"
+        params.append(before)
+    deleted = _conn().execute(sql, params).rowcount
+    if deleted:
+        _write_audit_many(
+            "purge", [("*", f"deleted={deleted}, statuses={statuses}, before={before}")],
+            operator=operator,
+        )
+    return deleted
 
 
 if __name__ == "__main__":
     # 测试用例
     print("Testing DLQ...")
-    
+
     # 测试 1: 写入 DLQ
     success = enqueue_dead_letter(
         task_id="test-dlq-001",
@@ -159,7 +345,7 @@ if __name__ == "__main__":
         error_type="timeout"
     )
     print(f"[OK] Enqueue: {success}")
-    
+
     # 测试 2: 幂等检查
     success = enqueue_dead_letter(
         task_id="test-dlq-001",
@@ -168,13 +354,13 @@ if __name__ == "__main__":
         error_type="timeout"
     )
     print(f"[OK] Idempotent: {not success}")
-    
+
     # 测试 3: 获取 DLQ 大小
     size = get_dlq_size()
     print(f"[OK] DLQ size: {size}")
-    
+
     # 测试 4: 获取 DLQ 条目
     entries = get_dlq_entries()
     print(f"[OK] DLQ entries: {len(entries)}")
-    
+
     print("\nAll tests passed!")
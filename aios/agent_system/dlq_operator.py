@@ -2,27 +2,26 @@
 """
 DLQ Operator - 人工介入通道
 
-提供两个操作：
-1. replay(task_id) - 重新入队，写审计日志
-2. discard(task_id, reason) - 标记为已丢弃，写审计日志
+提供的操作：
+1. replay(task_id) / replay_many(...) - 标记 replayed 并重新提交到任务队列，写审计日志
+2. discard(task_id, reason) / discard_many(...) - 标记为已丢弃，写审计日志
 
 硬约束：
-- 两个操作都做等幂：重复执行返回 no-op + 警告日志
+- 操作都做等幂：重复执行返回 no-op + 警告日志
 - 审计日志 append-only，字段：task_id/action/operator/timestamp/reason
-- replay 后该条目在 DLQ 中标记 replayed=true，不再计入 get_dlq_size()
+- replay 后该条目状态变为 replayed，不再计入 get_dlq_size()
+
+批量操作是一个 DLQ 事务 + 一次任务队列重写，适合故障风暴后的整批处理。
 """
 
-import json
-import time
-from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
-from dlq import DLQ_FILE, DLQ_AUDIT_FILE
+from dlq import discard_dead_letters, get_dlq_entry, requeue_dead_letters
 
 
 def replay(task_id: str, operator: str = "human") -> dict:
     """
-    重新入队（从 dead_letters.jsonl 读出该条目，重新提交到执行队列）。
+    重新入队（标记 DLQ 条目为 replayed，任务回到 pending）。
     
     Args:
         task_id: 任务 ID
@@ -31,31 +30,42 @@ def replay(task_id: str, operator: str = "human") -> dict:
     Returns:
         {"success": bool, "message": str}
     """
-    if not DLQ_FILE.exists():
-        return {"success": False, "message": "DLQ file not found"}
-    
-    # 检查 task_id 是否存在且未 replay
-    entry = _find_dlq_entry(task_id)
+    entry = get_dlq_entry(task_id)
     if not entry:
         return {"success": False, "message": f"Task {task_id} not found in DLQ"}
     
-    if entry.get("replayed"):
+    if entry["status"] == "replayed":
         return {"success": False, "message": f"Task {task_id} already replayed (no-op)"}
+    if entry["status"] != "pending_review":
+        return {"success": False, "message": f"Task {task_id} is {entry['status']} (no-op)"}
     
-    # 标记为 replayed=true（不物理删除，保留审计轨迹）
-    _mark_replayed(task_id)
-    
-    # 写审计日志
-    _write_audit("replay", task_id, operator, reason=None)
-    
-    # TODO: 实际重新提交到 task_queue.jsonl（Step 3 集成时实现）
-    
+    replay_many([task_id], operator=operator)
     return {"success": True, "message": f"Task {task_id} replayed"}
 
 
+def replay_many(
+    task_ids: Optional[List[str]] = None,
+    error_type: Optional[str] = None,
+    operator: str = "human",
+    reason: Optional[str] = None,
+) -> dict:
+    """
+    批量重新入队（task_ids / error_type 为 None 表示不过滤）。
+
+    Returns:
+        {"replayed": int, "requeued": int}  requeued = 任务队列中实际回到 pending 的数量
+    """
+    entries = requeue_dead_letters(task_ids, error_type, operator=operator, reason=reason)
+    requeued = 0
+    if entries:
+        from core.task_submitter import requeue_tasks
+        requeued = requeue_tasks([e["task_id"] for e in entries])
+    return {"replayed": len(entries), "requeued": requeued}
+
+
 def discard(task_id: str, reason: str, operator: str = "human") -> dict:
     """
-    丢弃任务（标记为 discarded=true，不再处理）。
+    丢弃任务（标记为 discarded，不再处理）。
     
     Args:
         task_id: 任务 ID
@@ -65,83 +75,27 @@ def discard(task_id: str, reason: str, operator: str = "human") -> dict:
     Returns:
         {"success": bool, "message": str}
     """
-    if not DLQ_FILE.exists():
-        return {"success": False, "message": "DLQ file not found"}
-    
-    # 检查 task_id 是否存在且未 discard
-    entry = _find_dlq_entry(task_id)
+    entry = get_dlq_entry(task_id)
     if not entry:
         return {"success": False, "message": f"Task {task_id} not found in DLQ"}
     
-    if entry.get("discarded"):
+    if entry["status"] == "discarded":
         return {"success": False, "message": f"Task {task_id} already discarded (no-op)"}
+    if entry["status"] != "pending_review":
+        return {"success": False, "message": f"Task {task_id} is {entry['status']} (no-op)"}
     
-    # 标记为 discarded=true
-    _mark_discarded(task_id)
-    
-    # 写审计日志
-    _write_audit("discard", task_id, operator, reason=reason)
-    
+    discard_dead_letters([task_id], operator=operator, reason=reason)
     return {"success": True, "message": f"Task {task_id} discarded"}
 
 
-def _find_dlq_entry(task_id: str) -> Optional[dict]:
-    """查找 DLQ 中的条目"""
-    with open(DLQ_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                entry = json.loads(line)
-                if entry.get("task_id") == task_id and entry.get("status") == "pending_review":
-                    return entry
-            except json.JSONDecodeError:
-                continue
-    return None
-
-
-def _mark_replayed(task_id: str):
-    """标记条目为 replayed=true（重写文件）"""
-    _update_dlq_entry(task_id, {"replayed": True})
-
-
-def _mark_discarded(task_id: str):
-    """标记条目为 discarded=true（重写文件）"""
-    _update_dlq_entry(task_id, {"discarded": True})
-
-
-def _update_dlq_entry(task_id: str, updates: dict):
-    """更新 DLQ 条目（重写文件）"""
-    lines = []
-    with open(DLQ_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                entry = json.loads(line)
-                if entry.get("task_id") == task_id and entry.get("status") == "pending_review":
-                    entry.update(updates)
-                lines.append(json.dumps(entry, ensure_ascii=False))
-            except json.JSONDecodeError:
-                lines.append(line.strip())
-    
-    with open(DLQ_FILE, "w", encoding="utf-8") as f:
-        for line in lines:
-            f.write(line + "\n")
-
-
-def _write_audit(action: str, task_id: str, operator: str, reason: Optional[str]):
-    """写入审计日志（append-only）"""
-    audit_entry = {
-        "action": action,
-        "task_id": task_id,
-        "operator": operator,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
-        "reason": reason
-    }
-    
-    with open(DLQ_AUDIT_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(audit_entry, ensure_ascii=False) + "\n")
+def discard_many(
+    task_ids: Optional[List[str]] = None,
+    error_type: Optional[str] = None,
+    reason: Optional[str] = None,
+    operator: str = "human",
+) -> int:
+    """批量丢弃，返回处理条数"""
+    return len(discard_dead_letters(task_ids, error_type, operator=operator, reason=reason))
 
 
 if __name__ == "__main__":
@@ -2,14 +2,27 @@
 """
 AIOS 执行记录器 - 强制规范化写入
 只允许写入符合统一 Schema 的执行记录
+
+读取路径不随日志变大而变慢：
+- 计数器（按 status / agent / task type）写入时增量更新，持久化到
+  task_executions_v2.stats.json（记录已统计到的文件偏移，其他进程追加的
+  记录在下次读写时补上）
+- 最近记录从文件尾部反向读取，只读 limit 行
+- 可选：live 日志超过 max_segment_bytes 时轮转到 task_executions_v2_segments/。
+  默认不轮转——很多模块直接读 TASK_EXECUTIONS，只看得到 live 文件
 """
 
 import json
+import os
 import time
 from pathlib import Path
-from typing import Dict, Any, Optional, Literal
+from typing import Dict, Any, List, Optional, Literal
 from datetime import datetime
 
+STATS_VERSION = 1
+DEFAULT_MAX_SEGMENT_BYTES: Optional[int] = None  # None = 不轮转
+_TAIL_BLOCK = 64 * 1024
+
 
 class ExecutionLogger:
     """
@@ -41,22 +54,32 @@ class ExecutionLogger:
         )
     """
     
-    def __init__(self, log_file: Optional[Path] = None):
+    def __init__(
+        self,
+        log_file: Optional[Path] = None,
+        max_segment_bytes: Optional[int] = DEFAULT_MAX_SEGMENT_BYTES,
+    ):
         """
         初始化执行记录器
         
         Args:
             log_file: 日志文件路径，默认为 task_executions_v2.jsonl
+            max_segment_bytes: live 日志超过该大小时轮转（None / 0 = 不轮转，默认）
         """
         if log_file is None:
             from paths import TASK_EXECUTIONS
             log_file = TASK_EXECUTIONS
         
-        self.log_file = log_file
+        self.log_file = Path(log_file)
         self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        self.stats_file = self.log_file.with_suffix(".stats.json")
+        self.segments_dir = self.log_file.parent / f"{self.log_file.stem}_segments"
+        self.max_segment_bytes = max_segment_bytes
         
         # 内存中的任务状态（用于计算 duration）
         self._active_tasks: Dict[str, Dict[str, Any]] = {}
+        # 计数器缓存（见 _catch_up）
+        self._counters: Optional[Dict[str, Any]] = None
     
     def start_task(
         self,
@@ -256,80 +279,183 @@ class ExecutionLogger:
     
     def _write_record(self, record: Dict[str, Any]) -> None:
         """
-        写入记录到文件（追加模式）
+        写入记录到文件（追加模式），同时更新计数器 sidecar，必要时轮转
         """
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
-    
-    def get_recent_executions(self, limit: int = 10) -> list[Dict[str, Any]]:
+        from task_queue import _file_mutex
+
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with _file_mutex(self.log_file):
+            self._catch_up()
+            if (self.max_segment_bytes
+                    and self.log_file.exists()
+                    and self.log_file.stat().st_size + len(line) > self.max_segment_bytes):
+                self._rotate()
+            with open(self.log_file, "ab") as f:
+                f.write(line)
+            self._catch_up()
+            self._save_counters()
+
+    # ── 计数器 ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _empty_counters() -> Dict[str, Any]:
+        return {
+            "version": STATS_VERSION,
+            "file_id": None,   # live 日志 (st_dev, st_ino)；None = 轮转后尚未写入
+            "offset": 0,       # live 日志已统计到的字节偏移
+            "total": 0,
+            "by_status": {},
+            "by_agent": {},
+            "by_task_type": {},
+        }
+
+    @staticmethod
+    def _count(counters: Dict[str, Any], record: Dict[str, Any]) -> None:
+        status = record.get("status") or "unknown"
+        counters["total"] += 1
+        counters["by_status"][status] = counters["by_status"].get(status, 0) + 1
+        for field, key in (("by_agent", "agent_id"), ("by_task_type", "task_type")):
+            bucket = counters[field].setdefault(record.get(key) or "unknown", {})
+            bucket[status] = bucket.get(status, 0) + 1
+
+    def _count_bytes(self, counters: Dict[str, Any], data: bytes) -> None:
+        for raw in data.splitlines():
+            if not raw.strip():
+                continue
+            try:
+                self._count(counters, json.loads(raw))
+            except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                continue
+
+    def _segments(self) -> List[Path]:
+        if not self.segments_dir.exists():
+            return []
+        return sorted(self.segments_dir.glob(f"{self.log_file.stem}-*.jsonl"))
+
+    def _load_counters(self, file_id: Optional[tuple], size: int) -> Dict[str, Any]:
         """
-        获取最近的执行记录
+        读取 sidecar；与当前 live 日志对不上（首次使用、日志被替换）时
+        从所有段 + live 日志重建（一次性 O(n)）
         """
-        if not self.log_file.exists():
+        try:
+            counters = json.loads(self.stats_file.read_text(encoding="utf-8"))
+            saved_id = tuple(counters["file_id"]) if counters.get("file_id") else None
+            if counters.get("version") == STATS_VERSION and counters["offset"] <= size:
+                if saved_id == file_id:
+                    return counters
+                if saved_id is None and counters["offset"] == 0:
+                    counters["file_id"] = file_id  # 轮转后的新文件
+                    return counters
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            pass
+
+        counters = self._empty_counters()
+        for segment in self._segments():
+            self._count_bytes(counters, segment.read_bytes())
+        counters["file_id"] = file_id
+        return counters
+
+    def _catch_up(self) -> Dict[str, Any]:
+        """把 live 日志中尚未统计的尾部计入计数器（只读新增字节）"""
+        try:
+            f = open(self.log_file, "rb")
+        except FileNotFoundError:
+            if self._counters is None or self._counters["file_id"] is not None:
+                self._counters = self._load_counters(None, 0)
+            return self._counters
+        with f:
+            st = os.fstat(f.fileno())
+            file_id = (st.st_dev, st.st_ino)
+            counters = self._counters
+            if counters is not None and counters["file_id"] is None and counters["offset"] == 0:
+                counters["file_id"] = file_id
+            if (counters is None
+                    or tuple(counters["file_id"]) != file_id
+                    or st.st_size < counters["offset"]):
+                counters = self._counters = self._load_counters(file_id, st.st_size)
+            if st.st_size > counters["offset"]:
+                f.seek(counters["offset"])
+                data = f.read(st.st_size - counters["offset"])
+                end = data.rfind(b"\n") + 1  # 只统计完整行
+                self._count_bytes(counters, data[:end])
+                counters["offset"] += end
+        return counters
+
+    def _save_counters(self) -> None:
+        tmp = self.stats_file.with_suffix(f".{os.getpid()}.tmp")
+        counters = dict(self._counters)
+        counters["file_id"] = list(counters["file_id"]) if counters["file_id"] else None
+        tmp.write_text(json.dumps(counters, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.stats_file)
+
+    def _rotate(self) -> None:
+        """live 日志 → 段目录（调用方持有写锁且已 _catch_up）"""
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        os.replace(self.log_file, self.segments_dir / f"{self.log_file.stem}-{stamp}.jsonl")
+        self._counters["file_id"] = None
+        self._counters["offset"] = 0
+        self._save_counters()
+
+    # ── 查询 ──────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _tail_lines(path: Path, limit: int) -> List[bytes]:
+        """从文件尾部反向读取最多 limit 个完整行（最新在前）"""
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
             return []
-        
-        records = []
-        with open(self.log_file, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    try:
-                        records.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue
-        
-        # 按 updated_at 倒序排序（兼容旧记录的 finished_at）
-        records.sort(key=lambda x: x.get("updated_at", x.get("finished_at", 0)), reverse=True)
+        with f:
+            pos = os.fstat(f.fileno()).st_size
+            buf = b""
+            lines: List[bytes] = []
+            while pos > 0 and len(lines) < limit:
+                step = min(_TAIL_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                parts = (f.read(step) + buf).split(b"\n")
+                # 第一段可能是不完整的行，留给下一块
+                buf = parts.pop(0) if pos > 0 else b""
+                lines.extend(raw for raw in reversed(parts) if raw.strip())
+        return lines[:limit]
+
+    def get_recent_executions(self, limit: int = 10) -> list[Dict[str, Any]]:
+        """
+        获取最近的执行记录（按写入顺序倒序，即最近完成的在前）
+        只从文件尾部读取 limit 行；live 日志不够时继续读最新的段
+        """
+        records: List[Dict[str, Any]] = []
+        sources = [self.log_file] + list(reversed(self._segments()))
+        for path in sources:
+            for raw in self._tail_lines(path, limit - len(records)):
+                try:
+                    records.append(json.loads(raw))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+            if len(records) >= limit:
+                break
         return records[:limit]
     
     def get_stats(self) -> Dict[str, Any]:
         """
-        获取执行统计（含 pending / blocked）
+        获取执行统计（含 pending / blocked，以及按 agent / task type 的分布）
         """
-        if not self.log_file.exists():
-            return {
-                "total": 0,
-                "completed": 0,
-                "failed": 0,
-                "pending": 0,
-                "blocked": 0,
-                "success_rate": 0.0,
-            }
-        
-        total = 0
-        completed = 0
-        failed = 0
-        pending = 0
-        blocked = 0
-        
-        with open(self.log_file, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    try:
-                        record = json.loads(line)
-                        total += 1
-                        s = record.get("status")
-                        if s == "completed":
-                            completed += 1
-                        elif s == "failed":
-                            failed += 1
-                        elif s == "pending":
-                            pending += 1
-                        elif s == "blocked":
-                            blocked += 1
-                    except json.JSONDecodeError:
-                        continue
-        
+        counters = self._catch_up()
+        by_status = counters["by_status"]
+        total = counters["total"]
+        completed = by_status.get("completed", 0)
         success_rate = (completed / total * 100) if total > 0 else 0.0
         
         return {
             "total": total,
             "completed": completed,
-            "failed": failed,
-            "pending": pending,
-            "blocked": blocked,
+            "failed": by_status.get("failed", 0),
+            "pending": by_status.get("pending", 0),
+            "blocked": by_status.get("blocked", 0),
             "success_rate": success_rate,
+            "by_agent": {k: dict(v) for k, v in counters["by_agent"].items()},
+            "by_task_type": {k: dict(v) for k, v in counters["by_task_type"].items()},
         }
 
 
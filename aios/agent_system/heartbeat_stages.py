@@ -0,0 +1,426 @@
+"""
+Heartbeat Stages - 心跳阶段 DAG + 有界线程池执行
+
+heartbeat_v5.main() 原来把所有阶段串行跑在一个线程上，最慢的 I/O 阶段决定心跳周期。
+现在每个阶段声明为 Stage（依赖 + 调度 + 超时），由 StageRunner 在有界线程池上执行：
+
+- 依赖：deps 中本轮运行的阶段结束（成功/失败/超时）后才启动；本轮没有运行的依赖视为已满足，
+  依赖的返回值在 ctx.results 里（失败/超时/未运行时没有这一项）
+- 调度：schedule(now, last_started) → 本轮是否运行，见 every_tick / every / hourly / daily / weekly。
+  hourly / daily / weekly 按"上次启动之后是否跨过了整点"判断，心跳被慢阶段拖住、
+  错过了整点那一分钟，下一轮照样补跑（只补一次）
+- 超时：运行超过 timeout 的阶段本轮记为 timeout，不再等待
+  （线程无法强制中断：它继续占用一个 worker，直到真正返回）
+- 仍在运行：上一轮还没结束的阶段本轮直接跳过（skipped_running），不会重复提交
+- 计时：每个阶段一个固定分桶的耗时直方图，见 stats()
+
+阶段的 stdout 按线程缓冲，阶段结束后整块输出，并行阶段的打印不会交错。
+
+用法：
+    runner = StageRunner([
+        Stage("guard", run_guard),
+        Stage("health", run_health, deps=("guard",)),
+        Stage("report", run_report, schedule=daily(0), timeout=120),
+    ], max_workers=4)
+    report = runner.run_tick(bridge=bridge)   # {"guard": {"status": "ok", "duration_ms": 12.3}, ...}
+"""
+
+import bisect
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# schedule(now, last_started) → bool；last_started 为上次启动时间。从未运行过的阶段传
+# StageRunner 第一次检查它的时间，第一次检查时为 None
+Schedule = Callable[[datetime, Optional[datetime]], bool]
+
+# 耗时直方图的桶上界（毫秒），最后一个桶为 +inf
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 30000, 60000, 300000)
+
+# 最长等待间隔：排队中的阶段开始运行后才有准确的截止时间
+_POLL_SEC = 0.5
+
+
+# ── 调度 ──────────────────────────────────────────────────────────────────────
+
+def every_tick(now: datetime, last_started: Optional[datetime]) -> bool:
+    """每轮都运行"""
+    return True
+
+
+def _crossed(now: datetime, last_started: Optional[datetime], boundary: datetime) -> bool:
+    """
+    boundary（<= now 的最近一个整点）是否还没运行过：
+    last_started 之后跨过了它；没有参照时间时只认整点那一分钟（启动时不补跑）
+    """
+    if last_started is None:
+        return now - boundary < timedelta(minutes=1)
+    return boundary > last_started
+
+
+def every(seconds: float) -> Schedule:
+    """距上次启动至少 seconds 秒"""
+    def schedule(now: datetime, last_started: Optional[datetime]) -> bool:
+        return last_started is None or (now - last_started).total_seconds() >= seconds
+    return schedule
+
+
+def hourly(minute: int = 0) -> Schedule:
+    """每小时第 minute 分钟（错过则在之后第一轮补跑）"""
+    def schedule(now: datetime, last_started: Optional[datetime]) -> bool:
+        boundary = now.replace(minute=minute, second=0, microsecond=0)
+        if boundary > now:
+            boundary -= timedelta(hours=1)
+        return _crossed(now, last_started, boundary)
+    return schedule
+
+
+def daily(*hours: int, minute: int = 0) -> Schedule:
+    """每天 hours 中各个整点（第 minute 分钟；错过则在之后第一轮补跑）"""
+    def schedule(now: datetime, last_started: Optional[datetime]) -> bool:
+        today = now.replace(minute=minute, second=0, microsecond=0)
+        boundary = max(
+            t for hour in hours
+            for t in (today.replace(hour=hour), today.replace(hour=hour) - timedelta(days=1))
+            if t <= now
+        )
+        return _crossed(now, last_started, boundary)
+    return schedule
+
+
+def weekly(weekday: int, hour: int = 0, minute: int = 0) -> Schedule:
+    """每周 weekday（0 = 周一）的 hour:minute（错过则在之后第一轮补跑）"""
+    def schedule(now: datetime, last_started: Optional[datetime]) -> bool:
+        boundary = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        boundary -= timedelta(days=(now.weekday() - weekday) % 7)
+        if boundary > now:
+            boundary -= timedelta(days=7)
+        return _crossed(now, last_started, boundary)
+    return schedule
+
+
+# ── 阶段 ──────────────────────────────────────────────────────────────────────
+
+@dataclass
+class Stage:
+    """一个心跳阶段：fn(ctx) 的返回值放入 ctx.results[name]"""
+    name: str
+    fn: Callable[["TickContext"], Any]
+    deps: Tuple[str, ...] = ()
+    schedule: Schedule = every_tick
+    timeout: float = 60.0
+
+
+class TickContext:
+    """一轮心跳的共享上下文"""
+
+    def __init__(self, now: datetime, shared: Dict[str, Any]):
+        self.now = now
+        self.shared = shared                  # run_tick(**shared) 传入的对象（如 dispatch bridge）
+        self.results: Dict[str, Any] = {}     # 本轮已成功阶段的返回值
+
+
+class StageHistogram:
+    """固定分桶的耗时直方图（毫秒）"""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """分位数估计（所在桶的上界，不超过最大值）"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if rank < seen:
+                return min(BUCKETS_MS[i], self.max_ms) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.50),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": self.max_ms,
+            "buckets": {
+                (f"le_{b}" if i < len(BUCKETS_MS) else "inf"): n
+                for i, (b, n) in enumerate(zip(BUCKETS_MS + (None,), self.counts))
+            },
+        }
+
+
+class _ThreadStdout:
+    """按线程缓冲的 stdout：capture() 过的线程写入缓冲，其余线程直通"""
+
+    def __init__(self, target):
+        self.target = target
+        self._local = threading.local()
+
+    def capture(self) -> None:
+        self._local.buf = []
+
+    def release(self) -> str:
+        buf = getattr(self._local, "buf", None)
+        self._local.buf = None
+        return "".join(buf or ())
+
+    def write(self, s: str) -> int:
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            return self.target.write(s)
+        buf.append(s)
+        return len(s)
+
+    def flush(self) -> None:
+        if getattr(self._local, "buf", None) is None:
+            self.target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+
+class _Run:
+    """一次阶段执行"""
+    __slots__ = ("stage", "future", "submitted", "started", "duration_ms", "output")
+
+    def __init__(self, stage: Stage, submitted: float):
+        self.stage = stage
+        self.future: Optional[Future] = None
+        self.submitted = submitted
+        self.started: Optional[float] = None
+        self.duration_ms: Optional[float] = None
+        self.output = ""
+
+    def deadline(self) -> float:
+        return (self.started or self.submitted) + self.stage.timeout
+
+
+class StageRunner:
+    """在有界线程池上按 DAG 执行心跳阶段"""
+
+    def __init__(
+        self,
+        stages: Iterable[Stage],
+        max_workers: int = 4,
+        instrument: Optional[Callable[[str], ContextManager]] = None,
+    ):
+        """
+        Args:
+            stages: 阶段列表（声明顺序即同时就绪时的提交顺序）
+            max_workers: 线程池大小
+            instrument: 可选，instrument(stage_name) 返回一个上下文管理器，
+                        在 worker 线程里包住阶段函数（用于逐阶段剖析）
+        """
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+        for stage in self.stages.values():
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage: {dep}")
+        self._order = self._topological_order()
+
+        self.max_workers = max_workers
+        self.instrument = instrument
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="heartbeat-stage")
+        self._lock = threading.Lock()
+        self._stdout: Optional[_ThreadStdout] = None
+        self._running: Dict[str, _Run] = {}  # 已提交、尚未返回（含之前几轮超时的阶段）
+        self._last_started: Dict[str, datetime] = {}
+        self._first_checked: Dict[str, datetime] = {}  # 从未运行的阶段：第一次检查调度的时间
+        self._histograms = {name: StageHistogram() for name in self.stages}
+        self._statuses: Dict[str, Dict[str, int]] = {name: {} for name in self.stages}
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1 = 访问中, 2 = 完成
+
+        def visit(name: str, path: Tuple[str, ...]) -> None:
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Stage dependency cycle: {' -> '.join(path + (name,))}")
+            state[name] = 1
+            for dep in self.stages[name].deps:
+                visit(dep, path + (name,))
+            state[name] = 2
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, ())
+        return order
+
+    # ── 执行 ────────────────────────────────────────────────────────────────
+
+    def _execute(self, run: _Run, ctx: TickContext) -> Any:
+        """在 worker 线程里运行一个阶段"""
+        stdout = self._stdout
+        if stdout is not None:
+            stdout.capture()
+        run.started = time.monotonic()
+        try:
+            if self.instrument is None:
+                return run.stage.fn(ctx)
+            with self.instrument(run.stage.name):
+                return run.stage.fn(ctx)
+        finally:
+            run.duration_ms = (time.monotonic() - run.started) * 1000
+            if stdout is not None:
+                run.output = stdout.release()
+            with self._lock:
+                self._histograms[run.stage.name].add(run.duration_ms)
+
+    def _count(self, name: str, status: str) -> None:
+        with self._lock:
+            counts = self._statuses[name]
+            counts[status] = counts.get(status, 0) + 1
+
+    def _emit(self, text: str) -> None:
+        target = self._stdout.target if self._stdout is not None else sys.stdout
+        if text:
+            target.write(text)
+            target.flush()
+
+    def _reap_stale(self) -> None:
+        """之前几轮超时、现在已返回的阶段：释放并输出它们的打印"""
+        for name, run in list(self._running.items()):
+            if run.future.done():
+                del self._running[name]
+                self._emit(run.output)
+                logger.info("[STAGES] %s finished late (%.0fms)", name, run.duration_ms or 0)
+
+    def run_tick(self, now: Optional[datetime] = None, **shared) -> Dict[str, Dict[str, Any]]:
+        """
+        执行一轮心跳
+
+        Args:
+            now: 调度用的当前时间（默认 datetime.now()）
+            shared: 放入 ctx.shared 的共享对象
+
+        Returns:
+            {stage_name: {"status": "ok" | "error" | "timeout" | "skipped_running",
+                          "duration_ms": float | None}}
+            本轮不到期的阶段不出现在结果里
+        """
+        now = now or datetime.now()
+        ctx = TickContext(now, shared)
+        report: Dict[str, Dict[str, Any]] = {}
+
+        installed = not isinstance(sys.stdout, _ThreadStdout)
+        if installed:
+            sys.stdout = _ThreadStdout(sys.stdout)
+        self._stdout = sys.stdout
+        try:
+            self._reap_stale()
+
+            pending: List[str] = []
+            for name in self._order:
+                stage = self.stages[name]
+                last_started = self._last_started.get(name, self._first_checked.get(name))
+                self._first_checked.setdefault(name, now)
+                if not stage.schedule(now, last_started):
+                    continue
+                if name in self._running:
+                    report[name] = {"status": "skipped_running", "duration_ms": None}
+                    self._count(name, "skipped_running")
+                    continue
+                pending.append(name)
+
+            active: Dict[Future, _Run] = {}
+            while pending or active:
+                unsettled = set(pending) | {run.stage.name for run in active.values()}
+                for name in [n for n in pending if not set(self.stages[n].deps) & unsettled]:
+                    pending.remove(name)
+                    run = _Run(self.stages[name], time.monotonic())
+                    run.future = self._executor.submit(self._execute, run, ctx)
+                    active[run.future] = run
+                    self._running[name] = run
+                    self._last_started[name] = now
+
+                if not active:  # 拓扑序保证不会发生
+                    break
+
+                timeout = min(run.deadline() for run in active.values()) - time.monotonic()
+                done, _ = wait(list(active), timeout=max(0.0, min(timeout, _POLL_SEC)),
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    run = active.pop(future)
+                    name = run.stage.name
+                    del self._running[name]
+                    error = future.exception()
+                    if error is None:
+                        ctx.results[name] = future.result()
+                        status = "ok"
+                    else:
+                        status = "error"
+                        logger.error("[STAGES] %s failed: %s", name, error, exc_info=error)
+                    self._emit(run.output)
+                    report[name] = {"status": status, "duration_ms": run.duration_ms}
+                    self._count(name, status)
+
+                now_ts = time.monotonic()
+                for future, run in list(active.items()):
+                    if now_ts < run.deadline():
+                        continue
+                    del active[future]
+                    name = run.stage.name
+                    if future.cancel():  # 一直没排上 worker
+                        del self._running[name]
+                    logger.warning("[STAGES] %s timed out after %.0fs", name, run.stage.timeout)
+                    report[name] = {"status": "timeout", "duration_ms": None}
+                    self._count(name, "timeout")
+        finally:
+            if installed and sys.stdout is self._stdout:
+                sys.stdout = self._stdout.target
+        return report
+
+    # ── 统计 ────────────────────────────────────────────────────────────────
+
+    def running(self) -> List[str]:
+        """仍在运行（含之前几轮超时）的阶段"""
+        return [name for name, run in self._running.items() if not run.future.done()]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        每个阶段的耗时直方图 + 状态计数
+
+        Returns:
+            {stage_name: {"count", "avg_ms", "p50_ms", "p95_ms", "max_ms", "buckets",
+                          "statuses": {"ok": 10, "timeout": 1}, "running": False}}
+        """
+        running = set(self.running())
+        with self._lock:
+            return {
+                name: {
+                    **self._histograms[name].summary(),
+                    "statuses": dict(self._statuses[name]),
+                    "running": name in running,
+                }
+                for name in self.stages
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
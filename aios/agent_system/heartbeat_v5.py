@@ -42,7 +42,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-from core.task_submitter import list_tasks, queue_stats
+from core.task_submitter import (
+    list_tasks, queue_stats,
+    claim_batch, renew_leases, release_claims, reclaim_expired_leases,
+)
 from core.task_executor import execute_batch
 from core.status_adapter import get_task_status
 # from low_success_regeneration import run_low_success_regeneration  # Temporarily disabled for service
@@ -125,8 +128,22 @@ from paths import (
     HEARTBEAT_LOG, HEARTBEAT_STATE, HEARTBEAT_STATS,
     ALERTS, EXECUTED_ACTIONS
 )
-from reality_ledger import create_action, transition_action
+from reality_ledger import create_actions, transition_many
 from ledger_summary import compute_ledger_summary, format_heartbeat_summary
+from heartbeat_stages import Stage, StageRunner, daily, hourly, weekly
+
+# 逐阶段剖析（aios/stage_profiler.py）；追加到 sys.path 末尾，不遮蔽 agent_system 的同名模块
+if str(AIOS_ROOT) not in sys.path:
+    sys.path.append(str(AIOS_ROOT))
+from stage_profiler import get_profiler
+
+# ── Task queue leases ────────────────────────────────────────────────────────
+QUEUE_WORKER_ID = "heartbeat_v5"
+QUEUE_CLAIM_LIMIT = 200  # 每次心跳最多认领的任务数
+QUEUE_LEASE_SEC = 300    # 租约时长；每执行完一个 chunk 为剩余任务续租
+QUEUE_CHUNK_SIZE = 5     # 每次 execute_batch 的任务数
+QUEUE_CHUNK_SEC = 30     # 单个 chunk 的预算；task_queue stage 超时按 chunk 数计算
+QUEUE_STAGE_TIMEOUT = QUEUE_CHUNK_SEC * -(-QUEUE_CLAIM_LIMIT // QUEUE_CHUNK_SIZE)
 
 
 def _print_learning_agents_status():
@@ -208,104 +225,121 @@ def _print_learning_agents_status():
 
 def reclaim_zombie_tasks(timeout_seconds: int = 300, max_retries: int = 2) -> dict:
     """
-    回收超时的 running 任务：running > timeout_seconds => retry(带上限) or failed
-    使用 transition_status 原子更新，清空 worker_id/started_at/last_heartbeat_at。
+    回收租约过期的 running 任务：retry(带上限) or failed（重试耗尽写入 DLQ）
+    由 task_submitter.reclaim_expired_leases 一次读写完成；
+    没有租约的旧 running 任务按 timeout_seconds 计算过期。
 
     Returns:
         {"reclaimed": int, "retried": int, "permanently_failed": int}
     """
-    queue_file = TASK_QUEUE
-    if not queue_file.exists():
-        return {"reclaimed": 0, "retried": 0, "permanently_failed": 0}
+    result = reclaim_expired_leases(max_retries=max_retries, legacy_timeout=timeout_seconds)
 
-    now = time.time()
-    reclaimed = retried = permanently_failed = 0
+    for task in result["retried"]:
+        print(f"  [ZOMBIE] {task.get('id') or task.get('task_id') or '?'}: {task['zombie_note']} → queued")
 
-    with open(queue_file, "r", encoding="utf-8") as f:
-        tasks = [json.loads(l) for l in f if l.strip()]
+    dead_letters = []
+    for task in result["failed"]:
+        task_id = task.get("id") or task.get("task_id") or "?"
+        print(f"  [ZOMBIE] {task_id}: {task['zombie_note']} → permanently failed (max retries)")
+        dead_letters.append({
+            "task_id": task_id,
+            "attempts": task.get("zombie_retries", 0) + 1,
+            "last_error": task["zombie_note"],
+            "error_type": "timeout",
+            "metadata": {"agent_id": task.get("agent_id"), "description": task.get("description", "")[:200]},
+        })
+
+    # DLQ: 重试耗尽 → 整批写入死信队列（一个事务）
+    if dead_letters:
+        try:
+            from dlq import enqueue_dead_letters
+            added = enqueue_dead_letters(dead_letters)
+            print(f"  [DLQ] {added}/{len(dead_letters)} tasks enqueued to dead letters")
+        except Exception as e:
+            print(f"  [DLQ] failed to enqueue {len(dead_letters)} tasks: {e}")
 
-    modified = False
-    for task in tasks:
-        if get_task_status(task) != "running":
-            continue
+    return {
+        "reclaimed": len(result["retried"]) + len(result["failed"]),
+        "retried": len(result["retried"]),
+        "permanently_failed": len(result["failed"]),
+    }
 
-        updated_at = task.get("updated_at", task.get("created_at", 0))
-        age = now - updated_at
-        if age <= timeout_seconds:
-            continue
 
-        task_id = task.get("id") or task.get("task_id") or "?"
-        age_hr = age / 3600
-        retry_count = task.get("zombie_retries", 0)
-
-        if retry_count < max_retries:
-            # 原子转换 running → queued，清空 worker 字段
-            ok = transition_status(
-                task,
-                from_status="running",
-                to_status="pending",
-                extra={
-                    "zombie_retries": retry_count + 1,
-                    "zombie_note": f"reclaimed after {age_hr:.1f}h, retry #{retry_count + 1}",
-                    "worker_id": None,
-                    "started_at": None,
-                    "last_heartbeat_at": None,
-                },
-            )
-            if ok:
-                retried += 1
-                print(f"  [ZOMBIE] {task_id}: running {age_hr:.1f}h → queued (retry #{retry_count + 1})")
-        else:
-            # 超过重试上限：原子转换 running → failed
-            ok = transition_status(
-                task,
-                from_status="running",
-                to_status="failed",
-                extra={
-                    "zombie_note": f"permanently failed after {max_retries} retries, last age {age_hr:.1f}h",
-                    "worker_id": None,
-                    "started_at": None,
-                    "last_heartbeat_at": None,
-                },
-            )
-            if ok:
-                permanently_failed += 1
-                print(f"  [ZOMBIE] {task_id}: running {age_hr:.1f}h → permanently failed (max retries)")
-                # DLQ: 重试耗尽 → 写入死信队列
-                try:
-                    from dlq import enqueue_dead_letter
-                    enqueue_dead_letter(
-                        task_id=task_id,
-                        attempts=retry_count + 1,
-                        last_error=task.get("zombie_note", f"timeout after {age_hr:.1f}h"),
-                        error_type="timeout",
-                        metadata={"agent_id": task.get("agent_id"), "description": task.get("description", "")[:200]}
-                    )
-                    print(f"  [DLQ] {task_id}: enqueued to dead letters")
-                except Exception as e:
-                    print(f"  [DLQ] {task_id}: failed to enqueue: {e}")
+def _prepare_tasks(tasks: list) -> list:
+    """
+    为一个 chunk 的已认领任务创建 Reality Ledger action 并获取 spawn 锁。
+    action 创建一次批量写入，skipped / locked 迁移一次批量写入。
 
-        if ok:
-            reclaimed += 1
-            modified = True
+    Returns:
+        [(task, action, token), ...]；token 为 None 表示幂等命中（已跳过）
+    """
+    task_ids = [task.get("id") or task.get("task_id") or "unknown" for task in tasks]
+    # Reality Ledger: create actions (proposed)
+    actions = create_actions(
+        {
+            "actor": "heartbeat",
+            "source": "heartbeat_v5",
+            "resource_type": "task",
+            "resource_id": task_id,
+            "action_type": "execute_task",
+            "payload": {"task_type": task.get("type", task.get("task_type", "")), "task_id": task_id},
+            "idempotency_key": f"task:execute:{task_id}",
+            "lock_resource": f"task:{task_id}",
+            "tags": ["task_execution", "heartbeat"],
+        }
+        for task, task_id in zip(tasks, task_ids)
+    )
 
-    if modified:
-        with open(queue_file, "w", encoding="utf-8") as f:
-            for task in tasks:
-                f.write(json.dumps(task, ensure_ascii=False) + "\n")
+    prepared = []
+    transitions = []
+    for task, task_id, action in zip(tasks, task_ids, actions):
+        # 将 action_id 注入 task，供 executor 使用
+        task["action_id"] = action.action_id
+        print(f"  [LEDGER] Created action {action.action_id} for task {task_id}")
+        token = try_acquire_spawn_lock(task)
+        if token is None:
+            # Reality Ledger: skipped (resource busy / duplicate)
+            transitions.append({
+                "action_id": action.action_id, "event_type": "skipped",
+                "actor": "heartbeat", "payload": {"reason": "resource_busy"},
+            })
+        else:
+            # Reality Ledger: locked
+            transitions.append({
+                "action_id": action.action_id, "event_type": "locked",
+                "actor": "heartbeat", "payload": {"lock_token": token},
+            })
+        prepared.append([task, action, token])
 
-    return {"reclaimed": reclaimed, "retried": retried, "permanently_failed": permanently_failed}
+    try:
+        _, errors = transition_many(transitions)
+    except Exception as e:
+        errors = [(i, str(e)) for i in range(len(transitions))]
+    for i, error in errors:
+        task, _, token = prepared[i]
+        if token is not None:
+            print(f"  [LEDGER] locked transition failed: {error}")
+            release_spawn_lock(task, token)
+            prepared[i][2] = None
+    return [tuple(p) for p in prepared]
 
 
-def process_task_queue(max_tasks: int = 5) -> dict:
+def process_task_queue(
+    max_tasks: int = QUEUE_CLAIM_LIMIT,
+    lease_sec: float = QUEUE_LEASE_SEC,
+    chunk_size: int = QUEUE_CHUNK_SIZE,
+) -> dict:
     """
     Process pending tasks from the queue.
+
+    1. claim_batch: 一次读写认领最多 max_tasks 个任务（带租约）
+    2. 每 chunk_size 个任务调用一次 execute_batch，之后为剩余任务续租
+    3. 幂等命中 / 未执行的任务一次性交还队列
     
     Returns:
         Summary of execution
     """
-    # Get pending tasks
-    tasks = list_tasks(status="pending", limit=max_tasks)
+    tasks = claim_batch(QUEUE_WORKER_ID, max_tasks, lease_sec=lease_sec)
     
     if not tasks:
         return {
@@ -314,83 +348,74 @@ def process_task_queue(max_tasks: int = 5) -> dict:
             "failed": 0,
         }
     
-    print(f"[QUEUE] Processing {len(tasks)} pending tasks...")
+    print(f"[QUEUE] Claimed {len(tasks)} pending tasks (lease {lease_sec:.0f}s)...")
     
     # Execute tasks with idempotency gate
     results = []
-    skipped = 0
-    for task in tasks[:max_tasks]:
-        task_id = task.get("id") or task.get("task_id") or "unknown"
-        # Reality Ledger: create action (proposed)
-        action = create_action(
-            actor="heartbeat",
-            source="heartbeat_v5",
-            resource_type="task",
-            resource_id=task_id,
-            action_type="execute_task",
-            payload={"task_type": task.get("type", task.get("task_type", "")), "task_id": task_id},
-            idempotency_key=f"task:execute:{task_id}",
-            lock_resource=f"task:{task_id}",
-            tags=["task_execution", "heartbeat"],
-        )
-        # 将 action_id 注入 task，供 executor 使用
-        task["action_id"] = action.action_id
-        print(f"  [LEDGER] Created action {action.action_id} for task {task_id}")
+    unstarted = []  # 交还队列的任务 id
+    try:
+        for i in range(0, len(tasks), chunk_size):
+            chunk = []
+            for task, action, token in _prepare_tasks(tasks[i:i + chunk_size]):
+                if token is None:
+                    unstarted.append(task.get("id") or task.get("task_id"))
+                else:
+                    chunk.append((task, action, token))
+            if not chunk:
+                continue
 
-        token = try_acquire_spawn_lock(task)
-        if token is None:
-            skipped += 1
-            # Reality Ledger: skipped (resource busy / duplicate)
             try:
-                transition_action(action.action_id, "skipped", actor="heartbeat", payload={"reason": "resource_busy"})
-            except Exception:
-                pass
-            continue
-        
-        # Reality Ledger: locked
-        try:
-            transition_action(action.action_id, "locked", actor="heartbeat", payload={"lock_token": token})
-        except Exception as e:
-            print(f"  [LEDGER] locked transition failed: {e}")
-            release_spawn_lock(task, token)
-            skipped += 1
-            continue
-
-        try:
-            batch_results = execute_batch([task], max_tasks=1)
-            results.extend(batch_results)
+                results.extend(execute_batch(
+                    [t for t, _, _ in chunk], max_tasks=len(chunk), worker_id=QUEUE_WORKER_ID,
+                ))
+            except Exception as exc:
+                # execute_batch 异常：可能 executing 已推进也可能没有
+                # 先尝试补 failed，再 released；状态不允许的迁移被跳过（一次批量写入）
+                transitions = []
+                for task, action, token in chunk:
+                    release_spawn_lock(task, token)
+                    # failed 可能不合法（executor 内部已经 transition 到 failed 了）
+                    transitions.append({
+                        "action_id": action.action_id, "event_type": "failed",
+                        "actor": "heartbeat", "payload": {"error": str(exc)[:300]},
+                    })
+                    transitions.append({
+                        "action_id": action.action_id, "event_type": "released",
+                        "actor": "heartbeat", "payload": {"release_reason": "execution_done"},
+                    })
+                try:
+                    transition_many(transitions)
+                except Exception:
+                    pass
+                unstarted.extend(t.get("id") or t.get("task_id") for t in tasks[i + chunk_size:])
+                raise
 
             # execute_batch 内部已推进 executing → completed/failed
-            # 这里只需要 completed/failed → released
-            release_spawn_lock(task, token)
+            # 这里只需要 completed/failed → released（整个 chunk 一次批量迁移）
+            for task, action, token in chunk:
+                release_spawn_lock(task, token)
             try:
-                transition_action(
-                    action.action_id, "released", actor="heartbeat",
-                    payload={"release_reason": "execution_done"},
+                _, errors = transition_many(
+                    {
+                        "action_id": action.action_id, "event_type": "released",
+                        "actor": "heartbeat", "payload": {"release_reason": "execution_done"},
+                    }
+                    for _, action, _ in chunk
                 )
+                for _, error in errors:
+                    print(f"  [LEDGER] released transition failed: {error}")
             except Exception as e:
                 print(f"  [LEDGER] released transition failed: {e}")
 
-        except Exception as exc:
-            # execute_batch 异常：可能 executing 已推进也可能没有
-            # 先尝试补 failed，再 released；如果状态不允许，catch 住继续
-            release_spawn_lock(task, token)
-            try:
-                transition_action(
-                    action.action_id, "failed", actor="heartbeat",
-                    payload={"error": str(exc)[:300]},
-                )
-            except Exception:
-                pass  # 可能 executor 内部已经 transition 到 failed 了
-            try:
-                transition_action(
-                    action.action_id, "released", actor="heartbeat",
-                    payload={"release_reason": "execution_done"},
-                )
-            except Exception:
-                pass  # 如果 failed transition 也失败了，released 也会失败，记录即可
-            raise
+            # 剩余任务续租（一次读写）
+            remaining = [t.get("id") or t.get("task_id") for t in tasks[i + chunk_size:]]
+            if remaining:
+                renew_leases(QUEUE_WORKER_ID, remaining, lease_sec=lease_sec)
+    finally:
+        if unstarted:
+            release_claims(QUEUE_WORKER_ID, unstarted)
     
+    skipped = len(unstarted)
     if skipped:
         print(f"   [IDEM] {skipped} tasks skipped (idempotent hit)")
     
@@ -600,37 +625,41 @@ def check_system_health(evolution_freshness: str = "fresh") -> dict:
     }
 
 
-def main():
-    """Main heartbeat function."""
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    print(f"╔══════════════════════════════════════════════════════════════╗")
-    print(f"║  AIOS Heartbeat v5.0 - {timestamp}  ║")
-    print(f"╚══════════════════════════════════════════════════════════════╝\n")
-    
-    # P2.5-1: 初始化中枢桥接器
-    dispatch_bridge = HeartbeatDispatcherBridge()
-    
-    # 0. Startup: cleanup expired spawn locks
+# ── Heartbeat stages ─────────────────────────────────────────────────────────
+# 每个阶段一个函数 fn(ctx)，在 HEARTBEAT_STAGES 里声明依赖 / 调度 / 超时，
+# 由 heartbeat_stages.StageRunner 在有界线程池上执行（见 heartbeat_stages.py）。
+# ctx.shared["bridge"] 是本轮的 HeartbeatDispatcherBridge；ctx.results 是依赖阶段的返回值。
+
+HEARTBEAT_STAGE_WORKERS = 4
+
+
+def _stage_startup_cleanup(ctx):
+    # Startup: cleanup expired spawn locks
     startup_cleanup()
-    
-    # 0. 启动 Self-Healing Loop v2（首次心跳时启动）
+
+
+def _stage_self_healing(ctx):
+    # 启动 Self-Healing Loop v2
     start_self_healing_loop()
     print()
-    
-    # 0. 比卦资源共享模式激活（每次心跳）
+
+
+def _stage_bigua(ctx):
+    # 比卦资源共享模式激活（每次心跳）
     activate_bigua_resource_sharing()
     print()
-    
-    # 0. Token Monitor (每次心跳)
+
+
+def _stage_token_monitor(ctx):
     print("[TOKEN] Token Usage Check:")
     alert = check_and_alert()
     if alert:
         print(f"   ⚠️ {alert['level'].upper()}: {alert['title']}")
         print(f"   {alert['body']}")
-        
+
         # P2.5-1: 收集 Token 告警事件
-        dispatch_bridge.collect_token_alert(alert)
-        
+        ctx.shared["bridge"].collect_token_alert(alert)
+
         # 自动优化
         strategies = auto_optimize()
         if strategies:
@@ -639,88 +668,90 @@ def main():
                 print(f"      - {s['name']}: {s['action']}")
     else:
         print(f"   ✅ Token usage within limits\n")
-    
-    # 0. LowSuccess Regeneration (每小时整点) + Phase 3观察
-    from datetime import datetime
-    current_minute = datetime.now().minute
-    current_hour = datetime.now().hour
-    if current_minute == 0:  # 每小时整点
-        # Phase 2.5: 先执行spawn请求
-        print("[BRIDGE] Spawn Request Execution:")
-        executed = execute_spawn_requests()
-        if executed > 0:
-            print(f"   [OK] Executed: {executed} spawn requests\n")
-        else:
-            print(f"   [OK] No spawn requests to execute\n")
-        
-        # 然后生成新的regeneration请求 + Phase 3观察
-        try:
-            from low_success_regeneration import run_low_success_regeneration
-            print("[REGEN] LowSuccess Regeneration + Phase 3 Observer:")
-            stats = run_low_success_regeneration(limit=5)
-            if stats['processed'] > 0:
-                print(f"   [OK] Regenerated: {stats['processed']} tasks")
-                print(f"   Pending: {stats['pending']}, Success: {stats['success']}, Failed: {stats['failed']}")
-                print(f"   📊 Phase 3 报告已生成: reports/lowsuccess_phase3_report.md\n")
-            else:
-                print(f"   [OK] No failed tasks to regenerate\n")
-        except (ImportError, SyntaxError, Exception) as e:
-            print(f"   ⚠️ LowSuccess Regeneration disabled ({type(e).__name__}: {e})\n")
-    
-    # 0.5. Experience Learning v4.0 (每小时整点，在regeneration之后)
-    if current_minute == 0:
-        print("[LEARN] Experience Learner v4.0:")
-        metrics = learner_v4.get_metrics()
-        store = metrics.get("store_stats", {})
-        cfg = metrics.get("config", {})
-        print(f"   Grayscale: {cfg.get('grayscale_ratio', 0):.0%} | Version: {cfg.get('strategy_version', '?')}")
-        print(f"   Store: {store.get('total_entries', 0)} entries, {store.get('unique_error_types', 0)} error types")
-        print(f"   Hit rate: {metrics.get('recommend_hit_rate', 0):.1%} | Regen success: {metrics.get('regen_success_rate', 0):.1%}")
-        post_fail = metrics.get('post_recommend_failure_rate', 0)
-        if post_fail > 0.3:
-            print(f"   ⚠️  Post-recommend failure rate HIGH: {post_fail:.1%}")
+
+
+def _stage_spawn_requests(ctx):
+    # Phase 2.5: 先执行spawn请求
+    print("[BRIDGE] Spawn Request Execution:")
+    executed = execute_spawn_requests()
+    if executed > 0:
+        print(f"   [OK] Executed: {executed} spawn requests\n")
+    else:
+        print(f"   [OK] No spawn requests to execute\n")
+
+
+def _stage_low_success_regeneration(ctx):
+    # 然后生成新的regeneration请求 + Phase 3观察
+    try:
+        from low_success_regeneration import run_low_success_regeneration
+        print("[REGEN] LowSuccess Regeneration + Phase 3 Observer:")
+        stats = run_low_success_regeneration(limit=5)
+        if stats['processed'] > 0:
+            print(f"   [OK] Regenerated: {stats['processed']} tasks")
+            print(f"   Pending: {stats['pending']}, Success: {stats['success']}, Failed: {stats['failed']}")
+            print(f"   📊 Phase 3 报告已生成: reports/lowsuccess_phase3_report.md\n")
         else:
-            print(f"   Post-recommend failure: {post_fail:.1%}")
-        print()
-    
-    # 0.6. Adversarial Validation Dashboard (每小时整点)
-    if current_minute == 0:
-        try:
-            sys.path.insert(0, str(Path(__file__).parent.parent.parent / "agents" / "adversarial_validator"))
-            from validation_dashboard import generate_validation_report
-            print("[ADVERSARIAL] Validation Dashboard:")
-            generate_validation_report()
-            print(f"   [OK] 报告已生成: reports/adversarial_validation_report.md\n")
-        except Exception as e:
-            print(f"   [OK] Adversarial Validation 暂无数据\n")
-    
-    # 0.7. Hexagram Timeline Logging (每小时整点)
-    if current_minute == 0:
-        try:
-            sys.path.insert(0, str(Path(__file__).parent.parent / "policy"))
-            from hexagram_timeline import print_timeline_summary, generate_timeline_report
-            print("[HEXAGRAM] Hexagram Timeline:")
-            print_timeline_summary()
-            generate_timeline_report()
-            print(f"   [OK] Timeline report updated\n")
-        except Exception as e:
-            print(f"   [OK] Hexagram Timeline: {e}\n")
-    
-    # 0.8. Process spawn_pending.jsonl (HIGHEST PRIORITY)
+            print(f"   [OK] No failed tasks to regenerate\n")
+    except (ImportError, SyntaxError, Exception) as e:
+        print(f"   ⚠️ LowSuccess Regeneration disabled ({type(e).__name__}: {e})\n")
+
+
+def _stage_learner_metrics(ctx):
+    # Experience Learning v4.0（在regeneration之后）
+    print("[LEARN] Experience Learner v4.0:")
+    metrics = learner_v4.get_metrics()
+    store = metrics.get("store_stats", {})
+    cfg = metrics.get("config", {})
+    print(f"   Grayscale: {cfg.get('grayscale_ratio', 0):.0%} | Version: {cfg.get('strategy_version', '?')}")
+    print(f"   Store: {store.get('total_entries', 0)} entries, {store.get('unique_error_types', 0)} error types")
+    print(f"   Hit rate: {metrics.get('recommend_hit_rate', 0):.1%} | Regen success: {metrics.get('regen_success_rate', 0):.1%}")
+    post_fail = metrics.get('post_recommend_failure_rate', 0)
+    if post_fail > 0.3:
+        print(f"   ⚠️  Post-recommend failure rate HIGH: {post_fail:.1%}")
+    else:
+        print(f"   Post-recommend failure: {post_fail:.1%}")
+    print()
+
+
+def _stage_adversarial_dashboard(ctx):
+    try:
+        sys.path.insert(0, str(Path(__file__).parent.parent.parent / "agents" / "adversarial_validator"))
+        from validation_dashboard import generate_validation_report
+        print("[ADVERSARIAL] Validation Dashboard:")
+        generate_validation_report()
+        print(f"   [OK] 报告已生成: reports/adversarial_validation_report.md\n")
+    except Exception as e:
+        print(f"   [OK] Adversarial Validation 暂无数据\n")
+
+
+def _stage_hexagram_timeline(ctx):
+    try:
+        sys.path.insert(0, str(Path(__file__).parent.parent / "policy"))
+        from hexagram_timeline import print_timeline_summary, generate_timeline_report
+        print("[HEXAGRAM] Hexagram Timeline:")
+        print_timeline_summary()
+        generate_timeline_report()
+        print(f"   [OK] Timeline report updated\n")
+    except Exception as e:
+        print(f"   [OK] Hexagram Timeline: {e}\n")
+
+
+def _stage_spawn_pending(ctx):
+    # Process spawn_pending.jsonl (HIGHEST PRIORITY)
     print("[SPAWN_PENDING] Checking for pending spawn requests...")
     spawn_pending_file = Path(__file__).parent / "data" / "spawn_pending.jsonl"
     if spawn_pending_file.exists():
         try:
             with spawn_pending_file.open("r", encoding="utf-8") as f:
                 requests = [json.loads(l) for l in f if l.strip()]
-            
+
             if requests:
                 print(f"   Found {len(requests)} spawn requests")
                 # TODO: Call sessions_spawn for each request
                 # For now, just log them
                 for req in requests:
                     print(f"   - {req['agent_id']}: {req['task'][:50]}...")
-                
+
                 # Clear the file after processing
                 spawn_pending_file.write_text("", encoding="utf-8")
                 print(f"   ✅ Processed {len(requests)} spawn requests")
@@ -730,21 +761,25 @@ def main():
             print(f"   ❌ Error processing spawn_pending: {e}")
     else:
         print("   No spawn_pending.jsonl file")
-    
-    # 1. Reclaim zombie running tasks (before processing queue)
+
+
+def _stage_zombie_reclaim(ctx):
+    # Reclaim zombie running tasks (before processing queue)
     print("[ZOMBIE] Checking for stale running tasks...")
     zombie_result = reclaim_zombie_tasks(timeout_seconds=300, max_retries=2)
     if zombie_result["reclaimed"] > 0:
         print(f"   Reclaimed: {zombie_result['reclaimed']} (retried: {zombie_result['retried']}, failed: {zombie_result['permanently_failed']})")
     else:
         print("   No zombie tasks found")
-    
+
     # P2.5-1: 收集僵尸回收事件
-    dispatch_bridge.collect_zombie_reclaim(zombie_result)
-    
-    # 2. Process task queue
-    queue_result = process_task_queue(max_tasks=5)
-    
+    ctx.shared["bridge"].collect_zombie_reclaim(zombie_result)
+    return zombie_result
+
+
+def _stage_task_queue(ctx):
+    queue_result = process_task_queue()
+
     if queue_result["processed"] > 0:
         print(f"[QUEUE] Task Queue Processing:")
         print(f"   Processed: {queue_result['processed']} tasks")
@@ -752,22 +787,29 @@ def main():
         print(f"   Failed: {queue_result['failed']}")
     else:
         print("[QUEUE] Task Queue: No pending tasks")
-    
-    # 3. Evolution Guard Pre-Check (before health calculation)
+    return queue_result
+
+
+def _stage_evolution_guard(ctx):
+    # Evolution Guard Pre-Check (before health calculation)
     print(f"\n[EVOLUTION_GUARD] Pre-Check:")
     guard_result = run_evolution_guard_precheck()
     print(f"   Status: {guard_result['guard_status']}")
     print(f"   Score: {guard_result['evolution_score']:.1f}")
     print(f"   Age: {guard_result['age_hours']:.1f}h")
     print(f"   Freshness: {guard_result['freshness']}")
-    
+
     # P2.5-1: 收集演化分数过期事件
-    dispatch_bridge.collect_evolution_stale(guard_result)
-    
-    # 4. Check system health (with freshness context)
+    ctx.shared["bridge"].collect_evolution_stale(guard_result)
+    return guard_result
+
+
+def _stage_health_check(ctx):
+    # Check system health (with freshness context)
+    guard_result = ctx.results.get("evolution_guard") or {}
     print(f"\n[HEALTH] System Health Check:")
-    health = check_system_health(evolution_freshness=guard_result['freshness'])
-    
+    health = check_system_health(evolution_freshness=guard_result.get('freshness', 'fresh'))
+
     # Determine health status
     if health['score'] >= 80:
         status = "GOOD"
@@ -775,7 +817,7 @@ def main():
         status = "WARNING"
     else:
         status = "CRITICAL"
-    
+
     print(f"   Score: {health['score']}/100 ({status})")
     print(f"   Total: {health['total_tasks']} tasks")
     print(f"   Finished: {health['finished']} (completed + failed)")
@@ -783,142 +825,154 @@ def main():
     print(f"   Failed: {health['failed']}")
     print(f"   Pending: {health['pending']}")
     print(f"   Evolution Freshness: {health['evolution_data_freshness']}")
-    
+
     # P2.5-1: 收集健康检查事件
-    dispatch_bridge.collect_health_check(health)
-    
-    # 2.5. Sync agent statistics (every hour at :00)
-    if current_minute == 0:
-        try:
-            from sync_agent_stats import sync_agent_stats
-            print(f"\n[SYNC] Syncing agent statistics...")
-            sync_agent_stats()
-        except Exception as e:
-            print(f"[WARN] Agent stats sync failed: {e}")
-        
-        # Spawn lock health check
-        try:
-            from spawn_lock_monitor import check_spawn_lock_health
-            print(f"\n[LOCK] Spawn lock health check:")
-            check_spawn_lock_health()
-        except Exception as e:
-            print(f"[WARN] Spawn lock monitor failed: {e}")
-        
-        # Skill Memory aggregation (every hour)
-        try:
-            from skill_memory_aggregator import aggregate_all_skills
-            print(f"\n[SKILL_MEMORY] Aggregating skill statistics...")
-            aggregate_all_skills()
-        except Exception as e:
-            print(f"[WARN] Skill memory aggregation failed: {e}")
-        
-        # Skill Failure Alert (每小时检查连续失败)
-        try:
-            from skill_failure_alert import check_consecutive_failures, format_alert_message
-            print(f"\n[SKILL_ALERT] Checking consecutive failures...")
-            alerts = check_consecutive_failures(window_size=5)
-            if alerts:
-                print(f"   ⚠️ {len(alerts)} skill(s) with consecutive failures:")
-                for alert in alerts[:3]:  # 只显示前 3 个
-                    print(f"\n{format_alert_message(alert)}")
-                
-                # P2.5-1: 收集技能失败告警事件
-                dispatch_bridge.collect_skill_failure(alerts)
-            else:
-                print("   ✅ All skills running normally")
-            
-            # ── Shadow Mode: Deduper 并行评估（只记录，不控制通知）──
-            if alerts:
-                try:
-                    from heartbeat_alert_deduper import run_shadow_evaluation
-                    print(f"\n[DEDUPER_SHADOW] Running parallel evaluation...")
-                    run_shadow_evaluation(alerts)
-                except Exception as e:
-                    print(f"   [DEDUPER_SHADOW] Failed (non-blocking): {e}")
-        except Exception as e:
-            print(f"[WARN] Skill failure alert failed: {e}")
-        
-        # Skill Analyzer Phase 2 (每周一次，周一0点)
-        if current_hour == 0:
-            from datetime import datetime as _dt
-            if _dt.now().weekday() == 0:  # Monday
-                try:
-                    from skill_analyzer import analyze_skills, print_analysis
-                    print(f"\n[SKILL_ANALYZER] Weekly Skill Analysis:")
-                    result = analyze_skills(days=7)
-                    print_analysis(result)
-                    if result.get("weekly_tip"):
-                        print(f"   💡 {result['weekly_tip']}")
-                except Exception as e:
-                    print(f"[WARN] Skill analysis failed: {e}")
-    
-    # 2.8. Learnings Extractor (每天0点和12点提炼黄金法则)
-    if current_minute == 0 and current_hour in (0, 12):
-        try:
-            from learnings_extractor import run as run_learnings_extractor
-            print(f"\n[LEARNINGS] Extracting Golden Rules:")
-            result = run_learnings_extractor()
-            if result["rules_new"] > 0:
-                print(f"   🆕 {result['rules_new']} new rules extracted!")
-            print(f"   Total: {result['rules_total']} rules | Success rate: {result['success_rate']:.1%}")
-        except Exception as e:
-            print(f"[WARN] Learnings extractor failed: {e}")
+    ctx.shared["bridge"].collect_health_check(health)
+    return health
 
-    # 2.9. Diary Extraction (每天23:00自动提取对话)
-    if current_minute == 0 and current_hour == 23:
-        try:
-            print(f"\n[DIARY] Extracting daily conversations...")
-            diary_entry = extract_diary_from_session()
-            if diary_entry:
-                save_diary(diary_entry)
-                print(f"   ✅ Diary saved: {diary_entry['date']}")
-            else:
-                print(f"   ℹ️  No conversations to extract today")
-        except Exception as e:
-            print(f"[WARN] Diary extraction failed: {e}")
-    
-    # 2.9.5. Hexagram Daily Snapshot (每天23:00收敛卦象快照)
-    if current_minute == 0 and current_hour == 23:
-        try:
-            from hexagram_daily_logger import run as run_hexagram_daily_logger
-            print(f"\n[HEXAGRAM_DAILY] Collecting daily hexagram snapshot...")
-            run_hexagram_daily_logger()
-            print(f"   ✅ Snapshot saved: data/hexagram_daily.jsonl")
-        except Exception as e:
-            print(f"[WARN] Hexagram daily snapshot failed: {e}")
 
-    # 2.10. Learning Agent Observer (每天0点自动更新观察表)
-    if current_minute == 0 and current_hour == 0:
-        try:
-            from learning_agent_observer import main as run_observer
-            print(f"\n[OBSERVER] Learning Agent Observer:")
-            run_observer()
-        except Exception as e:
-            print(f"[WARN] Learning agent observer failed: {e}")
-    
-    # 2.11. Learning Agent Triggers (每小时检查触发条件)
-    if current_minute == 0:
-        try:
-            from learning_agent_triggers import run_triggers
-            print(f"\n[TRIGGERS] Learning Agent Triggers:")
-            tasks = run_triggers()
-            if tasks:
-                print(f"   ✓ {len(tasks)} tasks triggered")
-        except Exception as e:
-            print(f"[WARN] Learning agent triggers failed: {e}")
-    
-    # 2.12. Memory Server Health Check (每次心跳)
+def _stage_agent_stats_sync(ctx):
+    try:
+        from sync_agent_stats import sync_agent_stats
+        print(f"\n[SYNC] Syncing agent statistics...")
+        sync_agent_stats()
+    except Exception as e:
+        print(f"[WARN] Agent stats sync failed: {e}")
+
+
+def _stage_spawn_lock_health(ctx):
+    try:
+        from spawn_lock_monitor import check_spawn_lock_health
+        print(f"\n[LOCK] Spawn lock health check:")
+        check_spawn_lock_health()
+    except Exception as e:
+        print(f"[WARN] Spawn lock monitor failed: {e}")
+
+
+def _stage_skill_memory(ctx):
+    try:
+        from skill_memory_aggregator import aggregate_all_skills
+        print(f"\n[SKILL_MEMORY] Aggregating skill statistics...")
+        aggregate_all_skills()
+    except Exception as e:
+        print(f"[WARN] Skill memory aggregation failed: {e}")
+
+
+def _stage_skill_failure_alert(ctx):
+    # Skill Failure Alert (每小时检查连续失败)
+    try:
+        from skill_failure_alert import check_consecutive_failures, format_alert_message
+        print(f"\n[SKILL_ALERT] Checking consecutive failures...")
+        alerts = check_consecutive_failures(window_size=5)
+        if alerts:
+            print(f"   ⚠️ {len(alerts)} skill(s) with consecutive failures:")
+            for alert in alerts[:3]:  # 只显示前 3 个
+                print(f"\n{format_alert_message(alert)}")
+
+            # P2.5-1: 收集技能失败告警事件
+            ctx.shared["bridge"].collect_skill_failure(alerts)
+        else:
+            print("   ✅ All skills running normally")
+
+        # ── Shadow Mode: Deduper 并行评估（只记录，不控制通知）──
+        if alerts:
+            try:
+                from heartbeat_alert_deduper import run_shadow_evaluation
+                print(f"\n[DEDUPER_SHADOW] Running parallel evaluation...")
+                run_shadow_evaluation(alerts)
+            except Exception as e:
+                print(f"   [DEDUPER_SHADOW] Failed (non-blocking): {e}")
+    except Exception as e:
+        print(f"[WARN] Skill failure alert failed: {e}")
+
+
+def _stage_skill_analyzer(ctx):
+    # Skill Analyzer Phase 2 (每周一次，周一0点)
+    try:
+        from skill_analyzer import analyze_skills, print_analysis
+        print(f"\n[SKILL_ANALYZER] Weekly Skill Analysis:")
+        result = analyze_skills(days=7)
+        print_analysis(result)
+        if result.get("weekly_tip"):
+            print(f"   💡 {result['weekly_tip']}")
+    except Exception as e:
+        print(f"[WARN] Skill analysis failed: {e}")
+
+
+def _stage_learnings_extractor(ctx):
+    # Learnings Extractor (每天0点和12点提炼黄金法则)
+    try:
+        from learnings_extractor import run as run_learnings_extractor
+        print(f"\n[LEARNINGS] Extracting Golden Rules:")
+        result = run_learnings_extractor()
+        if result["rules_new"] > 0:
+            print(f"   🆕 {result['rules_new']} new rules extracted!")
+        print(f"   Total: {result['rules_total']} rules | Success rate: {result['success_rate']:.1%}")
+    except Exception as e:
+        print(f"[WARN] Learnings extractor failed: {e}")
+
+
+def _stage_diary(ctx):
+    # Diary Extraction (每天23:00自动提取对话)
+    try:
+        print(f"\n[DIARY] Extracting daily conversations...")
+        diary_entry = extract_diary_from_session()
+        if diary_entry:
+            save_diary(diary_entry)
+            print(f"   ✅ Diary saved: {diary_entry['date']}")
+        else:
+            print(f"   ℹ️  No conversations to extract today")
+    except Exception as e:
+        print(f"[WARN] Diary extraction failed: {e}")
+
+
+def _stage_hexagram_daily(ctx):
+    # Hexagram Daily Snapshot (每天23:00收敛卦象快照)
+    try:
+        from hexagram_daily_logger import run as run_hexagram_daily_logger
+        print(f"\n[HEXAGRAM_DAILY] Collecting daily hexagram snapshot...")
+        run_hexagram_daily_logger()
+        print(f"   ✅ Snapshot saved: data/hexagram_daily.jsonl")
+    except Exception as e:
+        print(f"[WARN] Hexagram daily snapshot failed: {e}")
+
+
+def _stage_learning_observer(ctx):
+    # Learning Agent Observer (每天0点自动更新观察表)
+    try:
+        from learning_agent_observer import main as run_observer
+        print(f"\n[OBSERVER] Learning Agent Observer:")
+        run_observer()
+    except Exception as e:
+        print(f"[WARN] Learning agent observer failed: {e}")
+
+
+def _stage_learning_triggers(ctx):
+    # Learning Agent Triggers (每小时检查触发条件)
+    try:
+        from learning_agent_triggers import run_triggers
+        print(f"\n[TRIGGERS] Learning Agent Triggers:")
+        tasks = run_triggers()
+        if tasks:
+            print(f"   ✓ {len(tasks)} tasks triggered")
+    except Exception as e:
+        print(f"[WARN] Learning agent triggers failed: {e}")
+
+
+def _stage_memory_server_health(ctx):
+    # Memory Server Health Check (每次心跳)
     # 🔧 FIX: 添加状态缓存，只在状态变化时生成事件
+    from datetime import datetime
     try:
         from detectors.memory_server_health import MemoryServerHealthDetector
         print(f"\n[MEMORY_SERVER] Health Check:")
         detector = MemoryServerHealthDetector()
         check_result = detector.check()
-        
+
         status = check_result["status"]
         severity = check_result["severity"]
         response_time = check_result["response_time_ms"]
-        
+
         # 输出状态
         status_emoji = {
             "healthy": "✅",
@@ -926,7 +980,7 @@ def main():
             "down": "❌"
         }
         print(f"   {status_emoji.get(status, '❓')} Status: {status} | Response: {response_time}ms | Severity: {severity}")
-        
+
         # 检查上次状态（从状态文件读取）
         state_file = Path(__file__).parent / "data" / "memory_server_state.json"
         last_status = None
@@ -937,19 +991,19 @@ def main():
                     last_status = state.get("last_status")
             except:
                 pass
-        
+
         # 只在状态变化时生成事件
         if status != "healthy" and status != last_status:
             event = detector.generate_event(check_result)
             print(f"   📋 Event: {event['summary']}")
             print(f"   🔧 Suggested: {event['suggested_action']}")
-            
+
             # 写入事件日志
             events_file = Path(__file__).parent / "data" / "events.jsonl"
             events_file.parent.mkdir(parents=True, exist_ok=True)
             with open(events_file, "a", encoding="utf-8") as f:
                 f.write(json.dumps(event, ensure_ascii=False) + "\n")
-        
+
         # 更新状态文件
         state_file.parent.mkdir(parents=True, exist_ok=True)
         with open(state_file, "w", encoding="utf-8") as f:
@@ -958,35 +1012,37 @@ def main():
                 "last_check": datetime.now().isoformat(),
                 "response_time_ms": response_time
             }, f, ensure_ascii=False, indent=2)
-            
+
     except Exception as e:
         print(f"[WARN] Memory Server health check failed: {e}")
-    
-    # 2.13. Execution Latency Anomaly Detection (每次心跳)
+
+
+def _stage_exec_latency(ctx):
+    # Execution Latency Anomaly Detection (每次心跳)
     try:
         from detectors.exec_latency_detector import ExecLatencyDetector
         print(f"\n[EXEC_LATENCY] Anomaly Detection:")
-        
+
         # 初始化检测器
         latency_detector = ExecLatencyDetector()
-        
+
         # 加载基线
         records_path = Path(__file__).parent / "data" / "agent_execution_record.jsonl"
         latency_detector.load_baselines(records_path)
-        
+
         # 显示摘要
         summary = latency_detector.get_summary()
         print(f"   📊 Baseline: {summary['entities_with_baseline']}/{summary['total_entities']} entities")
-        
+
         if summary['entities_degraded'] > 0:
             print(f"   ⚠️  Degraded: {summary['entities_degraded']} entities")
-        
+
         # 检查最近的执行记录（最后 5 条）
         # 🔧 FIX: 添加去重机制，避免对同一条记录重复生成事件
         if records_path.exists():
             recent_records = []
             checked_tasks = set()  # 记录已检查的 task_id，避免重复
-            
+
             # 加载已检查过的 task_id（从最近的事件中提取）
             events_file = Path(__file__).parent / "data" / "events.jsonl"
             if events_file.exists():
@@ -1006,7 +1062,7 @@ def main():
                                         checked_tasks.add(entity_id)
                         except:
                             continue
-            
+
             with open(records_path, "r", encoding="utf-8") as f:
                 lines = f.readlines()
                 for line in lines[-5:]:
@@ -1022,36 +1078,36 @@ def main():
                                 recent_records.append(record)
                     except json.JSONDecodeError:
                         continue
-            
+
             # 检查每条记录
             anomalies = []
             for record in recent_records:
                 entity_id = record.get("agent_name") or record.get("task_id", "unknown")
                 task_id = record.get("task_id", "unknown")
                 duration_ms = record["duration_sec"] * 1000
-                
+
                 check_result = latency_detector.check(entity_id, duration_ms)
-                
+
                 if check_result["status"] not in ("normal", "cold_start"):
                     anomalies.append((entity_id, check_result))
-                    
+
                     # 生成事件
                     event = latency_detector.generate_event(
                         entity_id,
                         "agent",
                         check_result
                     )
-                    
+
                     if event:
                         # 标记为已检查
                         checked_tasks.add(task_id)
-                        
+
                         # 写入事件日志
                         events_file = Path(__file__).parent / "data" / "events.jsonl"
                         events_file.parent.mkdir(parents=True, exist_ok=True)
                         with open(events_file, "a", encoding="utf-8") as f:
                             f.write(json.dumps(event, ensure_ascii=False) + "\n")
-            
+
             # 输出异常
             if anomalies:
                 print(f"   ⚠️  Anomalies detected:")
@@ -1065,18 +1121,21 @@ def main():
                     print(f"      {emoji} {entity_id}: {result['current_duration_ms']}ms ({result['deviation_ratio']}x median)")
             else:
                 print(f"   ✅ All executions within normal range")
-        
+
     except Exception as e:
         print(f"[WARN] Execution latency detection failed: {e}")
-    
-    # 3. Token Report (每天0点生成)
-    if current_minute == 0 and datetime.now().hour == 0:
-        print(f"\n[REPORT] Daily Token Report:")
-        report = generate_report('daily')
-        print(report)
-    
-    # 3.5. Daily Metrics (00:00 full, 12:00 quick)
-    if current_minute == 0 and current_hour == 0:
+
+
+def _stage_token_report(ctx):
+    # Token Report (每天0点生成)
+    print(f"\n[REPORT] Daily Token Report:")
+    report = generate_report('daily')
+    print(report)
+
+
+def _stage_daily_metrics(ctx):
+    # Daily Metrics (00:00 full, 12:00 quick)
+    if ctx.now.hour == 0:
         try:
             from daily_metrics import run as run_daily_metrics
             print(f"\n[METRICS] Full Daily Metrics:")
@@ -1086,37 +1145,44 @@ def main():
             run_dashboard()
         except Exception as e:
             print(f"[WARN] Daily metrics failed: {e}")
-    elif current_minute == 0 and current_hour == 12:
+    else:
         try:
             from daily_metrics import run as run_daily_metrics
             print(f"\n[METRICS] Quick Metrics Check:")
             run_daily_metrics(mode="quick")
         except Exception as e:
             print(f"[WARN] Quick metrics failed: {e}")
-    
-    # 4. Ledger Summary (24h)
+
+
+def _stage_ledger_summary(ctx):
+    # Ledger Summary (24h)
     print(f"\n[LEDGER] 24h Summary:")
     ledger_summary = compute_ledger_summary(hours=24.0)
     print(format_heartbeat_summary(ledger_summary))
-    
-    # 4.5. Learning Agents Status (每次心跳)
+
+
+def _stage_learning_agents_status(ctx):
+    # Learning Agents Status (每次心跳)
     print(f"\n[LEARNING_AGENTS] Status:")
     _print_learning_agents_status()
-    
-    # 4.6. Agent Lifecycle Engine (每小时整点)
-    if current_minute == 0:
-        try:
-            from agent_lifecycle_engine import run_lifecycle_engine
-            print(f"\n[LIFECYCLE] Agent Lifecycle Engine:")
-            result = run_lifecycle_engine()
-            print(f"   ✓ Updated {result['updated_agents']}/{result['total_agents']} agents")
-            print(f"   • 乾卦（active）: {result['state_distribution']['active']}")
-            print(f"   • 坤卦（shadow）: {result['state_distribution']['shadow']}")
-            print(f"   • 坎卦（disabled）: {result['state_distribution']['disabled']}")
-        except Exception as e:
-            print(f"[WARN] Lifecycle engine failed: {e}")
-    
-    # 4.7. Lifecycle Check (每次心跳，只读模式)
+
+
+def _stage_lifecycle_engine(ctx):
+    # Agent Lifecycle Engine (每小时整点)
+    try:
+        from agent_lifecycle_engine import run_lifecycle_engine
+        print(f"\n[LIFECYCLE] Agent Lifecycle Engine:")
+        result = run_lifecycle_engine()
+        print(f"   ✓ Updated {result['updated_agents']}/{result['total_agents']} agents")
+        print(f"   • 乾卦（active）: {result['state_distribution']['active']}")
+        print(f"   • 坤卦（shadow）: {result['state_distribution']['shadow']}")
+        print(f"   • 坎卦（disabled）: {result['state_distribution']['disabled']}")
+    except Exception as e:
+        print(f"[WARN] Lifecycle engine failed: {e}")
+
+
+def _stage_lifecycle_check(ctx):
+    # Lifecycle Check (每次心跳，只读模式)
     try:
         from heartbeat_lifecycle import run_lifecycle_check
         print(f"\n[LIFECYCLE_CHECK] Agent Lifecycle Status:")
@@ -1132,7 +1198,10 @@ def main():
     except Exception as e:
         print(f"[WARN] Lifecycle check failed: {e}")
 
+
+def _stage_dispatch(ctx):
     # ── P2.5-1: 中枢统一派发 ──────────────────────────────────────────────────
+    dispatch_bridge = ctx.shared["bridge"]
     event_count = dispatch_bridge.get_event_count()
     if event_count > 0:
         print(f"\n[DISPATCH] 中枢处理 ({event_count} events):")
@@ -1140,8 +1209,12 @@ def main():
         print(dispatch_bridge.get_summary())
     else:
         print(f"\n[DISPATCH] 中枢: 无异常事件")
-    
-    # 5. Output summary
+
+
+def _stage_summary(ctx):
+    # Output summary
+    queue_result = ctx.results.get("task_queue") or {"processed": 0}
+    health = ctx.results.get("health_check") or {"score": 0}
     idem_metrics = get_idempotency_metrics()
     print(f"\n{'=' * 62}")
     if queue_result["processed"] > 0:
@@ -1152,6 +1225,91 @@ def main():
     print(f"{'=' * 62}\n")
 
 
+# 向中枢 bridge 提交事件的阶段：dispatch 必须在它们之后
+_BRIDGE_STAGES = ("token_monitor", "zombie_reclaim", "evolution_guard", "health_check", "skill_failure_alert")
+
+HEARTBEAT_STAGES = [
+    Stage("startup_cleanup", _stage_startup_cleanup),
+    Stage("self_healing", _stage_self_healing),
+    Stage("bigua", _stage_bigua),
+    Stage("token_monitor", _stage_token_monitor),
+    Stage("spawn_requests", _stage_spawn_requests, schedule=hourly()),
+    Stage("low_success_regeneration", _stage_low_success_regeneration,
+          deps=("spawn_requests",), schedule=hourly(), timeout=300),
+    Stage("learner_metrics", _stage_learner_metrics, deps=("low_success_regeneration",), schedule=hourly()),
+    Stage("adversarial_dashboard", _stage_adversarial_dashboard, schedule=hourly()),
+    Stage("hexagram_timeline", _stage_hexagram_timeline, schedule=hourly()),
+    Stage("spawn_pending", _stage_spawn_pending),
+    Stage("zombie_reclaim", _stage_zombie_reclaim),
+    Stage("task_queue", _stage_task_queue, deps=("zombie_reclaim",), timeout=QUEUE_STAGE_TIMEOUT),
+    Stage("evolution_guard", _stage_evolution_guard),
+    # 健康分读取本轮的队列/执行结果，需在 task_queue 之后
+    Stage("health_check", _stage_health_check, deps=("evolution_guard", "task_queue")),
+    Stage("agent_stats_sync", _stage_agent_stats_sync, schedule=hourly()),
+    Stage("spawn_lock_health", _stage_spawn_lock_health, schedule=hourly()),
+    Stage("skill_memory", _stage_skill_memory, schedule=hourly(), timeout=120),
+    Stage("skill_failure_alert", _stage_skill_failure_alert, schedule=hourly()),
+    Stage("skill_analyzer", _stage_skill_analyzer, deps=("skill_memory",), schedule=weekly(0, hour=0), timeout=300),
+    Stage("learnings_extractor", _stage_learnings_extractor, schedule=daily(0, 12), timeout=300),
+    Stage("diary", _stage_diary, schedule=daily(23), timeout=120),
+    Stage("hexagram_daily", _stage_hexagram_daily, schedule=daily(23)),
+    Stage("learning_observer", _stage_learning_observer, schedule=daily(0)),
+    Stage("learning_triggers", _stage_learning_triggers, schedule=hourly()),
+    Stage("memory_server_health", _stage_memory_server_health, timeout=30),
+    Stage("exec_latency", _stage_exec_latency),
+    Stage("token_report", _stage_token_report, schedule=daily(0)),
+    Stage("daily_metrics", _stage_daily_metrics, schedule=daily(0, 12), timeout=300),
+    Stage("ledger_summary", _stage_ledger_summary),
+    Stage("learning_agents_status", _stage_learning_agents_status),
+    Stage("lifecycle_engine", _stage_lifecycle_engine, schedule=hourly()),
+    Stage("lifecycle_check", _stage_lifecycle_check, deps=("lifecycle_engine",)),
+    Stage("dispatch", _stage_dispatch, deps=_BRIDGE_STAGES),
+    Stage("summary", _stage_summary, deps=("task_queue", "health_check", "dispatch")),
+]
+
+_stage_runner = None
+
+
+def get_stage_runner() -> StageRunner:
+    """全局 StageRunner（线程池和"仍在运行"状态跨心跳保留）"""
+    global _stage_runner
+    if _stage_runner is None:
+        _stage_runner = StageRunner(
+            HEARTBEAT_STAGES,
+            max_workers=HEARTBEAT_STAGE_WORKERS,
+            instrument=get_profiler().stage,
+        )
+    return _stage_runner
+
+
+def main(runner: StageRunner = None) -> dict:
+    """
+    Main heartbeat function.
+
+    各阶段按 HEARTBEAT_STAGES 的依赖并行执行；返回 run_tick 的逐阶段结果。
+    """
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"╔══════════════════════════════════════════════════════════════╗")
+    print(f"║  AIOS Heartbeat v5.0 - {timestamp}  ║")
+    print(f"╚══════════════════════════════════════════════════════════════╝\n")
+
+    runner = runner or get_stage_runner()
+    # P2.5-1: 每轮一个中枢桥接器；逐阶段耗时 / CPU / IO 写入 data/heartbeat_profile.jsonl
+    with get_profiler().tick():
+        report = runner.run_tick(bridge=HeartbeatDispatcherBridge())
+
+    problems = [f"{name}={r['status']}" for name, r in report.items() if r["status"] != "ok"]
+    slowest = sorted(
+        ((r["duration_ms"], name) for name, r in report.items() if r["duration_ms"] is not None),
+        reverse=True,
+    )[:3]
+    print(f"[STAGES] {len(report)} stages | slowest: "
+          + ", ".join(f"{name} {ms / 1000:.1f}s" for ms, name in slowest))
+    if problems:
+        print(f"   ⚠️  {', '.join(problems)}")
+    return report
+
+
 class HeartbeatSchedulerV5:
     """
     Heartbeat scheduler with boot recovery + periodic recovery.
@@ -1233,7 +1391,11 @@ class HeartbeatSchedulerV5:
         )
 
     def _run_loop(self) -> None:
-        """主循环：每次调用 main() 并 tick()。"""
+        """
+        主循环：每次调用 main() 并 tick()。
+        阶段在 StageRunner 的线程池里执行：卡住的阶段超时后本轮不再等待，之后几轮跳过，
+        不会拖住这个循环。
+        """
         while True:
             now_ts = time.time()
             try:
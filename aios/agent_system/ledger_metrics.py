@@ -21,7 +21,8 @@ from collections import Counter, defaultdict
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional, Set
 
-from paths import ACTION_LEDGER, ACTIONS_STATE
+from paths import ACTION_LEDGER
+from reality_ledger import list_actions
 
 
 def parse_iso(ts: Optional[str]) -> Optional[datetime]:
@@ -199,7 +200,7 @@ def compute_metrics(hours: int = 24) -> Dict[str, Any]:
     since = now - timedelta(hours=hours)
     
     events = load_jsonl(ACTION_LEDGER)
-    actions = load_jsonl(ACTIONS_STATE)
+    actions = [a.to_dict() for a in list_actions(limit=None)]
     
     # 第一层：聚合
     agg = aggregate_actions(events, actions, since)
@@ -276,7 +277,7 @@ def compute_metrics(hours: int = 24) -> Dict[str, Any]:
         if v is not None:
             lock_hold_ms.append(v)
     
-    # ── 4. 当前状态（从 actions_state.jsonl）──
+    # ── 4. 当前状态（从 actions_state 快照表）──
     current_status_counts = Counter()
     current_locked_actions = set()
     stale_locked_actions = set()  # locked 超过 5 分钟
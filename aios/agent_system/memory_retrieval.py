@@ -4,6 +4,7 @@ LanceDB-based semantic memory: ingest 鈫?query 鈫?rerank 鈫?inject 鈫?feedba
 """
 
 import json
+import threading
 import time
 import uuid
 from datetime import datetime, timezone
@@ -22,16 +23,27 @@ TOP_K = 10
 
 # 鈹€鈹€ Singleton model (lazy load) 鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€
 _model: Optional[SentenceTransformer] = None
+_model_lock = threading.Lock()
+# helpfulness updates are read-modify-write; serialize them (memory_server is threaded)
+_feedback_lock = threading.Lock()
 
 def _get_model() -> SentenceTransformer:
     global _model
     if _model is None:
-        _model = SentenceTransformer(MODEL_NAME)
+        with _model_lock:
+            if _model is None:
+                _model = SentenceTransformer(MODEL_NAME)
     return _model
 
 def _embed(text: str) -> list[float]:
     return _get_model().encode(text, normalize_embeddings=True).tolist()
 
+def _embed_many(texts: list[str]) -> list[list[float]]:
+    """One forward pass for a batch of texts."""
+    if not texts:
+        return []
+    return _get_model().encode(texts, normalize_embeddings=True).tolist()
+
 
 # 鈹€鈹€ Schema 鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€
 # id, text, vector, task_type, outcome, timestamp, tags, helpfulness
@@ -94,8 +106,36 @@ def query(
 ) -> list[dict]:
     """Semantic search. Returns reranked results."""
     tbl = _get_table()
-    vec = _embed(question)
+    return _search(tbl, _embed(question), top_k, task_type, outcome_filter)
+
+
+def query_batch(queries: list[dict]) -> list[list[dict]]:
+    """
+    Batched semantic search: one embedding forward pass for all queries.
+
+    Args:
+        queries: [{"text": ..., "task_type": ..., "top_k": ...}, ...]
 
+    Returns:
+        Reranked hits per query, in input order.
+    """
+    if not queries:
+        return []
+    tbl = _get_table()
+    vectors = _embed_many([q.get("text", "") for q in queries])
+    return [
+        _search(tbl, vec, q.get("top_k", TOP_K), q.get("task_type") or None, q.get("outcome_filter"))
+        for q, vec in zip(queries, vectors)
+    ]
+
+
+def _search(
+    tbl,
+    vec: list[float],
+    top_k: int,
+    task_type: str | None,
+    outcome_filter: str | None,
+) -> list[dict]:
     results = tbl.search(vec).limit(top_k * 3).to_list()
 
     # Basic filter (skip empty task_type in records)
@@ -145,14 +185,40 @@ def build_context(question: str, top_k: int = 5, task_type: str | None = None) -
 # 鈹€鈹€ Feedback 鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€鈹€
 def feedback(record_id: str, helpful: bool) -> bool:
     """Update helpfulness score for a memory record."""
-    tbl = _get_table()
-    rows = tbl.search([0.0] * 384).limit(10000).to_list()
-    target = next((r for r in rows if r.get("id") == record_id), None)
-    if not target:
-        return False
-    new_h = min(1.0, target["helpfulness"] + 0.1) if helpful else max(0.0, target["helpfulness"] - 0.1)
-    tbl.update(where=f"id = '{record_id}'", values={"helpfulness": new_h})
-    return True
+    return feedback_batch([(record_id, helpful)])[0]
+
+
+def feedback_batch(items: list[tuple[str, bool]]) -> list[bool]:
+    """
+    Update helpfulness for several records: one table scan, one update per record.
+
+    Args:
+        items: [(record_id, helpful), ...]; the same id may repeat (applied in order)
+
+    Returns:
+        Per item: True if the record exists.
+    """
+    if not items:
+        return []
+    ids = {rid for rid, _ in items if rid}
+    with _feedback_lock:
+        tbl = _get_table()
+        rows = tbl.search([0.0] * 384).limit(10000).to_list() if ids else []
+        current = {r["id"]: float(r["helpfulness"]) for r in rows if r.get("id") in ids}
+
+        found = []
+        for rid, helpful in items:
+            if rid not in current:
+                found.append(False)
+                continue
+            h = current[rid]
+            current[rid] = min(1.0, h + 0.1) if helpful else max(0.0, h - 0.1)
+            found.append(True)
+
+        for rid in ids & current.keys():
+            safe = rid.replace("'", "''")
+            tbl.update(where=f"id = '{safe}'", values={"helpfulness": current[rid]})
+    return found
 
 
 from paths import TASK_EXECUTIONS
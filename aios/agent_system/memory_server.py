@@ -9,28 +9,108 @@ Usage:
 
 Endpoints:
   GET  /status
-  POST /query   {"text": "...", "task_type": "code", "top_k": 3}
-  POST /ingest  {"text": "...", "task_type": "code", "outcome": "success", "record_id": "..."}
-  POST /feedback {"record_id": "...", "helpful": true}
+  POST /query          {"text": "...", "task_type": "code", "top_k": 3}
+  POST /query_batch    {"queries": [{"text": "...", "task_type": "code", "top_k": 3}, ...]}
+  POST /ingest         {"text": "...", "task_type": "code", "outcome": "success", "record_id": "..."}
+  POST /feedback       {"record_id": "...", "helpful": true}
+  POST /feedback_batch {"items": [{"record_id": "...", "helpful": true}, ...]}
+
+The server is threaded (one thread per connection, HTTP/1.1 keep-alive) and shares
+one model. Retrieval / feedback log lines are queued and written by a background
+thread, never inside the request handler.
 """
 import json
+import queue
 import sys
 import threading
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import time
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 PORT = 7788
 BASE_DIR = Path(__file__).resolve().parent
 sys.path.insert(0, str(BASE_DIR))
 
+RETRIEVAL_LOG = BASE_DIR / "memory_retrieval_log.jsonl"
+FEEDBACK_LOG = BASE_DIR / "reports" / "feedback_log.jsonl"
+
 # Pre-load on import (happens once at server start)
 print("[MEMORY_SERVER] Loading embedding model...", flush=True)
-from memory_retrieval import query, ingest, feedback, _get_model
+from memory_retrieval import query, query_batch, ingest, feedback, feedback_batch, _get_model
 _get_model()  # warm up
 print("[MEMORY_SERVER] Model ready.", flush=True)
 
 
+class _LogWriter:
+    """Background JSONL appender: handlers enqueue, one thread writes (grouped per file)."""
+
+    def __init__(self, flush_interval: float = 0.5):
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        threading.Thread(target=self._run, name="memory-server-log", daemon=True).start()
+
+    def write(self, path: Path, entry: dict) -> None:
+        self._queue.put((path, entry))
+
+    def _run(self) -> None:
+        while True:
+            try:
+                items = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            by_path: dict = {}
+            for path, entry in items:
+                by_path.setdefault(path, []).append(json.dumps(entry, ensure_ascii=False) + "\n")
+            for path, lines in by_path.items():
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(path, "a", encoding="utf-8") as f:
+                        f.write("".join(lines))
+                except Exception:
+                    pass
+
+
+_log = _LogWriter()
+
+
+def _now_cst() -> str:
+    return datetime.now(timezone(timedelta(hours=8))).isoformat()
+
+
+def _public(hit: dict) -> dict:
+    """Drop the embedding vector from a hit (clients only need text/score/id)."""
+    return {k: v for k, v in hit.items() if k != "vector"}
+
+
+def _log_query(text: str, elapsed_ms: float, result_count: int) -> None:
+    # 记录到 retrieval log（供 Gate 采集）
+    _log.write(RETRIEVAL_LOG, {
+        "timestamp": _now_cst(),
+        "latency_ms": elapsed_ms,
+        "result_count": result_count,
+        "query_text": text[:80],
+    })
+
+
+def _log_feedback(record_id: str, helpful: bool) -> None:
+    # 记录 feedback（供 Gate 质量采集）
+    _log.write(FEEDBACK_LOG, {
+        "timestamp": _now_cst(),
+        "record_id": record_id,
+        "helpful": helpful,
+        "helpfulness": 0.6 if helpful else 0.4,
+    })
+
+
 class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
     def log_message(self, format, *args):
         pass  # suppress default access log
 
@@ -48,7 +128,7 @@ class Handler(BaseHTTPRequestHandler):
 
     def do_GET(self):
         if self.path == "/status":
-            self._respond({"status": "ok", "model": "all-MiniLM-L6-v2", "port": PORT})
+            self._respond({"status": "ok", "model": "all-MiniLM-L6-v2", "port": self.server.server_address[1]})
         else:
             self._respond({"error": "not found"}, 404)
 
@@ -60,28 +140,30 @@ class Handler(BaseHTTPRequestHandler):
             return
 
         if self.path == "/query":
-            import time as _time
-            _t0 = _time.time()
+            _t0 = time.time()
             hits = query(
                 body.get("text", ""),
                 top_k=body.get("top_k", 3),
                 task_type=body.get("task_type") or None,
             )
-            _elapsed = round((_time.time() - _t0) * 1000, 1)
-            # 记录到 retrieval log（供 Gate 采集）
-            try:
-                from datetime import datetime as _dt, timezone as _tz, timedelta as _td
-                _log_entry = json.dumps({
-                    "timestamp": _dt.now(_tz(_td(hours=8))).isoformat(),
-                    "latency_ms": _elapsed,
-                    "result_count": len(hits),
-                    "query_text": body.get("text", "")[:80],
-                }, ensure_ascii=False)
-                with open(Path(__file__).parent / "memory_retrieval_log.jsonl", "a", encoding="utf-8") as _f:
-                    _f.write(_log_entry + "\n")
-            except Exception:
-                pass
-            self._respond({"hits": hits, "elapsed_ms": _elapsed})
+            _elapsed = round((time.time() - _t0) * 1000, 1)
+            _log_query(body.get("text", ""), _elapsed, len(hits))
+            self._respond({"hits": [_public(h) for h in hits], "elapsed_ms": _elapsed})
+
+        elif self.path == "/query_batch":
+            queries = body.get("queries", [])
+            _t0 = time.time()
+            results = query_batch([
+                {"text": q.get("text", ""), "top_k": q.get("top_k", 3), "task_type": q.get("task_type") or None}
+                for q in queries
+            ])
+            _elapsed = round((time.time() - _t0) * 1000, 1)
+            for q, hits in zip(queries, results):
+                _log_query(q.get("text", ""), _elapsed, len(hits))
+            self._respond({
+                "results": [[_public(h) for h in hits] for hits in results],
+                "elapsed_ms": _elapsed,
+            })
 
         elif self.path == "/ingest":
             rid = ingest(
@@ -95,27 +177,28 @@ class Handler(BaseHTTPRequestHandler):
 
         elif self.path == "/feedback":
             ok = feedback(body.get("record_id", ""), helpful=body.get("helpful", True))
-            # 记录 feedback（供 Gate 质量采集）
-            try:
-                from datetime import datetime as _dt, timezone as _tz, timedelta as _td
-                _fb_entry = json.dumps({
-                    "timestamp": _dt.now(_tz(_td(hours=8))).isoformat(),
-                    "record_id": body.get("record_id", ""),
-                    "helpful": body.get("helpful", True),
-                    "helpfulness": 0.6 if body.get("helpful", True) else 0.4,
-                }, ensure_ascii=False)
-                with open(Path(__file__).parent / "reports" / "feedback_log.jsonl", "a", encoding="utf-8") as _f:
-                    _f.write(_fb_entry + "\n")
-            except Exception:
-                pass
+            _log_feedback(body.get("record_id", ""), body.get("helpful", True))
             self._respond({"ok": ok})
 
+        elif self.path == "/feedback_batch":
+            items = [(i.get("record_id", ""), i.get("helpful", True)) for i in body.get("items", [])]
+            found = feedback_batch(items)
+            for record_id, helpful in items:
+                _log_feedback(record_id, helpful)
+            self._respond({"ok": found})
+
         else:
             self._respond({"error": "not found"}, 404)
 
 
+def make_server(port=PORT) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    return server
+
+
 def run(port=PORT):
-    server = HTTPServer(("127.0.0.1", port), Handler)
+    server = make_server(port)
     print(f"[MEMORY_SERVER] Listening on http://127.0.0.1:{port}", flush=True)
     server.serve_forever()
 
@@ -1,5 +1,5 @@
 """
-reality_ledger.py - Reality Ledger v0.2
+reality_ledger.py - Reality Ledger v0.3
 
 append-only 记录真实发生过的动作事件。
 不是模拟器，不负责决策，不负责执行。
@@ -9,12 +9,24 @@ v0.2 变更：
 - 状态机压实：executing 不直接 → released
 - released 必须带 release_reason
 - transition_action 自动设置 outcome
+
+v0.3 变更：
+- 动作快照从 actions_state.jsonl（每次迁移全量重写）移到 aios.db 的 actions_state 表
+  （见 aios_store.ACTIONS_STATE_SCHEMA）：get_action 是主键查找，
+  list_actions(status/outcome) 走 (status, outcome, seq) 索引
+- action_ledger.jsonl 仍是 append-only 事件流；快照更新和事件追加在同一个
+  BEGIN IMMEDIATE 事务里（事件先写，提交失败时快照落后于账本，可重放）
+- transition_many：一个事务 + 一次追加完成一批迁移（heartbeat 批量 released）
+- create_actions：一个事务 + 一次追加创建一批 action（heartbeat 每个 chunk 一次）
+旧的 actions_state.jsonl 首次使用时自动导入，并改名为 actions_state.jsonl.migrated。
 """
 
 import json
-from typing import Any, Dict, List, Optional
-from pathlib import Path
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+import aios_store
 from action_schema import (
     ActionRecord,
     LedgerEvent,
@@ -30,6 +42,42 @@ from action_schema import (
     get_outcome_for_released,
 )
 from paths import ACTION_LEDGER, ACTIONS_STATE
+from task_queue import _file_mutex
+
+# ── 存储 ──────────────────────────────────────────────────────────────────────
+ACTIONS_STATE_FILE = ACTIONS_STATE   # 旧版 JSONL 快照（只用于迁移）
+LEDGER_DB = aios_store.DB_PATH
+
+_local = threading.local()
+_ID_CHUNK = 500  # IN (...) 每批的变量个数
+
+
+def _conn():
+    """当前线程的连接（autocommit）；首次打开时建表并导入旧 JSONL 快照"""
+    key = (os.getpid(), str(LEDGER_DB))
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.key != key:
+        conn = aios_store.get_conn(LEDGER_DB)
+        conn.isolation_level = None
+        conn.execute("PRAGMA synchronous=NORMAL")
+        aios_store.init_actions_state(conn)
+        _migrate_legacy_file()
+        _local.conn = conn
+        _local.key = key
+    return conn
+
+
+def _migrate_legacy_file() -> None:
+    if not ACTIONS_STATE_FILE.exists():
+        return
+    with _file_mutex(ACTIONS_STATE_FILE):
+        if ACTIONS_STATE_FILE.exists():  # 其他进程可能已经迁移
+            aios_store.migrate_actions_state(ACTIONS_STATE_FILE, LEDGER_DB)
+            os.replace(ACTIONS_STATE_FILE, ACTIONS_STATE_FILE.with_suffix(".jsonl.migrated"))
+
+
+def _row_to_action(row) -> ActionRecord:
+    return ActionRecord.from_dict(json.loads(row["record"]))
 
 
 # ── 核心接口 ──────────────────────────────────────────────────────────────────
@@ -48,45 +96,88 @@ def create_action(
     tags: Optional[List[str]] = None,
 ) -> ActionRecord:
     """创建 Action Record，状态初始为 proposed，outcome 初始为 unknown。"""
-    action_id = new_action_id()
-    now = utc_now_iso()
-
-    action = ActionRecord(
-        action_id=action_id,
-        actor=actor,
-        source=source,
-        resource_type=resource_type,
-        resource_id=resource_id,
-        action_type=action_type,
-        payload=payload or {},
-        risk_level=risk_level,
-        idempotency_key=idempotency_key,
-        preconditions=preconditions or [],
-        status="proposed",
-        outcome="unknown",
-        created_at=now,
-        updated_at=now,
-        lock_resource=lock_resource,
-        lock_token=None,
-        result_summary=None,
-        error=None,
-        tags=tags or [],
-    )
+    return create_actions([{
+        "actor": actor,
+        "source": source,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "action_type": action_type,
+        "payload": payload,
+        "risk_level": risk_level,
+        "idempotency_key": idempotency_key,
+        "preconditions": preconditions,
+        "lock_resource": lock_resource,
+        "tags": tags,
+    }])[0]
+
+
+def create_actions(specs: Iterable[Dict[str, Any]]) -> List[ActionRecord]:
+    """
+    批量创建：一个事务、一次账本追加。
 
-    event = LedgerEvent(
-        event_id=new_event_id(),
-        action_id=action_id,
-        event_type="proposed",
-        timestamp=now,
-        actor=actor,
-        status_before="",
-        status_after="proposed",
-        payload={},
-    )
+    Args:
+        specs: [{create_action 的参数}, ...]
 
-    _append_event_to_ledger(event)
-    _update_action_state(action)
-    return action
+    Returns:
+        新建的 ActionRecord（按输入顺序）
+    """
+    actions: List[ActionRecord] = []
+    events: List[LedgerEvent] = []
+    for spec in specs:
+        now = utc_now_iso()
+        action = ActionRecord(
+            action_id=new_action_id(),
+            actor=spec["actor"],
+            source=spec["source"],
+            resource_type=spec["resource_type"],
+            resource_id=spec["resource_id"],
+            action_type=spec["action_type"],
+            payload=spec.get("payload") or {},
+            risk_level=spec.get("risk_level") or "L1",
+            idempotency_key=spec.get("idempotency_key"),
+            preconditions=spec.get("preconditions") or [],
+            status="proposed",
+            outcome="unknown",
+            created_at=now,
+            updated_at=now,
+            lock_resource=spec.get("lock_resource"),
+            lock_token=None,
+            result_summary=None,
+            error=None,
+            tags=spec.get("tags") or [],
+        )
+        actions.append(action)
+        events.append(LedgerEvent(
+            event_id=new_event_id(),
+            action_id=action.action_id,
+            event_type="proposed",
+            timestamp=now,
+            actor=action.actor,
+            status_before="",
+            status_after="proposed",
+            payload={},
+        ))
+    if not actions:
+        return []
+
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO actions_state (action_id, status, outcome, updated_at, record) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (a.action_id, a.status, a.outcome, a.updated_at,
+                 json.dumps(a.to_dict(), ensure_ascii=False))
+                for a in actions
+            ],
+        )
+        _append_events_to_ledger(events)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return actions
 
 
 def transition_action(
@@ -103,11 +194,168 @@ def transition_action(
     3. 如果是 released，校验 release_reason 并继承 outcome
     4. 追加 event
     5. 更新 action 快照
+
+    Raises:
+        ValueError: action 不存在 / 迁移不合法
+    """
+    applied, errors = transition_many([{
+        "action_id": action_id,
+        "event_type": event_type,
+        "actor": actor,
+        "payload": payload,
+    }])
+    if errors:
+        raise ValueError(errors[0][1])
+    return applied[0]
+
+
+def transition_many(
+    transitions: Iterable[Dict[str, Any]],
+) -> Tuple[List[ActionRecord], List[Tuple[int, str]]]:
     """
-    action = get_action(action_id)
-    if not action:
-        raise ValueError(f"Action not found: {action_id}")
+    批量状态迁移：一个事务、一次账本追加。
 
+    Args:
+        transitions: [{"action_id", "event_type", "actor"?, "payload"?}, ...]
+            同一 action 可以出现多次，按顺序在前一次的结果上迁移。
+
+    Returns:
+        (applied, errors)
+        - applied: 成功迁移后的 ActionRecord（按输入顺序）
+        - errors: [(输入下标, 错误信息)]；不合法的迁移跳过，不写事件也不改快照，
+          不影响同批其他迁移（与逐条调用 transition_action 并忽略 ValueError 等价）
+    """
+    items = list(transitions)
+    if not items:
+        return [], []
+
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = _load_actions(conn, {t["action_id"] for t in items})
+        applied: List[ActionRecord] = []
+        errors: List[Tuple[int, str]] = []
+        events: List[LedgerEvent] = []
+        touched: Dict[str, ActionRecord] = {}
+
+        for i, t in enumerate(items):
+            action = current.get(t["action_id"])
+            if action is None:
+                errors.append((i, f"Action not found: {t['action_id']}"))
+                continue
+            try:
+                event = _apply_transition(action, t["event_type"], t.get("actor"), t.get("payload"))
+            except ValueError as e:
+                errors.append((i, str(e)))
+                continue
+            events.append(event)
+            touched[action.action_id] = action
+            applied.append(ActionRecord.from_dict(action.to_dict()))
+
+        if events:
+            conn.executemany(
+                "UPDATE actions_state SET status = ?, outcome = ?, updated_at = ?, record = ? "
+                "WHERE action_id = ?",
+                [
+                    (a.status, a.outcome, a.updated_at,
+                     json.dumps(a.to_dict(), ensure_ascii=False), a.action_id)
+                    for a in touched.values()
+                ],
+            )
+            _append_events_to_ledger(events)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return applied, errors
+
+
+def get_action(action_id: str) -> Optional[ActionRecord]:
+    """读取 action 当前状态（主键查找）。"""
+    row = _conn().execute(
+        "SELECT record FROM actions_state WHERE action_id = ?", (action_id,)
+    ).fetchone()
+    return _row_to_action(row) if row else None
+
+
+def list_actions(
+    status: Optional[str] = None,
+    outcome: Optional[str] = None,
+    limit: Optional[int] = 100,
+) -> List[ActionRecord]:
+    """查询 action 列表，支持按 status/outcome 过滤（走索引），返回最新的 limit 条（按创建顺序，None 为全部）。"""
+    where, params = [], []
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if outcome:
+        where.append("outcome = ?")
+        params.append(outcome)
+    sql = "SELECT record FROM actions_state"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY seq DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    rows = _conn().execute(sql, params).fetchall()
+    return [_row_to_action(r) for r in reversed(rows)]
+
+
+def count_actions_by_status() -> Dict[str, int]:
+    """按 status 计数（索引覆盖扫描）。"""
+    rows = _conn().execute(
+        "SELECT status, COUNT(*) AS n FROM actions_state GROUP BY status"
+    ).fetchall()
+    return {r["status"]: r["n"] for r in rows}
+
+
+def list_events(
+    action_id: Optional[str] = None,
+    limit: int = 100,
+) -> List[LedgerEvent]:
+    """查询事件历史。"""
+    if not ACTION_LEDGER.exists():
+        return []
+    events = []
+    with open(ACTION_LEDGER, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                if action_id is None or data.get("action_id") == action_id:
+                    events.append(LedgerEvent.from_dict(data))
+            except Exception:
+                continue
+    return events[-limit:]
+
+
+# ── 内部函数 ──────────────────────────────────────────────────────────────────
+
+def _load_actions(conn, action_ids) -> Dict[str, ActionRecord]:
+    """按主键批量读取 action"""
+    ids = list(action_ids)
+    actions: Dict[str, ActionRecord] = {}
+    for i in range(0, len(ids), _ID_CHUNK):
+        chunk = ids[i:i + _ID_CHUNK]
+        rows = conn.execute(
+            f"SELECT record FROM actions_state WHERE action_id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        ).fetchall()
+        for row in rows:
+            action = _row_to_action(row)
+            actions[action.action_id] = action
+    return actions
+
+
+def _apply_transition(
+    action: ActionRecord,
+    event_type: str,
+    actor: Optional[str],
+    payload: Optional[Dict[str, Any]],
+) -> LedgerEvent:
+    """校验并在 action 上原地应用一次迁移，返回对应事件（校验失败抛 ValueError，action 不变）"""
     current_status = action.status
     target_status = event_type
     payload = payload or {}
@@ -135,10 +383,9 @@ def transition_action(
         if outcome != "unknown":
             action.outcome = outcome
 
-    # 追加事件
     event = LedgerEvent(
         event_id=new_event_id(),
-        action_id=action_id,
+        action_id=action.action_id,
         event_type=event_type,
         timestamp=utc_now_iso(),
         actor=actor or action.actor,
@@ -146,7 +393,6 @@ def transition_action(
         status_after=target_status,
         payload=payload,
     )
-    _append_event_to_ledger(event)
 
     # 更新 action 状态
     action.status = target_status
@@ -166,106 +412,20 @@ def transition_action(
     elif event_type == "failed":
         action.error = payload.get("error")
 
-    _update_action_state(action)
-    return action
-
-
-def get_action(action_id: str) -> Optional[ActionRecord]:
-    """从 actions_state.jsonl 读取 action 当前状态。"""
-    if not ACTIONS_STATE.exists():
-        return None
-    with open(ACTIONS_STATE, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                data = json.loads(line)
-                if data.get("action_id") == action_id:
-                    return ActionRecord.from_dict(data)
-            except Exception:
-                continue
-    return None
-
-
-def list_actions(
-    status: Optional[str] = None,
-    outcome: Optional[str] = None,
-    limit: int = 100,
-) -> List[ActionRecord]:
-    """查询 action 列表，支持按 status/outcome 过滤。"""
-    if not ACTIONS_STATE.exists():
-        return []
-    results = []
-    with open(ACTIONS_STATE, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                data = json.loads(line)
-                if status and data.get("status") != status:
-                    continue
-                if outcome and data.get("outcome") != outcome:
-                    continue
-                results.append(ActionRecord.from_dict(data))
-            except Exception:
-                continue
-    return results[-limit:]
-
-
-def list_events(
-    action_id: Optional[str] = None,
-    limit: int = 100,
-) -> List[LedgerEvent]:
-    """查询事件历史。"""
-    if not ACTION_LEDGER.exists():
-        return []
-    events = []
-    with open(ACTION_LEDGER, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                data = json.loads(line)
-                if action_id is None or data.get("action_id") == action_id:
-                    events.append(LedgerEvent.from_dict(data))
-            except Exception:
-                continue
-    return events[-limit:]
-
+    return event
 
-# ── 内部函数 ──────────────────────────────────────────────────────────────────
 
-def _append_event_to_ledger(event: LedgerEvent):
-    """追加事件到 action_ledger.jsonl（append-only）"""
+def _append_events_to_ledger(events: List[LedgerEvent]):
+    """追加事件到 action_ledger.jsonl（append-only，一批一次写入）"""
     ACTION_LEDGER.parent.mkdir(parents=True, exist_ok=True)
     with open(ACTION_LEDGER, "a", encoding="utf-8") as f:
-        f.write(json.dumps(event.to_dict(), ensure_ascii=False) + "\n")
-
-
-def _update_action_state(action: ActionRecord):
-    """更新 actions_state.jsonl（v0: 全量重写）"""
-    ACTIONS_STATE.parent.mkdir(parents=True, exist_ok=True)
-    actions = {}
-    if ACTIONS_STATE.exists():
-        with open(ACTIONS_STATE, "r", encoding="utf-8") as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                try:
-                    data = json.loads(line)
-                    actions[data["action_id"]] = data
-                except Exception:
-                    continue
-    actions[action.action_id] = action.to_dict()
-    with open(ACTIONS_STATE, "w", encoding="utf-8") as f:
-        for action_data in actions.values():
-            f.write(json.dumps(action_data, ensure_ascii=False) + "\n")
+        f.write("".join(json.dumps(e.to_dict(), ensure_ascii=False) + "\n" for e in events))
 
 
 # ── 测试 ──────────────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
-    print("Reality Ledger v0.2 - Test")
+    print("Reality Ledger v0.3 - Test")
     print("=" * 60)
 
     # 1. 成功路径: proposed → locked → executing → completed → released
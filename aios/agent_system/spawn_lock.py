@@ -2,6 +2,7 @@
 """
 Idempotent Spawn Lock - 方案 A（本地文件锁）
 支持 fcntl (Linux/Mac) / msvcrt (Windows) 双平台
+锁表按 key 分片，每个分片一把文件锁 + 追加写 journal（定期压缩）
 
 接口抽象为 LockStore，后续可平滑切 Redis（方案 B）。
 
@@ -12,14 +13,18 @@ Idempotent Spawn Lock - 方案 A（本地文件锁）
 4. 可观测性：idempotent_hit_rate / lock_acquire_latency / stale_lock_recovered_total
 """
 
+import atexit
+import heapq
 import json
 import os
+import threading
 import time
 import uuid
 import platform
+import zlib
 from pathlib import Path
 from contextlib import contextmanager
-from typing import Optional
+from typing import Dict, List, Optional
 
 # Import unified paths
 from paths import SPAWN_LOCKS, SPAWN_LOCK_METRICS, TASK_QUEUE
@@ -68,35 +73,204 @@ def _file_mutex(path: Path):
         fh.close()
 
 
+# ── 分片 ──────────────────────────────────────────────────────────────────────
+class _Shard:
+    """
+    一个锁分片：内存锁表 + 追加写 journal + TTL 堆。
+
+    journal 每行一条记录：
+        {"op": "acquire", "task_key": ..., "lock_token": ..., "worker_id": ..., "locked_at": ...}
+        {"op": "release", "task_key": ...}
+    每次操作前在分片文件锁内读取 journal 新增部分（其他进程写入的记录），
+    内存锁表因此与磁盘一致；文件被压缩替换（inode 变化）时从头重放。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.mutex = threading.Lock()      # 进程内（线程间）
+        self.locks: Dict[str, dict] = {}
+        self.heap: List[tuple] = []        # (locked_at, task_key, lock_token)，惰性删除
+        self.records = 0                   # journal 当前行数
+        self._offset = 0
+        self._file_id: Optional[tuple] = None
+
+    @contextmanager
+    def critical(self):
+        """线程锁 + 跨进程文件锁，进入时同步 journal"""
+        with self.mutex:
+            with _file_mutex(self.path):
+                self._sync()
+                yield
+
+    def _reset(self) -> None:
+        self.locks.clear()
+        self.heap.clear()
+        self.records = 0
+        self._offset = 0
+
+    def _apply(self, rec: dict) -> None:
+        key = rec.get("task_key")
+        if rec.get("op") == "acquire":
+            lock = {k: rec[k] for k in ("worker_id", "lock_token", "locked_at", "task_key")}
+            self.locks[key] = lock
+            heapq.heappush(self.heap, (lock["locked_at"], key, lock["lock_token"]))
+        else:
+            self.locks.pop(key, None)
+        self.records += 1
+
+    def _sync(self) -> None:
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            if self._file_id is not None:
+                self._reset()
+                self._file_id = None
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            file_id = (st.st_dev, st.st_ino)
+            if file_id != self._file_id or st.st_size < self._offset:
+                self._reset()
+                self._file_id = file_id
+            if st.st_size == self._offset:
+                return
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # 只消费完整行
+        for line in data[:end].splitlines():
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                continue
+        self._offset += end
+
+    def append(self, records: List[dict]) -> None:
+        """追加记录并应用到内存（调用方已在 critical() 内）"""
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(data)
+            st = os.fstat(f.fileno())
+        self._file_id = (st.st_dev, st.st_ino)
+        self._offset += len(data)
+        for rec in records:
+            self._apply(rec)
+
+    def compact(self) -> None:
+        """只保留活跃锁重写 journal（tmp + replace）"""
+        tmp = self.path.with_suffix(".tmp")
+        live = [dict(lock, op="acquire") for lock in self.locks.values()]
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rec in live:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+        self._reset()
+        self._file_id = None
+        self._sync()
+
+
 # ── LockStore 抽象（接口位，后续可换 Redis）────────────────────────────────────
 class LockStore:
     """
     本地文件实现的幂等锁存储。
     接口与 Redis 版本保持一致，后续切换只需替换此类。
+
+    - 锁表按 hash(task_key) 分成 shards 个分片，每个分片独立的文件锁 + journal，
+      不同 key 不再争用同一把锁、同一个文件
+    - journal 超过 compact_min_records 且是活跃锁的 4 倍以上时压缩
+    - 过期清理用按 locked_at 排序的堆，只弹出到期的锁
+    - 指标在内存累加，由后台线程每 metrics_flush_sec 秒把本进程的增量合并进
+      metrics 文件一次（退出时再合并一次），多个进程共用同一个文件不会互相覆盖
+
+    journal 目录：spawn_locks.json → spawn_locks.journal/shard-XX.jsonl。
+    首次启动时导入旧的 spawn_locks.json。同一目录的所有进程必须使用相同的 shards。
     """
 
-    def __init__(self, lock_file: Path = LOCK_FILE, ttl_sec: int = IDEMPOTENCY_TTL_SEC):
-        self.lock_file = lock_file
+    def __init__(
+        self,
+        lock_file: Path = LOCK_FILE,
+        ttl_sec: int = IDEMPOTENCY_TTL_SEC,
+        shards: int = 16,
+        compact_min_records: int = 1000,
+        metrics_file: Path = None,
+        metrics_flush_sec: float = 1.0,
+    ):
+        self.lock_file = Path(lock_file)
         self.ttl_sec = ttl_sec
-        self._metrics = self._load_metrics()
-
-    # ── 内部：读写锁表 ────────────────────────────────────────────────────────
-    def _read_locks(self) -> dict:
-        if not self.lock_file.exists():
-            return {}
-        try:
-            return json.loads(self.lock_file.read_text(encoding="utf-8"))
-        except Exception:
-            return {}
+        self.compact_min_records = compact_min_records
+        self.metrics_file = Path(metrics_file) if metrics_file else METRICS_FILE
+        self.metrics_flush_sec = metrics_flush_sec
+        self.journal_dir = self.lock_file.with_suffix(".journal")
+        self._shards = [
+            _Shard(self.journal_dir / f"shard-{i:02d}.jsonl") for i in range(shards)
+        ]
+        self._import_legacy()
 
-    def _write_locks(self, locks: dict):
-        self.lock_file.write_text(json.dumps(locks, ensure_ascii=False, indent=2), encoding="utf-8")
+        self._metrics = self._load_metrics()
+        self._metrics_delta: Dict[str, float] = {}  # 还没合并进文件的本进程增量
+        self._metrics_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        atexit.register(self.flush_metrics)
+
+    # ── 内部：分片 / 锁表 ─────────────────────────────────────────────────────
+    def _shard(self, task_key: str) -> _Shard:
+        return self._shards[zlib.crc32(task_key.encode("utf-8")) % len(self._shards)]
+
+    def _import_legacy(self) -> None:
+        """旧版 spawn_locks.json → journal（只在 journal 目录不存在时执行一次）"""
+        if self.journal_dir.exists():
+            return
+        with _file_mutex(self.lock_file):
+            if self.journal_dir.exists():
+                return
+            legacy = {}
+            if self.lock_file.exists():
+                try:
+                    legacy = json.loads(self.lock_file.read_text(encoding="utf-8"))
+                except Exception:
+                    legacy = {}
+            tmp_dir = self.journal_dir.with_suffix(".importing")
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            by_name: Dict[str, List[str]] = {}
+            for key, lock in legacy.items():
+                if not isinstance(lock, dict) or "lock_token" not in lock:
+                    continue
+                rec = {
+                    "op": "acquire",
+                    "task_key": key,
+                    "lock_token": lock["lock_token"],
+                    "worker_id": lock.get("worker_id"),
+                    "locked_at": lock.get("locked_at", 0),
+                }
+                name = self._shard(key).path.name
+                by_name.setdefault(name, []).append(json.dumps(rec, ensure_ascii=False))
+            for name, lines in by_name.items():
+                (tmp_dir / name).write_text("\n".join(lines) + "\n", encoding="utf-8")
+            os.replace(tmp_dir, self.journal_dir)
+
+    def list_locks(self) -> dict:
+        """所有分片的当前锁表（合并视图）"""
+        locks = {}
+        for shard in self._shards:
+            with shard.critical():
+                locks.update(shard.locks)
+        return locks
+
+    def get(self, task_key: str) -> Optional[dict]:
+        """读取一个锁（不存在返回 None）"""
+        shard = self._shard(task_key)
+        with shard.critical():
+            lock = shard.locks.get(task_key)
+            return dict(lock) if lock else None
+
+    def _maybe_compact(self, shard: _Shard) -> None:
+        if shard.records > max(self.compact_min_records, 4 * len(shard.locks)):
+            shard.compact()
 
     # ── 指标 ──────────────────────────────────────────────────────────────────
     def _load_metrics(self) -> dict:
-        if METRICS_FILE.exists():
+        if self.metrics_file.exists():
             try:
-                return json.loads(METRICS_FILE.read_text(encoding="utf-8"))
+                return json.loads(self.metrics_file.read_text(encoding="utf-8"))
             except Exception:
                 pass
         return {
@@ -107,22 +281,67 @@ class LockStore:
             "acquire_latency_ms_sum": 0.0,
         }
 
-    def _save_metrics(self):
-        METRICS_FILE.write_text(json.dumps(self._metrics, ensure_ascii=False, indent=2), encoding="utf-8")
+    def _count(self, **deltas) -> None:
+        """累加指标（按需启动后台写入线程）"""
+        with self._metrics_lock:
+            for key, delta in deltas.items():
+                self._metrics[key] = self._metrics.get(key, 0) + delta
+                self._metrics_delta[key] = self._metrics_delta.get(key, 0) + delta
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name="spawn-lock-metrics", daemon=True
+                )
+                self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.metrics_flush_sec)
+            self.flush_metrics()
+
+    def flush_metrics(self) -> None:
+        """
+        把本进程的指标增量合并进 metrics 文件。
+        读文件 → 累加 → tmp + replace 在文件锁内完成，其他进程的计数不会被覆盖；
+        写失败时增量留到下次再合并。
+        """
+        with self._metrics_lock:
+            if not self._metrics_delta:
+                return
+            delta, self._metrics_delta = self._metrics_delta, {}
+        tmp = self.metrics_file.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with _file_mutex(self.metrics_file):
+                merged = self._load_metrics()
+                for key, value in delta.items():
+                    merged[key] = merged.get(key, 0) + value
+                tmp.write_text(json.dumps(merged, ensure_ascii=False, indent=2), encoding="utf-8")
+                os.replace(tmp, self.metrics_file)
+        except OSError:
+            with self._metrics_lock:
+                for key, value in delta.items():
+                    self._metrics_delta[key] = self._metrics_delta.get(key, 0) + value
+            return
+        # 内存视图 = 文件里的合计 + 合并期间新增的增量
+        with self._metrics_lock:
+            for key, value in self._metrics_delta.items():
+                merged[key] = merged.get(key, 0) + value
+            self._metrics = merged
 
     def get_metrics(self) -> dict:
-        total = self._metrics["acquire_total"]
-        hits = self._metrics["idempotent_hit_total"]
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        total = metrics["acquire_total"]
+        hits = metrics["idempotent_hit_total"]
         latency_avg = (
-            self._metrics["acquire_latency_ms_sum"] / total if total > 0 else 0.0
+            metrics["acquire_latency_ms_sum"] / total if total > 0 else 0.0
         )
         return {
             "idempotent_hit_rate": round(hits / total, 4) if total > 0 else 0.0,
             "idempotent_hit_total": hits,
             "acquire_total": total,
-            "acquire_success": self._metrics["acquire_success"],
+            "acquire_success": metrics["acquire_success"],
             "lock_acquire_latency_ms_avg": round(latency_avg, 2),
-            "stale_lock_recovered_total": self._metrics["stale_lock_recovered_total"],
+            "stale_lock_recovered_total": metrics["stale_lock_recovered_total"],
         }
 
     # ── 核心接口 ──────────────────────────────────────────────────────────────
@@ -130,44 +349,46 @@ class LockStore:
         """
         尝试获取幂等锁。
         返回 lock_token（成功）或 None（已被锁定，幂等命中）。
-        原子操作：读→判定→写在文件锁临界区内完成。
+        原子操作：读→判定→写在分片文件锁临界区内完成。
         """
         t0 = time.time()
-        self._metrics["acquire_total"] += 1
         now = time.time()
-        token = None
+        stale = 0
+        shard = self._shard(task_key)
 
-        with _file_mutex(self.lock_file):
-            locks = self._read_locks()
-            existing = locks.get(task_key)
+        with shard.critical():
+            existing = shard.locks.get(task_key)
 
             if existing:
                 age = now - existing.get("locked_at", 0)
                 if age < self.ttl_sec:
                     # 幂等命中：锁仍有效
-                    self._metrics["idempotent_hit_total"] += 1
-                    latency_ms = (time.time() - t0) * 1000
-                    self._metrics["acquire_latency_ms_sum"] += latency_ms
-                    self._save_metrics()
+                    self._count(
+                        acquire_total=1,
+                        idempotent_hit_total=1,
+                        acquire_latency_ms_sum=(time.time() - t0) * 1000,
+                    )
                     return None
-                else:
-                    # 锁已过期（崩溃恢复）：可抢占
-                    self._metrics["stale_lock_recovered_total"] += 1
+                # 锁已过期（崩溃恢复）：可抢占
+                stale = 1
 
             # 写入新锁
             token = str(uuid.uuid4())
-            locks[task_key] = {
-                "worker_id": WORKER_ID,
+            shard.append([{
+                "op": "acquire",
+                "task_key": task_key,
                 "lock_token": token,
+                "worker_id": WORKER_ID,
                 "locked_at": now,
-                "task_key": task_key,
-            }
-            self._write_locks(locks)
-
-        self._metrics["acquire_success"] += 1
-        latency_ms = (time.time() - t0) * 1000
-        self._metrics["acquire_latency_ms_sum"] += latency_ms
-        self._save_metrics()
+            }])
+            self._maybe_compact(shard)
+
+        self._count(
+            acquire_total=1,
+            acquire_success=1,
+            stale_lock_recovered_total=stale,
+            acquire_latency_ms_sum=(time.time() - t0) * 1000,
+        )
         return token
 
     def release(self, task_key: str, lock_token: str) -> bool:
@@ -175,16 +396,16 @@ class LockStore:
         释放锁（仅释放自己持有的锁，防止误删）。
         返回 True 表示成功释放。
         """
-        with _file_mutex(self.lock_file):
-            locks = self._read_locks()
-            existing = locks.get(task_key)
+        shard = self._shard(task_key)
+        with shard.critical():
+            existing = shard.locks.get(task_key)
             if not existing:
                 return False
             # 校验 owner + token（CAS 语义）
             if existing.get("lock_token") != lock_token:
                 return False
-            del locks[task_key]
-            self._write_locks(locks)
+            shard.append([{"op": "release", "task_key": task_key}])
+            self._maybe_compact(shard)
         return True
 
     def force_release(self, task_key: str) -> bool:
@@ -198,36 +419,36 @@ class LockStore:
         Returns:
             True - 锁已释放（无论之前是否存在）
         """
-        with _file_mutex(self.lock_file):
-            locks = self._read_locks()
-            if task_key in locks:
-                del locks[task_key]
-                self._write_locks(locks)
-                self._metrics["force_release_total"] = self._metrics.get("force_release_total", 0) + 1
-                self._save_metrics()
+        shard = self._shard(task_key)
+        with shard.critical():
+            if task_key in shard.locks:
+                shard.append([{"op": "release", "task_key": task_key}])
+                self._maybe_compact(shard)
+                self._count(force_release_total=1)
         return True  # 幂等：不存在也算成功
 
     def cleanup_expired(self) -> int:
         """
         清理所有过期锁（Heartbeat 启动时调用）。
+        只从各分片的 TTL 堆顶弹出到期项，不扫描全部锁。
         返回清理数量。
         """
         now = time.time()
         cleaned = 0
-        with _file_mutex(self.lock_file):
-            locks = self._read_locks()
-            expired_keys = [
-                k for k, v in locks.items()
-                if now - v.get("locked_at", 0) >= self.ttl_sec
-            ]
-            for k in expired_keys:
-                del locks[k]
-                cleaned += 1
-            if cleaned:
-                self._write_locks(locks)
+        for shard in self._shards:
+            with shard.critical():
+                expired = []
+                while shard.heap and now - shard.heap[0][0] >= self.ttl_sec:
+                    _, key, token = heapq.heappop(shard.heap)
+                    lock = shard.locks.get(key)
+                    if lock and lock["lock_token"] == token:  # 已释放/被重新获取的条目跳过
+                        expired.append({"op": "release", "task_key": key})
+                if expired:
+                    shard.append(expired)
+                    self._maybe_compact(shard)
+                    cleaned += len(expired)
         if cleaned:
-            self._metrics["stale_lock_recovered_total"] += cleaned
-            self._save_metrics()
+            self._count(stale_lock_recovered_total=cleaned)
         return cleaned
 
 
@@ -299,12 +520,10 @@ def acquire_or_reuse(task: dict, existing_token: Optional[str] = None) -> tuple[
     
     # 如果有 existing_token，验证锁是否仍然有效
     if existing_token:
-        with _file_mutex(store.lock_file):
-            locks = store._read_locks()
-            existing = locks.get(key)
-            if existing and existing.get("lock_token") == existing_token:
-                # 锁仍然有效且属于自己，直接复用
-                return (existing_token, True)
+        existing = store.get(key)
+        if existing and existing.get("lock_token") == existing_token:
+            # 锁仍然有效且属于自己，直接复用
+            return (existing_token, True)
     
     # 否则正常 acquire
     token = store.acquire(key)
@@ -6,7 +6,7 @@ import json
 import time
 from pathlib import Path
 from datetime import datetime, timedelta
-from paths import SPAWN_LOCKS, SPAWN_LOCK_METRICS, SPAWN_LOCK_MONITOR_STATE, ALERTS
+from paths import SPAWN_LOCK_METRICS, SPAWN_LOCK_MONITOR_STATE, ALERTS
 
 # 配置
 STALE_THRESHOLD_SEC = 300  # 5分钟
@@ -14,11 +14,9 @@ CHECK_INTERVAL_SEC = 60    # 1分钟
 ALERT_FILE = ALERTS
 
 def load_locks():
-    """加载当前锁状态"""
-    if not SPAWN_LOCKS.exists():
-        return {}
-    with open(SPAWN_LOCKS, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """加载当前锁状态（分片 journal 的合并视图）"""
+    from spawn_lock import get_lock_store
+    return get_lock_store().list_locks()
 
 def load_metrics():
     """加载指标"""
@@ -1,14 +1,27 @@
 """
 Durable Task Queue with atomic state transitions and crash recovery.
+
+Two backends with the same interface:
+- TaskQueue: JSONL file (load-all / save-all under a file mutex)
+- SQLiteTaskQueue: WAL-mode SQLite table via aios_store; every operation is
+  a single indexed statement, acquire is an atomic UPDATE ... RETURNING
+
+Leases: claim_batch() hands out N tasks with a lease in one critical section,
+workers extend it with renew_leases(), and reclaim_expired_leases() returns
+tasks whose lease ran out to the queue (or fails them once retries are used up).
+
+open_task_queue() picks the backend (AIOS_TASK_QUEUE_BACKEND=sqlite|jsonl).
 """
 from __future__ import annotations
+import heapq
 import json
 import os
 import platform
 import threading
 import time
+import sqlite3
 from contextlib import contextmanager
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, fields
 from typing import Any, Dict, List, Optional, Literal
 from pathlib import Path
 
@@ -66,6 +79,7 @@ class TaskRecord:
     recovered_at: Optional[float] = None
     recovered_by: Optional[str] = None
     recover_reason: Optional[str] = None
+    lease_expires_at: Optional[float] = None
     
     def to_dict(self) -> Dict[str, Any]:
         return {k: v for k, v in asdict(self).items() if v is not None}
@@ -112,6 +126,7 @@ class TaskQueue:
                         recovered_at=data.get("recovered_at"),
                         recovered_by=data.get("recovered_by"),
                         recover_reason=data.get("recover_reason"),
+                        lease_expires_at=data.get("lease_expires_at"),
                     )
         return tasks
     
@@ -183,6 +198,111 @@ class TaskQueue:
                 self._save_all(tasks)
                 return task
     
+    def claim_batch(
+        self,
+        worker_id: str,
+        n: int,
+        lease_sec: float = 300,
+    ) -> List[TaskRecord]:
+        """
+        Atomically claim up to n pending tasks with a lease.
+        One load + one save for the whole batch; same order as acquire_task.
+        """
+        if n <= 0:
+            return []
+        with _QUEUE_LOCK:
+            with _file_mutex(self.queue_file):
+                tasks = self._load_all()
+                claimed = heapq.nsmallest(
+                    n,
+                    (t for t in tasks.values() if t.status == "pending"),
+                    key=lambda t: t.task_id,
+                )
+                if not claimed:
+                    return []
+                
+                now = time.time()
+                for task in claimed:
+                    task.status = "running"
+                    task.worker_id = worker_id
+                    task.started_at = now
+                    task.last_heartbeat_at = now
+                    task.lease_expires_at = now + lease_sec
+                
+                self._save_all(tasks)
+                return claimed
+    
+    def renew_leases(
+        self,
+        worker_id: str,
+        task_ids: List[str],
+        lease_sec: float = 300,
+    ) -> List[str]:
+        """
+        Extend the lease of tasks still running under worker_id.
+        Returns the task_ids that were renewed (lost leases are left out).
+        """
+        with _QUEUE_LOCK:
+            with _file_mutex(self.queue_file):
+                tasks = self._load_all()
+                now = time.time()
+                renewed = []
+                for task_id in task_ids:
+                    task = tasks.get(task_id)
+                    if task and task.status == "running" and task.worker_id == worker_id:
+                        task.last_heartbeat_at = now
+                        task.lease_expires_at = now + lease_sec
+                        renewed.append(task_id)
+                if renewed:
+                    self._save_all(tasks)
+                return renewed
+    
+    def reclaim_expired_leases(
+        self,
+        now_ts: Optional[float] = None,
+        limit: int = 1000,
+    ) -> Dict[str, List[TaskRecord]]:
+        """
+        Return running tasks whose lease has expired to the queue.
+        - retry_count < max_retries: back to pending, retry_count + 1
+        - otherwise: permanently_failed
+        Tasks without a lease (acquire_task) are left to list_recoverable_running.
+
+        Returns:
+            {"retried": [...], "failed": [...]}; up to limit tasks, oldest lease first
+        """
+        now = now_ts or time.time()
+        with _QUEUE_LOCK:
+            with _file_mutex(self.queue_file):
+                tasks = self._load_all()
+                expired = sorted(
+                    (t for t in tasks.values()
+                     if t.status == "running"
+                     and t.lease_expires_at is not None
+                     and t.lease_expires_at <= now),
+                    key=lambda t: t.lease_expires_at,
+                )[:limit]
+                result: Dict[str, List[TaskRecord]] = {"retried": [], "failed": []}
+                for task in expired:
+                    if task.retry_count < task.max_retries:
+                        task.status = "pending"
+                        task.retry_count += 1
+                        task.started_at = None
+                        result["retried"].append(task)
+                    else:
+                        task.status = "permanently_failed"
+                        task.finished_at = now
+                        result["failed"].append(task)
+                    task.worker_id = None
+                    task.last_heartbeat_at = None
+                    task.lease_expires_at = None
+                    task.recovered_at = now
+                    task.recovered_by = "lease_expiry"
+                    task.recover_reason = "lease expired"
+                if expired:
+                    self._save_all(tasks)
+                return result
+    
     def list_tasks_by_status(
         self, 
         status: TaskStatus, 
@@ -326,3 +446,352 @@ class TaskQueue:
         
         self._save_all(tasks)
         return True
+
+
+# ── SQLite backend ──────────────────────────────────────────────────────────
+
+_RECORD_COLUMNS = [f.name for f in fields(TaskRecord)]
+_FINAL_STATUSES = ("succeeded", "failed", "permanently_failed")
+# UPDATE ... RETURNING needs SQLite >= 3.35
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def _import_store():
+    try:
+        from . import aios_store
+    except ImportError:
+        import aios_store
+    return aios_store
+
+
+class SQLiteTaskQueue:
+    """
+    Durable task queue on WAL-mode SQLite (drop-in for TaskQueue).
+
+    - acquire_task / claim_batch: one atomic UPDATE ... RETURNING on idx_tq_status_task,
+      same task_id order as the JSONL backend
+    - transition_status: one UPDATE ... WHERE task_id=? AND status=? (CAS)
+    - list_recoverable_running: range scan on idx_tq_status_heartbeat
+    - reclaim_expired_leases: one UPDATE over a range scan on idx_tq_status_lease
+    Safe across threads (one connection per thread) and processes (SQLite locking).
+    """
+
+    def __init__(self, db_path: str = None, migrate_from: Optional[str] = None):
+        store = _import_store()
+        self.db_path = Path(db_path) if db_path else store.DB_PATH
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._store = store
+        self._local = threading.local()
+        with self._store.db(self.db_path) as conn:
+            self._store.init_task_queue(conn)
+        if migrate_from:
+            self.migrate_from_jsonl(migrate_from)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._store.get_conn(self.db_path)
+            conn.isolation_level = None  # autocommit：每条语句自成事务
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _to_record(row: sqlite3.Row) -> TaskRecord:
+        data = {k: row[k] for k in _RECORD_COLUMNS}
+        data["payload"] = json.loads(data["payload"]) if data["payload"] else {}
+        return TaskRecord(**data)
+
+    def migrate_from_jsonl(self, jsonl_path: str) -> int:
+        """Import a JSONL-backend queue file (idempotent)."""
+        return self._store.migrate_task_queue(Path(jsonl_path), self.db_path)
+
+    def enqueue_task(
+        self,
+        task_id: str,
+        payload: Dict[str, Any],
+        max_retries: int = 3
+    ) -> None:
+        """Add a new task to the queue. Raises ValueError if task_id already exists."""
+        try:
+            self._conn().execute(
+                "INSERT INTO task_queue (task_id, payload, status, retry_count, max_retries, created) "
+                "VALUES (?, ?, 'pending', 0, ?, ?)",
+                (task_id, json.dumps(payload, ensure_ascii=False), max_retries, time.time()),
+            )
+        except sqlite3.IntegrityError:
+            existing = self.get_task(task_id)
+            status = existing.status if existing else "unknown"
+            raise ValueError(f"Task '{task_id}' already exists (status={status})")
+
+    def get_task(self, task_id: str) -> Optional[TaskRecord]:
+        """Get a single task by ID."""
+        row = self._conn().execute(
+            "SELECT * FROM task_queue WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        return self._to_record(row) if row else None
+
+    def _update_selected(
+        self,
+        assignments: str,
+        params: List[Any],
+        select_sql: str,
+        select_params: List[Any],
+    ) -> List[sqlite3.Row]:
+        """
+        UPDATE the rows picked by select_sql (a SELECT task_id ...) in one
+        write transaction and return them as updated.
+        """
+        conn = self._conn()
+        if _HAS_RETURNING:
+            return conn.execute(
+                f"UPDATE task_queue SET {assignments} WHERE task_id IN ({select_sql}) RETURNING *",
+                params + select_params,
+            ).fetchall()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [r["task_id"] for r in conn.execute(select_sql, select_params)]
+            rows = []
+            if ids:
+                marks = ", ".join("?" * len(ids))
+                conn.execute(
+                    f"UPDATE task_queue SET {assignments} WHERE task_id IN ({marks})",
+                    params + ids,
+                )
+                rows = conn.execute(
+                    f"SELECT * FROM task_queue WHERE task_id IN ({marks})", ids
+                ).fetchall()
+            conn.execute("COMMIT")
+            return rows
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire_task(self, worker_id: str) -> Optional[TaskRecord]:
+        """
+        Atomically acquire the first pending task (by task_id, as TaskQueue does).
+        Returns the task if acquired, None if no tasks available.
+        """
+        now = time.time()
+        rows = self._update_selected(
+            "status = 'running', worker_id = ?, started_at = ?, last_heartbeat_at = ?",
+            [worker_id, now, now],
+            "SELECT task_id FROM task_queue WHERE status = 'pending' "
+            "ORDER BY task_id LIMIT 1",
+            [],
+        )
+        return self._to_record(rows[0]) if rows else None
+
+    def claim_batch(
+        self,
+        worker_id: str,
+        n: int,
+        lease_sec: float = 300,
+    ) -> List[TaskRecord]:
+        """
+        Atomically claim up to n pending tasks with a lease.
+        One UPDATE statement for the whole batch; same order as acquire_task.
+        """
+        if n <= 0:
+            return []
+        now = time.time()
+        rows = self._update_selected(
+            "status = 'running', worker_id = ?, started_at = ?, last_heartbeat_at = ?, "
+            "lease_expires_at = ?",
+            [worker_id, now, now, now + lease_sec],
+            "SELECT task_id FROM task_queue WHERE status = 'pending' "
+            "ORDER BY task_id LIMIT ?",
+            [n],
+        )
+        rows.sort(key=lambda r: r["task_id"])
+        return [self._to_record(r) for r in rows]
+
+    def renew_leases(
+        self,
+        worker_id: str,
+        task_ids: List[str],
+        lease_sec: float = 300,
+    ) -> List[str]:
+        """
+        Extend the lease of tasks still running under worker_id.
+        Returns the task_ids that were renewed (lost leases are left out).
+        """
+        now = time.time()
+        conn = self._conn()
+        renewed = []
+        # 分块，避免超过 SQLite 变量个数上限
+        for i in range(0, len(task_ids), 500):
+            chunk = list(task_ids[i:i + 500])
+            marks = ", ".join("?" * len(chunk))
+            where = f"status = 'running' AND worker_id = ? AND task_id IN ({marks})"
+            params = [now, now + lease_sec, worker_id] + chunk
+            if _HAS_RETURNING:
+                rows = conn.execute(
+                    "UPDATE task_queue SET last_heartbeat_at = ?, lease_expires_at = ? "
+                    f"WHERE {where} RETURNING task_id",
+                    params,
+                ).fetchall()
+            else:
+                rows = self._update_selected(
+                    "last_heartbeat_at = ?, lease_expires_at = ?", params[:2],
+                    f"SELECT task_id FROM task_queue WHERE {where}", params[2:],
+                )
+            found = {r["task_id"] for r in rows}
+            renewed.extend(task_id for task_id in chunk if task_id in found)
+        return renewed
+
+    def reclaim_expired_leases(
+        self,
+        now_ts: Optional[float] = None,
+        limit: int = 1000,
+    ) -> Dict[str, List[TaskRecord]]:
+        """
+        Return running tasks whose lease has expired to the queue.
+        - retry_count < max_retries: back to pending, retry_count + 1
+        - otherwise: permanently_failed
+        Tasks without a lease (acquire_task) are left to list_recoverable_running.
+
+        Returns:
+            {"retried": [...], "failed": [...]}; up to limit tasks, oldest lease first
+        """
+        now = now_ts or time.time()
+        retry = "retry_count < max_retries"
+        rows = self._update_selected(
+            f"status = CASE WHEN {retry} THEN 'pending' ELSE 'permanently_failed' END, "
+            f"retry_count = CASE WHEN {retry} THEN retry_count + 1 ELSE retry_count END, "
+            f"started_at = CASE WHEN {retry} THEN NULL ELSE started_at END, "
+            f"finished_at = CASE WHEN {retry} THEN finished_at ELSE ? END, "
+            "worker_id = NULL, last_heartbeat_at = NULL, lease_expires_at = NULL, "
+            "recovered_at = ?, recovered_by = 'lease_expiry', recover_reason = 'lease expired'",
+            [now, now],
+            "SELECT task_id FROM task_queue "
+            "WHERE status = 'running' AND lease_expires_at <= ? "
+            "ORDER BY lease_expires_at LIMIT ?",
+            [now, limit],
+        )
+        rows.sort(key=lambda r: (r["created"], r["task_id"]))
+        result: Dict[str, List[TaskRecord]] = {"retried": [], "failed": []}
+        for row in rows:
+            record = self._to_record(row)
+            result["retried" if record.status == "pending" else "failed"].append(record)
+        return result
+
+    def list_tasks_by_status(
+        self,
+        status: TaskStatus,
+        limit: int = 1000
+    ) -> List[TaskRecord]:
+        """List tasks with a given status (oldest first)."""
+        rows = self._conn().execute(
+            "SELECT * FROM task_queue WHERE status = ? ORDER BY created, task_id LIMIT ?",
+            (status, limit),
+        ).fetchall()
+        return [self._to_record(r) for r in rows]
+
+    def transition_status(
+        self,
+        task_id: str,
+        from_status: TaskStatus,
+        to_status: TaskStatus,
+        patch: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+        Atomically transition a task from one status to another.
+        Returns True if transition succeeded, False if task not in expected state.
+        """
+        now = time.time()
+        assignments: Dict[str, Any] = {"status": ("?", to_status)}
+
+        # Auto-set timestamps (patch can override)
+        if to_status == "running":
+            assignments["started_at"] = ("COALESCE(started_at, ?)", now)
+            assignments["last_heartbeat_at"] = (
+                "CASE WHEN started_at IS NULL THEN COALESCE(last_heartbeat_at, ?) "
+                "ELSE last_heartbeat_at END", now
+            )
+        if to_status in _FINAL_STATUSES:
+            assignments["finished_at"] = ("?", now)
+
+        for key, value in (patch or {}).items():
+            if key in _RECORD_COLUMNS and key != "task_id":
+                if key == "payload":
+                    value = json.dumps(value, ensure_ascii=False)
+                assignments[key] = ("?", value)
+
+        sql = "UPDATE task_queue SET {} WHERE task_id = ? AND status = ?".format(
+            ", ".join(f"{col} = {expr}" for col, (expr, _) in assignments.items())
+        )
+        params = [value for _, value in assignments.values()] + [task_id, from_status]
+        return self._conn().execute(sql, params).rowcount == 1
+
+    def heartbeat_running_task(
+        self,
+        task_id: str,
+        worker_id: str,
+        ts: Optional[float] = None
+    ) -> bool:
+        """Update heartbeat timestamp for a running task."""
+        cur = self._conn().execute(
+            "UPDATE task_queue SET last_heartbeat_at = ?, worker_id = ? "
+            "WHERE task_id = ? AND status = 'running'",
+            (ts or time.time(), worker_id, task_id),
+        )
+        return cur.rowcount == 1
+
+    def list_recoverable_running(
+        self,
+        now_ts: float,
+        timeout_seconds: int,
+        limit: int = 1000,
+    ) -> List[TaskRecord]:
+        """
+        List running tasks whose heartbeat is missing or older than timeout_seconds.
+        NULL heartbeats first, then oldest heartbeat (SQLite sorts NULL first).
+        """
+        rows = self._conn().execute("""
+            SELECT * FROM task_queue
+            WHERE status = 'running'
+              AND (last_heartbeat_at IS NULL OR last_heartbeat_at <= ?)
+            ORDER BY last_heartbeat_at ASC
+            LIMIT ?
+        """, (now_ts - timeout_seconds, limit)).fetchall()
+        return [self._to_record(r) for r in rows]
+
+    def mark_recovered(
+        self,
+        task_id: str,
+        recovered_by: str,
+        recover_reason: str,
+        recovered_at: Optional[float] = None,
+    ) -> bool:
+        """Mark a task as recovered (for audit trail)."""
+        cur = self._conn().execute(
+            "UPDATE task_queue SET recovered_at = ?, recovered_by = ?, recover_reason = ? "
+            "WHERE task_id = ?",
+            (recovered_at or time.time(), recovered_by, recover_reason, task_id),
+        )
+        return cur.rowcount == 1
+
+
+def open_task_queue(backend: Optional[str] = None, **kwargs):
+    """
+    Open the task queue backend.
+
+    Args:
+        backend: "jsonl" | "sqlite" (default: $AIOS_TASK_QUEUE_BACKEND or "jsonl")
+        **kwargs: queue_file= for jsonl; db_path= / migrate_from= for sqlite
+    """
+    backend = backend or os.environ.get("AIOS_TASK_QUEUE_BACKEND", "jsonl")
+    if backend == "sqlite":
+        return SQLiteTaskQueue(**kwargs)
+    if backend == "jsonl":
+        return TaskQueue(**kwargs)
+    raise ValueError(f"Unknown task queue backend: {backend}")
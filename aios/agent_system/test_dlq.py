@@ -0,0 +1,110 @@
+"""
+DLQ tests (SQLite store)
+
+Covers:
+1. Idempotent enqueue, O(1) counted size, keyset paging
+2. Import of the legacy dead_letters.jsonl (replayed / discarded flags)
+3. Bulk requeue / discard / purge, and operator replay back into the task queue
+"""
+
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+import dlq
+import dlq_operator
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(dlq, "DLQ_DB", tmp_path / "aios.db")
+    monkeypatch.setattr(dlq, "DLQ_FILE", tmp_path / "dead_letters.jsonl")
+    monkeypatch.setattr(dlq, "DLQ_AUDIT_FILE", tmp_path / "dlq_audit.jsonl")
+    monkeypatch.setattr(dlq, "record_dlq_enqueue_latency", lambda *a: None)
+    monkeypatch.setattr(dlq, "_local", threading.local())
+    return tmp_path
+
+
+def _audit(tmp_path):
+    with open(tmp_path / "dlq_audit.jsonl", encoding="utf-8") as f:
+        return [json.loads(l) for l in f]
+
+
+def test_enqueue_size_and_paging(store):
+    assert dlq.enqueue_dead_letter("t1", 3, "boom", "timeout")
+    assert not dlq.enqueue_dead_letter("t1", 3, "boom", "timeout")
+    assert dlq.enqueue_dead_letters(
+        {"task_id": f"s{i}", "attempts": 1, "last_error": "x"} for i in range(250)
+    ) == 250
+    assert dlq.get_dlq_size() == 251
+    assert dlq._is_in_dlq("s7") and not dlq._is_in_dlq("nope")
+
+    seen, after = [], 0
+    while True:
+        page = dlq.get_dlq_entries(limit=100, after_id=after)
+        if not page:
+            break
+        seen += [e["task_id"] for e in page]
+        after = page[-1]["id"]
+    assert seen == ["t1"] + [f"s{i}" for i in range(250)]
+    assert len(_audit(store)) == 251
+
+
+def test_legacy_jsonl_import(store):
+    rows = [
+        {"task_id": "a", "attempts": 3, "last_error": "e", "error_type": "timeout",
+         "timestamp": "2026-01-01T00:00:00", "status": "pending_review"},
+        {"task_id": "b", "attempts": 1, "last_error": "e", "error_type": "logic_error",
+         "timestamp": "2026-01-01T00:00:00", "status": "pending_review", "replayed": True},
+    ]
+    (store / "dead_letters.jsonl").write_text(
+        "".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8"
+    )
+    assert dlq.get_dlq_size() == 1
+    assert dlq.get_dlq_size("replayed") == 1
+    assert dlq.get_dlq_entry("b")["replayed"] is True
+    assert not (store / "dead_letters.jsonl").exists()
+    # b 已 replay：可以再次进入 DLQ
+    assert dlq.enqueue_dead_letter("b", 2, "again")
+
+
+def test_bulk_ops_and_operator_replay(store, monkeypatch):
+    from core import task_submitter
+    monkeypatch.setattr(task_submitter, "TASK_QUEUE", store / "task_queue.jsonl")
+    ids = [task_submitter.submit_task(f"job {i}")["id"] for i in range(4)]
+    for task_id in ids:
+        dlq.enqueue_dead_letter(task_id, 3, "slow", "timeout" if task_id != ids[3] else "logic_error")
+    queued = task_submitter.list_tasks()
+    for t in queued:
+        t["status"] = "failed"
+    task_submitter._save_all(queued)
+
+    assert dlq_operator.replay(ids[0], operator="ops")["success"]
+    assert "no-op" in dlq_operator.replay(ids[0])["message"]
+    assert dlq_operator.replay_many(error_type="timeout") == {"replayed": 2, "requeued": 2}
+    assert dlq_operator.discard_many(reason="bad input") == 1
+    assert dlq.get_dlq_size() == 0
+    assert (dlq.get_dlq_size("replayed"), dlq.get_dlq_size("discarded")) == (3, 1)
+    statuses = {t["id"]: t["status"] for t in task_submitter.list_tasks()}
+    assert [statuses[i] for i in ids] == ["pending", "pending", "pending", "failed"]
+
+    assert dlq.purge_dead_letters(statuses=("discarded",)) == 1
+    assert dlq.get_dlq_size("discarded") == 0
+    assert dlq.get_dlq_entry(ids[3]) is None
+    assert [a["action"] for a in _audit(store)][-1] == "purge"
+
+
+def test_failure_storm_is_linear(store):
+    t0 = time.perf_counter()
+    dlq.enqueue_dead_letters(
+        {"task_id": f"storm-{i}", "attempts": 3, "last_error": "x"} for i in range(20000)
+    )
+    for i in range(200):
+        dlq.enqueue_dead_letter(f"late-{i}", 3, "x")
+    assert dlq.get_dlq_size() == 20200
+    assert time.perf_counter() - t0 < 10
@@ -0,0 +1,66 @@
+"""
+ExecutionLogger tests
+
+Covers:
+1. Counters per status / agent / task type, persisted in the stats sidecar
+2. Records appended by other writers are picked up incrementally
+3. Tail reads for recent executions, across segment rotation
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from execution_logger import ExecutionLogger
+
+
+def _run(logger, agent, task_type, ok=True):
+    task_id = logger.start_task(agent_id=agent, task_type=task_type, description="d")
+    if ok:
+        logger.complete_task(task_id, output_summary="ok")
+    else:
+        logger.fail_task(task_id, error_type="timeout", error_message="slow")
+    return task_id
+
+
+def test_counters_and_sidecar(tmp_path):
+    log = tmp_path / "task_executions_v2.jsonl"
+    logger = ExecutionLogger(log_file=log)
+    _run(logger, "coder", "code")
+    _run(logger, "coder", "code", ok=False)
+    _run(logger, "analyst", "analysis")
+
+    stats = logger.get_stats()
+    assert (stats["total"], stats["completed"], stats["failed"]) == (3, 2, 1)
+    assert stats["by_agent"]["coder"] == {"completed": 1, "failed": 1}
+    assert stats["by_task_type"]["analysis"] == {"completed": 1}
+    assert json.loads(logger.stats_file.read_text(encoding="utf-8"))["total"] == 3
+    assert logger.max_segment_bytes is None and not logger.segments_dir.exists()  # 默认不轮转
+
+    # 其他写入方直接追加（含坏行）：新实例从 sidecar 偏移继续统计
+    with open(log, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"task_id": "x", "status": "blocked", "agent_id": "coder"}) + "\n")
+        f.write("not json\n")
+    stats = ExecutionLogger(log_file=log).get_stats()
+    assert stats["total"] == 4 and stats["blocked"] == 1
+    assert stats["by_agent"]["coder"]["blocked"] == 1
+
+    # sidecar 丢失 → 重建
+    logger.stats_file.unlink()
+    assert ExecutionLogger(log_file=log).get_stats()["total"] == 4
+
+
+def test_recent_and_rotation(tmp_path):
+    log = tmp_path / "task_executions_v2.jsonl"
+    logger = ExecutionLogger(log_file=log, max_segment_bytes=2000)
+    ids = [_run(logger, f"a{i}", "code") for i in range(12)]
+
+    assert len(logger._segments()) >= 2
+    assert [r["task_id"] for r in logger.get_recent_executions(limit=8)] == ids[::-1][:8]
+    assert len(logger.get_recent_executions(limit=100)) == 12
+
+    fresh = ExecutionLogger(log_file=log, max_segment_bytes=2000)
+    assert fresh.get_stats()["completed"] == 12
+    fresh.stats_file.unlink()
+    assert ExecutionLogger(log_file=log).get_stats()["total"] == 12
@@ -0,0 +1,104 @@
+"""
+Heartbeat stage runner tests
+
+Covers:
+1. Dependency order + results passed to dependents, independent stages overlap
+2. Timeout does not block the tick; a still-running stage is skipped next tick
+3. Schedules and DAG validation
+"""
+
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from heartbeat_stages import Stage, StageRunner, daily, every, hourly, weekly
+
+
+def test_deps_results_and_overlap(capsys):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def a(ctx):
+        barrier.wait()  # a 和 b 必须同时在运行
+        print("from a")
+        return 1
+
+    def b(ctx):
+        barrier.wait()
+        return 2
+
+    runner = StageRunner([
+        Stage("sum", lambda ctx: ctx.results["a"] + ctx.results["b"], deps=("a", "b")),
+        Stage("a", a),
+        Stage("b", b),
+        Stage("broken", lambda ctx: 1 / 0),
+    ], max_workers=3)
+    report = runner.run_tick()
+    assert {name: r["status"] for name, r in report.items()} == {
+        "a": "ok", "b": "ok", "sum": "ok", "broken": "error",
+    }
+    assert "from a" in capsys.readouterr().out
+    stats = runner.stats()
+    assert stats["sum"]["count"] == 1 and stats["broken"]["statuses"] == {"error": 1}
+    runner.shutdown()
+
+
+def test_timeout_and_skip_if_running():
+    release = threading.Event()
+    seen = []
+    runner = StageRunner([
+        Stage("hung", lambda ctx: release.wait(10), timeout=0.2),
+        Stage("after", lambda ctx: seen.append(dict(ctx.results)), deps=("hung",)),
+    ], max_workers=2)
+
+    start = time.monotonic()
+    report = runner.run_tick()
+    assert time.monotonic() - start < 2
+    assert report["hung"]["status"] == "timeout"
+    assert report["after"]["status"] == "ok" and seen == [{}]
+
+    assert runner.run_tick()["hung"]["status"] == "skipped_running"
+    assert runner.running() == ["hung"]
+
+    release.set()
+    time.sleep(0.1)
+    assert runner.run_tick()["hung"]["status"] == "ok"
+    assert runner.stats()["hung"]["statuses"] == {"timeout": 1, "skipped_running": 1, "ok": 1}
+    runner.shutdown()
+
+
+def test_schedules():
+    at = datetime(2026, 3, 2, 0, 0, 10)  # 周一 00:00
+    assert hourly()(at, None) and not hourly()(at.replace(minute=1), None)
+    assert not hourly()(at, at.replace(second=0))  # 同一分钟只运行一次
+    assert daily(0, 12)(at.replace(hour=12), None) and not daily(23)(at, None)
+    assert weekly(0)(at, None) and not weekly(1)(at, None)
+    assert every(60)(at, None) and not every(60)(at, at.replace(second=0))
+
+    # 错过整点那一分钟：之后第一轮补跑一次
+    late = at.replace(minute=20)
+    assert hourly()(late, at - timedelta(minutes=30)) and not hourly()(late, at)
+    assert daily(23)(at, at - timedelta(hours=2)) and not daily(23)(at, at - timedelta(minutes=30))
+    assert weekly(6, hour=23)(at, at - timedelta(days=1)) and not weekly(6, hour=23)(at, at - timedelta(minutes=30))
+
+    calls = []
+    runner = StageRunner([Stage("hourly", calls.append, schedule=hourly())])
+    assert runner.run_tick(now=at - timedelta(minutes=1)) == {}
+    assert runner.run_tick(now=late)["hourly"]["status"] == "ok"  # 上一轮拖过了 00:00
+    assert runner.run_tick(now=late + timedelta(minutes=10)) == {}
+    assert runner.run_tick(now=at + timedelta(hours=1, minutes=3))["hourly"]["status"] == "ok"
+    assert len(calls) == 2
+    runner.shutdown()
+
+
+def test_invalid_dag():
+    with pytest.raises(ValueError):
+        StageRunner([Stage("a", print, deps=("missing",))])
+    with pytest.raises(ValueError):
+        StageRunner([Stage("a", print, deps=("b",)), Stage("b", print, deps=("a",))])
+    with pytest.raises(ValueError):
+        StageRunner([Stage("a", print), Stage("a", print)])
@@ -0,0 +1,133 @@
+"""
+Reality Ledger tests (SQLite snapshot store)
+
+Covers:
+1. Lifecycle transitions, ALLOWED_TRANSITIONS / release validation, append-only event log
+2. Indexed list_actions(status, outcome) and point get_action
+3. transition_many / create_actions: one batch, illegal items skipped without side effects
+4. Import of the legacy actions_state.jsonl
+"""
+
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+import reality_ledger as ledger
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "LEDGER_DB", tmp_path / "aios.db")
+    monkeypatch.setattr(ledger, "ACTIONS_STATE_FILE", tmp_path / "actions_state.jsonl")
+    monkeypatch.setattr(ledger, "ACTION_LEDGER", tmp_path / "action_ledger.jsonl")
+    monkeypatch.setattr(ledger, "_local", threading.local())
+    return tmp_path
+
+
+def _new(resource_id="t1"):
+    return ledger.create_action(
+        actor="test", source="test", resource_type="task",
+        resource_id=resource_id, action_type="execute_task",
+    )
+
+
+def test_lifecycle_and_validation(store):
+    action = _new()
+    ledger.transition_action(action.action_id, "locked", payload={"lock_token": "tok"})
+    ledger.transition_action(action.action_id, "executing")
+    with pytest.raises(ValueError, match="Invalid transition: executing -> released"):
+        ledger.transition_action(action.action_id, "released")
+    ledger.transition_action(action.action_id, "completed", payload={"result_summary": "ok"})
+    done = ledger.transition_action(action.action_id, "released")
+
+    assert done.status == "released" and done.outcome == "completed"
+    stored = ledger.get_action(action.action_id)
+    assert stored.to_dict() == done.to_dict() and stored.lock_token == "tok"
+    assert ledger.get_action("act-missing") is None
+    with pytest.raises(ValueError, match="Action not found"):
+        ledger.transition_action("act-missing", "locked")
+
+    events = ledger.list_events(action_id=action.action_id)
+    assert [e.event_type for e in events] == ["proposed", "locked", "executing", "completed", "released"]
+
+
+def test_list_actions_filters_and_order(store):
+    ids = [_new(f"t{i}").action_id for i in range(6)]
+    for aid in ids[:4]:
+        ledger.transition_action(aid, "locked")
+    ledger.transition_action(ids[0], "released", payload={"release_reason": "lock_timeout"})
+    ledger.transition_action(ids[4], "skipped")
+
+    assert [a.action_id for a in ledger.list_actions(status="locked")] == ids[1:4]
+    assert [a.action_id for a in ledger.list_actions(status="locked", limit=2)] == ids[2:4]
+    assert [a.action_id for a in ledger.list_actions(outcome="skipped")] == [ids[4]]
+    assert [a.action_id for a in ledger.list_actions(status="released", outcome="unknown")] == [ids[0]]
+    assert len(ledger.list_actions(limit=None)) == 6
+    assert ledger.count_actions_by_status() == {"locked": 3, "released": 1, "skipped": 1, "proposed": 1}
+
+    plan = ledger._conn().execute(
+        "EXPLAIN QUERY PLAN SELECT record FROM actions_state WHERE status = ? AND outcome = ? "
+        "ORDER BY seq DESC LIMIT 5", ("locked", "unknown"),
+    ).fetchall()
+    assert "idx_as_status_outcome" in " ".join(str(tuple(r)) for r in plan)
+
+
+def test_transition_many_skips_illegal_items(store):
+    a, b = _new("a").action_id, _new("b").action_id
+    ledger.transition_action(a, "locked")
+    before = len(ledger.list_events())
+
+    applied, errors = ledger.transition_many([
+        {"action_id": a, "event_type": "executing", "actor": "hb"},
+        {"action_id": b, "event_type": "executing"},          # proposed -> executing 不合法
+        {"action_id": a, "event_type": "failed", "payload": {"error": "boom"}},
+        {"action_id": a, "event_type": "released"},
+        {"action_id": "act-missing", "event_type": "locked"},
+    ])
+
+    assert [r.status for r in applied] == ["executing", "failed", "released"]
+    assert [i for i, _ in errors] == [1, 4]
+    final = ledger.get_action(a)
+    assert final.status == "released" and final.outcome == "failed" and final.error == "boom"
+    assert ledger.get_action(b).status == "proposed"
+    events = ledger.list_events()
+    assert len(events) == before + 3 and events[-3].actor == "hb"
+    assert ledger.transition_many([]) == ([], [])
+
+
+def test_create_actions_one_batch(store):
+    before = len(ledger.list_events())
+    actions = ledger.create_actions(
+        {"actor": "hb", "source": "test", "resource_type": "task",
+         "resource_id": rid, "action_type": "execute_task", "tags": ["x"]}
+        for rid in ("a", "b", "c")
+    )
+    assert [a.resource_id for a in actions] == ["a", "b", "c"]
+    assert len({a.action_id for a in actions}) == 3
+    stored = ledger.get_action(actions[1].action_id)
+    assert stored.status == "proposed" and stored.risk_level == "L1" and stored.tags == ["x"]
+    assert [e.event_type for e in ledger.list_events()[before:]] == ["proposed"] * 3
+    assert ledger.create_actions([]) == []
+
+
+def test_imports_legacy_jsonl(store):
+    legacy = [
+        {"action_id": "act-1", "actor": "x", "source": "s", "resource_type": "task",
+         "resource_id": "r1", "action_type": "execute_task", "status": "locked",
+         "outcome": "unknown", "updated_at": "2026-01-01T00:00:00+00:00"},
+        {"action_id": "act-2", "actor": "x", "source": "s", "resource_type": "task",
+         "resource_id": "r2", "action_type": "execute_task", "status": "released",
+         "outcome": "completed", "updated_at": "2026-01-01T00:00:01+00:00"},
+    ]
+    (store / "actions_state.jsonl").write_text(
+        "".join(json.dumps(r) + "\n" for r in legacy), encoding="utf-8"
+    )
+
+    assert [a.action_id for a in ledger.list_actions()] == ["act-1", "act-2"]
+    assert not (store / "actions_state.jsonl").exists()
+    assert (store / "actions_state.jsonl.migrated").exists()
+    assert ledger.transition_action("act-1", "executing").status == "executing"
@@ -0,0 +1,111 @@
+"""
+Spawn LockStore tests (sharded journal)
+
+Covers:
+1. acquire / idempotent hit / CAS release / force release
+2. TTL expiry via the heap, journal compaction, legacy spawn_locks.json import
+3. Several processes contending for the same keys: exactly one winner per key
+4. Metrics from several stores are merged into the shared file, not overwritten
+"""
+
+import json
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from spawn_lock import LockStore
+
+
+def _store(tmp_path, **kwargs):
+    return LockStore(
+        lock_file=tmp_path / "spawn_locks.json",
+        metrics_file=tmp_path / "spawn_lock_metrics.json",
+        **kwargs,
+    )
+
+
+def test_acquire_release(tmp_path):
+    store = _store(tmp_path)
+    token = store.acquire("a:v0")
+    assert token and store.acquire("a:v0") is None
+    assert not store.release("a:v0", "wrong-token")
+    assert store.release("a:v0", token)
+    assert store.acquire("a:v0") is not None
+    assert store.force_release("a:v0") and store.force_release("a:v0")
+    assert store.list_locks() == {}
+
+    # 另一个实例（如另一进程）从 journal 看到同样的锁
+    token = store.acquire("b:v0")
+    other = _store(tmp_path)
+    assert other.get("b:v0")["lock_token"] == token
+    assert other.acquire("b:v0") is None
+
+    metrics = store.get_metrics()
+    assert metrics["acquire_total"] == 4 and metrics["idempotent_hit_total"] == 1
+    store.flush_metrics()
+    saved = json.loads((tmp_path / "spawn_lock_metrics.json").read_text(encoding="utf-8"))
+    assert saved["acquire_success"] == 3
+
+
+def test_expiry_compaction_and_legacy_import(tmp_path):
+    legacy = {"old:v0": {"worker_id": "w", "lock_token": "t0", "locked_at": time.time(), "task_key": "old:v0"}}
+    (tmp_path / "spawn_locks.json").write_text(json.dumps(legacy), encoding="utf-8")
+    store = _store(tmp_path, shards=2, compact_min_records=10)
+    assert store.get("old:v0")["lock_token"] == "t0"
+
+    for i in range(50):
+        store.release(f"k{i}", store.acquire(f"k{i}"))
+    assert all(shard.records <= 10 for shard in store._shards)
+    assert list(store.list_locks()) == ["old:v0"]
+
+    store.acquire("new:v0")
+    store.ttl_sec = 0
+    assert store.cleanup_expired() == 2
+    assert store.list_locks() == {}
+    assert _store(tmp_path, shards=2).list_locks() == {}
+
+
+def _contend(lock_dir, keys, out):
+    store = _store(Path(lock_dir))
+    out.put([key for key in keys if store.acquire(key)])
+
+
+def test_processes_never_double_acquire(tmp_path):
+    keys = [f"task-{i}:v0" for i in range(100)]
+    # spawn 子进程要按模块名重新导入测试文件找 _contend，在 pytest 下不一定能导入；
+    # 有 fork 就用 fork
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_contend, args=(str(tmp_path), keys, out)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    deadline = time.monotonic() + 60
+    for p in procs:
+        p.join(max(0.0, deadline - time.monotonic()))
+    for p in procs:
+        if p.is_alive():
+            p.terminate()
+    assert [p.exitcode for p in procs] == [0] * len(procs)
+    won = [key for _ in procs for key in out.get(timeout=5)]
+
+    assert sorted(won) == sorted(keys)
+    assert len(_store(tmp_path).list_locks()) == 100
+
+
+def test_metrics_from_several_stores_are_merged(tmp_path):
+    first, second = _store(tmp_path), _store(tmp_path)
+    first.acquire("a:v0")
+    second.acquire("b:v0")
+    second.acquire("b:v0")
+    first.flush_metrics()
+    second.flush_metrics()
+    first.flush_metrics()  # 没有新增量，不改文件
+
+    saved = json.loads((tmp_path / "spawn_lock_metrics.json").read_text(encoding="utf-8"))
+    assert saved["acquire_total"] == 3 and saved["acquire_success"] == 2
+    assert saved["idempotent_hit_total"] == 1
+    assert second.get_metrics()["acquire_total"] == 3
+    assert _store(tmp_path).get_metrics()["acquire_total"] == 3
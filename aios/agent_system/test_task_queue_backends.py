@@ -0,0 +1,214 @@
+"""
+TaskQueue backend tests (JSONL / SQLite)
+
+Covers:
+1. Same semantics on both backends (enqueue / acquire / CAS transition / recovery scan)
+2. Batch claim with leases: renew / expiry reclaim / batched completion
+3. SQLite: migration from task_queue.jsonl
+4. SQLite: concurrent acquire from several processes never double-claims
+"""
+
+import json
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from task_queue import SQLiteTaskQueue, TaskQueue, open_task_queue
+
+
+@pytest.fixture(params=["jsonl", "sqlite"])
+def queue(request, tmp_path):
+    if request.param == "jsonl":
+        return TaskQueue(queue_file=str(tmp_path / "task_queue.jsonl"))
+    return SQLiteTaskQueue(db_path=str(tmp_path / "aios.db"))
+
+
+def test_enqueue_duplicate_raises(queue):
+    queue.enqueue_task("t1", {"a": 1})
+    with pytest.raises(ValueError):
+        queue.enqueue_task("t1", {})
+    assert queue.get_task("t1").payload == {"a": 1}
+
+
+def test_acquire_order_and_fields(queue):
+    for task_id in ("t1", "t2", "t3"):
+        queue.enqueue_task(task_id, {})
+    task = queue.acquire_task("w1")
+    assert task.task_id == "t1"
+    assert task.status == "running" and task.worker_id == "w1"
+    assert task.last_heartbeat_at == task.started_at
+    assert [t.task_id for t in queue.list_tasks_by_status("pending")] == ["t2", "t3"]
+
+
+def test_acquire_follows_task_id_not_enqueue_time(queue):
+    for task_id in ("t3", "t1", "t2"):
+        queue.enqueue_task(task_id, {})
+    assert queue.acquire_task("w1").task_id == "t1"
+    assert [t.task_id for t in queue.claim_batch("w1", 5)] == ["t2", "t3"]
+
+
+def test_acquire_empty(queue):
+    assert queue.acquire_task("w1") is None
+
+
+def test_transition_is_compare_and_set(queue):
+    queue.enqueue_task("t1", {})
+    assert not queue.transition_status("t1", "running", "succeeded")
+    assert not queue.transition_status("missing", "pending", "running")
+    assert queue.transition_status("t1", "pending", "running")
+    assert queue.transition_status("t1", "running", "failed", patch={"retry_count": 2, "worker_id": None})
+
+    task = queue.get_task("t1")
+    assert task.status == "failed" and task.retry_count == 2
+    assert task.worker_id is None and task.finished_at is not None
+
+
+def test_heartbeat_and_recovery_scan(queue):
+    for task_id in ("t1", "t2", "t3"):
+        queue.enqueue_task(task_id, {})
+        queue.acquire_task("w1")
+    now = time.time()
+    assert queue.heartbeat_running_task("t1", "w1", ts=now - 100)
+    assert queue.heartbeat_running_task("t2", "w1", ts=now - 500)
+    queue.transition_status("t3", "running", "running", patch={"last_heartbeat_at": None})
+    assert not queue.heartbeat_running_task("missing", "w1")
+
+    recoverable = queue.list_recoverable_running(now_ts=now, timeout_seconds=60)
+    assert [t.task_id for t in recoverable] == ["t3", "t2", "t1"]
+    assert queue.mark_recovered("t2", "boot", "test")
+    assert queue.get_task("t2").recovered_by == "boot"
+
+
+def test_claim_batch_and_leases(queue):
+    for i in range(5):
+        queue.enqueue_task(f"t{i}", {}, max_retries=1)
+    claimed = queue.claim_batch("w1", 3, lease_sec=60)
+    assert [t.task_id for t in claimed] == ["t0", "t1", "t2"]
+    assert all(t.status == "running" and t.lease_expires_at for t in claimed)
+    assert queue.claim_batch("w2", 0) == []
+    assert [t.task_id for t in queue.claim_batch("w2", 10)] == ["t3", "t4"]
+
+    # 只有持有者能续租；已结束的任务不续租
+    queue.transition_status("t2", "running", "succeeded")
+    assert queue.renew_leases("w1", ["t0", "t1", "t2", "t3"], lease_sec=600) == ["t0", "t1"]
+
+    now = time.time()
+    assert queue.reclaim_expired_leases(now_ts=now) == {"retried": [], "failed": []}
+    result = queue.reclaim_expired_leases(now_ts=now + 300)
+    assert [t.task_id for t in result["retried"]] == ["t3", "t4"]
+    assert result["failed"] == []
+    task = queue.get_task("t3")
+    assert task.status == "pending" and task.retry_count == 1
+    assert task.worker_id is None and task.lease_expires_at is None
+
+    # 重试耗尽 → permanently_failed
+    assert len(queue.claim_batch("w3", 2, lease_sec=1)) == 2
+    result = queue.reclaim_expired_leases(now_ts=now + 300)
+    assert sorted(t.task_id for t in result["failed"]) == ["t3", "t4"]
+    assert queue.get_task("t4").status == "permanently_failed"
+
+
+def test_task_submitter_leases(tmp_path, monkeypatch):
+    from core import task_submitter
+
+    monkeypatch.setattr(task_submitter, "TASK_QUEUE", tmp_path / "task_queue.jsonl")
+    ids = [task_submitter.submit_task(f"job {i}")["id"] for i in range(4)]
+
+    claimed = task_submitter.claim_batch("hb", 3, lease_sec=60)
+    assert [t["id"] for t in claimed] == ids[:3]
+    assert task_submitter.release_claims("hb", [ids[2]]) == 1
+    assert task_submitter.renew_leases("other", ids[:2]) == []
+    assert task_submitter.renew_leases("hb", ids[:2], lease_sec=60) == ids[:2]
+
+    result = task_submitter.reclaim_expired_leases(max_retries=1, now=time.time() + 120)
+    assert [t["id"] for t in result["retried"]] == ids[:2]
+    by_id = {t["id"]: t for t in task_submitter.list_tasks()}
+    assert by_id[ids[0]]["status"] == "pending" and by_id[ids[0]]["zombie_retries"] == 1
+    assert "worker_id" not in by_id[ids[0]]
+
+    task_submitter.claim_batch("hb", 1, lease_sec=0)
+    result = task_submitter.reclaim_expired_leases(max_retries=1, now=time.time() + 1)
+    assert [t["id"] for t in result["failed"]] == ids[:1]
+
+
+def test_task_submitter_complete_claims(tmp_path, monkeypatch):
+    from core import task_submitter
+
+    monkeypatch.setattr(task_submitter, "TASK_QUEUE", tmp_path / "task_queue.jsonl")
+    ids = [task_submitter.submit_task(f"job {i}")["id"] for i in range(3)]
+    task_submitter.claim_batch("hb", 2, lease_sec=60)
+
+    outcomes = {
+        ids[0]: ("completed", {"success": True}),
+        ids[1]: ("failed", {"success": False}),
+        ids[2]: ("completed", {"success": True}),  # 未被 hb 认领，不更新
+    }
+    assert task_submitter.complete_claims("other", outcomes) == 0
+    assert task_submitter.complete_claims("hb", outcomes) == 2
+    by_id = {t["id"]: t for t in task_submitter.list_tasks()}
+    assert [by_id[i]["status"] for i in ids] == ["completed", "failed", "pending"]
+    assert by_id[ids[1]]["result"] == {"success": False} and "completed_at" in by_id[ids[1]]
+
+
+def test_sqlite_migrates_jsonl(tmp_path):
+    jsonl = TaskQueue(queue_file=str(tmp_path / "task_queue.jsonl"))
+    for task_id in ("b", "a", "c"):
+        jsonl.enqueue_task(task_id, {"id": task_id})
+    jsonl.acquire_task("w0")  # "a"
+
+    queue = SQLiteTaskQueue(db_path=str(tmp_path / "aios.db"), migrate_from=str(jsonl.queue_file))
+    assert queue.get_task("a").status == "running"
+    assert queue.get_task("b").payload == {"id": "b"}
+    # 迁移后出队顺序与 JSONL 后端一致，重复迁移不产生重复行
+    assert queue.migrate_from_jsonl(str(jsonl.queue_file)) == 0
+    assert queue.acquire_task("w1").task_id == "b"
+
+
+def test_open_task_queue(tmp_path, monkeypatch):
+    monkeypatch.setenv("AIOS_TASK_QUEUE_BACKEND", "sqlite")
+    assert isinstance(open_task_queue(db_path=str(tmp_path / "aios.db")), SQLiteTaskQueue)
+    assert isinstance(open_task_queue("jsonl", queue_file=str(tmp_path / "q.jsonl")), TaskQueue)
+    with pytest.raises(ValueError):
+        open_task_queue("redis")
+
+
+def _claim_all(db_path, worker_id, out):
+    queue = SQLiteTaskQueue(db_path=db_path)
+    claimed = []
+    while True:
+        task = queue.acquire_task(worker_id)
+        if task is None:
+            break
+        claimed.append(task.task_id)
+    out.put(claimed)
+
+
+def test_sqlite_concurrent_processes(tmp_path):
+    db_path = str(tmp_path / "aios.db")
+    queue = SQLiteTaskQueue(db_path=db_path)
+    for i in range(400):
+        queue.enqueue_task(f"t{i:04d}", {})
+
+    # spawn 子进程要按模块名重新导入测试文件找 _claim_all，在 pytest 下不一定能导入；
+    # 有 fork 就用 fork
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_claim_all, args=(db_path, f"w{i}", out)) for i in range(4)]
+    for p in procs:
+        p.start()
+    deadline = time.monotonic() + 60
+    for p in procs:
+        p.join(max(0.0, deadline - time.monotonic()))
+    for p in procs:
+        if p.is_alive():
+            p.terminate()
+    assert [p.exitcode for p in procs] == [0] * len(procs)
+    claimed = [task_id for _ in procs for task_id in out.get(timeout=5)]
+
+    assert len(claimed) == len(set(claimed)) == 400
+    assert queue.list_tasks_by_status("pending") == []
@@ -4,9 +4,9 @@ sys.path.insert(0, '.')
 print('=== 干净环境二次闭环验证 ===')
 print()
 
-from task_queue import TaskQueue
+from task_queue import open_task_queue
 
-tq = TaskQueue()
+tq = open_task_queue()
 task_id = 'clean-env-verify-' + str(uuid.uuid4())[:8]
 results = {}
 
@@ -378,6 +378,171 @@ def bench_storage() -> List[Dict[str, Any]]:
     return results
 
 
+def bench_event_dispatch(subscribers: int = 500, emits: int = 100_000) -> List[Dict[str, Any]]:
+    """订阅模式分发：fnmatch 全量循环 vs 前缀树索引"""
+    import fnmatch
+    results = []
+    idx_mod = _import_module("core.subscription_index")
+
+    # 500 个订阅：精确类型 + 前缀通配 + 后缀通配 + 全局
+    patterns = []
+    for i in range(subscribers):
+        kind = i % 4
+        if kind == 0:
+            patterns.append(f"agent{i}.task.done")
+        elif kind == 1:
+            patterns.append(f"agent{i}.*")
+        elif kind == 2:
+            patterns.append(f"*.error{i}")
+        else:
+            patterns.append(f"task{i}.*.done")
+    patterns.append("*")
+    event_types = [f"agent{i % subscribers}.task.{'done' if i % 2 else f'error{i % subscribers}'}"
+                   for i in range(1000)]
+
+    t0 = time.perf_counter()
+    fn_hits = 0
+    for n in range(emits):
+        event_type = event_types[n % len(event_types)]
+        for pattern in patterns:
+            if fnmatch.fnmatch(event_type, pattern):
+                fn_hits += 1
+    elapsed = time.perf_counter() - t0
+    results.append(BenchmarkResult(f"dispatch.fnmatch_loop ({subscribers} subs)", emits, elapsed).to_dict())
+
+    index = idx_mod.SubscriptionIndex()
+    for pattern in patterns:
+        index.add(pattern)
+    t0 = time.perf_counter()
+    trie_hits = 0
+    for n in range(emits):
+        trie_hits += len(index.match(event_types[n % len(event_types)]))
+    elapsed = time.perf_counter() - t0
+    results.append(BenchmarkResult(f"dispatch.subscription_trie ({subscribers} subs)", emits, elapsed).to_dict())
+
+    if fn_hits != trie_hits:
+        results.append({"name": "dispatch.consistency", "error": f"fnmatch={fn_hits} trie={trie_hits}"})
+    return results
+
+
+_RUNTIME_EVENT_LINE = ('{{"event_id": "{}", "timestamp": "{}", '
+                       '"event_type": "{}", "task_id": "{}", "data": {}}}\n')
+
+
+def _write_runtime_tasks(path: Path, prefix: str, count: int, event_types=("task_created",),
+                         priorities=("normal",), timestamp: str = "2026-01-01T00:00:00Z") -> None:
+    """直接生成 runtime_v2 event log 行（比逐条 append_event 快得多）"""
+    import uuid
+    with open(path, "a", encoding="utf-8") as f:
+        for i in range(count):
+            task_id = f"{prefix}-{i}"
+            data = json.dumps({"task_id": task_id, "type": "monitor",
+                               "priority": priorities[i % len(priorities)],
+                               "created_at": timestamp})
+            f.write("".join(
+                _RUNTIME_EVENT_LINE.format(uuid.uuid4().hex, timestamp, t, task_id,
+                                           data if t == "task_created" else "{}")
+                for t in event_types
+            ))
+
+
+def bench_runtime_cold_start(tasks: int = 1_000_000, batch: int = 100_000,
+                             live_tasks: int = 1_000) -> List[Dict[str, Any]]:
+    """runtime_v2 冷启动：快照 + 归档计数 + 回放尾部（历史任务分批压缩）"""
+    from runtime_v2.compaction import compact_event_log
+    from runtime_v2.event_log import EventLog
+    from runtime_v2.state import StateProjection
+
+    results = []
+    finished = ("task_created", "task_started", "task_completed")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = EventLog(log_path=Path(tmp) / "event_log.jsonl")
+        t0 = time.perf_counter()
+        for b in range(0, tasks, batch):
+            _write_runtime_tasks(log.log_path, f"h{b}", min(batch, tasks - b), finished)
+            compact_event_log(StateProjection(event_log=log, snapshot_every=0))
+        setup = time.perf_counter() - t0
+        # 快照之后追加的尾部：live_tasks 个 pending 任务
+        _write_runtime_tasks(log.log_path, "live", live_tasks)
+
+        t0 = time.perf_counter()
+        state = StateProjection(event_log=log)
+        pending = state.count_tasks("pending")
+        elapsed = time.perf_counter() - t0
+        archived = state.count_tasks("completed", include_archived=True)
+
+        result = BenchmarkResult(f"runtime.cold_start ({archived:,} archived)", 1, elapsed).to_dict()
+        result["setup_sec"] = round(setup, 2)
+        results.append(result)
+        if archived != tasks or pending != live_tasks:
+            results.append({"name": "runtime.consistency",
+                            "error": f"archived={archived} pending={pending}"})
+    return results
+
+
+def bench_runtime_dispatch(pending: int = 100_000, ticks: int = 500, slots: int = 5,
+                           arrivals_per_tick: int = 5) -> List[Dict[str, Any]]:
+    """runtime_v2 Dispatcher 负载：大量 pending + 持续到达，测每次 tick 的成本"""
+    import contextlib
+    import io
+    from datetime import datetime
+    from runtime_v2.dispatcher import Dispatcher
+    from runtime_v2.event_log import EventLog
+    from runtime_v2.state import StateProjection
+
+    results = []
+    priorities = ("high", "normal", "normal", "low")
+
+    class _NoopWorker:
+        def __init__(self, event_log):
+            self.event_log = event_log
+
+        def execute(self, task):
+            return True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = EventLog(log_path=Path(tmp) / "event_log.jsonl")
+        now = datetime.utcnow().isoformat() + "Z"
+        _write_runtime_tasks(log.log_path, "backlog", pending, priorities=priorities, timestamp=now)
+        state = StateProjection(event_log=log, snapshot_every=0)
+        state.count_tasks("pending")
+
+        # 旧实现：每次 tick 列出全部 pending 并按 created_at 排序
+        legacy_ticks = 5
+        t0 = time.perf_counter()
+        for _ in range(legacy_ticks):
+            sorted(state.list_pending_tasks(), key=lambda t: t["task_data"]["created_at"])
+        elapsed = time.perf_counter() - t0
+        results.append(BenchmarkResult(f"runtime.dispatch.sort_pending ({pending:,})",
+                                       legacy_ticks, elapsed).to_dict())
+
+        worker = _NoopWorker(log)
+        dispatcher = Dispatcher(max_workers=slots, worker_factory=lambda: worker,
+                                state=state, event_log=log)
+        spawned = 0
+        latencies = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for n in range(ticks):
+                # 负载生成：每个 tick 到达 arrivals_per_tick 个新任务
+                _write_runtime_tasks(log.log_path, f"arrival{n}", arrivals_per_tick,
+                                     priorities=priorities, timestamp=now)
+                t0 = time.perf_counter()
+                spawned += dispatcher.tick()["spawned"]
+                latencies.append(time.perf_counter() - t0)
+            dispatcher.shutdown()
+
+        total = sum(latencies)
+        result = BenchmarkResult(f"runtime.dispatch.tick ({pending:,} pending, {slots} slots)",
+                                 ticks, total).to_dict()
+        latencies.sort()
+        result["p50_us"] = round(latencies[len(latencies) // 2] * 1e6, 1)
+        result["p99_us"] = round(latencies[int(len(latencies) * 0.99)] * 1e6, 1)
+        result["spawned"] = spawned
+        results.append(result)
+    return results
+
+
 # ── Report ─────────────────────────────────────────────────────────
 
 BASELINES = {
@@ -448,6 +613,9 @@ def main():
         "sdk.action": bench_action_engine,
         "sdk.memory": bench_memory_sdk,
         "storage": bench_storage,
+        "core.event_dispatch": bench_event_dispatch,
+        "runtime.cold_start": bench_runtime_cold_start,
+        "runtime.dispatch": bench_runtime_dispatch,
     }
 
     for name, fn in modules.items():
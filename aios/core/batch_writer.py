@@ -0,0 +1,308 @@
+"""
+AIOS 后台批量写入基类
+BatchedEventWriter（SQLite）和 BufferedAppender（JSONL）共用的写线程骨架
+
+设计：
+1. 专用写线程 + 有界队列：submit(block=True) 队列满时阻塞（背压），
+   block=False 时立即抛出 queue.Full，由调用方决定丢弃
+2. 组提交：写线程一次取空队列（最多 max_batch 条）交给子类的 _write(batch)；
+   linger > 0 时拿到第一条后最多再等 linger 秒攒批（flush / close / 攒满时提前唤醒）
+3. flush()：等待所有已提交记录落盘（读己之写）
+4. close()：停止前清空队列（关闭时不丢记录），并注销 start() 注册的 atexit 钩子
+5. 写入失败：指数退避重试；仍失败则把该批放回队首，下一轮优先重写
+   （只有关闭时重试耗尽才丢弃，计入 dropped）
+6. 每轮结束调用 _after_cycle(stopping)，子类可以挂周期任务（快照等）
+
+子类实现：
+- _write(batch)：写入一批，失败时抛异常
+- 可选 _open() / _close_resources()：在写线程里打开 / 关闭连接
+
+创建时间：2026-10-16
+版本：v1.0
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    from aios.observability.metrics import METRICS
+except ImportError:
+    try:
+        from observability.metrics import METRICS
+    except ImportError:  # pragma: no cover - 指标是可选的
+        METRICS = None
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BatchWriter:
+    """后台批量写入器基类（见模块说明）"""
+
+    # stats() 里成功写入条数的键名
+    WRITTEN_STAT = "written"
+    # METRICS 指标名前缀（None 表示不上报）
+    METRICS_PREFIX: Optional[str] = None
+    THREAD_NAME = "aios-batch-writer"
+
+    def __init__(
+        self,
+        max_queue: int = 10000,
+        max_batch: int = 1000,
+        poll_interval: float = 0.5,
+        max_retries: int = 3,
+        retry_backoff: float = 0.05,
+        linger: float = 0.0,
+    ):
+        """
+        Args:
+            max_queue: 队列上限（超过后 submit 阻塞或抛 queue.Full）
+            max_batch: 单次写入的最大条数
+            poll_interval: 写线程空闲时的唤醒间隔（秒），也是 _after_cycle 的最长间隔
+            max_retries: 单批写入失败后的重试次数（指数退避）
+            retry_backoff: 第一次重试前的等待（秒），之后每次翻倍
+            linger: 拿到第一条后等待更多记录的时间（秒），0 表示立即写
+        """
+        self.max_batch = max_batch
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.linger = linger
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        # 重试耗尽的批次：放回队首，下一轮先写它
+        self._requeued: Optional[List[Any]] = None
+
+        # 提交序号 / 完成序号，用于 flush() 等待
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._done = 0
+        self._closed = False
+
+        self._stats: Dict[str, Any] = {
+            self.WRITTEN_STAT: 0,
+            "batches": 0,
+            "errors": 0,
+            "retries": 0,
+            "requeued": 0,
+            "dropped": 0,
+            "last_batch_size": 0,
+            "last_batch_ms": 0.0,
+            "max_batch_ms": 0.0,
+            "total_batch_ms": 0.0,
+            "last_error": None,
+        }
+
+    # ==================== 生命周期 ====================
+
+    def start(self):
+        """启动写线程（幂等）"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=self.THREAD_NAME, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)  # close() 里注销，重启不会重复注册
+        return self
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """清空队列并停止写线程"""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        if self._thread and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._wake.set()
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    # ==================== 写入接口 ====================
+
+    def submit(self, item: Any, block: bool = True, timeout: Optional[float] = None) -> None:
+        """
+        提交一条记录
+
+        Args:
+            item: 交给 _write 的记录（提交后不要再修改）
+            block: 队列满时是否阻塞等待（背压）
+            timeout: 阻塞等待上限（秒），超时抛出 queue.Full
+
+        Raises:
+            RuntimeError: 写入器未启动或已关闭
+            queue.Full: 队列满（block=False 或超时）
+        """
+        if self._closed or not self.running:
+            raise RuntimeError(f"{type(self).__name__} is not running")
+        with self._cond:
+            self._submitted += 1
+        try:
+            self._queue.put(item, block=block, timeout=timeout)
+        except queue.Full:
+            with self._cond:
+                self._submitted -= 1
+            raise
+        if self.linger and self._queue.qsize() >= self.max_batch:
+            self._wake.set()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待当前所有已提交记录写入完成
+
+        Returns:
+            是否在超时前完成
+        """
+        with self._cond:
+            target = self._submitted
+        self._wake.set()
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._done >= target or not self.running, timeout
+            )
+
+    def pending(self) -> int:
+        """尚未落盘的记录数"""
+        with self._cond:
+            return self._submitted - self._done
+
+    def stats(self) -> Dict[str, Any]:
+        """写入统计（含每批延迟/大小）"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["pending"] = self._submitted - self._done
+        batches = stats["batches"]
+        stats["avg_batch_ms"] = stats["total_batch_ms"] / batches if batches else 0.0
+        stats["avg_batch_size"] = stats[self.WRITTEN_STAT] / batches if batches else 0.0
+        return stats
+
+    # ==================== 子类钩子 ====================
+
+    def _open(self) -> None:
+        """写线程启动时调用"""
+
+    def _close_resources(self) -> None:
+        """写线程退出时调用"""
+
+    def _write(self, batch: List[Any]) -> None:
+        raise NotImplementedError
+
+    def _after_cycle(self, stopping: bool) -> None:
+        """每轮（写完一批或空闲唤醒）之后调用；stopping 为 True 时是最后一轮"""
+
+    # ==================== 写线程 ====================
+
+    def _run(self) -> None:
+        self._open()
+        stopping = False
+        try:
+            while not stopping or self._requeued:
+                batch: List[Any] = []
+                if self._requeued:
+                    batch, self._requeued = self._requeued, None
+                else:
+                    try:
+                        first = self._queue.get(timeout=self.poll_interval)
+                    except queue.Empty:
+                        self._after_cycle(False)
+                        continue
+                    if first is _STOP:
+                        stopping = True
+                    else:
+                        batch.append(first)
+                        if self.linger and self._queue.qsize() + 1 < self.max_batch:
+                            self._wake.wait(self.linger)
+                self._wake.clear()
+
+                # 取空队列（组提交）；收到 _STOP 后继续取空再退出
+                while len(batch) < self.max_batch or stopping:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        continue
+                    batch.append(item)
+
+                if batch and not self._write_with_retry(batch):
+                    if stopping:
+                        self._drop(batch)
+                    else:
+                        self._requeued = batch
+                        with self._cond:
+                            self._stats["requeued"] += 1
+                        time.sleep(self.poll_interval)
+                self._after_cycle(stopping and not self._requeued)
+        finally:
+            self._close_resources()
+            with self._cond:
+                self._cond.notify_all()
+
+    def _write_with_retry(self, batch: List[Any]) -> bool:
+        """写一批，失败时指数退避重试；返回是否写入成功"""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self._cond:
+                    self._stats["retries"] += 1
+                time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+            if self._write_batch(batch):
+                return True
+        return False
+
+    def _drop(self, batch: List[Any]) -> None:
+        """关闭时重试耗尽：丢弃并计数（flush 不再等待这些记录）"""
+        logger.error("%s dropped %d records after retries", type(self).__name__, len(batch))
+        with self._cond:
+            self._done += len(batch)
+            self._stats["dropped"] += len(batch)
+            self._cond.notify_all()
+        if METRICS is not None and self.METRICS_PREFIX:
+            METRICS.inc_counter(f"{self.METRICS_PREFIX}.dropped", len(batch))
+
+    def _write_batch(self, batch: List[Any]) -> bool:
+        start = time.perf_counter()
+        error = None
+        try:
+            self._write(batch)
+        except Exception as e:
+            error = e
+            logger.warning(
+                "%s batch write failed (%d records): %s", type(self).__name__, len(batch), e
+            )
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._cond:
+            if error is None:
+                self._done += len(batch)
+                self._stats[self.WRITTEN_STAT] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["last_batch_size"] = len(batch)
+                self._stats["last_batch_ms"] = elapsed_ms
+                self._stats["total_batch_ms"] += elapsed_ms
+                self._stats["max_batch_ms"] = max(self._stats["max_batch_ms"], elapsed_ms)
+            else:
+                self._stats["errors"] += 1
+                self._stats["last_error"] = str(error)
+            self._cond.notify_all()
+
+        if METRICS is not None and self.METRICS_PREFIX:
+            prefix = self.METRICS_PREFIX
+            if error is None:
+                METRICS.observe(f"{prefix}.batch_size", len(batch))
+                METRICS.observe(f"{prefix}.batch_latency_ms", elapsed_ms)
+                METRICS.inc_counter(f"{prefix}.{self.WRITTEN_STAT}", len(batch))
+            else:
+                METRICS.inc_counter(f"{prefix}.errors")
+            METRICS.set_gauge(f"{prefix}.queue_depth", self._queue.qsize())
+        return error is None
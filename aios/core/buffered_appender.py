@@ -0,0 +1,166 @@
+"""
+AIOS 缓冲 JSONL 追加器 - 把热路径上的文件 I/O 挪到后台线程
+
+设计：
+1. append() 只把记录放进内存队列（不序列化、不碰文件），队列满时丢弃并计数
+2. 后台线程拿到第一条记录后最多再攒 flush_interval 秒（或攒满 max_batch 条），
+   序列化后一次 write 追加到 JSONL 文件；写失败时退避重试，仍失败则下一轮重写
+3. 快照任务（add_snapshot 注册的回调）每 snapshot_interval 秒在后台线程执行一次，
+   用于周期性地原子落盘内存状态（指标、缓存等）
+4. flush()：等待当前缓冲写完并执行一次快照（读己之写）
+5. close()：写完剩余记录、执行最后一次快照后停止
+
+写线程、队列、重试、atexit 由 core/batch_writer.BatchWriter 提供（与 BatchedEventWriter 共用）。
+
+创建时间：2026-10-16
+版本：v1.1
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .batch_writer import BatchWriter
+
+try:
+    import fcntl
+except ImportError:  # Windows：不做跨进程锁
+    fcntl = None
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """写临时文件再 os.replace，读者不会看到写了一半的文件"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+@contextmanager
+def file_lock(path: Path):
+    """跨进程互斥（path 上的 flock，进程退出时自动释放）"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+class BufferedAppender(BatchWriter):
+    """
+    缓冲异步 JSONL 追加器
+
+    用法：
+        appender = BufferedAppender(Path("events/router_calls.jsonl")).start()
+        appender.add_snapshot(lambda: atomic_write_text(path, json.dumps(state)))
+        appender.append({"provider": "ollama", "latency_ms": 120})
+        appender.flush()
+        appender.close()
+    """
+
+    THREAD_NAME = "aios-buffered-appender"
+
+    def __init__(
+        self,
+        path: Path,
+        flush_interval: float = 1.0,
+        snapshot_interval: float = 30.0,
+        max_buffer: int = 10000,
+        max_batch: int = 1000,
+    ):
+        """
+        Args:
+            path: JSONL 文件路径
+            flush_interval: 攒批等待时间（秒）
+            snapshot_interval: 快照回调执行间隔（秒）
+            max_buffer: 队列上限（超过后 append 丢弃记录，热路径不阻塞）
+            max_batch: 攒到该数量时立即写
+        """
+        super().__init__(
+            max_queue=max_buffer,
+            max_batch=max_batch,
+            poll_interval=min(flush_interval, snapshot_interval),
+            linger=flush_interval,
+        )
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+
+        self._snapshots: List[Callable[[], None]] = []
+        self._snapshot_lock = threading.Lock()
+        self._last_snapshot = time.monotonic()
+        self._stats.update(appended=0, snapshots=0)
+
+    def add_snapshot(self, fn: Callable[[], None]) -> None:
+        """注册周期快照回调（在后台线程执行，异常只计数不传播）"""
+        with self._cond:
+            self._snapshots.append(fn)
+
+    # ==================== 写入接口 ====================
+
+    def append(self, record: Dict[str, Any]) -> bool:
+        """
+        追加一条记录（调用方之后不要再修改 record）
+
+        Returns:
+            是否进入队列（队列满、未启动或已关闭时返回 False）
+        """
+        try:
+            self.submit(record, block=False)
+        except (queue.Full, RuntimeError):
+            with self._cond:
+                self._stats["dropped"] += 1
+            return False
+        with self._cond:
+            self._stats["appended"] += 1
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        写出队列中的记录并执行一次快照
+
+        Returns:
+            记录是否在超时前写完
+        """
+        done = super().flush(timeout)
+        self._run_snapshots()
+        return done
+
+    # ==================== 后台线程 ====================
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        text = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+    def _after_cycle(self, stopping: bool) -> None:
+        if stopping or time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self._run_snapshots()
+
+    def _run_snapshots(self) -> None:
+        with self._cond:
+            snapshots = list(self._snapshots)
+        with self._snapshot_lock:
+            for fn in snapshots:
+                try:
+                    fn()
+                except Exception as e:
+                    print(f"[BufferedAppender] 快照失败: {e}")
+                    with self._cond:
+                        self._stats["errors"] += 1
+                        self._stats["last_error"] = str(e)
+            self._last_snapshot = time.monotonic()
+            with self._cond:
+                self._stats["snapshots"] += 1
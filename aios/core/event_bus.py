@@ -17,6 +17,7 @@ from collections import defaultdict
 import fnmatch
 
 from .event import Event
+from .subscription_index import SubscriptionIndex
 
 # 使用新的 Storage Manager（通过适配器）
 try:
@@ -34,17 +35,22 @@ except ImportError:
 class EventBus:
     """事件总线 - 系统心脏（v0.6 使用 EventStore）"""
     
-    def __init__(self, storage_path: Optional[str] = None):
+    def __init__(self, storage_path: Optional[str] = None, write_behind: bool = False, **writer_options):
         """
         初始化 EventBus
         
         Args:
             storage_path: 事件存储路径（兼容旧版，新版使用 EventStore）
+            write_behind: 异步批量写入模式（emit 不再等待 SQLite 提交）
+            writer_options: 异步写入参数（max_queue / max_batch / poll_interval）
         """
         self._subscribers: Dict[str, List[Callable]] = defaultdict(list)
+        # 订阅模式前缀树（按点分段索引，订阅变化时增量更新）
+        self._index = SubscriptionIndex()
         
         # 使用新的 EventStoreAdapter（基于 Storage Manager）
-        self.store = get_event_store_adapter()
+        # write-behind 使用独立的进程级实例，不影响其他同步模式的 EventBus
+        self.store = get_event_store_adapter(write_behind, **writer_options)
         
         # 兼容旧版：如果指定了 storage_path，尝试迁移
         if storage_path:
@@ -120,6 +126,7 @@ class EventBus:
             handler: 处理函数
         """
         self._subscribers[event_type].append(handler)
+        self._index.add(event_type)
     
     def unsubscribe(self, event_type: str, handler: Callable[[Event], None]) -> None:
         """
@@ -131,6 +138,8 @@ class EventBus:
         """
         if event_type in self._subscribers:
             self._subscribers[event_type].remove(handler)
+            if not self._subscribers[event_type]:
+                self._index.remove(event_type)
     
     def _store(self, event: Event) -> None:
         """
@@ -148,14 +157,14 @@ class EventBus:
         Args:
             event: 事件对象
         """
-        for pattern, handlers in self._subscribers.items():
-            if self._match_pattern(event.type, pattern):
-                for handler in handlers:
-                    try:
-                        handler(event)
-                    except Exception as e:
-                        # 订阅者错误不应该影响事件发布
-                        print(f"[EventBus] Subscriber error: {e}")
+        for pattern in self._index.match(event.type):
+            # 复制一份，允许 handler 在回调中取消订阅
+            for handler in list(self._subscribers[pattern]):
+                try:
+                    handler(event)
+                except Exception as e:
+                    # 订阅者错误不应该影响事件发布
+                    print(f"[EventBus] Subscriber error: {e}")
     
     @staticmethod
     def _match_pattern(event_type: str, pattern: str) -> bool:
@@ -175,7 +184,7 @@ class EventBus:
         self,
         event_type: Optional[str] = None,
         since: Optional[int] = None,
-        limit: Optional[int] = None
+        limit: Optional[int] = 100
     ) -> List[Event]:
         """
         加载历史事件（使用 EventStore）
@@ -183,7 +192,7 @@ class EventBus:
         Args:
             event_type: 事件类型过滤（支持通配符）
             since: 时间戳过滤（毫秒）
-            limit: 最大数量
+            limit: 最大数量（默认 100；显式传 None 表示不限）
         
         Returns:
             事件列表
@@ -205,7 +214,23 @@ class EventBus:
         Returns:
             事件数量
         """
-        return len(self.load_events(event_type=event_type, since=since))
+        return self.store.count_events(event_type=event_type, since=since)
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待异步写入的事件全部落盘
+        
+        Args:
+            timeout: 最长等待时间（秒）
+        
+        Returns:
+            是否全部落盘
+        """
+        return self.store.flush(timeout)
+    
+    def close(self) -> None:
+        """关闭事件总线（清空异步写入队列）"""
+        self.store.close()
     
     def clear_events(self) -> None:
         """清空所有事件（谨慎使用）"""
@@ -6,12 +6,12 @@ import time
 from pathlib import Path
 from typing import Callable, Dict, List, Optional
 from collections import defaultdict
-import fnmatch
 import threading
 from queue import Queue
 
 from .event import Event
 from .event_store import EventStore, get_event_store
+from .subscription_index import SubscriptionIndex
 
 
 class OptimizedEventBus:
@@ -34,8 +34,8 @@ class OptimizedEventBus:
         self.batch_thread = None
         self.running = False
         
-        # 订阅缓存（加速模式匹配）
-        self._pattern_cache: Dict[str, List[str]] = {}
+        # 订阅模式前缀树（增量更新，无需整体失效缓存）
+        self._index = SubscriptionIndex()
         
         # 兼容旧版
         if storage_path:
@@ -97,50 +97,34 @@ class OptimizedEventBus:
         else:
             self.store.append(event)
         
-        # 2. 通知订阅者（使用缓存加速）
+        # 2. 通知订阅者（前缀树匹配）
         matched_patterns = self._get_matched_patterns(event.type)
         
         for pattern in matched_patterns:
-            for handler in self._subscribers[pattern]:
+            for handler in list(self._subscribers[pattern]):
                 try:
                     handler(event)
                 except Exception as e:
                     print(f"[EventBus] Handler 错误: {e}")
     
     def _get_matched_patterns(self, event_type: str) -> List[str]:
-        """获取匹配的模式（使用缓存）"""
-        # 检查缓存
-        if event_type in self._pattern_cache:
-            return self._pattern_cache[event_type]
-        
-        # 计算匹配
-        matched = []
-        for pattern in self._subscribers.keys():
-            if pattern == "*" or fnmatch.fnmatch(event_type, pattern):
-                matched.append(pattern)
-        
-        # 缓存结果
-        self._pattern_cache[event_type] = matched
-        
-        return matched
+        """获取匹配的模式（O(段数) 前缀树查找）"""
+        return self._index.match(event_type)
     
     def subscribe(self, pattern: str, handler: Callable) -> None:
         """订阅事件"""
         self._subscribers[pattern].append(handler)
-        
-        # 清除缓存（因为订阅变化了）
-        self._pattern_cache.clear()
+        self._index.add(pattern)
     
     def unsubscribe(self, pattern: str, handler: Callable) -> None:
         """取消订阅"""
         if pattern in self._subscribers:
             try:
                 self._subscribers[pattern].remove(handler)
-                
-                # 清除缓存
-                self._pattern_cache.clear()
             except ValueError:
-                pass
+                return
+            if not self._subscribers[pattern]:
+                self._index.remove(pattern)
     
     def flush(self):
         """强制刷新队列"""
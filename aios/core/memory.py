@@ -2,16 +2,18 @@
 AIOS Memory Module - 记忆管理系统
 
 核心功能：
-1. 向量检索（FAISS）
+1. 向量检索（矩阵化余弦检索，见 vector_index.py）
 2. 记忆分层（短期/长期/工作记忆）
 3. 自动整理（定期提炼）
 4. 重要性评分
+5. 长期记忆持久化：快照（JSON + 按快照命名的 .npy）+ 追加日志（后台压缩，见 memory_log.py）
 
 Author: 小九 + 珊瑚海
 Date: 2026-02-26
 """
 
 import json
+import os
 import time
 import numpy as np
 from pathlib import Path
@@ -20,6 +22,13 @@ from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 import hashlib
 
+try:
+    from .memory_log import MemoryLog
+    from .vector_index import VectorIndex, remove_stale_vectors, snapshot_vectors_path
+except ImportError:
+    from memory_log import MemoryLog
+    from vector_index import VectorIndex, remove_stale_vectors, snapshot_vectors_path
+
 
 @dataclass
 class Memory:
@@ -100,65 +109,100 @@ class SimpleEmbedding:
 
 
 class VectorDB:
-    """简单的向量数据库（基于 FAISS 的思路，但用纯 Python 实现）"""
+    """向量数据库（连续 float32 矩阵，存储时预归一化，一次矩阵乘 + argpartition 取 top-k）"""
     
     def __init__(self, dim: int = 128):
         self.dim = dim
-        self.vectors = []
+        self.index = VectorIndex(dim)
         self.memories = []
     
+    @property
+    def vectors(self) -> np.ndarray:
+        """归一化后的向量矩阵（第 i 行对应 memories[i]）"""
+        return self.index.vectors
+    
     def add(self, embedding: List[float], memory: Memory):
         """添加向量"""
-        self.vectors.append(np.array(embedding))
+        self.index.add(embedding)
         self.memories.append(memory)
     
     def search(self, query_embedding: List[float], k: int = 5) -> List[Memory]:
         """向量检索（余弦相似度）"""
-        if not self.vectors:
-            return []
-        
-        query_vec = np.array(query_embedding)
-        
-        # 计算余弦相似度
-        similarities = []
-        for vec in self.vectors:
-            sim = np.dot(query_vec, vec) / (
-                np.linalg.norm(query_vec) * np.linalg.norm(vec) + 1e-8
-            )
-            similarities.append(sim)
-        
-        # 取 top-k
-        top_k_indices = np.argsort(similarities)[-k:][::-1]
-        return [self.memories[i] for i in top_k_indices if similarities[i] > 0.1]
+        return self.search_batch([query_embedding], k)[0]
+    
+    def search_batch(self, query_embeddings: List[List[float]], k: int = 5) -> List[List[Memory]]:
+        """批量检索（每个查询返回 top-k）"""
+        if not self.memories:
+            return [[] for _ in query_embeddings]
+        hits = self.index.search_batch(query_embeddings, k, min_similarity=0.1)
+        return [[self.memories[row] for row, _ in rows] for rows in hits]
     
-    def save(self, path: Path):
-        """保存到文件"""
+    def snapshot(self) -> "VectorDB":
+        """当前状态的只读副本（共享向量行，不复制），供后台线程保存"""
+        snap = VectorDB.__new__(VectorDB)
+        snap.dim = self.dim
+        snap.index = self.index.snapshot()
+        snap.memories = list(self.memories)
+        return snap
+    
+    def save(self, path: Path, extra: Optional[Dict[str, Any]] = None):
+        """
+        保存到文件（记忆元数据 → JSON，向量 → 本次快照自己的 .npy；extra 为附加头字段）
+
+        JSON 的 os.replace 是唯一提交点：之前崩溃，旧 JSON 仍指向完好的旧 .npy；
+        之后才删除旧 .npy。
+        """
+        vectors_file = snapshot_vectors_path(path, (extra or {}).get("log_seq", 0))
+        self.index.save(vectors_file)
         data = {
-            "vectors": [v.tolist() for v in self.vectors],
-            "memories": [asdict(m) for m in self.memories]
+            "dim": self.dim,
+            "vectors_file": vectors_file.name,
+            "memories": [asdict(m) for m in self.memories],
+            **(extra or {})
         }
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        remove_stale_vectors(path, keep=vectors_file)
     
-    def load(self, path: Path):
-        """从文件加载"""
+    def load(self, path: Path) -> Dict[str, Any]:
+        """从文件加载（兼容旧格式：向量内联在 JSON 里），返回 save 时的 extra 头字段"""
         if not path.exists():
-            return
+            return {}
         
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
         
-        self.vectors = [np.array(v) for v in data["vectors"]]
-        self.memories = [Memory(**m) for m in data["memories"]]
+        index = VectorIndex(self.dim)
+        if "vectors" in data:
+            if data["vectors"]:
+                index.add_many(data["vectors"])
+        else:
+            index.load(path.parent / data["vectors_file"])  # 内存映射，按需分页
+        memories = [Memory(**m) for m in data["memories"]]
+        if len(index) != len(memories):
+            raise ValueError(f"{len(index)} vectors for {len(memories)} memories in {path}")
+        self.index = index
+        self.memories = memories
+        return {k: v for k, v in data.items() if k not in ("dim", "vectors_file", "vectors", "memories")}
 
 
 class MemoryManager:
     """记忆管理器"""
     
-    def __init__(self, workspace: Path, dim: int = 128):
+    def __init__(self, workspace: Path, dim: int = 128,
+                 fsync: str = "interval", compact_every: int = 1000):
+        """
+        Args:
+            fsync: 长期记忆日志的 fsync 策略（always/interval/never）
+            compact_every: 日志累计多少条后在后台压缩成快照
+        """
         self.workspace = workspace
         self.memory_dir = workspace / "memory"
         self.memory_dir.mkdir(parents=True, exist_ok=True)
+        self.compact_every = compact_every
+        self.log = MemoryLog(self.memory_dir / "long_term.log", fsync=fsync)
         
         # 三层记忆
         self.short_term: List[Memory] = []  # 短期记忆（最近 100 条）
@@ -176,15 +220,37 @@ class MemoryManager:
             self._init_embedding()
     
     def _load_long_term(self):
-        """加载长期记忆"""
+        """
+        加载长期记忆（快照 + 重放快照之后的日志）
+
+        失败直接抛出：带着不完整的状态继续运行，下一次压缩会覆盖快照并截掉日志。
+        """
         db_file = self.memory_dir / "long_term.json"
-        if db_file.exists():
-            self.long_term.load(db_file)
+        header = self.long_term.load(db_file)
+        for record in self.log.replay(after_seq=header.get("log_seq", 0)):
+            memory = Memory(**record)
+            self.long_term.add(memory.embedding, memory)
     
-    def _save_long_term(self):
-        """保存长期记忆"""
+    def _append_long_term(self, memory: Memory):
+        """持久化一条新的长期记忆（只追加日志，O(1)）"""
+        self.log.append(asdict(memory))
+        # 后台压缩还在跑时不做 O(n) 的快照复制
+        if self.log.pending >= self.compact_every and not self.log.compacting:
+            self._compact_long_term(wait=False)
+    
+    def _compact_long_term(self, wait: bool):
+        """写快照并截掉快照已覆盖的日志"""
         db_file = self.memory_dir / "long_term.json"
-        self.long_term.save(db_file)
+        snapshot = self.long_term.snapshot()
+        self.log.compact(lambda seq: snapshot.save(db_file, extra={"log_seq": seq}), wait=wait)
+    
+    def _save_long_term(self):
+        """保存长期记忆（同步写快照）"""
+        self._compact_long_term(wait=True)
+    
+    def close(self):
+        """等待后台压缩完成并刷盘日志"""
+        self.log.close()
     
     def _init_embedding(self):
         """初始化 Embedding（从 MEMORY.md 训练）"""
@@ -247,7 +313,7 @@ class MemoryManager:
             memory.embedding = embedding
             memory.type = "long_term"
             self.long_term.add(embedding, memory)
-            self._save_long_term()
+            self._append_long_term(memory)
         
         # 3. 限制短期记忆大小
         if len(self.short_term) > 100:
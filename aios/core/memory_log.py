@@ -0,0 +1,220 @@
+"""
+AIOS Memory Log - append-only persistence for long-term memory
+
+Long-term memory is stored as a snapshot (VectorDB.save) plus an append-only
+JSONL log of records added since that snapshot:
+- append(): one JSON line per new memory (O(1), no re-serialization of the DB)
+- Each record carries a sequence number; the snapshot stores the last sequence
+  it contains ("log_seq"), so replay after a crash never applies a record twice
+- compact(): writes a snapshot in a background thread, then drops the log prefix
+  the snapshot covers (records appended meanwhile are kept)
+- replay(): returns records newer than the snapshot; a torn final line left by a
+  crash is cut off
+
+fsync policies:
+- "always": fsync after every append (survives power loss, slowest)
+- "interval": flush every append to the OS, fsync at most every fsync_interval
+  seconds (a process crash loses nothing; power loss loses <= the interval)
+- "never": leave durability to the OS
+
+Date: 2026-10-16
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+class MemoryLog:
+    """Append-only JSONL log with sequence numbers and background compaction.
+
+    Example:
+        >>> log = MemoryLog(Path("memory/long_term.log"))
+        >>> records = log.replay(after_seq=snapshot_seq)
+        >>> log.append(memory_dict)
+        >>> if log.pending >= 1000:
+        ...     log.compact(lambda seq: db.snapshot().save(path, extra={"log_seq": seq}))
+    """
+
+    def __init__(self, path: Path, fsync: str = "interval", fsync_interval: float = 1.0):
+        """Initialize the log (the file is opened on first append).
+
+        Args:
+            path: Log file path
+            fsync: One of FSYNC_POLICIES
+            fsync_interval: Seconds between fsyncs for the "interval" policy
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.path = Path(path)
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.seq = 0
+        self.pending = 0  # records in the log file (not yet covered by a snapshot)
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._last_fsync = 0.0
+        self._compactor: Optional[threading.Thread] = None
+
+    # ==================== Write ====================
+
+    def _open(self):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "ab")
+        return self._file
+
+    def _sync(self, force: bool = False) -> None:
+        f = self._file
+        if f is None:
+            return
+        f.flush()
+        if self.fsync == "never":
+            return
+        now = time.monotonic()
+        if self.fsync == "always" or force or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(f.fileno())
+            self._last_fsync = now
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Append one record; returns its sequence number."""
+        with self._lock:
+            self.seq += 1
+            line = json.dumps({"seq": self.seq, "record": record}, ensure_ascii=False)
+            self._open().write(line.encode("utf-8") + b"\n")
+            self._sync()
+            self.pending += 1
+            return self.seq
+
+    def flush(self) -> None:
+        """Flush and fsync (unless the policy is "never")."""
+        with self._lock:
+            self._sync(force=True)
+
+    # ==================== Replay ====================
+
+    def replay(self, after_seq: int = 0) -> List[Dict[str, Any]]:
+        """Read records with seq > after_seq and position the log for appends.
+
+        A line that does not parse (torn write from a crash) ends the log; the
+        file is truncated there so new appends start on a clean line.
+
+        Args:
+            after_seq: Last sequence number contained in the snapshot
+
+        Returns:
+            Records in append order
+        """
+        with self._lock:
+            self.seq = after_seq
+            self.pending = 0
+            if not self.path.exists():
+                return []
+
+            records = []
+            good_offset = 0
+            with open(self.path, "rb") as f:
+                for raw in f:
+                    try:
+                        if not raw.endswith(b"\n"):
+                            raise ValueError("incomplete line")
+                        entry = json.loads(raw)
+                        seq, record = entry["seq"], entry["record"]
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.warning(f"Truncating {self.path} at byte {good_offset}: {e}")
+                        break
+                    good_offset += len(raw)
+                    self.pending += 1
+                    self.seq = max(self.seq, seq)
+                    if seq > after_seq:
+                        records.append(record)
+
+            if good_offset != self.path.stat().st_size:
+                with open(self.path, "r+b") as f:
+                    f.truncate(good_offset)
+            return records
+
+    # ==================== Compaction ====================
+
+    @property
+    def compacting(self) -> bool:
+        return bool(self._compactor and self._compactor.is_alive())
+
+    def compact(self, write_snapshot: Callable[[int], None], wait: bool = False) -> bool:
+        """Snapshot the state and drop the log prefix it covers.
+
+        The caller must capture the state to snapshot before calling, with no
+        append in between; write_snapshot(seq) then persists it with seq as
+        its log_seq.
+
+        Args:
+            write_snapshot: Persists the captured state, given its last sequence number
+            wait: Run in the calling thread (after any running compaction)
+                instead of a background thread
+
+        Returns:
+            False if a background compaction is already running (nothing started)
+        """
+        if self.compacting:
+            if not wait:
+                return False
+            self._compactor.join()
+
+        with self._lock:
+            self._sync(force=True)
+            seq = self.seq
+            offset = self._file.tell() if self._file else 0
+            covered = self.pending
+
+        def run():
+            try:
+                write_snapshot(seq)
+                self._drop_prefix(offset, covered)
+            except Exception as e:
+                logger.error(f"Memory log compaction failed: {e}")
+
+        if wait:
+            run()
+        else:
+            self._compactor = threading.Thread(target=run, name="memory-log-compact", daemon=True)
+            self._compactor.start()
+        return True
+
+    def _drop_prefix(self, offset: int, covered: int) -> None:
+        """Rewrite the log without its first `offset` bytes (atomic replace)."""
+        with self._lock:
+            if self._file is not None:
+                self._sync(force=True)
+                self._file.close()
+                self._file = None
+            if self.path.exists():
+                with open(self.path, "rb") as f:
+                    f.seek(offset)
+                    tail = f.read()
+                tmp = self.path.with_name(self.path.name + ".tmp")
+                with open(tmp, "wb") as f:
+                    f.write(tail)
+                    f.flush()
+                    if self.fsync != "never":
+                        os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            self.pending -= covered
+
+    def close(self) -> None:
+        """Wait for a running compaction, then flush and close the file."""
+        if self.compacting:
+            self._compactor.join()
+        with self._lock:
+            if self._file is not None:
+                self._sync(force=True)
+                self._file.close()
+                self._file = None
@@ -5,7 +5,8 @@ This module provides a hierarchical memory system for AIOS with:
 - Vector-based retrieval (FAISS-style)
 - Three-tier memory architecture (short-term/long-term/working)
 - Automatic consolidation and importance scoring
-- Persistent storage with JSON serialization
+- Persistent storage (JSON metadata + binary .npy vectors snapshot,
+  plus an append-only log of long-term memories added since the snapshot)
 
 Author: 小九 + 珊瑚海
 Date: 2026-02-26
@@ -14,6 +15,7 @@ Refactored: 2026-03-14
 
 import json
 import logging
+import os
 import time
 import numpy as np
 from pathlib import Path
@@ -24,6 +26,13 @@ from enum import Enum
 import hashlib
 import re
 
+try:
+    from .memory_log import MemoryLog
+    from .vector_index import VectorIndex, remove_stale_vectors, snapshot_vectors_path
+except ImportError:
+    from memory_log import MemoryLog
+    from vector_index import VectorIndex, remove_stale_vectors, snapshot_vectors_path
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -36,6 +45,7 @@ DEFAULT_CONSOLIDATION_DAYS = 7
 MIN_PARAGRAPH_LENGTH = 20
 MAX_RECENT_UPDATES = 10
 MIN_SIMILARITY_THRESHOLD = 0.1
+DEFAULT_COMPACT_THRESHOLD = 1000
 
 
 class MemoryType(Enum):
@@ -62,12 +72,18 @@ class MemoryConfig:
         importance_threshold: Threshold for promoting to long-term memory
         consolidation_days: Days to look back for consolidation
         min_similarity: Minimum similarity score for retrieval
+        log_fsync: Long-term log fsync policy ("always"/"interval"/"never")
+        log_fsync_interval: Seconds between fsyncs for the "interval" policy
+        compact_threshold: Log records that trigger a background snapshot
     """
     embedding_dim: int = DEFAULT_EMBEDDING_DIM
     short_term_limit: int = DEFAULT_SHORT_TERM_LIMIT
     importance_threshold: float = DEFAULT_IMPORTANCE_THRESHOLD
     consolidation_days: int = DEFAULT_CONSOLIDATION_DAYS
     min_similarity: float = MIN_SIMILARITY_THRESHOLD
+    log_fsync: str = "interval"
+    log_fsync_interval: float = 1.0
+    compact_threshold: int = DEFAULT_COMPACT_THRESHOLD
 
 
 @dataclass
@@ -288,20 +304,23 @@ class SimpleEmbedding:
 
 
 class VectorDB:
-    """Simple vector database for similarity search.
+    """Vector database for similarity search.
     
-    Implements cosine similarity search over stored vectors.
-    For production use, consider using FAISS, Pinecone, or Weaviate.
+    Embeddings live in a contiguous, pre-normalized float32 matrix
+    (see core.vector_index.VectorIndex); search is one matrix product
+    plus argpartition. Vectors are persisted as a binary .npy file per
+    snapshot, named in the JSON metadata, and loaded memory-mapped.
     
     Attributes:
         dim: Vector dimension
-        vectors: List of stored vectors
+        vectors: Normalized vector matrix (one row per memory)
         memories: List of corresponding memories
     
     Example:
         >>> db = VectorDB(dim=128)
         >>> db.add(embedding, memory)
         >>> results = db.search(query_embedding, k=5)
+        >>> batch = db.search_batch([q1, q2], k=5)
     """
     
     def __init__(self, dim: int = DEFAULT_EMBEDDING_DIM):
@@ -314,10 +333,15 @@ class VectorDB:
             raise ValueError(f"Dimension must be positive, got {dim}")
         
         self.dim = dim
-        self.vectors: List[np.ndarray] = []
+        self.index = VectorIndex(dim)
         self.memories: List[Memory] = []
         logger.info(f"Initialized VectorDB with dim={dim}")
     
+    @property
+    def vectors(self) -> np.ndarray:
+        """Normalized vectors, row i belongs to memories[i]."""
+        return self.index.vectors
+    
     def add(self, embedding: List[float], memory: Memory) -> None:
         """Add vector and memory to database.
         
@@ -334,7 +358,7 @@ class VectorDB:
             )
         
         try:
-            self.vectors.append(np.array(embedding))
+            self.index.add(embedding)
             self.memories.append(memory)
             logger.debug(f"Added memory {memory.id} to VectorDB")
         except Exception as e:
@@ -360,58 +384,87 @@ class VectorDB:
         Raises:
             ValueError: If query dimension doesn't match
         """
-        if not self.vectors:
+        if not self.memories:
             return []
+        return self.search_batch([query_embedding], k, min_similarity)[0]
+    
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        k: int = 5,
+        min_similarity: float = MIN_SIMILARITY_THRESHOLD
+    ) -> List[List[Memory]]:
+        """Search for several queries at once (one matrix product per chunk).
         
-        if len(query_embedding) != self.dim:
-            raise ValueError(
-                f"Query dimension mismatch: expected {self.dim}, got {len(query_embedding)}"
-            )
-        
-        try:
-            query_vec = np.array(query_embedding)
+        Args:
+            query_embeddings: Query vectors
+            k: Number of results per query
+            min_similarity: Minimum similarity threshold
             
-            # Calculate cosine similarities
-            similarities = []
-            for vec in self.vectors:
-                sim = np.dot(query_vec, vec) / (
-                    np.linalg.norm(query_vec) * np.linalg.norm(vec) + 1e-8
-                )
-                similarities.append(sim)
-            
-            # Get top-k indices above threshold
-            top_k_indices = np.argsort(similarities)[-k:][::-1]
-            results = [
-                self.memories[i] 
-                for i in top_k_indices 
-                if similarities[i] > min_similarity
-            ]
+        Returns:
+            Top-k similar memories for each query, in query order
             
-            logger.debug(f"Search returned {len(results)} results")
+        Raises:
+            ValueError: If a query dimension doesn't match
+        """
+        if not self.memories:
+            return [[] for _ in query_embeddings]
+        
+        for query in query_embeddings:
+            if len(query) != self.dim:
+                raise ValueError(
+                    f"Query dimension mismatch: expected {self.dim}, got {len(query)}"
+                )
+        
+        try:
+            hits = self.index.search_batch(query_embeddings, k, min_similarity)
+            results = [[self.memories[row] for row, _ in rows] for rows in hits]
+            logger.debug(f"Search returned {sum(map(len, results))} results")
             return results
             
         except Exception as e:
             logger.error(f"Error searching VectorDB: {e}")
             raise
     
-    def save(self, path: Path) -> None:
-        """Save database to JSON file.
+    def snapshot(self) -> "VectorDB":
+        """Point-in-time copy for saving in the background (rows are shared, not copied)."""
+        snap = VectorDB.__new__(VectorDB)
+        snap.dim = self.dim
+        snap.index = self.index.snapshot()
+        snap.memories = list(self.memories)
+        return snap
+    
+    def save(self, path: Path, extra: Optional[Dict[str, Any]] = None) -> None:
+        """Save memories to a JSON file and vectors to a new .npy file.
+        
+        The .npy is named after the snapshot (``<stem>.<log_seq>.<unique>.npy``)
+        and recorded in the JSON's ``vectors_file``. Replacing the JSON is the
+        single commit point: a crash before it leaves the old JSON pointing at
+        the old, intact .npy. Older .npy files are deleted afterwards.
         
         Args:
             path: Output file path
+            extra: Additional header fields stored in the JSON (returned by load)
             
         Raises:
             IOError: If file cannot be written
         """
         try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            vectors_file = snapshot_vectors_path(path, (extra or {}).get("log_seq", 0))
+            self.index.save(vectors_file)
+            
             data = {
-                "vectors": [v.tolist() for v in self.vectors],
-                "memories": [m.to_dict() for m in self.memories]
+                "dim": self.dim,
+                "vectors_file": vectors_file.name,
+                "memories": [m.to_dict() for m in self.memories],
+                **(extra or {})
             }
-            
-            path.parent.mkdir(parents=True, exist_ok=True)
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, path)
+            remove_stale_vectors(path, keep=vectors_file)
             
             logger.info(f"Saved VectorDB to {path}")
             
@@ -419,32 +472,55 @@ class VectorDB:
             logger.error(f"Error saving VectorDB: {e}")
             raise IOError(f"Failed to save VectorDB: {e}")
     
-    def load(self, path: Path) -> None:
-        """Load database from JSON file.
+    def load(self, path: Path) -> Dict[str, Any]:
+        """Load database from JSON file (and its .npy vector file).
+        
+        Files written before the .npy format (vectors inline in the
+        JSON) are still accepted.
         
         Args:
             path: Input file path
             
+        Returns:
+            The extra header fields passed to save() (empty if none)
+            
         Raises:
             IOError: If file cannot be read
             ValueError: If data format is invalid
         """
         if not path.exists():
             logger.warning(f"VectorDB file not found: {path}")
-            return
+            return {}
         
         try:
             with open(path, "r", encoding="utf-8") as f:
                 data = json.load(f)
             
-            self.vectors = [np.array(v) for v in data["vectors"]]
-            self.memories = [Memory.from_dict(m) for m in data["memories"]]
+            memories = [Memory.from_dict(m) for m in data["memories"]]
+            index = VectorIndex(self.dim)
+            if "vectors" in data:
+                if data["vectors"]:
+                    index.add_many(data["vectors"])
+            else:
+                index.load(path.parent / data["vectors_file"])
+            if len(index) != len(memories):
+                raise ValueError(
+                    f"{len(index)} vectors for {len(memories)} memories in {path}"
+                )
             
+            self.index = index
+            self.memories = memories
             logger.info(f"Loaded {len(self.memories)} memories from {path}")
+            return {
+                key: value for key, value in data.items()
+                if key not in ("dim", "vectors_file", "vectors", "memories")
+            }
             
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON in VectorDB file: {e}")
             raise ValueError(f"Invalid JSON format: {e}")
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Error loading VectorDB: {e}")
             raise IOError(f"Failed to load VectorDB: {e}")
@@ -458,6 +534,10 @@ class MemoryManager:
     - Long-term: Important memories (persistent, vector-indexed)
     - Working: Task-specific temporary memories
     
+    Long-term memories are persisted by appending to memory/long_term.log;
+    every compact_threshold records the log is folded into the
+    long_term.json/.npy snapshot in a background thread.
+    
     Attributes:
         workspace: Workspace directory path
         config: Memory configuration
@@ -496,6 +576,13 @@ class MemoryManager:
         # Embedding model
         self.embedding = SimpleEmbedding(self.config.embedding_dim)
         
+        # Append-only log of long-term memories newer than the snapshot
+        self.log = MemoryLog(
+            self.memory_dir / "long_term.log",
+            fsync=self.config.log_fsync,
+            fsync_interval=self.config.log_fsync_interval,
+        )
+        
         # Load long-term memory
         self._load_long_term()
         
@@ -506,21 +593,58 @@ class MemoryManager:
         logger.info(f"Initialized MemoryManager at {workspace}")
     
     def _load_long_term(self) -> None:
-        """Load long-term memory from disk."""
+        """Load long-term memory from disk (snapshot, then replay the log tail).
+        
+        A failed load is fatal: continuing with partial state would let the
+        next compaction overwrite the snapshot and drop the log it covers.
+        
+        Raises:
+            IOError: If the snapshot or a log record cannot be loaded
+                (both files are left as they are)
+        """
         db_file = self.memory_dir / "long_term.json"
         try:
-            self.long_term.load(db_file)
+            header = self.long_term.load(db_file)
+            replayed = self.log.replay(after_seq=header.get("log_seq", 0))
+            for record in replayed:
+                memory = Memory.from_dict(record)
+                self.long_term.add(memory.embedding, memory)
+            if replayed:
+                logger.info(f"Replayed {len(replayed)} long-term memories from log")
         except Exception as e:
             logger.error(f"Failed to load long-term memory: {e}")
+            raise IOError(f"Failed to load long-term memory from {self.memory_dir}: {e}") from e
     
-    def _save_long_term(self) -> None:
-        """Save long-term memory to disk."""
+    def _append_long_term(self, memory: Memory) -> None:
+        """Persist one new long-term memory (log append, O(1))."""
+        try:
+            self.log.append(memory.to_dict())
+            # Skip the O(n) snapshot copy while a compaction is still running
+            if self.log.pending >= self.config.compact_threshold and not self.log.compacting:
+                self._compact_long_term(wait=False)
+        except Exception as e:
+            logger.error(f"Failed to append long-term memory: {e}")
+    
+    def _compact_long_term(self, wait: bool) -> None:
+        """Write a snapshot of long-term memory and truncate the log it covers."""
         db_file = self.memory_dir / "long_term.json"
+        snapshot = self.long_term.snapshot()
+        self.log.compact(
+            lambda seq: snapshot.save(db_file, extra={"log_seq": seq}),
+            wait=wait,
+        )
+    
+    def _save_long_term(self) -> None:
+        """Save long-term memory to disk (synchronous snapshot)."""
         try:
-            self.long_term.save(db_file)
+            self._compact_long_term(wait=True)
         except Exception as e:
             logger.error(f"Failed to save long-term memory: {e}")
     
+    def close(self) -> None:
+        """Finish any background snapshot and flush the long-term log."""
+        self.log.close()
+    
     def _init_embedding(self) -> None:
         """Initialize embedding model from MEMORY.md.
         
@@ -632,7 +756,7 @@ class MemoryManager:
                 memory.embedding = embedding
                 memory.type = MemoryType.LONG_TERM.value
                 self.long_term.add(embedding, memory)
-                self._save_long_term()
+                self._append_long_term(memory)
                 logger.info(f"Promoted memory {memory.id} to long-term storage")
             
             # Limit short-term memory size
@@ -791,7 +915,7 @@ class MemoryManager:
         Performs the following operations:
         1. Promotes important short-term memories to long-term
         2. Trims short-term memory to size limit
-        3. Saves long-term memory to disk
+        3. Snapshots long-term memory to disk (truncating the log)
         4. Updates MEMORY.md with recent important memories
         
         Returns:
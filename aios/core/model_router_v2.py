@@ -7,18 +7,112 @@ aios/core/model_router_v2.py - 生产级智能模型路由
 - 自动降级
 - 性能监控
 - 灰度开关
+- 共享 keep-alive 连接池 + Provider 健康缓存（路由决策不再额外探测）
+- 流式调用（route_stream，记录首 token 延迟）
+- 响应缓存（精确 + 可选语义相似，TTL/LRU/字节预算，落盘跨重启）
+- 指标在内存（MetricsRegistry，按 provider 的延迟直方图），调用日志走缓冲异步追加，
+  指标/缓存由后台线程周期性原子快照，热路径不做同步文件 I/O
+- 指标快照把本进程的增量合并进 router_metrics.json（文件锁保护），
+  多进程、重启后累计值不丢；get_metrics() 只反映本进程
+- 后台线程在第一次调用时才启动，close() 停止
 """
 
 import json
+import threading
 import time
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
-from typing import Literal, Optional, Dict, Any
+from typing import Callable, Iterator, Literal, Optional, Dict, Any, Tuple
 from datetime import datetime
 
+from .buffered_appender import BufferedAppender, atomic_write_text, file_lock
+from .response_cache import ResponseCache
+
+try:
+    from aios.observability.metrics import MetricsRegistry, snapshot_delta
+except ImportError:
+    from observability.metrics import MetricsRegistry, snapshot_delta
+
 CONFIG_FILE = Path(__file__).parent / "router_config.json"
 METRICS_FILE = Path(__file__).parent.parent / "events" / "router_metrics.json"
 LOG_FILE = Path(__file__).parent.parent / "events" / "router_calls.jsonl"
+CACHE_FILE = Path(__file__).parent.parent / "events" / "router_cache.json"
+OLLAMA_URL = "http://localhost:11434"
+CLAUDE_PLACEHOLDER = "[Claude API 调用]"
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """进程内共享的 HTTP 会话（keep-alive 连接池）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+class ProviderHealth:
+    """
+    Provider 健康缓存（stale-while-revalidate）
+
+    - is_available() 只读缓存，不发请求；缓存超过 ttl_sec 时在后台线程重新探测，先返回旧值
+    - 从未探测过时乐观返回 True，同时在后台探测
+    - mark(ok) 用真实调用的结果更新缓存（连接失败立即标记为不可用）
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[], bool],
+        ttl_sec: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._probe = probe
+        self.ttl_sec = ttl_sec
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._available: Optional[bool] = None
+        self._checked_at: Optional[float] = None
+        self._refreshing = False
+
+    def is_available(self) -> bool:
+        with self._lock:
+            available = self._available
+            stale = self._checked_at is None or self._clock() - self._checked_at >= self.ttl_sec
+            start = stale and not self._refreshing
+            if start:
+                self._refreshing = True
+        if start:
+            threading.Thread(target=self._background_refresh, name="provider-health", daemon=True).start()
+        return True if available is None else available
+
+    def refresh(self) -> bool:
+        """同步探测一次"""
+        try:
+            ok = bool(self._probe())
+        except Exception:
+            ok = False
+        self.mark(ok)
+        return ok
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def mark(self, ok: bool):
+        with self._lock:
+            self._available = ok
+            self._checked_at = self._clock()
 
 
 class ModelRouter:
@@ -28,6 +122,27 @@ class ModelRouter:
         self.config_path = config_path or CONFIG_FILE
         self.config = self._load_config()
         self._ensure_log_dir()
+        self.ollama_url = self.config.get("ollama_url", OLLAMA_URL).rstrip("/")
+        self.session = get_session()
+        self.ollama_health = ProviderHealth(
+            self._probe_ollama, ttl_sec=self.config.get("health", {}).get("ttl_sec", 30)
+        )
+        self.metrics = MetricsRegistry()
+        self._last_updated: Optional[str] = None
+        self._persisted_metrics: Optional[Dict[str, Any]] = None  # 上次已合并进文件的快照
+        self._metrics_file = METRICS_FILE  # 与调用日志一样在构造时确定路径
+        monitoring = self.config.get("monitoring", {})
+        self._call_log = BufferedAppender(
+            LOG_FILE,
+            flush_interval=monitoring.get("flush_interval_sec", 1.0),
+            snapshot_interval=monitoring.get("snapshot_interval_sec", 30.0),
+        )
+        self._call_log.add_snapshot(self._snapshot_metrics)
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self.response_cache = self._build_cache()
+        if self.response_cache is not None:
+            self._call_log.add_snapshot(self.response_cache.save)
 
     def _load_config(self) -> dict:
         """加载配置"""
@@ -38,7 +153,8 @@ class ModelRouter:
                 pass
         return self._default_config()
 
-    def _default_config(self) -> dict:
+    @staticmethod
+    def _default_config() -> dict:
         """默认配置"""
         return {
             "enabled": True,
@@ -51,8 +167,37 @@ class ModelRouter:
                 "simple_qa": "simple",
                 "reasoning": "complex",
             },
+            "cache": {
+                "enabled": True,
+                "ttl_sec": 3600,
+                "max_entries": 1000,
+                "max_bytes": 8 * 1024 * 1024,
+                "exclude_task_types": [],
+                "semantic": {"enabled": False, "threshold": 0.95, "embed_model": "nomic-embed-text"},
+            },
+            "monitoring": {
+                "log_all_calls": True,
+                "flush_interval_sec": 1.0,
+                "snapshot_interval_sec": 30.0,
+            },
         }
 
+    def _build_cache(self) -> Optional[ResponseCache]:
+        """按配置构建响应缓存（未启用返回 None）"""
+        cfg = self.config.get("cache", {})
+        if not cfg.get("enabled", False):
+            return None
+        semantic = cfg.get("semantic", {})
+        cache = ResponseCache(
+            path=CACHE_FILE,
+            ttl_sec=cfg.get("ttl_sec", 3600),
+            max_entries=cfg.get("max_entries", 1000),
+            max_bytes=cfg.get("max_bytes", 8 * 1024 * 1024),
+            embed=self._embed_ollama if semantic.get("enabled", False) else None,
+            similarity_threshold=semantic.get("threshold", 0.95),
+        )
+        return cache
+
     def _ensure_log_dir(self):
         """确保日志目录存在"""
         LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
@@ -63,6 +208,7 @@ class ModelRouter:
         prompt: str,
         context: Optional[Dict[str, Any]] = None,
         force_model: Optional[Literal["ollama", "claude"]] = None,
+        use_cache: bool = True,
     ) -> Dict[str, Any]:
         """
         智能路由入口
@@ -72,6 +218,7 @@ class ModelRouter:
             prompt: 提示词
             context: 上下文信息
             force_model: 强制使用指定模型
+            use_cache: 是否查/写响应缓存（缓存启用时）
 
         Returns:
             {
@@ -83,7 +230,10 @@ class ModelRouter:
                 "reason": str,
                 "estimated_cost": float,
                 "latency_ms": int,
-                "timestamp": str
+                "timestamp": str,
+                "cached": bool,          # 查过缓存时才有
+                "cache_tier": str,       # 命中时："exact" | "semantic"
+                "saved_latency_ms": int  # 命中时：原调用延迟 - 本次延迟
             }
         """
         start_time = time.time()
@@ -96,8 +246,13 @@ class ModelRouter:
         # 决策：选择模型
         decision = self._decide_model(task_type, prompt, force_model)
 
-        # 执行调用
-        result = self._execute(decision, prompt, context)
+        # 查缓存，未命中再执行调用
+        cacheable = use_cache and self._cacheable(task_type)
+        hit, embedding = self._cache_lookup(decision, prompt, task_type) if cacheable else (None, None)
+        if hit is not None:
+            result = self._cached_result(decision, hit)
+        else:
+            result = self._execute(decision, prompt, context)
 
         # 计算延迟
         latency_ms = int((time.time() - start_time) * 1000)
@@ -105,6 +260,13 @@ class ModelRouter:
         result["timestamp"] = timestamp
         result["task_type"] = task_type
 
+        if cacheable:
+            result["cached"] = hit is not None
+            if hit is not None:
+                result["saved_latency_ms"] = max(0, hit["latency_ms"] - latency_ms)
+            else:
+                self._cache_store(decision, prompt, task_type, result, embedding)
+
         # 记录日志
         self._log_call(result)
 
@@ -195,42 +357,198 @@ class ModelRouter:
 
             # Ollama 失败，降级到 Claude
             if self.config.get("fallback", {}).get("enabled", True):
-                result["fallback"] = True
-                result["provider"] = "claude"
-                result["model"] = self.config["default_cloud_model"]
-                result["reason"] = f"{reason}_fallback"
-                result["response"] = "[Claude API 调用]"
-                result["success"] = True
-                result["estimated_cost"] = 0.01
-                return result
+                return self._fallback_to_claude(result)
 
         # 调用 Claude（占位）
         elif provider == "claude":
-            result["response"] = "[Claude API 调用]"
+            result["response"] = CLAUDE_PLACEHOLDER
             result["success"] = True
             result["estimated_cost"] = 0.01
             return result
 
         return result
 
-    def _is_ollama_available(self) -> bool:
-        """检查 Ollama 是否可用"""
-        try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=2)
-            return response.status_code == 200
-        except Exception:
+    def _fallback_to_claude(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Ollama 失败，降级到 Claude"""
+        result["fallback"] = True
+        result["provider"] = "claude"
+        result["model"] = self.config["default_cloud_model"]
+        result["reason"] = f"{result['reason']}_fallback"
+        result["response"] = CLAUDE_PLACEHOLDER
+        result["success"] = True
+        result["estimated_cost"] = 0.01
+        return result
+
+    def _cacheable(self, task_type: str) -> bool:
+        if self.response_cache is None:
             return False
+        return task_type not in self.config.get("cache", {}).get("exclude_task_types", [])
+
+    def _cache_lookup(
+        self, decision: Dict[str, Any], prompt: str, task_type: str
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[list]]:
+        """(命中结果, prompt embedding)；embedding 留给未命中后的写入复用"""
+        try:
+            return self.response_cache.lookup(decision["provider"], decision["model"], prompt, task_type)
+        except Exception as e:
+            print(f"缓存查询失败: {e}")
+            return None, None
+
+    def _cached_result(self, decision: Dict[str, Any], hit: Dict[str, Any]) -> Dict[str, Any]:
+        """缓存命中：不调用模型，成本为 0"""
+        return {
+            "provider": decision["provider"],
+            "model": decision["model"],
+            "reason": f"{decision['reason']}_cached",
+            "response": hit["response"],
+            "success": True,
+            "fallback": False,
+            "estimated_cost": 0.0,
+            "saved_cost": hit["estimated_cost"],
+            "cache_tier": hit["tier"],
+        }
+
+    def _cache_store(
+        self,
+        decision: Dict[str, Any],
+        prompt: str,
+        task_type: str,
+        result: Dict[str, Any],
+        embedding: Optional[list] = None,
+    ):
+        """只缓存按决策成功完成的调用（降级结果不缓存），由后台快照落盘"""
+        if not result["success"] or result["fallback"] or result["provider"] != decision["provider"]:
+            return
+        try:
+            self.response_cache.put(
+                decision["provider"],
+                decision["model"],
+                prompt,
+                task_type,
+                result["response"],
+                latency_ms=result["latency_ms"],
+                estimated_cost=result["estimated_cost"],
+                embedding=embedding,
+            )
+        except Exception as e:
+            print(f"缓存写入失败: {e}")
+
+    def _embed_ollama(self, text: str) -> Optional[list]:
+        """语义缓存用的 embedding（Ollama /api/embeddings，失败返回 None）"""
+        if not self._is_ollama_available():
+            return None
+        model = self.config.get("cache", {}).get("semantic", {}).get("embed_model", "nomic-embed-text")
+        response = self.session.post(
+            f"{self.ollama_url}/api/embeddings",
+            json={"model": model, "prompt": text},
+            timeout=self._ollama_timeout(),
+        )
+        if response.status_code != 200:
+            return None
+        return response.json().get("embedding")
+
+    def route_stream(
+        self,
+        task_type: str,
+        prompt: str,
+        context: Optional[Dict[str, Any]] = None,
+        force_model: Optional[Literal["ollama", "claude"]] = None,
+    ) -> Iterator[str]:
+        """
+        流式路由：token 到达即 yield，结束后写日志和指标
+
+        生成器的返回值（yield from / StopIteration.value）是与 route() 相同的结果字典，
+        另外带 "ttft_ms"（首 token 延迟）和 "streamed": True。
+        首个 token 之前失败按 route() 的规则降级；之后失败返回已收到的部分，success=False。
+
+        用法：
+            for token in router.route_stream("simple_qa", "..."):
+                print(token, end="", flush=True)
+        """
+        start_time = time.time()
+        timestamp = datetime.now().isoformat()
+
+        if not self.config.get("enabled", True):
+            result = self._disabled_response(prompt, timestamp)
+            yield result["response"]
+            return result
+
+        decision = self._decide_model(task_type, prompt, force_model)
+        result = {
+            "provider": decision["provider"],
+            "model": decision["model"],
+            "reason": decision["reason"],
+            "response": None,
+            "success": False,
+            "fallback": False,
+            "estimated_cost": 0.0,
+        }
+        ttft_ms = None
+
+        if decision["provider"] == "ollama":
+            tokens = []
+            try:
+                for token in self._stream_ollama(prompt, decision["model"]):
+                    if ttft_ms is None:
+                        ttft_ms = int((time.time() - start_time) * 1000)
+                    tokens.append(token)
+                    yield token
+                result["response"] = "".join(tokens)
+                result["success"] = True
+            except Exception as e:
+                print(f"Ollama 流式调用失败: {e}")
+                result["response"] = "".join(tokens) or None
+                if not tokens and self.config.get("fallback", {}).get("enabled", True):
+                    self._fallback_to_claude(result)
+
+        if result["provider"] == "claude":
+            if not result["success"]:
+                result["response"] = CLAUDE_PLACEHOLDER
+                result["success"] = True
+                result["estimated_cost"] = 0.01
+            ttft_ms = int((time.time() - start_time) * 1000)
+            yield result["response"]
+
+        result["latency_ms"] = int((time.time() - start_time) * 1000)
+        result["ttft_ms"] = ttft_ms
+        result["streamed"] = True
+        result["timestamp"] = timestamp
+        result["task_type"] = task_type
+
+        self._log_call(result)
+        self._update_metrics(result)
+        return result
+
+    def _is_ollama_available(self) -> bool:
+        """检查 Ollama 是否可用（只读健康缓存，不发请求）"""
+        return self.ollama_health.is_available()
+
+    def _probe_ollama(self) -> bool:
+        """探测 Ollama（由 ProviderHealth 在后台调用）"""
+        timeout = self.config.get("health", {}).get("probe_timeout", 2)
+        response = self.session.get(f"{self.ollama_url}/api/tags", timeout=timeout)
+        return response.status_code == 200
+
+    def _ollama_timeout(self) -> tuple:
+        """(连接超时, 读超时)"""
+        timeout = self.config.get("timeout", {}).get("ollama", 30)
+        return (min(timeout, self.config.get("health", {}).get("probe_timeout", 2)), timeout)
 
     def _call_ollama(self, prompt: str, model: str) -> Optional[str]:
         """调用 Ollama"""
         try:
-            timeout = self.config.get("timeout", {}).get("ollama", 30)
-            response = requests.post(
-                "http://localhost:11434/api/generate",
+            response = self.session.post(
+                f"{self.ollama_url}/api/generate",
                 json={"model": model, "prompt": prompt, "stream": False},
-                timeout=timeout,
+                timeout=self._ollama_timeout(),
             )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self.ollama_health.mark(False)
+            print(f"Ollama 调用失败: {e}")
+            return None
 
+        self.ollama_health.mark(True)
+        try:
             if response.status_code == 200:
                 result = response.json()
                 return result.get("response", "")
@@ -241,6 +559,34 @@ class ModelRouter:
             print(f"Ollama 调用失败: {e}")
             return None
 
+    def _stream_ollama(self, prompt: str, model: str) -> Iterator[str]:
+        """流式调用 Ollama：逐行 JSON，yield 每个 token（失败抛异常）"""
+        try:
+            response = self.session.post(
+                f"{self.ollama_url}/api/generate",
+                json={"model": model, "prompt": prompt, "stream": True},
+                timeout=self._ollama_timeout(),
+                stream=True,
+            )
+        except (requests.ConnectionError, requests.Timeout):
+            self.ollama_health.mark(False)
+            raise
+
+        self.ollama_health.mark(True)
+        with response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                token = chunk.get("response", "")
+                if token:
+                    yield token
+                if chunk.get("done"):
+                    break
+
     def _get_model_name(self, provider: str) -> str:
         """获取模型名称"""
         if provider == "ollama":
@@ -253,7 +599,7 @@ class ModelRouter:
         return {
             "provider": "claude",
             "model": self.config["default_cloud_model"],
-            "response": "[Claude API 调用]",
+            "response": CLAUDE_PLACEHOLDER,
             "success": True,
             "fallback": False,
             "reason": "router_disabled",
@@ -264,10 +610,11 @@ class ModelRouter:
         }
 
     def _log_call(self, result: Dict[str, Any]):
-        """记录调用日志"""
+        """记录调用日志（进缓冲，由后台线程追加到文件）"""
         if not self.config.get("monitoring", {}).get("log_all_calls", True):
             return
 
+        self._ensure_background()
         try:
             log_entry = {
                 "timestamp": result["timestamp"],
@@ -280,53 +627,149 @@ class ModelRouter:
                 "estimated_cost": result["estimated_cost"],
                 "latency_ms": result["latency_ms"],
             }
+            if result.get("streamed"):
+                log_entry["ttft_ms"] = result.get("ttft_ms")
+            if "cached" in result:
+                log_entry["cached"] = result["cached"]
+                if result["cached"]:
+                    log_entry["cache_tier"] = result["cache_tier"]
 
-            with open(LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+            self._call_log.append(log_entry)
 
         except Exception as e:
             print(f"日志记录失败: {e}")
 
+    def _ensure_background(self):
+        """第一次调用时启动后台写线程"""
+        if self._call_log.running or self._closed:
+            return
+        with self._start_lock:
+            if not self._call_log.running and not self._closed:
+                self._call_log.start()
+
     def _update_metrics(self, result: Dict[str, Any]):
-        """更新指标"""
+        """更新内存指标"""
+        self._ensure_background()
         try:
-            metrics = self._load_metrics()
-
-            provider = result["provider"]
-            metrics["total_calls"] = metrics.get("total_calls", 0) + 1
-            metrics[f"{provider}_calls"] = metrics.get(f"{provider}_calls", 0) + 1
-
+            m = self.metrics
+            labels = {"provider": result["provider"]}
+            m.inc_counter("router.calls", labels=labels)
+            m.inc_counter("router.cost", result["estimated_cost"], labels=labels)
+            m.observe("router.latency_ms", result["latency_ms"], labels=labels)
+            if result.get("ttft_ms") is not None:
+                m.observe("router.ttft_ms", result["ttft_ms"], labels=labels)
             if result["fallback"]:
-                metrics["fallback_count"] = metrics.get("fallback_count", 0) + 1
+                m.inc_counter("router.fallbacks")
 
-            metrics["total_cost"] = (
-                metrics.get("total_cost", 0.0) + result["estimated_cost"]
-            )
-            metrics["last_updated"] = result["timestamp"]
+            if "cached" in result:
+                if result["cached"]:
+                    m.inc_counter("router.cache.hits", labels={"tier": result["cache_tier"]})
+                    m.inc_counter("router.cache.saved_latency_ms", result["saved_latency_ms"])
+                    m.inc_counter("router.cache.saved_cost", result["saved_cost"])
+                else:
+                    m.inc_counter("router.cache.misses")
 
-            self._save_metrics(metrics)
+            self._last_updated = result["timestamp"]
 
         except Exception as e:
             print(f"指标更新失败: {e}")
 
-    def _load_metrics(self) -> dict:
-        """加载指标"""
-        if METRICS_FILE.exists():
-            try:
-                return json.loads(METRICS_FILE.read_text(encoding="utf-8"))
-            except Exception:
-                pass
-        return {}
+    def get_metrics(self) -> dict:
+        """获取本进程的当前指标（扁平汇总 + 按 provider 的延迟直方图）"""
+        metrics = self._summarize(self.metrics.snapshot())
+        metrics["last_updated"] = self._last_updated
+        metrics["call_log"] = self._call_log.stats()
+        return metrics
+
+    @staticmethod
+    def _summarize(snapshot: Dict[str, Any]) -> dict:
+        counters: Dict[str, float] = {}
+        for c in snapshot["counters"]:
+            name, labels = c["name"], c["labels"]
+            if name == "router.calls":
+                counters["total_calls"] = counters.get("total_calls", 0) + c["value"]
+                counters[f"{labels['provider']}_calls"] = c["value"]
+            elif name == "router.cost":
+                counters["total_cost"] = counters.get("total_cost", 0.0) + c["value"]
+            elif name == "router.fallbacks":
+                counters["fallback_count"] = c["value"]
+            elif name == "router.cache.hits":
+                counters["cache_hits"] = counters.get("cache_hits", 0) + c["value"]
+                counters[f"cache_{labels['tier']}_hits"] = c["value"]
+            elif name == "router.cache.misses":
+                counters["cache_misses"] = c["value"]
+            elif name == "router.cache.saved_latency_ms":
+                counters["cache_saved_latency_ms"] = c["value"]
+            elif name == "router.cache.saved_cost":
+                counters["cache_saved_cost"] = c["value"]
+
+        metrics: Dict[str, Any] = {
+            k: v if k.endswith("cost") else int(v) for k, v in counters.items()
+        }
+        for h in snapshot["histograms"]:
+            key = h["name"].split(".", 1)[1]
+            metrics.setdefault(key, {})[h["labels"]["provider"]] = h["value"]
+        return metrics
 
-    def _save_metrics(self, metrics: dict):
-        """保存指标"""
-        METRICS_FILE.write_text(
-            json.dumps(metrics, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
+    @staticmethod
+    def _legacy_registry(stored: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        旧版扁平指标文件（total_calls / <provider>_calls / fallback_count / total_cost，
+        没有 "registry"）→ registry 快照，作为累计的起点
+        """
+        counters = [
+            {"name": "router.calls", "labels": {"provider": key[:-len("_calls")]}, "value": value}
+            for key, value in stored.items()
+            if key.endswith("_calls") and key != "total_calls" and isinstance(value, (int, float))
+        ]
+        if stored.get("total_cost"):
+            # 旧格式没有按 provider 拆分费用
+            counters.append({"name": "router.cost", "labels": {"provider": "legacy"},
+                             "value": stored["total_cost"]})
+        if stored.get("fallback_count"):
+            counters.append({"name": "router.fallbacks", "labels": {}, "value": stored["fallback_count"]})
+        return {"counters": counters}
+
+    def _snapshot_metrics(self):
+        """
+        把本进程自上次快照以来的增量合并进指标文件（后台线程调用）
 
-    def get_metrics(self) -> dict:
-        """获取当前指标"""
-        return self._load_metrics()
+        文件里的 "registry" 是所有进程累计的原始 counter / histogram，
+        其余字段是它的扁平汇总；合并在文件锁内完成，多个进程不会互相覆盖。
+        旧版只有扁平汇总的文件先换算成 registry 再合并。
+        """
+        current = self.metrics.snapshot()
+        delta = snapshot_delta(current, self._persisted_metrics)
+        metrics_file = self._metrics_file
+        with file_lock(metrics_file.with_suffix(".lock")):
+            try:
+                stored = json.loads(metrics_file.read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                stored = {}
+            total = MetricsRegistry()
+            if "registry" in stored:
+                total.merge(stored["registry"])
+            else:
+                total.merge(self._legacy_registry(stored))
+            total.merge(delta)
+            merged = total.snapshot()
+            metrics = self._summarize(merged)
+            updated = [t for t in (stored.get("last_updated"), self._last_updated) if t]
+            metrics["last_updated"] = max(updated) if updated else None
+            metrics["call_log"] = self._call_log.stats()
+            metrics["registry"] = {"counters": merged["counters"], "histograms": merged["histograms"]}
+            atomic_write_text(metrics_file, json.dumps(metrics, ensure_ascii=False, indent=2))
+        self._persisted_metrics = current
+
+    def flush(self, timeout: Optional[float] = 10.0) -> bool:
+        """写出缓冲的调用日志并立即快照指标/缓存"""
+        return self._call_log.flush(timeout)
+
+    def close(self):
+        """写完剩余日志、做最后一次快照并停止后台线程"""
+        with self._start_lock:
+            self._closed = True
+        self._call_log.close()
 
 
 # 全局单例
@@ -346,6 +789,7 @@ def route_model(
     prompt: str,
     context: Optional[Dict[str, Any]] = None,
     force_model: Optional[Literal["ollama", "claude"]] = None,
+    use_cache: bool = True,
 ) -> Dict[str, Any]:
     """
     便捷函数：路由模型调用
@@ -355,12 +799,23 @@ def route_model(
         prompt: 提示词
         context: 上下文
         force_model: 强制模型
+        use_cache: 是否使用响应缓存
 
     Returns:
         路由结果
     """
     router = get_router()
-    return router.route(task_type, prompt, context, force_model)
+    return router.route(task_type, prompt, context, force_model, use_cache)
+
+
+def route_model_stream(
+    task_type: str,
+    prompt: str,
+    context: Optional[Dict[str, Any]] = None,
+    force_model: Optional[Literal["ollama", "claude"]] = None,
+) -> Iterator[str]:
+    """便捷函数：流式路由（见 ModelRouter.route_stream）"""
+    return get_router().route_stream(task_type, prompt, context, force_model)
 
 
 if __name__ == "__main__":
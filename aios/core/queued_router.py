@@ -99,6 +99,7 @@ class QueuedRouter:
 
     def stop(self) -> None:
         self._stop.set()
+        self._queue.wake_waiters()
         if self._worker_thread and self._worker_thread.is_alive():
             self._worker_thread.join(timeout=5)
         self._started = False
@@ -197,9 +198,12 @@ class QueuedRouter:
 
     def _worker_loop(self) -> None:
         while not self._stop.is_set():
-            req = self._queue.dequeue()
+            # Blocks until a request is runnable (within max_concurrency)
+            generation = self._queue.wake_generation
+            if self._stop.is_set():
+                break
+            req = self._queue.dequeue(block=True, generation=generation)
             if req is None:
-                self._stop.wait(timeout=0.05)
                 continue
 
             # Execute the actual LLM call
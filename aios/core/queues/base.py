@@ -5,17 +5,21 @@ Defines:
 - QueueRequest: universal request envelope
 - RequestState: lifecycle states
 - SchedulingPolicy: algorithm enum
+- HeapIndex / RoundRobinIndex: O(log n) pending-request indexes
 - BaseQueue: abstract queue with EventBus integration
 """
 from __future__ import annotations
 
 import abc
+import heapq
+import itertools
 import threading
 import time
 import uuid
+from collections import deque
 from dataclasses import dataclass, field
 from enum import IntEnum, auto
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
 
 import sys
 from pathlib import Path
@@ -103,6 +107,127 @@ class QueueRequest:
         return self.elapsed()
 
 
+# ---------------------------------------------------------------------------
+# Pending-request indexes
+# ---------------------------------------------------------------------------
+
+def fifo_key(req: QueueRequest) -> Tuple:
+    """FIFO: insertion order only (ties broken by the index sequence)."""
+    return ()
+
+
+def priority_key(req: QueueRequest) -> Tuple:
+    """PRIORITY: lower priority value first, FIFO within a level."""
+    return (int(req.priority), req.created_at)
+
+
+def sjf_key(req: QueueRequest) -> Tuple:
+    """SJF: smallest estimated_cost first, FIFO on ties."""
+    return (req.estimated_cost, req.created_at)
+
+
+def edf_key(req: QueueRequest) -> Tuple:
+    """EDF: earliest deadline first; requests without deadline go last (FIFO)."""
+    if req.deadline is not None:
+        return (0, req.deadline)
+    return (1, req.created_at)
+
+
+_POLICY_KEYS: Dict[SchedulingPolicy, Callable[[QueueRequest], Tuple]] = {
+    SchedulingPolicy.FIFO: fifo_key,
+    SchedulingPolicy.PRIORITY: priority_key,
+    SchedulingPolicy.SJF: sjf_key,
+    SchedulingPolicy.EDF: edf_key,
+}
+
+
+class HeapIndex:
+    """
+    Min-heap of pending requests ordered by key(req).
+
+    Removal is lazy: cancelled / already-dequeued requests stay in the heap
+    and are skipped by pop() when is_live(req) is False. The heap is rebuilt
+    from live entries once stale entries outnumber live ones, so memory stays
+    proportional to the pending set.
+    """
+
+    def __init__(self, key: Callable[[QueueRequest], Tuple]):
+        self._key = key
+        self._heap: List[Tuple[Tuple, int, QueueRequest]] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, req: QueueRequest) -> None:
+        heapq.heappush(self._heap, (self._key(req), next(self._seq), req))
+
+    def pop(self, is_live: Callable[[QueueRequest], bool]) -> Optional[QueueRequest]:
+        while self._heap:
+            _, _, req = heapq.heappop(self._heap)
+            if is_live(req):
+                return req
+        return None
+
+    def compact(self, is_live: Callable[[QueueRequest], bool]) -> None:
+        self._heap = [entry for entry in self._heap if is_live(entry[2])]
+        heapq.heapify(self._heap)
+
+
+class RoundRobinIndex:
+    """
+    Round Robin across agents with one FIFO sub-heap per agent.
+
+    Agents rotate through a ring in first-seen order; each pop serves the
+    agent at the head of the ring and moves it to the back if it still has
+    requests. Agents whose sub-queue runs dry drop out of the ring.
+    """
+
+    DEFAULT_AGENT = "__default__"
+
+    def __init__(self, group: Optional[Callable[[QueueRequest], Hashable]] = None):
+        self._group = group or (lambda r: r.agent_id or self.DEFAULT_AGENT)
+        self._queues: Dict[Hashable, HeapIndex] = {}
+        self._ring: Deque[Hashable] = deque()
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def push(self, req: QueueRequest) -> None:
+        agent = self._group(req)
+        sub = self._queues.get(agent)
+        if sub is None:
+            sub = self._queues[agent] = HeapIndex(lambda r: r.created_at)
+            self._ring.append(agent)
+        sub.push(req)
+
+    def pop(self, is_live: Callable[[QueueRequest], bool]) -> Optional[QueueRequest]:
+        while self._ring:
+            agent = self._ring.popleft()
+            sub = self._queues[agent]
+            req = sub.pop(is_live)
+            if req is None:
+                del self._queues[agent]
+                continue
+            if len(sub):
+                self._ring.append(agent)
+            else:
+                del self._queues[agent]
+            return req
+        return None
+
+    def compact(self, is_live: Callable[[QueueRequest], bool]) -> None:
+        for agent in list(self._ring):
+            self._queues[agent].compact(is_live)
+
+
+def make_index(policy: SchedulingPolicy):
+    """Build the pending-request index for a scheduling policy."""
+    if policy == SchedulingPolicy.RR:
+        return RoundRobinIndex()
+    return HeapIndex(_POLICY_KEYS[policy])
+
+
 # ---------------------------------------------------------------------------
 # BaseQueue (abstract)
 # ---------------------------------------------------------------------------
@@ -111,10 +236,15 @@ class BaseQueue(abc.ABC):
     """
     Abstract base for all AIOS resource queues.
 
-    Subclasses implement _pick_next() which encodes the scheduling policy.
+    Subclasses encode the scheduling policy either by maintaining an index
+    (_index_request() on enqueue, _pop_next() on dequeue — O(log n)), or by
+    implementing the legacy _pick_next() which scans the pending list (O(n)).
     The base class provides:
-    - thread-safe enqueue / dequeue
+    - thread-safe enqueue / dequeue / cancel
+    - blocking dequeue: one waiter is woken per enqueue or freed slot
+    - max_concurrency: at most N requests handed out (RUNNING) at once
     - EventBus integration (emit on enqueue, start, complete, fail)
+    - bounded history of finished requests
     - stats collection
     """
 
@@ -124,15 +254,22 @@ class BaseQueue(abc.ABC):
         self,
         bus: Optional[EventBus] = None,
         max_concurrency: int = 4,
+        completed_history: int = 1000,
     ):
         self.bus = bus or get_event_bus()
         self.max_concurrency = max_concurrency
 
-        self._pending: List[QueueRequest] = []
+        # id -> request, insertion ordered; the scheduling index holds the order
+        self._pending: Dict[str, QueueRequest] = {}
+        # HeapIndex / RoundRobinIndex set by subclasses; None = legacy _pick_next
+        self._index = None
         self._running: Dict[str, QueueRequest] = {}
-        self._completed: List[QueueRequest] = []
+        # ring buffer: only the most recent finished requests are kept
+        self._completed: Deque[QueueRequest] = deque(maxlen=completed_history)
         self._lock = threading.Lock()
-        self._semaphore = threading.Semaphore(max_concurrency)
+        # signalled (notify one) on enqueue and when a running slot frees up
+        self._available = threading.Condition(self._lock)
+        self._wake_generation = 0
 
         # stats
         self._total_enqueued = 0
@@ -148,28 +285,70 @@ class BaseQueue(abc.ABC):
         """Add a request to the queue. Returns request id."""
         req.state = RequestState.QUEUED
         with self._lock:
-            self._pending.append(req)
+            self._pending[req.id] = req
+            self._index_request(req)
             self._total_enqueued += 1
+            self._available.notify()
 
         self._emit(f"queue.{self.queue_kind}.enqueued", req)
         return req.id
 
-    def dequeue(self) -> Optional[QueueRequest]:
+    def dequeue(
+        self,
+        block: bool = False,
+        timeout: Optional[float] = None,
+        generation: Optional[int] = None,
+    ) -> Optional[QueueRequest]:
         """
         Pick the next request according to the scheduling policy.
-        Returns None if the queue is empty.
+
+        A request is only handed out while fewer than max_concurrency
+        requests are RUNNING; complete()/fail() free the slot.
+
+        Args:
+            block: wait until a request can be handed out
+            timeout: max seconds to wait when blocking (None = forever)
+            generation: wake_generation read by the caller before deciding
+                to block; a wake_waiters() since then returns None at once
+
+        Returns:
+            The request, or None if the queue is empty / at capacity
+            (non-blocking), the timeout expired, or wake_waiters() was called.
         """
+        deadline = None if timeout is None else time.monotonic() + timeout
         with self._lock:
-            if not self._pending:
-                return None
-            req = self._pick_next(self._pending)
-            if req is None:
-                return None
-            self._pending.remove(req)
+            if generation is None:
+                generation = self._wake_generation
+            while True:
+                req = None
+                if self._pending and len(self._running) < self.max_concurrency:
+                    req = self._pop_next()
+                if req is not None:
+                    break
+                if not block or self._wake_generation != generation:
+                    return None
+
+                # nothing runnable: sleep until notified (or, if the policy
+                # is holding back a pending request, e.g. a rate limit, re-poll)
+                wait = None
+                if self._pending and len(self._running) < self.max_concurrency:
+                    wait = self._retry_delay()
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._available.wait(wait)
+
+            del self._pending[req.id]
+            self._unindex_request(req)
             req.state = RequestState.RUNNING
             req.started_at = time.monotonic()
             self._running[req.id] = req
             self._total_wait_ms += req.wait_time() * 1000
+            # chain the wakeup if more work can be handed out right away
+            if self._pending and len(self._running) < self.max_concurrency:
+                self._available.notify()
 
         self._emit(f"queue.{self.queue_kind}.started", req)
         return req
@@ -178,6 +357,8 @@ class BaseQueue(abc.ABC):
         """Mark a request as successfully completed."""
         with self._lock:
             req = self._running.pop(req_id, None)
+            if req is not None:
+                self._available.notify()
         if req is None:
             return
         req.state = RequestState.COMPLETED
@@ -196,6 +377,8 @@ class BaseQueue(abc.ABC):
         """Mark a request as failed."""
         with self._lock:
             req = self._running.pop(req_id, None)
+            if req is not None:
+                self._available.notify()
         if req is None:
             return
         req.state = RequestState.FAILED
@@ -208,13 +391,25 @@ class BaseQueue(abc.ABC):
     def cancel(self, req_id: str) -> bool:
         """Cancel a pending request. Returns True if found and cancelled."""
         with self._lock:
-            for i, req in enumerate(self._pending):
-                if req.id == req_id:
-                    req.state = RequestState.CANCELLED
-                    self._pending.pop(i)
-                    self._completed.append(req)
-                    return True
-        return False
+            req = self._pending.pop(req_id, None)
+            if req is None:
+                return False
+            # heap entries are dropped lazily on pop()
+            req.state = RequestState.CANCELLED
+            self._unindex_request(req)
+            self._completed.append(req)
+            self._maybe_compact()
+            return True
+
+    def wake_waiters(self) -> None:
+        """Wake every blocked dequeue() call; they return None (used on shutdown)."""
+        with self._lock:
+            self._wake_generation += 1
+            self._available.notify_all()
+
+    @property
+    def wake_generation(self) -> int:
+        return self._wake_generation
 
     def pending_count(self) -> int:
         with self._lock:
@@ -242,17 +437,52 @@ class BaseQueue(abc.ABC):
         }
 
     # ------------------------------------------------------------------
-    # Abstract: scheduling policy
+    # Scheduling policy hooks (called while holding self._lock)
     # ------------------------------------------------------------------
 
-    @abc.abstractmethod
+    def _is_live(self, req: QueueRequest) -> bool:
+        """True if req is still pending (used to skip lazily-deleted entries)."""
+        return self._pending.get(req.id) is req
+
+    def _index_request(self, req: QueueRequest) -> None:
+        """Add a newly enqueued request to the scheduling index."""
+        if self._index is not None:
+            self._index.push(req)
+
+    def _unindex_request(self, req: QueueRequest) -> None:
+        """Called when req leaves the pending set (dequeued or cancelled)."""
+
+    def _pop_next(self) -> Optional[QueueRequest]:
+        """
+        Pop the next request from the scheduling index.
+        Must NOT modify self._pending (caller removes the chosen item).
+        Without an index, delegates to the legacy _pick_next() list scan.
+        """
+        if self._index is not None:
+            return self._index.pop(self._is_live)
+        return self._pick_next(list(self._pending.values()))
+
+    def _retry_delay(self) -> float:
+        """Re-poll interval for a blocked dequeue() when _pop_next() holds back work."""
+        return 0.01
+
+    def _rebuild_index(self, index) -> None:
+        """Replace the scheduling index and re-add all pending requests."""
+        self._index = index
+        for req in self._pending.values():
+            index.push(req)
+
+    def _maybe_compact(self) -> None:
+        """Drop lazily-deleted entries once they outnumber live ones."""
+        if self._index is not None and len(self._index) > 2 * len(self._pending) + 64:
+            self._index.compact(self._is_live)
+
     def _pick_next(self, pending: List[QueueRequest]) -> Optional[QueueRequest]:
         """
-        Select the next request from the pending list.
-        Called while holding self._lock.
+        Legacy O(n) hook: select the next request from the pending list.
         Must NOT modify the list (caller removes the chosen item).
         """
-        ...
+        raise NotImplementedError
 
     # ------------------------------------------------------------------
     # EventBus helpers
@@ -12,7 +12,8 @@ from __future__ import annotations
 
 import threading
 import time
-from typing import Any, Dict, List, Optional
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
 
 from .base import (
     BaseQueue,
@@ -20,6 +21,7 @@ from .base import (
     RequestPriority,
     RequestState,
     SchedulingPolicy,
+    make_index,
 )
 
 
@@ -28,7 +30,8 @@ class LLMQueue(BaseQueue):
     LLM request queue with FIFO + priority scheduling.
 
     Scheduling: requests are grouped by priority; within each group, FIFO.
-    Higher priority (lower numeric value) always goes first.
+    Higher priority (lower numeric value) always goes first. Pending
+    requests live in a (priority, created_at) heap, so dequeue is O(log n).
 
     Optional rate limiting: max N requests per second.
     """
@@ -41,14 +44,21 @@ class LLMQueue(BaseQueue):
         max_concurrency: int = 4,
         rate_limit_rps: Optional[float] = None,
         token_budget_per_min: Optional[int] = None,
+        completed_history: int = 1000,
     ):
-        super().__init__(bus=bus, max_concurrency=max_concurrency)
+        super().__init__(
+            bus=bus,
+            max_concurrency=max_concurrency,
+            completed_history=completed_history,
+        )
+        self._index = make_index(SchedulingPolicy.PRIORITY)
         self.rate_limit_rps = rate_limit_rps
         self.token_budget_per_min = token_budget_per_min
 
         # rate limiter state
         self._last_dequeue_time: float = 0.0
-        self._tokens_used_window: List[tuple] = []  # (timestamp, tokens)
+        self._tokens_used_window: Deque[Tuple[float, int]] = deque()  # (timestamp, tokens)
+        self._tokens_in_window = 0
         self._rate_lock = threading.Lock()
 
         # stats
@@ -58,49 +68,49 @@ class LLMQueue(BaseQueue):
     # Scheduling: Priority + FIFO
     # ------------------------------------------------------------------
 
-    def _pick_next(self, pending: List[QueueRequest]) -> Optional[QueueRequest]:
-        """Pick highest priority request; FIFO within same priority."""
-        if not pending:
-            return None
-
-        # Rate limit check
+    def _pop_next(self) -> Optional[QueueRequest]:
+        """Pop highest priority request; FIFO within same priority."""
+        # Rate limit check (the slot is only taken once a request is popped)
         if not self._check_rate_limit():
             return None
 
-        # Token budget check
-        if not self._check_token_budget(pending):
-            # Try to find a smaller request that fits
-            pass  # fall through to normal selection
+        # Token budget is advisory: an exhausted budget does not block
+        # selection (the window is pruned here so it stays bounded)
+        self._check_token_budget()
 
-        # Sort by (priority, created_at) — stable sort preserves FIFO
-        best = min(pending, key=lambda r: (int(r.priority), r.created_at))
-        return best
+        req = super()._pop_next()
+        if req is not None and self.rate_limit_rps is not None:
+            with self._rate_lock:
+                self._last_dequeue_time = time.monotonic()
+        return req
 
     def _check_rate_limit(self) -> bool:
-        """Returns True if we're within rate limits."""
+        """Returns True if we're within rate limits (does not consume a slot)."""
         if self.rate_limit_rps is None:
             return True
         with self._rate_lock:
-            now = time.monotonic()
             min_interval = 1.0 / self.rate_limit_rps
-            if now - self._last_dequeue_time < min_interval:
-                return False
-            self._last_dequeue_time = now
-            return True
+            return time.monotonic() - self._last_dequeue_time >= min_interval
+
+    def _retry_delay(self) -> float:
+        """Sleep until the rate limiter admits the next request."""
+        if self.rate_limit_rps is None:
+            return super()._retry_delay()
+        with self._rate_lock:
+            next_slot = self._last_dequeue_time + 1.0 / self.rate_limit_rps
+        return max(0.001, next_slot - time.monotonic())
 
-    def _check_token_budget(self, pending: List[QueueRequest]) -> bool:
+    def _check_token_budget(self) -> bool:
         """Returns True if token budget allows more requests."""
         if self.token_budget_per_min is None:
             return True
         now = time.monotonic()
         with self._rate_lock:
-            # Prune old entries (older than 60s)
-            self._tokens_used_window = [
-                (t, tokens) for t, tokens in self._tokens_used_window
-                if now - t < 60.0
-            ]
-            used = sum(tokens for _, tokens in self._tokens_used_window)
-            return used < self.token_budget_per_min
+            # Prune old entries (older than 60s); window is time-ordered
+            window = self._tokens_used_window
+            while window and now - window[0][0] >= 60.0:
+                self._tokens_in_window -= window.popleft()[1]
+            return self._tokens_in_window < self.token_budget_per_min
 
     # ------------------------------------------------------------------
     # Override complete to track tokens
@@ -111,6 +121,7 @@ class LLMQueue(BaseQueue):
         if tokens_used > 0:
             with self._rate_lock:
                 self._tokens_used_window.append((time.monotonic(), tokens_used))
+                self._tokens_in_window += tokens_used
                 self._total_tokens += tokens_used
         super().complete(req_id, result)
 
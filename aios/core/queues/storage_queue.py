@@ -5,10 +5,13 @@ Features:
 - SJF and RR scheduling (same as MemoryQueue)
 - Batch coalescing: groups small requests into batches
 - I/O priority: reads before writes (configurable)
+- O(log n) dequeue: separate read/write heaps (per-agent sub-queues for RR),
+  plus an (op, path) group index for batch coalescing
 - EventBus integration
 """
 from __future__ import annotations
 
+import heapq
 import time
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
@@ -19,6 +22,7 @@ from .base import (
     RequestPriority,
     RequestState,
     SchedulingPolicy,
+    make_index,
 )
 
 
@@ -48,16 +52,29 @@ class StorageQueue(BaseQueue):
         reads_first: bool = True,
         batch_size: int = _DEFAULT_BATCH_SIZE,
         batch_window_sec: float = _DEFAULT_BATCH_WINDOW_SEC,
+        completed_history: int = 1000,
     ):
-        super().__init__(bus=bus, max_concurrency=max_concurrency)
+        super().__init__(
+            bus=bus,
+            max_concurrency=max_concurrency,
+            completed_history=completed_history,
+        )
         self._policy = policy
         self._reads_first = reads_first
         self._batch_size = batch_size
         self._batch_window_sec = batch_window_sec
 
-        # RR state
-        self._rr_agent_order: List[str] = []
-        self._rr_index: int = 0
+        # Scheduling lanes: reads are served before writes when reads_first;
+        # otherwise everything goes through the write lane
+        self._read_index = make_index(policy)
+        self._write_index = make_index(policy)
+
+        # (op, path) -> {req_id: req}, insertion ordered
+        self._groups: Dict[tuple, Dict[str, QueueRequest]] = {}
+        # Groups with >= 2 pending requests, as a (oldest created_at, oldest id, key)
+        # min-heap; entries go stale when the group's head changes and are
+        # skipped lazily, like HeapIndex
+        self._batch_heap: List[tuple] = []
 
         # batch stats
         self._batches_created = 0
@@ -69,7 +86,12 @@ class StorageQueue(BaseQueue):
     def set_policy(self, policy: SchedulingPolicy) -> None:
         if policy not in (SchedulingPolicy.SJF, SchedulingPolicy.RR):
             raise ValueError(f"StorageQueue supports SJF and RR, not {policy.name}")
-        self._policy = policy
+        with self._lock:
+            self._policy = policy
+            self._read_index = make_index(policy)
+            self._write_index = make_index(policy)
+            for req in self._pending.values():
+                self._lane(req).push(req)
 
     @property
     def policy(self) -> SchedulingPolicy:
@@ -89,41 +111,39 @@ class StorageQueue(BaseQueue):
         Batching criteria:
         - Same operation type (read/write)
         - Same target path
-        - Within batch window
-        - Up to batch_size
+        - Oldest request has waited at least the batch window
+        - Up to batch_size, and no more than the free max_concurrency slots
+
+        The group whose head request is oldest is checked first (O(log n));
+        if it is still inside the window, no other group can qualify.
         """
         with self._lock:
-            if len(self._pending) < 2:
+            slots = min(self._batch_size, self.max_concurrency - len(self._running))
+            if len(self._pending) < 2 or slots < 2:
                 return None
 
             now = time.monotonic()
-            # Group by (op, path)
-            groups: Dict[tuple, List[QueueRequest]] = {}
-            for req in self._pending:
-                op = req.payload.get("op", "unknown")
-                path = req.payload.get("path", "")
-                key = (op, path)
-                if key not in groups:
-                    groups[key] = []
-                groups[key].append(req)
-
-            # Find a group that qualifies for batching
-            for key, reqs in groups.items():
-                if len(reqs) < 2:
+            heap = self._batch_heap
+            while heap:
+                created_at, head_id, key = heap[0]
+                group = self._groups.get(key)
+                if group is None or len(group) < 2 or next(iter(group)) != head_id:
+                    heapq.heappop(heap)  # stale entry
                     continue
-                # Check if oldest request is within batch window
-                oldest = min(reqs, key=lambda r: r.created_at)
-                if now - oldest.created_at < self._batch_window_sec:
-                    continue  # wait a bit more for accumulation
+                if now - created_at < self._batch_window_sec:
+                    return None  # wait a bit more for accumulation
+                heapq.heappop(heap)
 
-                batch = reqs[:self._batch_size]
+                batch = list(group.values())[:slots]
                 for req in batch:
                     req.state = RequestState.RUNNING
                     req.started_at = now
-                    self._pending.remove(req)
+                    del self._pending[req.id]
+                    self._unindex_request(req)
                     self._running[req.id] = req
 
                 self._batches_created += 1
+                self._maybe_compact()
                 return batch
 
             return None
@@ -132,56 +152,54 @@ class StorageQueue(BaseQueue):
     # Scheduling
     # ------------------------------------------------------------------
 
-    def _pick_next(self, pending: List[QueueRequest]) -> Optional[QueueRequest]:
-        if not pending:
-            return None
-
-        # Separate reads and writes
-        if self._reads_first:
-            reads = [r for r in pending if r.payload.get("op") == "read"]
-            writes = [r for r in pending if r.payload.get("op") != "read"]
-            pool = reads if reads else writes
-        else:
-            pool = pending
-
-        if self._policy == SchedulingPolicy.SJF:
-            return self._pick_sjf(pool)
-        elif self._policy == SchedulingPolicy.RR:
-            return self._pick_rr(pool)
-        else:
-            return pool[0]
-
-    def _pick_sjf(self, pool: List[QueueRequest]) -> QueueRequest:
-        return min(pool, key=lambda r: (r.estimated_cost, r.created_at))
-
-    def _pick_rr(self, pool: List[QueueRequest]) -> Optional[QueueRequest]:
-        agents = list(dict.fromkeys(
-            r.agent_id or "__default__" for r in pool
-        ))
-        if not agents:
-            return pool[0]
-
-        for a in agents:
-            if a not in self._rr_agent_order:
-                self._rr_agent_order.append(a)
-        self._rr_agent_order = [a for a in self._rr_agent_order if a in agents]
-        if not self._rr_agent_order:
-            return pool[0]
-
-        self._rr_index = self._rr_index % len(self._rr_agent_order)
-        current_agent = self._rr_agent_order[self._rr_index]
-
-        agent_reqs = [
-            r for r in pool
-            if (r.agent_id or "__default__") == current_agent
-        ]
-        if not agent_reqs:
-            self._rr_index = (self._rr_index + 1) % len(self._rr_agent_order)
-            return pool[0]
-
-        chosen = min(agent_reqs, key=lambda r: r.created_at)
-        self._rr_index = (self._rr_index + 1) % len(self._rr_agent_order)
-        return chosen
+    @staticmethod
+    def _group_key(req: QueueRequest) -> tuple:
+        return (req.payload.get("op", "unknown"), req.payload.get("path", ""))
+
+    def _lane(self, req: QueueRequest):
+        if self._reads_first and req.payload.get("op") == "read":
+            return self._read_index
+        return self._write_index
+
+    def _push_batch_entry(self, key: tuple, group: Dict[str, QueueRequest]) -> None:
+        head = next(iter(group.values()))
+        heapq.heappush(self._batch_heap, (head.created_at, head.id, key))
+
+    def _index_request(self, req: QueueRequest) -> None:
+        self._lane(req).push(req)
+        key = self._group_key(req)
+        group = self._groups.setdefault(key, {})
+        group[req.id] = req
+        if len(group) == 2:
+            self._push_batch_entry(key, group)
+
+    def _unindex_request(self, req: QueueRequest) -> None:
+        key = self._group_key(req)
+        group = self._groups.get(key)
+        if group is not None:
+            head_id = next(iter(group))
+            group.pop(req.id, None)
+            if not group:
+                del self._groups[key]
+            elif req.id == head_id and len(group) >= 2:
+                self._push_batch_entry(key, group)
+
+    def _pop_next(self) -> Optional[QueueRequest]:
+        """Reads first (if enabled), then SJF or RR within the lane."""
+        req = self._read_index.pop(self._is_live)
+        if req is None:
+            req = self._write_index.pop(self._is_live)
+        return req
+
+    def _maybe_compact(self) -> None:
+        for index in (self._read_index, self._write_index):
+            if len(index) > 2 * len(self._pending) + 64:
+                index.compact(self._is_live)
+        if len(self._batch_heap) > 2 * len(self._groups) + 64:
+            self._batch_heap = []
+            for key, group in self._groups.items():
+                if len(group) >= 2:
+                    self._push_batch_entry(key, group)
 
     # ------------------------------------------------------------------
     # Stats
@@ -3,7 +3,9 @@ AIOS Thread Pool Manager - Thread binding with CPU affinity.
 
 Features:
 - Named thread pools for different resource types (llm, memory, storage)
-- Thread-to-queue binding (each pool serves one queue)
+- Thread-to-queue binding (each pool serves one queue): workers block in
+  queue.dequeue(block=True), so idle pools use no CPU and the queue's
+  max_concurrency is enforced around execution
 - CPU affinity hints (best-effort on Windows/Linux)
 - Pool lifecycle management (start, stop, resize)
 - Worker stats (utilization, idle time)
@@ -13,8 +15,9 @@ from __future__ import annotations
 import os
 import threading
 import time
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Any, Callable, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Optional
 
 import sys
 from pathlib import Path
@@ -25,6 +28,9 @@ sys.path.insert(0, str(AIOS_ROOT))
 from core.event import create_event
 from core.event_bus import EventBus, get_event_bus
 
+if TYPE_CHECKING:
+    from core.queues.base import BaseQueue, QueueRequest
+
 
 # ---------------------------------------------------------------------------
 # Worker
@@ -58,6 +64,10 @@ class _Worker:
     def stop(self) -> None:
         self._stop.set()
 
+    @property
+    def stopping(self) -> bool:
+        return self._stop.is_set()
+
     def join(self, timeout: float = 5.0) -> None:
         if self._thread.is_alive():
             self._thread.join(timeout=timeout)
@@ -69,7 +79,8 @@ class _Worker:
     def _run(self) -> None:
         idle_start = time.monotonic()
         while not self._stop.is_set():
-            task = self.pool._get_task(timeout=0.1)
+            # blocks until work arrives or the pool wakes us to stop
+            task = self.pool._get_task(worker=self)
             if task is None:
                 continue
 
@@ -100,10 +111,13 @@ class _Worker:
 
 class ThreadPool:
     """
-    A named thread pool bound to a specific resource queue.
+    A named thread pool, optionally bound to a resource queue.
 
-    Workers pull tasks from an internal queue. The pool owner
-    submits callables via submit().
+    Unbound: workers pull callables from an internal queue; the pool
+    owner submits them via submit().
+
+    Bound (queue + handler): workers block in queue.dequeue(block=True),
+    run handler(req) and report queue.complete() / queue.fail().
     """
 
     def __init__(
@@ -111,14 +125,19 @@ class ThreadPool:
         name: str,
         size: int = 4,
         cpu_affinity: Optional[List[int]] = None,
+        queue: Optional["BaseQueue"] = None,
+        handler: Optional[Callable[["QueueRequest"], Any]] = None,
     ):
+        if (queue is None) != (handler is None):
+            raise ValueError("queue and handler must be given together")
         self.name = name
         self._size = size
         self._cpu_affinity = cpu_affinity
+        self._queue = queue
+        self._handler = handler
         self._workers: List[_Worker] = []
-        self._task_queue: List[Callable] = []
-        self._task_lock = threading.Lock()
-        self._task_event = threading.Event()
+        self._task_queue: Deque[Callable] = deque()
+        self._task_cond = threading.Condition()
         self._started = False
 
     def start(self) -> None:
@@ -137,7 +156,7 @@ class ThreadPool:
     def stop(self) -> None:
         for w in self._workers:
             w.stop()
-        self._task_event.set()  # wake blocked workers
+        self._wake_workers()
         for w in self._workers:
             w.join()
         self._workers.clear()
@@ -145,9 +164,13 @@ class ThreadPool:
 
     def submit(self, task: Callable) -> None:
         """Submit a callable to be executed by a pool worker."""
-        with self._task_lock:
+        if self._queue is not None:
+            raise RuntimeError(
+                f"Pool '{self.name}' is bound to a queue; enqueue requests instead"
+            )
+        with self._task_cond:
             self._task_queue.append(task)
-        self._task_event.set()
+            self._task_cond.notify()
 
     def resize(self, new_size: int) -> None:
         """Resize the pool. Adds or removes workers."""
@@ -164,6 +187,7 @@ class ThreadPool:
             self._workers = self._workers[:new_size]
             for w in excess:
                 w.stop()
+            self._wake_workers()
             for w in excess:
                 w.join()
         self._size = new_size
@@ -189,21 +213,57 @@ class ThreadPool:
         return {
             "pool": self.name,
             "size": self._size,
-            "pending_tasks": len(self._task_queue),
+            "pending_tasks": (
+                self._queue.pending_count() if self._queue is not None
+                else len(self._task_queue)
+            ),
             "workers": worker_stats,
         }
 
+    @property
+    def queue(self) -> Optional["BaseQueue"]:
+        return self._queue
+
     # internal: called by workers
-    def _get_task(self, timeout: float = 0.1) -> Optional[Callable]:
-        self._task_event.wait(timeout=timeout)
-        with self._task_lock:
-            if self._task_queue:
-                task = self._task_queue.pop(0)
-                if not self._task_queue:
-                    self._task_event.clear()
-                return task
-            self._task_event.clear()
-            return None
+    def _get_task(
+        self,
+        timeout: Optional[float] = None,
+        worker: Optional[_Worker] = None,
+    ) -> Optional[Callable]:
+        """
+        Block until a task is available. Returns None on timeout or when
+        the calling worker has been asked to stop.
+        """
+        if self._queue is not None:
+            generation = self._queue.wake_generation
+            if worker is not None and worker.stopping:
+                return None
+            req = self._queue.dequeue(block=True, timeout=timeout, generation=generation)
+            if req is None:
+                return None
+            return lambda: self._run_request(req)
+
+        with self._task_cond:
+            while not self._task_queue:
+                if worker is not None and worker.stopping:
+                    return None
+                if not self._task_cond.wait(timeout) and not self._task_queue:
+                    return None
+            return self._task_queue.popleft()
+
+    def _run_request(self, req: "QueueRequest") -> None:
+        try:
+            result = self._handler(req)
+        except Exception as e:
+            self._queue.fail(req.id, str(e))
+            raise
+        self._queue.complete(req.id, result)
+
+    def _wake_workers(self) -> None:
+        if self._queue is not None:
+            self._queue.wake_waiters()
+        with self._task_cond:
+            self._task_cond.notify_all()
 
     def _set_affinity(self) -> None:
         """Best-effort CPU affinity (Windows only for now)."""
@@ -237,6 +297,7 @@ class ThreadPoolManager:
         manager.create_pool("llm", size=4)
         manager.create_pool("memory", size=2)
         manager.create_pool("storage", size=2, cpu_affinity=[0, 1])
+        manager.create_pool("llm-calls", size=4, queue=llm_queue, handler=call_llm)
         manager.start_all()
     """
 
@@ -249,11 +310,16 @@ class ThreadPoolManager:
         name: str,
         size: int = 4,
         cpu_affinity: Optional[List[int]] = None,
+        queue: Optional["BaseQueue"] = None,
+        handler: Optional[Callable[["QueueRequest"], Any]] = None,
     ) -> ThreadPool:
-        """Create a named thread pool."""
+        """Create a named thread pool (bound to queue if queue/handler given)."""
         if name in self._pools:
             raise ValueError(f"Pool '{name}' already exists")
-        pool = ThreadPool(name=name, size=size, cpu_affinity=cpu_affinity)
+        pool = ThreadPool(
+            name=name, size=size, cpu_affinity=cpu_affinity,
+            queue=queue, handler=handler,
+        )
         self._pools[name] = pool
         return pool
 
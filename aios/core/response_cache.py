@@ -0,0 +1,331 @@
+"""
+AIOS 模型响应缓存 - ModelRouter.route 前置缓存
+
+两级查找：
+- 精确层：键 = (provider, model, 规范化 prompt, task_type) 的 sha256，O(1) 命中
+- 语义层（可选）：传入 embed 函数后，对同一 (provider, model, task_type) 的条目
+  算余弦相似度，>= threshold 视为命中（精确层未命中时才走）
+  每组的 embedding 存成一个归一化 float32 矩阵，查找是一次矩阵-向量乘积；
+  lookup() 未命中时返回算好的 embedding，put(embedding=...) 直接复用，不再重复 embed
+
+淘汰：
+- TTL：超过 ttl_sec 的条目在查找/写入时惰性删除
+- LRU + 字节预算：总大小超过 max_bytes 或条目数超过 max_entries 时从最久未用处淘汰
+
+持久化：save() 原子写 JSON（tmp + os.replace），构造时 load()，重启后缓存仍然有效。
+过期时间用墙钟（time.time），跨进程一致。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .vector_index import MIN_CAPACITY, normalize_rows
+
+CACHE_VERSION = 1
+
+
+def normalize_prompt(prompt: str) -> str:
+    """规范化 prompt：去首尾空白，连续空白折叠为一个空格（不改大小写）"""
+    return " ".join(prompt.split())
+
+
+def cache_key(provider: str, model: str, prompt: str, task_type: str) -> str:
+    raw = json.dumps([provider, model, normalize_prompt(prompt), task_type], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _SemanticGroup:
+    """一个 (provider, model, task_type) 组的 embedding 矩阵（删除时与末行交换，O(1)）"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._matrix = np.empty((MIN_CAPACITY, dim), dtype=np.float32)
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str, vector: Sequence[float]) -> bool:
+        row = normalize_rows(vector)[0]
+        if len(row) != self.dim:
+            return False
+        if key in self._rows:
+            self.remove(key)
+        n = len(self._keys)
+        if n == len(self._matrix):
+            grown = np.empty((2 * n, self.dim), dtype=np.float32)
+            grown[:n] = self._matrix
+            self._matrix = grown
+        self._matrix[n] = row
+        self._rows[key] = n
+        self._keys.append(key)
+        return True
+
+    def remove(self, key: str):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self._keys) - 1
+        if row != last:
+            moved = self._keys[last]
+            self._matrix[row] = self._matrix[last]
+            self._keys[row] = moved
+            self._rows[moved] = row
+        self._keys.pop()
+
+    def candidates(self, vector: Sequence[float], threshold: float) -> List[Tuple[str, float]]:
+        """相似度 >= threshold 的条目，从高到低"""
+        query = normalize_rows(vector)[0]
+        if len(query) != self.dim or not self._keys:
+            return []
+        sims = self._matrix[:len(self._keys)] @ query
+        idx = np.flatnonzero(sims >= threshold)
+        idx = idx[np.argsort(-sims[idx], kind="stable")]
+        return [(self._keys[i], float(sims[i])) for i in idx]
+
+
+class ResponseCache:
+    """
+    模型响应缓存（线程安全）
+
+    用法：
+        cache = ResponseCache(path=Path("events/router_cache.json"), ttl_sec=3600)
+        hit = cache.get("ollama", "qwen2.5:3b", prompt, "simple_qa")
+        if hit is None:
+            cache.put("ollama", "qwen2.5:3b", prompt, "simple_qa", response, latency_ms=830)
+
+    get() 命中时返回 {"response", "latency_ms", "estimated_cost", "tier", "similarity"}。
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        ttl_sec: float = 3600.0,
+        max_entries: int = 1000,
+        max_bytes: int = 8 * 1024 * 1024,
+        embed: Optional[Callable[[str], Optional[Sequence[float]]]] = None,
+        similarity_threshold: float = 0.95,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = Path(path) if path else None
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self._clock = clock
+        self._lock = threading.RLock()
+        # key → entry；顺序即 LRU 顺序（末尾最新）
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # (provider, model, task_type) → 语义层矩阵
+        self._groups: Dict[Tuple[str, str, str], _SemanticGroup] = {}
+        self._bytes = 0
+        self._dirty = False
+        if self.path:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    # ---------- 查找 / 写入 ----------
+
+    def get(self, provider: str, model: str, prompt: str, task_type: str) -> Optional[Dict[str, Any]]:
+        return self.lookup(provider, model, prompt, task_type)[0]
+
+    def lookup(
+        self, provider: str, model: str, prompt: str, task_type: str
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """
+        同 get()，另外返回语义层算出的 prompt embedding（未算时为 None），
+        未命中后调用 put(..., embedding=embedding) 可避免再 embed 一次
+        """
+        key = cache_key(provider, model, prompt, task_type)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._expired(entry, now):
+                    self._remove(key)
+                else:
+                    self._entries.move_to_end(key)
+                    return self._hit(entry, "exact", 1.0), None
+
+        if self.embed is None:
+            return None, None
+        vector = self._safe_embed(prompt)
+        if vector is None:
+            return None, None
+
+        with self._lock:
+            group = self._groups.get((provider, model, task_type))
+            if group is None:
+                return None, vector
+            for key, sim in group.candidates(vector, self.similarity_threshold):
+                entry = self._entries[key]
+                if self._expired(entry, now):
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                return self._hit(entry, "semantic", sim), vector
+            return None, vector
+
+    def put(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        task_type: str,
+        response: str,
+        latency_ms: int = 0,
+        estimated_cost: float = 0.0,
+        embedding: Optional[Sequence[float]] = None,
+    ):
+        """写入条目；embedding 为 lookup() 返回的向量时不再调用 embed"""
+        key = cache_key(provider, model, prompt, task_type)
+        if embedding is None and self.embed is not None:
+            embedding = self._safe_embed(prompt)
+        entry = {
+            "key": key,
+            "provider": provider,
+            "model": model,
+            "task_type": task_type,
+            "prompt": normalize_prompt(prompt),
+            "response": response,
+            "latency_ms": latency_ms,
+            "estimated_cost": estimated_cost,
+            "created_at": self._clock(),
+            "embedding": list(embedding) if embedding is not None else None,
+        }
+        entry["size"] = self._entry_size(entry)
+        if entry["size"] > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._add(entry)
+            self._dirty = True
+            self._evict(self._clock())
+
+    def invalidate(self, provider: str, model: str, prompt: str, task_type: str) -> bool:
+        key = cache_key(provider, model, prompt, task_type)
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            self._dirty = True
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._bytes = 0
+            self._dirty = True
+
+    # ---------- 持久化 ----------
+
+    def save(self, force: bool = False):
+        """原子写入磁盘（没有改动时跳过）"""
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty and not force:
+                return
+            payload = {"version": CACHE_VERSION, "entries": list(self._entries.values())}
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def load(self):
+        """从磁盘加载（丢弃过期条目，按原 LRU 顺序恢复）"""
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        if payload.get("version") != CACHE_VERSION:
+            return
+        now = self._clock()
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._bytes = 0
+            for entry in payload.get("entries", []):
+                if self._expired(entry, now):
+                    continue
+                entry["size"] = self._entry_size(entry)
+                self._add(entry)
+            self._evict(now)
+
+    # ---------- 内部 ----------
+
+    def _hit(self, entry: Dict[str, Any], tier: str, similarity: float) -> Dict[str, Any]:
+        return {
+            "response": entry["response"],
+            "latency_ms": entry.get("latency_ms", 0),
+            "estimated_cost": entry.get("estimated_cost", 0.0),
+            "tier": tier,
+            "similarity": similarity,
+        }
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.ttl_sec is not None and now - entry.get("created_at", 0) >= self.ttl_sec
+
+    @staticmethod
+    def _group_key(entry: Dict[str, Any]) -> Tuple[str, str, str]:
+        return entry["provider"], entry["model"], entry["task_type"]
+
+    def _add(self, entry: Dict[str, Any]):
+        self._entries[entry["key"]] = entry
+        self._bytes += entry["size"]
+        if entry.get("embedding"):
+            group_key = self._group_key(entry)
+            group = self._groups.get(group_key)
+            if group is None:
+                group = self._groups[group_key] = _SemanticGroup(len(entry["embedding"]))
+            group.add(entry["key"], entry["embedding"])
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+        group = self._groups.get(self._group_key(entry))
+        if group is not None:
+            group.remove(key)
+            if not len(group):
+                del self._groups[self._group_key(entry)]
+
+    def _evict(self, now: float):
+        for key, entry in list(self._entries.items()):
+            if self._expired(entry, now):
+                self._remove(key)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def _safe_embed(self, prompt: str) -> Optional[List[float]]:
+        try:
+            vector = self.embed(normalize_prompt(prompt))
+        except Exception:
+            return None
+        return list(vector) if vector else None
+
+    @staticmethod
+    def _entry_size(entry: Dict[str, Any]) -> int:
+        size = len(entry["prompt"].encode("utf-8")) + len((entry["response"] or "").encode("utf-8"))
+        if entry.get("embedding"):
+            size += 8 * len(entry["embedding"])
+        return size + 128
@@ -0,0 +1,157 @@
+"""
+AIOS 订阅索引 - EventBus 模式分发
+按事件类型的点分段（"agent.task.started" → agent / task / started）建立前缀树，
+一次发布只沿匹配路径走，不再对每个订阅模式跑 fnmatch。
+
+匹配语义与 fnmatch.fnmatchcase 一致（区分大小写，不随平台变化）：
+- 整段 "*" 匹配一个或多个段（fnmatch 的 * 可以跨越 "."）
+    "agent.*" 匹配 agent.started / agent.task.started
+    "*.error" 匹配 task.error / a.b.error
+    "*"       匹配所有事件
+- 段内通配（"agent*"、"task.err?"、"[!p]*"）无法按段索引，
+  退化为预编译正则逐个匹配（这类模式很少）
+
+订阅/取消订阅只增删一条路径，不需要清空缓存。
+"""
+import fnmatch
+import re
+from typing import Dict, List, Optional, Pattern, Set
+
+_WILDCARD_CHARS = "*?["
+
+
+class _Node:
+    """前缀树节点"""
+    __slots__ = ("children", "star", "patterns")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.star: Optional["_Node"] = None
+        self.patterns: Set[str] = set()
+
+    def is_empty(self) -> bool:
+        return not self.children and self.star is None and not self.patterns
+
+
+class SubscriptionIndex:
+    """
+    订阅模式索引
+
+    用法：
+        index = SubscriptionIndex()
+        index.add("agent.*")
+        index.match("agent.started")  # ["agent.*"]
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        # 段内通配模式 → 预编译正则
+        self._fallback: Dict[str, Pattern] = {}
+        # 模式首次注册顺序（保持与 dict 迭代一致的分发顺序）
+        self._order: Dict[str, int] = {}
+        self._patterns: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def __contains__(self, pattern: str) -> bool:
+        return pattern in self._patterns
+
+    @staticmethod
+    def _is_indexable(segments: List[str]) -> bool:
+        return all(
+            seg == "*" or not any(c in seg for c in _WILDCARD_CHARS)
+            for seg in segments
+        )
+
+    def add(self, pattern: str) -> None:
+        """注册模式（幂等）"""
+        if pattern in self._patterns:
+            return
+        self._patterns.add(pattern)
+        self._order.setdefault(pattern, len(self._order))
+
+        segments = pattern.split(".")
+        if not self._is_indexable(segments):
+            self._fallback[pattern] = re.compile(fnmatch.translate(pattern))
+            return
+
+        node = self._root
+        for seg in segments:
+            if seg == "*":
+                if node.star is None:
+                    node.star = _Node()
+                node = node.star
+            else:
+                node = node.children.setdefault(seg, _Node())
+        node.patterns.add(pattern)
+
+    def remove(self, pattern: str) -> None:
+        """移除模式，并剪掉空分支"""
+        if pattern not in self._patterns:
+            return
+        self._patterns.discard(pattern)
+
+        if pattern in self._fallback:
+            del self._fallback[pattern]
+            return
+
+        path = [self._root]
+        for seg in pattern.split("."):
+            node = path[-1]
+            path.append(node.star if seg == "*" else node.children[seg])
+        path[-1].patterns.discard(pattern)
+
+        segments = pattern.split(".")
+        for depth in range(len(segments), 0, -1):
+            node, parent, seg = path[depth], path[depth - 1], segments[depth - 1]
+            if not node.is_empty():
+                break
+            if seg == "*":
+                parent.star = None
+            else:
+                del parent.children[seg]
+
+    def match(self, event_type: str) -> List[str]:
+        """
+        返回匹配事件类型的所有模式（按注册顺序）
+
+        Args:
+            event_type: 事件类型
+
+        Returns:
+            模式列表
+        """
+        segments = event_type.split(".")
+        n = len(segments)
+        matched: Set[str] = set()
+
+        # (节点, 已消费段数)；visited 防止多个 * 组合时重复展开
+        stack = [(self._root, 0)]
+        visited = set()
+        while stack:
+            node, i = stack.pop()
+            key = (id(node), i)
+            if key in visited:
+                continue
+            visited.add(key)
+
+            if i == n:
+                matched.update(node.patterns)
+                continue
+
+            child = node.children.get(segments[i])
+            if child is not None:
+                stack.append((child, i + 1))
+            if node.star is not None:
+                # * 吞掉 1..(n - i) 个段
+                for j in range(i + 1, n + 1):
+                    stack.append((node.star, j))
+
+        for pattern, regex in self._fallback.items():
+            if regex.match(event_type):
+                matched.add(pattern)
+
+        if len(matched) <= 1:
+            return list(matched)
+        return sorted(matched, key=self._order.__getitem__)
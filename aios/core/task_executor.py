@@ -8,6 +8,13 @@ Usage:
     
     executor = TaskExecutor()
     result = executor.execute_task(task)
+    results = executor.execute_batch(tasks, concurrency=4, deadline_s=120)
+
+execute_batch runs tasks on a bounded thread pool: at most `concurrency` tasks at
+once, at most TYPE_CONCURRENCY[type] of one task type, each with its own deadline.
+Reality Ledger transitions for an action are serialized (executing → completed/failed).
+Memory hints for the whole batch come from one /query_batch request, and feedback
+goes out as one /feedback_batch request, over a keep-alive connection to memory_server.
 """
 from __future__ import annotations
 
@@ -15,6 +22,7 @@ import sys
 import os
 import time
 import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from typing import Dict, List, Optional
 
@@ -30,57 +38,131 @@ import json as _json_mod  # needed by server helpers below
 
 _MEMORY_SERVER_URL = "http://127.0.0.1:7788"
 
+
+class _RequestNotSent(ConnectionError):
+    """The request never reached memory_server, so it is safe to apply it another way."""
+
+
+class _MemoryServerClient:
+    """
+    Keep-alive JSON client for memory_server (one persistent connection per thread).
+
+    A dropped connection is reopened and the request retried once, but only if
+    the request never reached the server or is a read-only /query* call:
+    /feedback_batch must not be applied twice. A request that could not be sent
+    at all raises _RequestNotSent.
+    """
+
+    RETRY_SAFE_PREFIX = "/query"
+
+    def __init__(self, base_url: str):
+        from urllib.parse import urlsplit
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self._local = threading.local()
+
+    def _conn(self, timeout_s: float):
+        import http.client
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout_s)
+            self._local.conn = conn
+        conn.timeout = timeout_s
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout_s)
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def post(self, path: str, payload: dict, timeout_s: float) -> dict:
+        import http.client
+        body = _json_mod.dumps(payload).encode()
+        headers = {"Content-Type": "application/json"}
+        for attempt in range(2):
+            conn = self._conn(timeout_s)
+            sent = False
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                sent = True
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                self._drop()
+                if attempt and not sent:
+                    raise _RequestNotSent(f"memory server {path}: {e}") from e
+                if attempt or (sent and not path.startswith(self.RETRY_SAFE_PREFIX)):
+                    raise
+                continue
+            except Exception as e:
+                self._drop()
+                if not sent:
+                    raise _RequestNotSent(f"memory server {path}: {e}") from e
+                raise
+            if resp.status != 200:
+                raise RuntimeError(f"memory server {path} -> HTTP {resp.status}")
+            return _json_mod.loads(data)
+
+
+_memory_client = _MemoryServerClient(_MEMORY_SERVER_URL)
+
+
 def _query_via_server(text: str, task_type: str, top_k: int, timeout_s: float) -> list | None:
     """Try memory server first (fast, warm). Returns None if unavailable."""
     try:
-        import urllib.request, urllib.error
-        payload = _json_mod.dumps({"text": text, "task_type": task_type, "top_k": top_k}).encode()
-        req = urllib.request.Request(
-            f"{_MEMORY_SERVER_URL}/query",
-            data=payload,
-            headers={"Content-Type": "application/json"},
-        )
-        with urllib.request.urlopen(req, timeout=timeout_s) as resp:
-            return _json_mod.loads(resp.read())["hits"]
+        payload = {"text": text, "task_type": task_type, "top_k": top_k}
+        return _memory_client.post("/query", payload, timeout_s)["hits"]
     except Exception:
         return None
 
 
-def _feedback_via_server(record_id: str, helpful: bool) -> bool:
-    """Send feedback to memory server. Returns True if succeeded."""
+def _query_batch_via_server(queries: List[Dict], timeout_s: float) -> list | None:
+    """One round trip for many queries. Returns hits per query, or None if unavailable."""
     try:
-        import urllib.request
-        payload = _json_mod.dumps({"record_id": record_id, "helpful": helpful}).encode()
-        req = urllib.request.Request(
-            f"{_MEMORY_SERVER_URL}/feedback",
-            data=payload,
-            headers={"Content-Type": "application/json"},
-        )
-        with urllib.request.urlopen(req, timeout=1.0) as resp:
-            return _json_mod.loads(resp.read()).get("ok", False)
+        return _memory_client.post("/query_batch", {"queries": queries}, timeout_s)["results"]
     except Exception:
-        return False
+        return None
+
+
+def _feedback_batch_via_server(items: List[Dict]) -> list | None:
+    """
+    Send feedback for many records in one request. Returns per-item ok flags,
+    or None if the request never reached the server. A request that was sent
+    but failed counts as not ok: the server may already have applied it.
+    """
+    try:
+        return _memory_client.post("/feedback_batch", {"items": items}, 1.0)["ok"]
+    except _RequestNotSent:
+        return None
+    except Exception:
+        return [False] * len(items)
 
 
 
 # ── Memory retrieval: module-level lazy singleton ─────────────────────────────
 _mem_query_fn = None
-_mem_feedback_fn = None
+_mem_query_batch_fn = None
+_mem_feedback_batch_fn = None
 _mem_lock = threading.Lock()
 _mem_loaded = False
 
 def _ensure_memory_loaded() -> bool:
     """Load memory_retrieval once; return True if available."""
-    global _mem_query_fn, _mem_feedback_fn, _mem_loaded
+    global _mem_query_fn, _mem_query_batch_fn, _mem_feedback_batch_fn, _mem_loaded
     if _mem_loaded:
         return _mem_query_fn is not None
     with _mem_lock:
         if _mem_loaded:
             return _mem_query_fn is not None
         try:
-            from memory_retrieval import query as _q, feedback as _fb
+            from memory_retrieval import query as _q, query_batch as _qb, feedback_batch as _fbb
             _mem_query_fn = _q
-            _mem_feedback_fn = _fb
+            _mem_query_batch_fn = _qb
+            _mem_feedback_batch_fn = _fbb
         except Exception:
             pass
         _mem_loaded = True
@@ -89,7 +171,40 @@ def _ensure_memory_loaded() -> bool:
 # Kick off background pre-load immediately on import
 threading.Thread(target=_ensure_memory_loaded, daemon=True).start()
 
-from core.task_submitter import get_submitter, update_task_status
+from core.task_submitter import get_submitter, update_task_status as _update_task_status
+
+# TaskSubmitter.update_task_status rewrites the whole queue file; serialize callers
+_status_lock = threading.Lock()
+
+
+def update_task_status(task_id: str, status: str, result: Optional[Dict] = None) -> bool:
+    with _status_lock:
+        return _update_task_status(task_id, status, result=result)
+
+
+class _BatchSlot:
+    """Per-task state shared by the worker and the deadline watcher."""
+
+    def __init__(self, index: int, task: Dict, limit_s: Optional[float]):
+        self.index = index
+        self.task = task
+        self.limit_s = limit_s
+        self.deadline: Optional[float] = None  # set when the worker starts
+        self.lock = threading.Lock()  # orders ledger transitions for this action
+        self.started = False          # "executing" recorded
+        self.finalized_by: Optional[str] = None  # "worker" / "deadline": who reports the outcome
+        self.started_at: Optional[float] = None
+
+    @property
+    def finalized(self) -> bool:
+        return self.finalized_by is not None
+
+    def finalize(self, owner: str) -> bool:
+        """Claim the terminal report for owner; False if the other side already has it."""
+        with self.lock:
+            if self.finalized_by is None:
+                self.finalized_by = owner
+            return self.finalized_by == owner
 
 
 class TaskExecutor:
@@ -109,19 +224,41 @@ class TaskExecutor:
     # Retry configuration
     MAX_RETRIES = 3
     RETRY_DELAY = 2.0  # seconds
+
+    # Batch concurrency (execute_batch)
+    BATCH_CONCURRENCY = int(os.environ.get("TASK_BATCH_CONCURRENCY", "4"))
+    TYPE_CONCURRENCY = {
+        "deploy": 1,  # deployments never overlap
+    }
     
     def __init__(self):
         self._submitter = get_submitter()
         self._execution_log = AIOS_ROOT / "agent_system" / "task_executions.jsonl"
         self._execution_log.parent.mkdir(parents=True, exist_ok=True)
+        self._log_lock = threading.Lock()
+        self.last_batch_stats: Dict = {}
     
-    def execute_task(self, task: Dict, retry_count: int = 0) -> Dict:
+    def execute_task(
+        self,
+        task: Dict,
+        retry_count: int = 0,
+        deadline: Optional[float] = None,
+        mem_ctx: Optional[dict] = None,
+        feedback_sink: Optional[list] = None,
+        slot: Optional[_BatchSlot] = None,
+    ) -> Dict:
         """
         Execute a single task with retry support.
         
         Args:
             task: Task record from queue
             retry_count: Current retry attempt (0 = first attempt)
+            deadline: time.monotonic() after which no further retry is started
+            mem_ctx: Prefetched memory context (execute_batch queries all tasks at once)
+            feedback_sink: If given, memory feedback is appended here for one batched
+                write instead of being sent immediately
+            slot: execute_batch bookkeeping; once its deadline has reported the task
+                failed, this call writes no status, log or feedback
         
         Returns:
             Execution result
@@ -138,7 +275,8 @@ class TaskExecutor:
         agent_type = self.AGENT_MAPPING.get(task_type, "coder")
         
         # ── Memory Retrieval: build context ──────────────────────────────
-        mem_ctx = self._build_memory_context(task_id, description, task_type)
+        if mem_ctx is None:
+            mem_ctx = self._build_memory_context(task_id, description, task_type)
         
         # Prepare spawn request
         spawn_request = {
@@ -155,15 +293,21 @@ class TaskExecutor:
         result = self._execute_spawn(spawn_request)
         
         # Handle failure with retry
-        if not result["success"] and retry_count < self.MAX_RETRIES:
+        out_of_time = deadline is not None and time.monotonic() + self.RETRY_DELAY >= deadline
+        if slot is not None and slot.finalized:
+            out_of_time = True
+        if not result["success"] and retry_count < self.MAX_RETRIES and not out_of_time:
             print(f"  [WARN] Attempt {retry_count + 1} failed: {result.get('error', 'Unknown error')}")
             print(f"  [RETRY] Retrying in {self.RETRY_DELAY}s... (attempt {retry_count + 2}/{self.MAX_RETRIES + 1})")
             
-            import time
             time.sleep(self.RETRY_DELAY)
             
             # Retry
-            return self.execute_task(task, retry_count + 1)
+            return self.execute_task(task, retry_count + 1, deadline, mem_ctx, feedback_sink, slot)
+        
+        # Abandoned at its deadline: execute_batch already wrote the failed status
+        if slot is not None and not slot.finalize("worker"):
+            return result
         
         # Update task status (final result)
         if result["success"]:
@@ -187,7 +331,10 @@ class TaskExecutor:
         self._log_execution(task, result, retry_count)
         
         # ── Memory Retrieval: write feedback ─────────────────────────────
-        self._write_memory_feedback(task_id, mem_ctx, result)
+        if feedback_sink is not None:
+            feedback_sink.append((task_id, mem_ctx, result))
+        else:
+            self._write_memory_feedback(task_id, mem_ctx, result)
         
         return result
     
@@ -253,40 +400,73 @@ class TaskExecutor:
                 "error": "Simulated failure",
             }
     
-    def _build_memory_context(self, task_id: str, description: str, task_type: str) -> dict:
-        """Retrieve relevant memories (server-first, fallback to direct call)."""
-        import os
-        enabled = os.environ.get("MEMORY_RETRIEVAL_ENABLED", "true").lower() == "true"
-        timeout_ms = int(os.environ.get("MEMORY_TIMEOUT_MS", "400"))
-        max_hints = int(os.environ.get("MEMORY_MAX_HINTS", "3"))
-        max_chars = int(os.environ.get("MEMORY_MAX_CHARS", "250"))
-
-        empty = {"memory_hints": [], "memory_ids": [], "retrieved_count": 0,
-                 "used_count": 0, "latency_ms": 0, "degraded": True}
-        if not enabled:
-            return {**empty, "error": "disabled"}
+    @staticmethod
+    def _memory_settings() -> tuple:
+        """(enabled, timeout_ms, max_hints, max_chars) from the MEMORY_* env vars."""
+        return (
+            os.environ.get("MEMORY_RETRIEVAL_ENABLED", "true").lower() == "true",
+            int(os.environ.get("MEMORY_TIMEOUT_MS", "400")),
+            int(os.environ.get("MEMORY_MAX_HINTS", "3")),
+            int(os.environ.get("MEMORY_MAX_CHARS", "250")),
+        )
 
-        t0 = time.time()
+    @staticmethod
+    def _context_from_hits(hits: list, latency_ms: float, max_hints: int, max_chars: int, source: str) -> dict:
+        hints, ids = [], []
+        for h in hits[:max_hints]:
+            hints.append(f"[{h.get('outcome','?')}|score={h.get('_score',0)}] {h.get('text','')[:max_chars]}")
+            ids.append(h.get("id", ""))
+        print(
+            f"  [MEMORY:BUILD] OK retrieved={len(hits)} used={len(hints)} latency={latency_ms}ms ({source})",
+            flush=True,
+        )
+        return {
+            "memory_hints": hints, "memory_ids": ids,
+            "retrieved_count": len(hits), "used_count": len(hints),
+            "latency_ms": latency_ms, "degraded": False, "error": None,
+        }
 
-        # Try server first (fast, warm, no cold start)
-        hits = _query_via_server(description, task_type or "", max_hints, timeout_ms / 1000.0)
-        if hits is not None:
+    def _build_memory_contexts(self, tasks: List[Dict]) -> List[dict]:
+        """Memory contexts for a batch: one /query_batch round trip, else one direct query_batch."""
+        enabled, timeout_ms, max_hints, max_chars = self._memory_settings()
+        if not enabled or not tasks:
+            return [self._build_memory_context(
+                t.get("task_id") or t.get("id", "unknown"), t.get("description", "No description"),
+                t.get("type", "code"),
+            ) for t in tasks]
+
+        t0 = time.time()
+        queries = [{"text": t.get("description", "No description"), "task_type": t.get("type", "code"),
+                    "top_k": max_hints} for t in tasks]
+        results = _query_batch_via_server(queries, timeout_ms / 1000.0)
+        if results is not None and len(results) == len(tasks):
             latency_ms = round((time.time() - t0) * 1000, 1)
-            hints, ids = [], []
-            for h in hits[:max_hints]:
-                hints.append(f"[{h.get('outcome','?')}|score={h.get('_score',0)}] {h.get('text','')[:max_chars]}")
-                ids.append(h.get("id", ""))
-            print(
-                f"  [MEMORY:BUILD] OK retrieved={len(hits)} used={len(hints)} latency={latency_ms}ms (server)",
-                flush=True,
-            )
-            return {
-                "memory_hints": hints, "memory_ids": ids,
-                "retrieved_count": len(hits), "used_count": len(hints),
-                "latency_ms": latency_ms, "degraded": False, "error": None,
-            }
+            return [self._context_from_hits(hits, latency_ms, max_hints, max_chars, "server batch")
+                    for hits in results]
+
+        # Fallback: one direct batched call (one embedding pass), same wait budget as a single query
+        results, error, latency_ms = self._query_direct(lambda: _mem_query_batch_fn(queries), t0, timeout_ms)
+        if error is None and len(results) != len(tasks):
+            error = f"query_batch returned {len(results)} results for {len(tasks)} queries"
+        if error is not None:
+            return [self._degraded_context(latency_ms, error) for _ in tasks]
+        return [self._context_from_hits(hits[:max_hints], latency_ms, max_hints, max_chars, "direct batch")
+                for hits in results]
+
+    @staticmethod
+    def _degraded_context(latency_ms: float, error: str) -> dict:
+        print(f"  [MEMORY:BUILD] DEGRADED {error} latency={latency_ms}ms", flush=True)
+        return {"memory_hints": [], "memory_ids": [], "retrieved_count": 0, "used_count": 0,
+                "latency_ms": latency_ms, "degraded": True, "error": error}
+
+    @staticmethod
+    def _query_direct(call, t0: float, timeout_ms: int) -> tuple:
+        """
+        Run a direct memory_retrieval call (cold start possible) within the wait budget.
 
-        # Fallback: direct call (cold start possible)
+        Returns:
+            (result, error, latency_ms); error is None on success
+        """
         first_call_timeout = 12.0
         fast_timeout = timeout_ms / 1000.0
         wait_timeout = fast_timeout if _mem_loaded else first_call_timeout
@@ -295,71 +475,81 @@ class TaskExecutor:
         while not _mem_loaded and time.time() < deadline:
             time.sleep(0.02)
 
-        latency_ms = round((time.time() - t0) * 1000, 1)
-
         if not _ensure_memory_loaded():
-            print(f"  [MEMORY:BUILD] DEGRADED module_unavailable latency={latency_ms}ms", flush=True)
-            return {**empty, "latency_ms": latency_ms, "error": "module_unavailable"}
+            return None, "module_unavailable", round((time.time() - t0) * 1000, 1)
 
         container: dict = {}
 
         def _run():
             try:
-                hits = _mem_query_fn(description, top_k=max_hints, task_type=task_type or None)
-                container["hits"] = hits
+                container["result"] = call()
             except Exception as e:
                 container["error"] = str(e)
 
-        t1 = time.time()
-        remaining = max(0.1, deadline - t1)
+        remaining = max(0.1, deadline - time.time())
         t = threading.Thread(target=_run, daemon=True)
         t.start()
         t.join(timeout=remaining)
         latency_ms = round((time.time() - t0) * 1000, 1)
 
         if t.is_alive():
-            print(f"  [MEMORY:BUILD] DEGRADED timeout>{timeout_ms}ms latency={latency_ms}ms", flush=True)
-            return {**empty, "latency_ms": latency_ms, "error": f"timeout>{timeout_ms}ms"}
+            return None, f"timeout>{timeout_ms}ms", latency_ms
         if "error" in container:
-            print(f"  [MEMORY:BUILD] DEGRADED err={container['error']} latency={latency_ms}ms", flush=True)
-            return {**empty, "latency_ms": latency_ms, "error": container["error"]}
+            return None, container["error"], latency_ms
+        return container.get("result", []), None, latency_ms
 
-        hits = container.get("hits", [])[:max_hints]
-        hints, ids = [], []
-        for h in hits:
-            hints.append(f"[{h.get('outcome','?')}|score={h.get('_score',0)}] {h.get('text','')[:max_chars]}")
-            ids.append(h.get("id", ""))
+    def _build_memory_context(self, task_id: str, description: str, task_type: str) -> dict:
+        """Retrieve relevant memories (server-first, fallback to direct call)."""
+        enabled, timeout_ms, max_hints, max_chars = self._memory_settings()
 
-        print(
-            f"  [MEMORY:BUILD] OK retrieved={len(hits)} used={len(hints)} latency={latency_ms}ms (direct)",
-            flush=True,
+        if not enabled:
+            return {"memory_hints": [], "memory_ids": [], "retrieved_count": 0,
+                    "used_count": 0, "latency_ms": 0, "degraded": True, "error": "disabled"}
+
+        t0 = time.time()
+
+        # Try server first (fast, warm, no cold start)
+        hits = _query_via_server(description, task_type or "", max_hints, timeout_ms / 1000.0)
+        if hits is not None:
+            latency_ms = round((time.time() - t0) * 1000, 1)
+            return self._context_from_hits(hits, latency_ms, max_hints, max_chars, "server")
+
+        # Fallback: direct call (cold start possible)
+        hits, error, latency_ms = self._query_direct(
+            lambda: _mem_query_fn(description, top_k=max_hints, task_type=task_type or None),
+            t0, timeout_ms,
         )
-        return {
-            "memory_hints": hints, "memory_ids": ids,
-            "retrieved_count": len(hits), "used_count": len(hints),
-            "latency_ms": latency_ms, "degraded": False, "error": None,
-        }
+        if error is not None:
+            return self._degraded_context(latency_ms, error)
+        return self._context_from_hits(hits[:max_hints], latency_ms, max_hints, max_chars, "direct")
 
     def _write_memory_feedback(self, task_id: str, mem_ctx: dict, result: dict) -> None:
         """Write feedback (server-first, fallback to direct call)."""
-        memory_ids = mem_ctx.get("memory_ids", [])
-        if not memory_ids:
+        self._write_memory_feedback_batch([(task_id, mem_ctx, result)])
+
+    def _write_memory_feedback_batch(self, entries: List[tuple]) -> None:
+        """
+        Write feedback for many tasks: one /feedback_batch request, one log append.
+
+        Args:
+            entries: [(task_id, mem_ctx, result), ...]
+        """
+        entries = [e for e in entries if e[1].get("memory_ids")]
+        if not entries:
             return
-        helpful = result.get("success", False)
+        items = [
+            {"record_id": mid, "helpful": result.get("success", False)}
+            for _, mem_ctx, result in entries
+            for mid in mem_ctx["memory_ids"] if mid
+        ]
 
         # Try server first
-        success_count = 0
-        for mid in memory_ids:
-            if mid and _feedback_via_server(mid, helpful):
-                success_count += 1
+        ok = _feedback_batch_via_server(items) if items else []
 
-        # If server failed for all, try direct call
-        if success_count == 0 and _mem_feedback_fn:
+        # Never reached the server: apply directly, one batch
+        if ok is None and _mem_feedback_batch_fn:
             try:
-                for mid in memory_ids:
-                    if mid:
-                        _mem_feedback_fn(mid, helpful=helpful)
-                success_count = len(memory_ids)
+                _mem_feedback_batch_fn([(item["record_id"], item["helpful"]) for item in items])
             except Exception as e:
                 print(f"  [MEMORY:FEEDBACK] ERROR {e}", flush=True)
                 return
@@ -367,23 +557,29 @@ class TaskExecutor:
         # Log to file
         log_path = AIOS_ROOT / "agent_system" / "memory_retrieval_log.jsonl"
         from datetime import datetime, timezone
-        entry = {
-            "ts": datetime.now(timezone.utc).isoformat(),
-            "task_id": task_id,
-            "memory_ids": memory_ids,
-            "helpful": helpful,
-            "score": 1.0 if helpful else 0.0,
-            "reason": "task_success" if helpful else "task_failed",
-            "latency_ms": mem_ctx.get("latency_ms", 0),
-            "retrieved_count": mem_ctx.get("retrieved_count", 0),
-            "injected_count": mem_ctx.get("used_count", 0),
-            "degraded": mem_ctx.get("degraded", False),
-            "feature_flag_enabled": os.environ.get("MEMORY_RETRIEVAL_ENABLED", "true").lower() == "true",
-        }
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(_json_mod.dumps(entry, ensure_ascii=False) + "\n")
+        now = datetime.now(timezone.utc).isoformat()
+        flag = os.environ.get("MEMORY_RETRIEVAL_ENABLED", "true").lower() == "true"
+        lines = []
+        for task_id, mem_ctx, result in entries:
+            helpful = result.get("success", False)
+            lines.append(_json_mod.dumps({
+                "ts": now,
+                "task_id": task_id,
+                "memory_ids": mem_ctx["memory_ids"],
+                "helpful": helpful,
+                "score": 1.0 if helpful else 0.0,
+                "reason": "task_success" if helpful else "task_failed",
+                "latency_ms": mem_ctx.get("latency_ms", 0),
+                "retrieved_count": mem_ctx.get("retrieved_count", 0),
+                "injected_count": mem_ctx.get("used_count", 0),
+                "degraded": mem_ctx.get("degraded", False),
+                "feature_flag_enabled": flag,
+            }, ensure_ascii=False) + "\n")
+        with self._log_lock:
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
         print(
-            f"  [MEMORY:FEEDBACK] feedback_written=True ids={len(memory_ids)} helpful={helpful}",
+            f"  [MEMORY:FEEDBACK] feedback_written=True tasks={len(entries)} ids={len(items)}",
             flush=True,
         )
 
@@ -401,19 +597,37 @@ class TaskExecutor:
             "total_attempts": retry_count + 1,
         }
         
-        with open(self._execution_log, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+        line = json.dumps(log_entry, ensure_ascii=False) + "\n"
+        with self._log_lock:
+            with open(self._execution_log, "a", encoding="utf-8") as f:
+                f.write(line)
     
-    def execute_batch(self, tasks: List[Dict], max_tasks: int = 5) -> List[Dict]:
+    def execute_batch(
+        self,
+        tasks: List[Dict],
+        max_tasks: int = 5,
+        concurrency: Optional[int] = None,
+        deadline_s: Optional[float] = None,
+        type_concurrency: Optional[Dict[str, int]] = None,
+    ) -> List[Dict]:
         """
-        Execute a batch of tasks.
+        Execute a batch of tasks concurrently.
         
         Args:
             tasks: List of tasks to execute
             max_tasks: Maximum number of tasks to execute
+            concurrency: Max tasks in flight (default BATCH_CONCURRENCY; 1 = sequential)
+            deadline_s: Per-task deadline in seconds, counted from the moment its worker
+                starts (a task's own "deadline_s" field wins). A task past its deadline
+                is reported failed here (ledger, queue status, execution log); its worker
+                thread is abandoned, not killed, and holds its concurrency slots until
+                it returns.
+            type_concurrency: Per task-type limits (default TYPE_CONCURRENCY)
         
         Returns:
-            List of execution results
+            List of execution results, in input order.
+            self.last_batch_stats has wall_ms, sum_task_ms and saved_ms
+            (time concurrency saved versus running the same tasks back to back).
         """
         # Import Reality Ledger
         try:
@@ -421,26 +635,71 @@ class TaskExecutor:
             from reality_ledger import transition_action as _transition_action
         except ImportError:
             _transition_action = None
-        
-        results = []
-        
-        for i, task in enumerate(tasks[:max_tasks]):
-            task_id = task.get('task_id') or task.get('id', 'unknown')
-            action_id = task.get('action_id')  # injected by heartbeat
-            
-            print(f"[{i+1}/{min(len(tasks), max_tasks)}] Executing task: {task_id}")
-            print(f"  Type: {task.get('type', 'unknown')}")
-            print(f"  Description: {task.get('description', 'No description')}")
-            
-            # Reality Ledger: executing
-            if action_id and _transition_action:
-                try:
-                    _transition_action(action_id, "executing", actor=task.get('type', 'unknown'))
-                except Exception as e:
-                    print(f"  [LEDGER] executing transition failed: {e}")
-            
+
+        batch = tasks[:max_tasks]
+        concurrency = max(1, concurrency or self.BATCH_CONCURRENCY)
+        limits = self.TYPE_CONCURRENCY if type_concurrency is None else type_concurrency
+        results: List[Optional[Dict]] = [None] * len(batch)
+        task_ms: List[float] = [0.0] * len(batch)
+        batch_start = time.monotonic()
+
+        # One memory round trip for the whole batch; feedback is sent together at the end
+        # (feedback from tasks abandoned at their deadline is dropped)
+        mem_contexts = self._build_memory_contexts(batch)
+        feedback_sink: list = []
+
+        def _ledger(slot: _BatchSlot, event: str, payload: Optional[Dict] = None) -> None:
+            action_id = slot.task.get("action_id")  # injected by heartbeat
+            if not (action_id and _transition_action):
+                return
+            try:
+                _transition_action(action_id, event, actor=slot.task.get("type", "unknown"), payload=payload)
+            except Exception as e:
+                print(f"  [LEDGER] {event} transition failed: {e}")
+
+        def _finish(slot: _BatchSlot, result: Dict, owner: str) -> bool:
+            """Record the terminal transition once; False if the other owner already did."""
+            if not slot.finalize(owner):
+                return False
+            with slot.lock:
+                if not slot.started:
+                    _ledger(slot, "executing")
+                    slot.started = True
+                duration_ms = int(result.get("duration", 0) * 1000)
+                if result["success"]:
+                    _ledger(slot, "completed", {"result_summary": str(result.get("output", ""))[:200],
+                                                "duration_ms": duration_ms})
+                else:
+                    _ledger(slot, "failed", {"error": str(result.get("error", ""))[:200],
+                                             "duration_ms": duration_ms})
+            results[slot.index] = result
+            if slot.started_at is not None:
+                task_ms[slot.index] = (time.monotonic() - slot.started_at) * 1000
+            task_id = slot.task.get("task_id") or slot.task.get("id", "unknown")
+            if owner == "deadline":
+                # The worker skips its own status / log once the slot is finalized
+                update_task_status(task_id, "failed", result=result)
+                self._log_execution(slot.task, result)
+            if result["success"]:
+                print(f"  [OK] {task_id} completed in {result.get('duration', 0):.1f}s")
+            else:
+                print(f"  [FAIL] {task_id} failed: {result.get('error', 'Unknown error')}")
+            return True
+
+        def _run(slot: _BatchSlot) -> None:
+            task = slot.task
+            with slot.lock:
+                if slot.finalized:
+                    return
+                _ledger(slot, "executing")
+                slot.started = True
+                # The deadline clock starts when the task does, not when it is queued
+                slot.started_at = time.monotonic()
+                if slot.limit_s:
+                    slot.deadline = slot.started_at + slot.limit_s
+
             # Force failure for testing (if description contains FORCE_FAILURE_TEST)
-            if "FORCE_FAILURE_TEST" in task.get('description', ''):
+            if "FORCE_FAILURE_TEST" in task.get("description", ""):
                 result = {
                     "success": False,
                     "error": "Forced failure for testing",
@@ -449,29 +708,108 @@ class TaskExecutor:
                 }
                 print(f"  [TEST] Forced failure triggered")
             else:
-                result = self.execute_task(task)
-            
-            results.append(result)
-            
-            # Reality Ledger: completed / failed
-            if action_id and _transition_action:
                 try:
-                    if result["success"]:
-                        _transition_action(action_id, "completed", actor=task.get('type', 'unknown'),
-                                           payload={"result_summary": str(result.get('output', ''))[:200],
-                                                    "duration_ms": int(result.get('duration', 0) * 1000)})
-                    else:
-                        _transition_action(action_id, "failed", actor=task.get('type', 'unknown'),
-                                           payload={"error": str(result.get('error', ''))[:200],
-                                                    "duration_ms": int(result.get('duration', 0) * 1000)})
+                    result = self.execute_task(
+                        task, deadline=slot.deadline,
+                        mem_ctx=mem_contexts[slot.index], feedback_sink=feedback_sink, slot=slot,
+                    )
                 except Exception as e:
-                    print(f"  [LEDGER] terminal transition failed: {e}")
-            
-            if result["success"]:
-                print(f"  [OK] Completed in {result.get('duration', 0):.1f}s")
-            else:
-                print(f"  [FAIL] Failed: {result.get('error', 'Unknown error')}")
-        
+                    result = {"success": False, "error": f"{type(e).__name__}: {e}", "output": ""}
+            _finish(slot, result, "worker")
+
+        pending = list(enumerate(batch))
+        # future -> slot; a worker abandoned at its deadline keeps its global and
+        # per-type slot until its thread actually returns
+        running: Dict = {}
+        running_by_type: Dict[str, int] = {}
+        blocked_since: Optional[float] = None
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="task-exec")
+        try:
+            while pending or any(not s.finalized for s in running.values()):
+                # Start tasks in input order while global / per-type slots are free;
+                # a task whose type is saturated does not block later tasks of other types
+                for item in list(pending):
+                    if len(running) >= concurrency:
+                        break
+                    i, task = item
+                    task_type = task.get("type", "unknown")
+                    if running_by_type.get(task_type, 0) >= max(1, limits.get(task_type, concurrency)):
+                        continue
+                    pending.remove(item)
+                    slot = _BatchSlot(i, task, task.get("deadline_s", deadline_s))
+                    task_id = task.get("task_id") or task.get("id", "unknown")
+                    print(f"[{i+1}/{len(batch)}] Executing task: {task_id}")
+                    print(f"  Type: {task_type}")
+                    print(f"  Description: {task.get('description', 'No description')}")
+                    running[pool.submit(_run, slot)] = slot
+                    running_by_type[task_type] = running_by_type.get(task_type, 0) + 1
+
+                now = time.monotonic()
+                live = [s for s in running.values() if not s.finalized]
+                waits = [s.deadline - now for s in live if s.deadline is not None]
+                if any(s.limit_s and s.deadline is None for s in live):
+                    waits.append(0.05)  # queued in the pool; its clock starts with the worker
+
+                # Only abandoned workers hold the slots the remaining tasks need: wait for
+                # them up to each task's own deadline, then report the task failed
+                blocked_since = (blocked_since or now) if pending and not live else None
+                if blocked_since is not None:
+                    for item in list(pending):
+                        i, task = item
+                        limit_s = task.get("deadline_s", deadline_s)
+                        if not limit_s:
+                            continue
+                        if now < blocked_since + limit_s:
+                            waits.append(blocked_since + limit_s - now)
+                            continue
+                        pending.remove(item)
+                        _finish(_BatchSlot(i, task, limit_s), {
+                            "success": False,
+                            "error": f"deadline exceeded ({limit_s:.1f}s) waiting for an abandoned "
+                                     f"{task.get('type', 'unknown')} task to release its slot",
+                            "output": "",
+                            "duration": 0.0,
+                            "deadline_exceeded": True,
+                        }, "deadline")
+                    if not pending:
+                        continue
+
+                timeout = max(0.0, min(waits)) if waits else None
+                done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                now = time.monotonic()
+                for future, slot in list(running.items()):
+                    if future in done:
+                        del running[future]
+                        running_by_type[slot.task.get("type", "unknown")] -= 1
+                    elif not slot.finalized and slot.deadline is not None and now >= slot.deadline:
+                        _finish(slot, {
+                            "success": False,
+                            "error": f"deadline exceeded ({slot.limit_s:.1f}s)",
+                            "output": "",
+                            "duration": now - slot.started_at,
+                            "deadline_exceeded": True,
+                        }, "deadline")
+        finally:
+            # Abandoned (deadline-exceeded) workers finish in the background
+            pool.shutdown(wait=False)
+            self._write_memory_feedback_batch(list(feedback_sink))
+
+        wall_ms = (time.monotonic() - batch_start) * 1000
+        sum_ms = sum(task_ms)
+        self.last_batch_stats = {
+            "tasks": len(batch),
+            "concurrency": concurrency,
+            "wall_ms": round(wall_ms, 1),
+            "sum_task_ms": round(sum_ms, 1),
+            "saved_ms": round(max(0.0, sum_ms - wall_ms), 1),
+            "deadline_exceeded": sum(1 for r in results if r and r.get("deadline_exceeded")),
+        }
+        if batch:
+            print(
+                f"[BATCH] {len(batch)} tasks wall={wall_ms:.0f}ms sequential={sum_ms:.0f}ms "
+                f"saved={self.last_batch_stats['saved_ms']:.0f}ms (concurrency={concurrency})"
+            )
         return results
 
 
@@ -492,9 +830,9 @@ def execute_task(task: Dict) -> Dict:
     return get_executor().execute_task(task)
 
 
-def execute_batch(tasks: List[Dict], max_tasks: int = 5) -> List[Dict]:
-    """Execute a batch of tasks (convenience function)."""
-    return get_executor().execute_batch(tasks, max_tasks)
+def execute_batch(tasks: List[Dict], max_tasks: int = 5, **kwargs) -> List[Dict]:
+    """Execute a batch of tasks (convenience function; kwargs as TaskExecutor.execute_batch)."""
+    return get_executor().execute_batch(tasks, max_tasks, **kwargs)
 
 
 # ── CLI ────────────────────────────────────────────────────────────
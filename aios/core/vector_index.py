@@ -0,0 +1,239 @@
+"""
+AIOS Vector Index - contiguous cosine-similarity index
+
+Storage layer shared by the VectorDB classes in memory.py / memory_refactored.py:
+- One float32 matrix of L2-normalized rows (norms computed once, at insert)
+- Amortized O(1) append: capacity doubles when full
+- Top-k search = one matrix-vector product + argpartition (no full sort)
+- Batch search = one matrix-matrix product per chunk of queries
+- Binary .npy persistence, loaded memory-mapped (rows are paged in on demand;
+  the first append after load copies them into a growable buffer)
+- Each snapshot writes its own .npy (snapshot_vectors_path); the JSON that names
+  it is the commit point, older files are removed afterwards
+
+Date: 2026-10-16
+"""
+
+import glob
+import os
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Upper bound on the (queries x rows) score block computed at once by search_batch
+BATCH_SCORE_ELEMENTS = 1 << 24
+MIN_CAPACITY = 64
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Return float32 rows scaled to unit length (zero rows stay zero)."""
+    arr = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    np.divide(arr, norms, out=arr, where=norms > 0)
+    return arr
+
+
+def snapshot_vectors_path(path: Path, log_seq: int = 0) -> Path:
+    """Fresh vector file for a snapshot of the JSON file at path.
+
+    Named <stem>.<log_seq>.<unique>.npy, so a save never overwrites the file
+    the current JSON (or a live memory map) still points at.
+    """
+    path = Path(path)
+    return path.with_name(f"{path.stem}.{log_seq}.{time.time_ns():x}.npy")
+
+
+def remove_stale_vectors(path: Path, keep: Path) -> None:
+    """Delete vector files of older snapshots of path, except keep.
+
+    Call only after the JSON naming keep has been os.replace'd into place.
+    """
+    path = Path(path)
+    stale = [path.with_suffix(".npy")]  # pre-snapshot-naming layout
+    stale += [Path(p) for p in glob.glob(str(path.parent / f"{glob.escape(path.stem)}.*.npy"))]
+    for old in stale:
+        if old.name == Path(keep).name:
+            continue
+        try:
+            old.unlink()
+        except OSError:
+            pass  # already gone, or still mapped (Windows); a later save retries
+
+
+class VectorIndex:
+    """Growable matrix of normalized vectors with top-k cosine search.
+
+    Row numbers are stable (append-only), so callers keep a parallel list of
+    payloads and map search hits back by row.
+
+    Example:
+        >>> index = VectorIndex(dim=128)
+        >>> row = index.add(embedding)
+        >>> hits = index.search(query, k=5)   # [(row, similarity), ...]
+    """
+
+    def __init__(self, dim: int, capacity: int = MIN_CAPACITY):
+        """Initialize an empty index.
+
+        Args:
+            dim: Vector dimension
+            capacity: Initial number of preallocated rows
+        """
+        if dim <= 0:
+            raise ValueError(f"Dimension must be positive, got {dim}")
+        self.dim = dim
+        self._matrix = np.empty((max(capacity, 1), dim), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._matrix.shape[0]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Normalized rows currently stored (a view, do not modify)."""
+        return self._matrix[:self._size]
+
+    # ==================== Insert ====================
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        if needed <= self.capacity and not isinstance(self._matrix, np.memmap):
+            return
+        capacity = max(self.capacity, MIN_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+        grown = np.empty((capacity, self.dim), dtype=np.float32)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    def add(self, vector: Sequence[float]) -> int:
+        """Append one vector; returns its row number."""
+        return self.add_many([vector])
+
+    def add_many(self, vectors) -> int:
+        """Append several vectors; returns the row number of the first one."""
+        rows = normalize_rows(vectors)
+        if rows.shape[1] != self.dim:
+            raise ValueError(
+                f"Embedding dimension mismatch: expected {self.dim}, got {rows.shape[1]}"
+            )
+        start = self._size
+        self._reserve(len(rows))
+        self._matrix[start:start + len(rows)] = rows
+        self._size += len(rows)
+        return start
+
+    def snapshot(self) -> "VectorIndex":
+        """Read-only copy of the current rows without copying them.
+
+        Rows are append-only and growth reallocates, so the shared prefix
+        never changes; the snapshot can be saved from another thread.
+        """
+        if isinstance(self._matrix, np.memmap):
+            self._matrix = np.array(self.vectors)
+        snap = VectorIndex(self.dim, capacity=1)
+        snap._matrix = self.vectors
+        snap._size = self._size
+        return snap
+
+    def clear(self) -> None:
+        self._matrix = np.empty((MIN_CAPACITY, self.dim), dtype=np.float32)
+        self._size = 0
+
+    # ==================== Search ====================
+
+    def _check_queries(self, queries) -> np.ndarray:
+        q = normalize_rows(queries)
+        if q.shape[1] != self.dim:
+            raise ValueError(
+                f"Query dimension mismatch: expected {self.dim}, got {q.shape[1]}"
+            )
+        return q
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k largest scores along the last axis, best first."""
+        n = scores.shape[-1]
+        if k < n:
+            idx = np.argpartition(scores, n - k, axis=-1)[..., n - k:]
+        else:
+            idx = np.broadcast_to(np.arange(n), scores.shape[:-1] + (n,))
+        top = np.take_along_axis(scores, idx, axis=-1)
+        order = np.argsort(-top, axis=-1, kind="stable")
+        return np.take_along_axis(idx, order, axis=-1)
+
+    def search(
+        self, query: Sequence[float], k: int = 5, min_similarity: Optional[float] = None
+    ) -> List[Tuple[int, float]]:
+        """Top-k rows by cosine similarity.
+
+        Args:
+            query: Query vector
+            k: Number of results
+            min_similarity: Drop hits whose similarity is not above this value
+
+        Returns:
+            [(row, similarity), ...] ordered by similarity, best first
+        """
+        return self.search_batch([query], k, min_similarity)[0]
+
+    def search_batch(
+        self, queries, k: int = 5, min_similarity: Optional[float] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Top-k rows for each query; same contract as search()."""
+        q = self._check_queries(queries) if len(queries) else np.empty((0, self.dim), np.float32)
+        if self._size == 0 or k <= 0:
+            return [[] for _ in range(len(q))]
+
+        matrix = self.vectors
+        chunk = max(1, BATCH_SCORE_ELEMENTS // self._size)
+        results: List[List[Tuple[int, float]]] = []
+        for start in range(0, len(q), chunk):
+            scores = q[start:start + chunk] @ matrix.T
+            idx = self._top_k(scores, k)
+            top = np.take_along_axis(scores, idx, axis=-1)
+            for rows, sims in zip(idx.tolist(), top.tolist()):
+                results.append([
+                    (r, s) for r, s in zip(rows, sims)
+                    if min_similarity is None or s > min_similarity
+                ])
+        return results
+
+    # ==================== Persistence ====================
+
+    def save(self, path: Path) -> None:
+        """Write the rows to a .npy file (atomic replace)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = np.ascontiguousarray(self.vectors)
+        if isinstance(self._matrix, np.memmap):
+            # Release the mapping before replacing the file it points at
+            data = np.array(data)
+            self._matrix = data
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, data)
+        os.replace(tmp, path)
+
+    def load(self, path: Path, mmap: bool = True) -> None:
+        """Replace the contents with rows from a .npy file.
+
+        Args:
+            path: File written by save()
+            mmap: Map the file read-only instead of reading it into memory
+        """
+        data = np.load(Path(path), mmap_mode="r" if mmap else None)
+        if data.ndim != 2 or data.shape[1] != self.dim:
+            raise ValueError(
+                f"Vector file shape {data.shape} does not match dim={self.dim}"
+            )
+        if data.dtype != np.float32:
+            data = data.astype(np.float32)
+        self._matrix = data
+        self._size = data.shape[0]
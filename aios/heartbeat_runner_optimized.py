@@ -10,6 +10,7 @@ AIOS v0.6 心跳优化版本
 5. 批量处理事件
 6. 集成性能监控
 7. 启动时预热组件
+8. 逐阶段剖析（stage_profiler：耗时 / CPU / IO / json 次数）
 """
 import sys
 import time
@@ -27,6 +28,7 @@ from core.production_reactor import get_reactor
 from core.toy_score_engine import ToyScoreEngine
 from core.notification_handler import start_notification_handler
 from performance_monitor import get_monitor
+from stage_profiler import get_profiler
 
 
 # 全局缓存组件实例
@@ -138,24 +140,33 @@ def log_resource_snapshot(cpu_percent, memory_percent):
 
 def run_heartbeat_optimized():
     """优化的心跳运行"""
+    with get_profiler().tick():
+        return _run_heartbeat_optimized()
+
+
+def _run_heartbeat_optimized():
     start_time = time.time()
     monitor = get_monitor()
+    profiler = get_profiler()
     
     # 获取缓存的组件
-    components = get_or_create_components()
+    with profiler.stage("components"):
+        components = get_or_create_components()
     bus = components["bus"]
     scheduler = components["scheduler"]
     reactor = components["reactor"]
     score_engine = components["score_engine"]
     
     # 快速检查资源
-    cpu_percent, memory_percent = check_resources_fast()
-    
-    # 记录资源使用
-    monitor.record_resources(cpu_percent, memory_percent)
+    with profiler.stage("resources"):
+        cpu_percent, memory_percent = check_resources_fast()
+        
+        # 记录资源使用
+        monitor.record_resources(cpu_percent, memory_percent)
     
     # 异步记录资源快照（不等待）
-    log_resource_snapshot(cpu_percent, memory_percent)
+    with profiler.stage("resource_snapshot"):
+        log_resource_snapshot(cpu_percent, memory_percent)
     
     # 批量收集需要处理的事件
     events_to_emit = []
@@ -205,12 +216,14 @@ def run_heartbeat_optimized():
         monitor.record_alert("memory_high", f"内存使用率 {memory_percent:.1f}% 超过阈值 85%")
     
     # 批量发布事件
-    for event in events_to_emit:
-        bus.emit(event)
+    with profiler.stage("emit_events"):
+        for event in events_to_emit:
+            bus.emit(event)
     
     # 快速获取状态（不等待）
-    current_score = score_engine.get_score()
-    scheduler_status = scheduler.get_status()
+    with profiler.stage("status"):
+        current_score = score_engine.get_score()
+        scheduler_status = scheduler.get_status()
     
     # 计算耗时
     elapsed_ms = int((time.time() - start_time) * 1000)
@@ -233,21 +246,30 @@ def run_heartbeat_optimized():
 
 def run_heartbeat_minimal():
     """最小化心跳（仅监控，不修复）"""
+    with get_profiler().tick():
+        return _run_heartbeat_minimal()
+
+
+def _run_heartbeat_minimal():
     start_time = time.time()
     monitor = get_monitor()
+    profiler = get_profiler()
     
     # 如果还没预热，先预热
     if not _cached_components["warmed_up"]:
-        warmup_components()
+        with profiler.stage("warmup"):
+            warmup_components()
     
     # 快速检查资源
-    cpu_percent, memory_percent = check_resources_fast()
-    
-    # 记录资源使用
-    monitor.record_resources(cpu_percent, memory_percent)
+    with profiler.stage("resources"):
+        cpu_percent, memory_percent = check_resources_fast()
+        
+        # 记录资源使用
+        monitor.record_resources(cpu_percent, memory_percent)
     
     # 异步记录
-    log_resource_snapshot(cpu_percent, memory_percent)
+    with profiler.stage("resource_snapshot"):
+        log_resource_snapshot(cpu_percent, memory_percent)
     
     # 计算耗时
     elapsed_ms = int((time.time() - start_time) * 1000)
@@ -258,7 +280,7 @@ def run_heartbeat_minimal():
         monitor.record_heartbeat(elapsed_ms, result)
         return result
     
-    # 如果资源异常，才初始化完整组件
+    # 如果资源异常，才初始化完整组件（并入同一轮剖析记录）
     return run_heartbeat_optimized()
 
 
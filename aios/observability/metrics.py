@@ -26,6 +26,15 @@ class Histogram:
         if v > self.max:
             self.max = v
     
+    def merge(self, d: Dict[str, Any]) -> None:
+        """合并另一个 to_dict() 的结果"""
+        if not d.get("count"):
+            return
+        self.count += d["count"]
+        self.total += d["sum"]
+        self.min = min(self.min, d["min"])
+        self.max = max(self.max, d["max"])
+    
     def to_dict(self) -> Dict[str, Any]:
         avg = (self.total / self.count) if self.count else 0.0
         return {
@@ -93,6 +102,21 @@ class MetricsRegistry:
                 "histograms": hists,
             }
     
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """把一份 snapshot()（或 snapshot_delta()）累加进来：counter / histogram 相加，gauge 覆盖"""
+        with self._lock:
+            for c in snapshot.get("counters", []):
+                key = (c["name"], _labels_key(c["labels"]))
+                self._counters[key] = self._counters.get(key, 0.0) + float(c["value"])
+            for g in snapshot.get("gauges", []):
+                self._gauges[(g["name"], _labels_key(g["labels"]))] = float(g["value"])
+            for h in snapshot.get("histograms", []):
+                key = (h["name"], _labels_key(h["labels"]))
+                hist = self._hists.get(key)
+                if hist is None:
+                    hist = self._hists[key] = Histogram()
+                hist.merge(h["value"])
+    
     def snapshot_json(self, indent: int = 2) -> str:
         return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
     
@@ -102,5 +126,27 @@ class MetricsRegistry:
         p.parent.mkdir(parents=True, exist_ok=True)
         p.write_text(self.snapshot_json(indent=2), encoding="utf-8")
 
+def snapshot_delta(current: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    同一个 registry 两次 snapshot() 之间的增量（可交给 merge() 累加到别处）
+    
+    histogram 的 count/sum 取差值，min/max 沿用当前值（合并时取极值，重复合并无副作用）
+    """
+    previous = previous or {}
+    prev_counters = {(c["name"], _labels_key(c["labels"])): c["value"] for c in previous.get("counters", [])}
+    prev_hists = {(h["name"], _labels_key(h["labels"])): h["value"] for h in previous.get("histograms", [])}
+    counters = []
+    for c in current.get("counters", []):
+        value = c["value"] - prev_counters.get((c["name"], _labels_key(c["labels"])), 0.0)
+        if value:
+            counters.append({**c, "value": value})
+    hists = []
+    for h in current.get("histograms", []):
+        prev = prev_hists.get((h["name"], _labels_key(h["labels"])), {})
+        count = h["value"]["count"] - prev.get("count", 0)
+        if count:
+            hists.append({**h, "value": {**h["value"], "count": count, "sum": h["value"]["sum"] - prev.get("sum", 0.0)}})
+    return {"counters": counters, "gauges": list(current.get("gauges", [])), "histograms": hists}
+
 # 全局单例（你在任何地方 import METRICS 就能用）
 METRICS = MetricsRegistry()
@@ -69,6 +69,15 @@ def profile_heartbeat():
     
     print(f"   monitor.record_heartbeat: {sum(times)/len(times):.1f}ms (平均)")
     
+    # 常开的逐阶段剖析（heartbeat_v5 / heartbeat_runner_optimized 每轮写入）
+    from stage_profiler import PROFILE_STORE, format_report, read_ticks
+    ticks = read_ticks(PROFILE_STORE)
+    print(f"\n3. 最近 {len(ticks)} 轮心跳逐阶段剖析:")
+    if ticks:
+        print(format_report(ticks))
+    else:
+        print(f"   暂无数据（{PROFILE_STORE}）")
+    
     print("\n" + "=" * 60)
 
 
@@ -20,16 +20,18 @@ Runtime v2 - Event-Driven Task Execution Runtime
     run_runtime()
 """
 
-from .event_log import EventLog, get_event_log
+from .event_log import EventLog, LogCursor, get_event_log
 from .queue import TaskQueue, get_queue
 from .state import StateProjection, get_state
 from .dispatcher import Dispatcher, get_dispatcher
 from .worker import Worker, get_worker
 from .runner import RuntimeRunner, run_runtime
 from .metrics import RuntimeMetrics, get_metrics
+from .compaction import compact_event_log
 
 __all__ = [
     "EventLog",
+    "LogCursor",
     "get_event_log",
     "TaskQueue",
     "get_queue",
@@ -43,4 +45,5 @@ __all__ = [
     "run_runtime",
     "RuntimeMetrics",
     "get_metrics",
+    "compact_event_log",
 ]
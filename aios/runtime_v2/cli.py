@@ -5,6 +5,7 @@ Runtime v2 CLI - Task Submission Interface
     python cli.py submit --type code --desc "refactor module" --priority high
     python cli.py list
     python cli.py status
+    python cli.py compact
 """
 
 import argparse
@@ -13,6 +14,7 @@ from pathlib import Path
 
 from .queue import get_queue
 from .state import get_state
+from .compaction import compact_event_log
 
 
 def cmd_submit(args):
@@ -72,10 +74,10 @@ def cmd_status(args):
     """显示系统状态"""
     state = get_state()
     
-    pending = len(state.list_pending_tasks())
-    running = len(state.list_running_tasks())
-    completed = len(state.list_completed_tasks())
-    failed = len(state.list_failed_tasks())
+    pending = state.count_tasks("pending")
+    running = state.count_tasks("running")
+    completed = state.count_tasks("completed")
+    failed = state.count_tasks("failed")
     
     print("[RUNTIME STATUS]")
     print(f"  Pending: {pending}")
@@ -83,6 +85,25 @@ def cmd_status(args):
     print(f"  Completed: {completed}")
     print(f"  Failed: {failed}")
     print(f"  Total: {pending + running + completed + failed}")
+    if state.archived_counts:
+        archived = ", ".join(f"{k}={v}" for k, v in sorted(state.archived_counts.items()))
+        print(f"  Archived: {archived}")
+
+
+def cmd_compact(args):
+    """归档终态任务，重写 live log，写入快照"""
+    state = get_state()
+    result = compact_event_log(state)
+    
+    if not result["archived_tasks"]:
+        state.save_snapshot()
+        print("[OK] Nothing to compact (snapshot refreshed)")
+        return
+    
+    print(f"[OK] Archived {result['archived_tasks']} tasks → {result['segment']}")
+    for task_state, count in sorted(result["archived_states"].items()):
+        print(f"  {task_state}: {count}")
+    print(f"  Live log: {result['bytes_before']:,} → {result['bytes_after']:,} bytes")
 
 
 def main():
@@ -102,6 +123,9 @@ def main():
     # status 命令
     status_parser = subparsers.add_parser("status", help="Show runtime status")
     
+    # compact 命令
+    compact_parser = subparsers.add_parser("compact", help="Archive finished tasks and snapshot state")
+    
     args = parser.parse_args()
     
     if args.command == "submit":
@@ -110,6 +134,8 @@ def main():
         cmd_list(args)
     elif args.command == "status":
         cmd_status(args)
+    elif args.command == "compact":
+        cmd_compact(args)
     else:
         parser.print_help()
 
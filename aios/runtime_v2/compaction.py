@@ -0,0 +1,255 @@
+"""
+Event Log Compaction - 归档终态任务，保持 live log 小
+
+职责：
+- 把终态任务（completed / failed / timeout）写成归档段：
+  每个任务一行投影结果（task_id / state / task_data / last_event），gzip 压缩
+- 重写 live log，只保留非终态任务的 events
+- 更新归档 manifest（记录每个段的任务数，启动时只读计数）
+- 写入新快照，下次启动只需加载快照 + 回放尾部
+
+提交顺序（崩溃安全）：
+1. 写归档段、新 live log 临时文件
+2. manifest 追加新段（记录被替换的 live log 文件标识 "replaces"）
+3. 旧快照改名为 .prev，写入指向新文件（替换后 cursor）的快照
+4. os.replace 新 live log —— 唯一提交点
+在 4 之前崩溃：live log 仍是旧文件，recover_archive() 把 manifest 最后一段回滚，
+投影从 .prev 快照恢复；在 4 之后崩溃：manifest 和快照都已指向新文件。
+
+目录结构：
+    event_log.jsonl                  live log
+    event_log.lock                   追加 / 替换 live log 的 flock
+    event_log.snapshot.json          投影快照
+    event_log.snapshot.prev.json     压缩前的快照（压缩未提交时回退用）
+    event_log_archive/
+        manifest.json                段列表 + 按状态计数
+        segment-20260101T000000.jsonl.gz
+
+并发：
+- 同一时间只允许一个压缩：archive_dir/.compact.lock 上的 flock（非阻塞），
+  进程崩溃时由内核释放，不会留下需要手动删除的锁
+- 复制尾部 + os.replace 期间持有 event log 的排他锁（EventLog.lock），
+  压缩期间追加的 events 不会写到被替换掉的旧文件上
+
+注意：压缩会替换 live log 文件，其他进程的 cursor 会检测到文件变化并从新文件
+开头重新同步；但如果它们尚未读到某个被归档任务的终态事件，会一直看到旧状态。
+建议在 runner 停止时压缩。
+"""
+
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .event_log import EventLog, LogCursor, fcntl
+
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".compact.lock"
+
+
+def archive_dir_for(event_log: EventLog) -> Path:
+    """event_log.jsonl → event_log_archive/"""
+    return event_log.log_path.parent / f"{event_log.log_path.stem}_archive"
+
+
+def _load_manifest(archive_dir: Path) -> Dict[str, Any]:
+    try:
+        with open(archive_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"segments": []}
+
+
+def _save_manifest(archive_dir: Path, manifest: Dict[str, Any]) -> None:
+    path = archive_dir / MANIFEST_NAME
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _compaction_lock(archive_dir: Path, blocking: bool):
+    """archive_dir/LOCK_NAME 上的 flock（关闭即释放；锁文件保留）"""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    lock_path = archive_dir / LOCK_NAME
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                raise RuntimeError(f"Compaction already running: {lock_path}")
+        yield
+
+
+def _rollback_uncommitted(archive_dir: Path, event_log: EventLog) -> bool:
+    """manifest 最后一段要替换的 live log 仍在原位 → 那次压缩没有提交，撤销该段"""
+    manifest = _load_manifest(archive_dir)
+    segments = manifest["segments"]
+    file_id = event_log.end_cursor().file_id
+    if not segments or file_id is None or segments[-1].get("replaces") != list(file_id):
+        return False
+    segment = segments.pop()
+    _save_manifest(archive_dir, manifest)
+    (archive_dir / segment["file"]).unlink(missing_ok=True)
+    return True
+
+
+def recover_archive(event_log: EventLog) -> bool:
+    """
+    回滚崩溃时未提交的压缩（启动时调用；等待正在进行的压缩结束）
+
+    Returns:
+        是否回滚了一个段
+    """
+    archive_dir = archive_dir_for(event_log)
+    if not (archive_dir / MANIFEST_NAME).exists():
+        return False
+    with _compaction_lock(archive_dir, blocking=True):
+        return _rollback_uncommitted(archive_dir, event_log)
+
+
+def load_archive_counts(archive_dir: Path) -> Dict[str, int]:
+    """汇总所有归档段的按状态计数"""
+    counts: Dict[str, int] = {}
+    for segment in _load_manifest(archive_dir)["segments"]:
+        for state, count in segment.get("states", {}).items():
+            counts[state] = counts.get(state, 0) + count
+    return counts
+
+
+def iter_archived_tasks(archive_dir: Path):
+    """按归档顺序遍历所有已归档任务"""
+    for segment in _load_manifest(archive_dir)["segments"]:
+        with gzip.open(archive_dir / segment["file"], "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _copy_rest(src, dst) -> None:
+    while True:
+        chunk = src.read(1 << 20)
+        if not chunk:
+            break
+        dst.write(chunk)
+
+
+def compact_event_log(state=None) -> Dict[str, Any]:
+    """
+    压缩 event log
+
+    Args:
+        state: StateProjection（默认全局单例）
+
+    Returns:
+        {
+            "archived_tasks": 1000,
+            "archived_states": {"completed": 990, "failed": 10},
+            "segment": "segment-....jsonl.gz" | None,
+            "bytes_before": 123456,
+            "bytes_after": 789,
+        }
+    """
+    from .state import TERMINAL_STATES, get_state
+
+    state = state or get_state()
+    event_log = state.event_log
+    log_path = event_log.log_path
+    archive_dir = archive_dir_for(event_log)
+
+    state._project_state()
+    end = state._cursor
+    terminal = {
+        task_id: task
+        for st in TERMINAL_STATES
+        for task_id, task in state._by_state[st].items()
+    }
+    result = {
+        "archived_tasks": 0,
+        "archived_states": {},
+        "segment": None,
+        "bytes_before": end.offset,
+        "bytes_after": end.offset,
+    }
+    if not terminal:
+        return result
+
+    with _compaction_lock(archive_dir, blocking=False):
+        if _rollback_uncommitted(archive_dir, event_log):
+            state.archived_counts = load_archive_counts(archive_dir)
+
+        # 1. 终态任务 → 归档段（每个任务一行）
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        segment_name = f"segment-{stamp}.jsonl.gz"
+        with gzip.open(archive_dir / segment_name, "wt", encoding="utf-8") as f:
+            for task in terminal.values():
+                f.write(json.dumps(task, ensure_ascii=False) + "\n")
+        archived_states: Dict[str, int] = {}
+        for task in terminal.values():
+            archived_states[task["state"]] = archived_states.get(task["state"], 0) + 1
+
+        # 2. 重写 live log：只保留非终态任务的 events
+        tmp_path = log_path.with_suffix(".compact.tmp")
+        with open(log_path, "rb") as src, open(tmp_path, "wb") as dst:
+            st = os.fstat(src.fileno())
+            if (st.st_dev, st.st_ino) != end.file_id:
+                raise RuntimeError("Event log was replaced during compaction")
+
+            pos = 0
+            while pos < end.offset:
+                line = src.readline()
+                if not line:
+                    break
+                pos += len(line)
+                try:
+                    task_id = json.loads(line)["task_id"]
+                except (json.JSONDecodeError, UnicodeDecodeError, KeyError):
+                    continue
+                if task_id not in terminal:
+                    dst.write(line)
+            dst.flush()
+            new_st = os.fstat(dst.fileno())  # os.replace 保留 inode
+            new_cursor = LogCursor(dst.tell(), (new_st.st_dev, new_st.st_ino))
+
+            # 3. 提交前先写 manifest 和指向新文件的快照（见模块说明的提交顺序）
+            manifest = _load_manifest(archive_dir)
+            manifest["segments"].append({
+                "file": segment_name,
+                "created_at": datetime.utcnow().isoformat() + "Z",
+                "tasks": len(terminal),
+                "states": archived_states,
+                "replaces": list(end.file_id),
+            })
+            _save_manifest(archive_dir, manifest)
+            kept = {
+                task_id: task
+                for task_id, task in state._state_cache.items()
+                if task_id not in terminal
+            }
+            state.save_snapshot(tasks=kept, cursor=new_cursor, head_path=tmp_path, keep_previous=True)
+
+            # 4. 压缩期间追加的 events 原样保留：先无锁复制大部分，
+            #    再在排他锁下复制最后一段并替换（提交点），期间追加者等待
+            _copy_rest(src, dst)
+            with event_log.lock(exclusive=True):
+                _copy_rest(src, dst)
+                dst.flush()
+                os.replace(tmp_path, log_path)
+
+        state._cursor = new_cursor
+        dropped = state.drop_tasks(terminal)
+        state.previous_snapshot_path.unlink(missing_ok=True)
+        new_stat = os.stat(log_path)
+
+    result.update(
+        archived_tasks=len(terminal),
+        archived_states=dropped,
+        segment=segment_name,
+        bytes_after=new_stat.st_size,
+    )
+    return result
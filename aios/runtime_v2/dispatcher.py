@@ -2,90 +2,307 @@
 Dispatcher - Runtime Kernel
 
 职责：
-- tick() → 扫描 pending tasks + 检查 worker capacity + spawn worker
-- 不做 queue logic / state logic / event logic
+- tick() → 回收已结束的任务 + 检查超时 + 按空闲 slot 从 pending 索引取任务执行
+- 拥有一个有界执行器：最多 max_workers 个任务同时执行
+- 不做 queue logic / state logic
 
-Scheduling 策略（第一版）：
-- FIFO（先进先出）
-- 不做 priority scheduling（等有真实负载再加）
+Scheduling 策略：
+- priority（high / normal / low）+ aging，见 scheduling.PendingIndex
+- 索引随 StateProjection 的状态变化增量维护，tick 不再扫描/排序全部 pending
+- 每次 tick 的选择成本 O(k)（k = 填充的 slot 数，优先级数为常数）
 - worker capacity = 5（最多 5 个并发任务）
+
+执行器：
+- 每种 task type 可选 "thread"（默认）或 "process"
+  （CPU 密集/需要隔离的任务用进程池，worker 必须能在子进程里由 worker_factory 重建）
+- 每种 task type 可设置超时（timeouts），超时写入 task_timeout event
+- 超时任务无法强制中断：它继续占用 slot 直到真正返回，之后的 completed/failed
+  event 会被 StateProjection 忽略（timeout 是最终状态）
 """
 
-from typing import List, Dict, Any
+import copy
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Any, Optional
 import time
 
-from .state import get_state
-from .event_log import get_event_log
+from .state import StateProjection, get_state
+from .event_log import EventLog, get_event_log
+from .worker import get_worker
+from .scheduling import PendingIndex
+
+EXECUTOR_KINDS = ("thread", "process")
+
+
+def _execute_task(worker_factory: Callable[[], Any], task: Dict[str, Any],
+                  log_path: Optional[str] = None) -> bool:
+    """
+    在执行器里运行一个任务（线程/子进程共用，必须是模块级函数才能被 pickle）
+    """
+    worker = worker_factory()
+    if log_path and Path(worker.event_log.log_path) != Path(log_path):
+        # worker_factory 可能返回全局单例：复制一份再换 event log
+        worker = copy.copy(worker)
+        worker.event_log = EventLog(log_path=Path(log_path))
+    return worker.execute(task)
+
+
+class _Slot:
+    """一个执行中的任务"""
+    __slots__ = ("task_id", "task_type", "future", "started", "deadline", "timed_out")
+
+    def __init__(self, task_id: str, task_type: str, future: Future,
+                 started: float, deadline: Optional[float]):
+        self.task_id = task_id
+        self.task_type = task_type
+        self.future = future
+        self.started = started
+        self.deadline = deadline
+        self.timed_out = False
 
 
 class Dispatcher:
-    def __init__(self, max_workers: int = 5):
-        self.state = get_state()
-        self.event_log = get_event_log()
+    def __init__(
+        self,
+        max_workers: int = 5,
+        worker_factory: Callable[[], Any] = get_worker,
+        executor_types: Optional[Dict[str, str]] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: Optional[float] = 300.0,
+        aging_seconds: float = 60.0,
+        state: Optional[StateProjection] = None,
+        event_log: Optional[EventLog] = None,
+    ):
+        """
+        Args:
+            max_workers: 并发 slot 数（线程池 + 进程池合计）
+            worker_factory: 返回带 execute(task) 的 worker；进程池下必须可 pickle（模块级函数）
+            executor_types: task type → "thread" | "process"，未列出的用 "thread"
+            timeouts: task type → 超时秒数
+            default_timeout: 未列出 task type 的超时（None = 不限）
+            aging_seconds: 每等待多少秒提升一个优先级
+        """
+        for kind in (executor_types or {}).values():
+            if kind not in EXECUTOR_KINDS:
+                raise ValueError(f"Unknown executor kind: {kind}")
+
+        self.state = state or get_state()
+        self.event_log = event_log or get_event_log()
         self.max_workers = max_workers
-    
+        self.worker_factory = worker_factory
+        self.executor_types = dict(executor_types or {})
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+
+        self._executors: Dict[str, Executor] = {}
+        self._slots: Dict[str, _Slot] = {}
+        # slot 利用率统计（busy slot-seconds / 总 slot-seconds）
+        self._created = time.monotonic()
+        self._last_sample = self._created
+        self._busy_slot_seconds = 0.0
+        self._completed = 0
+        self._timed_out = 0
+
+        # pending 索引：启动时按创建时间灌入一次，之后只接收状态变化
+        self._pending_index = PendingIndex(aging_seconds=aging_seconds)
+        self.state.add_listener(self._on_transition)
+        for task in sorted(
+            self.state.list_pending_tasks(),
+            key=lambda t: t.get("timings", {}).get("created_at") or 0,
+        ):
+            self._pending_index.push(task)
+
+    def _on_transition(self, task: Dict[str, Any], old_state: Optional[str]) -> None:
+        if task["state"] == "pending":
+            self._pending_index.push(task)
+
+    def _is_dispatchable(self, task: Dict[str, Any]) -> bool:
+        return task["state"] == "pending" and task["task_id"] not in self._slots
+
+    def _executor_for(self, task_type: str) -> Executor:
+        kind = self.executor_types.get(task_type, "thread")
+        executor = self._executors.get(kind)
+        if executor is None:
+            if kind == "process":
+                executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="runtime-worker"
+                )
+            self._executors[kind] = executor
+        return executor
+
+    def _timeout_for(self, task_type: str) -> Optional[float]:
+        return self.timeouts.get(task_type, self.default_timeout)
+
+    def _sample_utilization(self, now: float) -> None:
+        self._busy_slot_seconds += len(self._slots) * (now - self._last_sample)
+        self._last_sample = now
+
     def tick(self) -> Dict[str, Any]:
         """
         Dispatcher 主循环（一次 tick）
-        
+
         流程：
-        1. 扫描 pending tasks
-        2. 检查 worker capacity
-        3. spawn worker（如果有空位）
-        
+        1. 回收已结束的任务
+        2. 检查超时（写 task_timeout）
+        3. 从 pending 索引取出最多 k 个任务（k = 空闲 slot）
+        4. 提交执行
+
         Returns:
             {
                 "pending": 3,
                 "running": 2,
-                "spawned": 1
+                "spawned": 1,
+                "finished": 4,
+                "timed_out": 0,
+                "slots": 5,
+                "utilization": 0.6
             }
         """
-        pending_tasks = self.state.list_pending_tasks()
-        running_tasks = self.state.list_running_tasks()
-        
+        now = time.monotonic()
+        self._sample_utilization(now)
+        finished = self._reap()
+        timed_out = self._check_timeouts(now)
+
+        # 应用新 events（新的 pending 任务经 listener 进入索引）
+        pending = self.state.count_tasks("pending")
+
         # 检查 worker capacity
-        available_slots = self.max_workers - len(running_tasks)
-        
+        available_slots = self.max_workers - len(self._slots)
+
         spawned = 0
-        if available_slots > 0 and len(pending_tasks) > 0:
-            # FIFO：按 created_at 排序
-            pending_tasks.sort(key=lambda t: t["task_data"]["created_at"])
-            
-            # Spawn workers
-            for task in pending_tasks[:available_slots]:
+        if available_slots > 0 and pending > 0:
+            # priority + aging：只取 available_slots 个
+            for task in self._pending_index.pop_many(available_slots, self._is_dispatchable):
                 self.spawn_worker(task)
                 spawned += 1
-        
+
         return {
-            "pending": len(pending_tasks),
-            "running": len(running_tasks),
-            "spawned": spawned
+            "pending": pending,
+            "running": len(self._slots),
+            "spawned": spawned,
+            "finished": finished,
+            "timed_out": timed_out,
+            "slots": self.max_workers,
+            "utilization": self.utilization(),
         }
-    
+
     def spawn_worker(self, task: Dict[str, Any]) -> None:
         """
         Spawn 一个 worker 执行任务
-        
-        实际上应该：
+
         1. 写入 task_started event
-        2. 调用 worker.execute(task)
-        
-        第一版先只写 event，worker 逻辑在 Step 5 实现
+        2. 提交到对应执行器，worker.execute(task) 写入 completed/failed event
         """
         task_id = task["task_id"]
-        
+        task_type = task["task_data"].get("type", "unknown")
+        kind = self.executor_types.get(task_type, "thread")
+
         # 写入 task_started event
         self.event_log.append_event(
             event_type="task_started",
             task_id=task_id,
             data={
                 "started_at": time.time(),
-                "worker_id": f"worker-{task_id}"
+                "worker_id": f"{kind}-worker-{task_id}"
             }
         )
-        
-        # TODO: 调用 worker.execute(task)
-        print(f"[DISPATCHER] Spawned worker for task: {task_id}")
+
+        job = {"task_id": task_id, "task_data": task["task_data"]}
+        future = self._executor_for(task_type).submit(
+            _execute_task, self.worker_factory, job, str(self.event_log.log_path)
+        )
+
+        started = time.monotonic()
+        timeout = self._timeout_for(task_type)
+        deadline = started + timeout if timeout is not None else None
+        self._slots[task_id] = _Slot(task_id, task_type, future, started, deadline)
+        print(f"[DISPATCHER] Spawned {kind} worker for task: {task_id}")
+
+    def _reap(self) -> int:
+        """回收已结束的任务，释放 slot"""
+        done = [slot for slot in self._slots.values() if slot.future.done()]
+        for slot in done:
+            del self._slots[slot.task_id]
+            self._completed += 1
+            error = slot.future.exception() if not slot.future.cancelled() else None
+            if error is not None and not slot.timed_out:
+                # worker 自己会写 failed event；这里只兜底执行器层面的错误（如子进程崩溃）
+                self.event_log.append_event(
+                    event_type="task_failed",
+                    task_id=slot.task_id,
+                    data={"failed_at": time.time(), "error": f"{type(error).__name__}: {error}"}
+                )
+                print(f"[DISPATCHER] Task crashed: {slot.task_id} - {error}")
+        return len(done)
+
+    def _check_timeouts(self, now: float) -> int:
+        """超时任务写入 task_timeout（slot 在任务真正返回后才释放）"""
+        timed_out = 0
+        for slot in self._slots.values():
+            if slot.timed_out or slot.deadline is None or now < slot.deadline:
+                continue
+            slot.timed_out = True
+            slot.future.cancel()
+            timed_out += 1
+            self._timed_out += 1
+            self.event_log.append_event(
+                event_type="task_timeout",
+                task_id=slot.task_id,
+                data={
+                    "timed_out_at": time.time(),
+                    "timeout_s": self._timeout_for(slot.task_type),
+                }
+            )
+            print(f"[DISPATCHER] Task timed out: {slot.task_id}")
+        return timed_out
+
+    def utilization(self) -> float:
+        """当前 slot 利用率（0.0 - 1.0）"""
+        return len(self._slots) / self.max_workers if self.max_workers > 0 else 0
+
+    def slot_stats(self) -> Dict[str, Any]:
+        """
+        slot 利用率统计
+
+        Returns:
+            {
+                "slots": 5,
+                "busy": 3,
+                "utilization": 0.6,
+                "avg_utilization": 0.42,   # 自创建以来的平均利用率
+                "by_type": {"code": 2, "analysis": 1},
+                "finished": 120,
+                "timed_out": 2
+            }
+        """
+        now = time.monotonic()
+        self._sample_utilization(now)
+        elapsed = now - self._created
+        by_type: Dict[str, int] = {}
+        for slot in self._slots.values():
+            by_type[slot.task_type] = by_type.get(slot.task_type, 0) + 1
+        return {
+            "slots": self.max_workers,
+            "busy": len(self._slots),
+            "utilization": self.utilization(),
+            "avg_utilization": (
+                self._busy_slot_seconds / (elapsed * self.max_workers)
+                if elapsed > 0 and self.max_workers > 0 else 0
+            ),
+            "by_type": by_type,
+            "finished": self._completed,
+            "timed_out": self._timed_out,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭执行器"""
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait)
+        self._executors.clear()
+        if wait:
+            self._reap()
 
 
 # 全局单例
@@ -2,10 +2,20 @@
 Event Log - Append-Only Event Storage
 
 职责：
-- 只做两件事：append_event() 和 read_events()
+- 只做两件事：append_event() 和 read_events() / read_since()
 - 不做 filter / state / queue logic
 - 每个 event 有 event_id（uuid4）
 
+增量读取（tail）：
+- read_since(cursor) 只解析 cursor 之后新增的完整行，返回 (events, new_cursor)
+- cursor = 字节偏移 + 文件标识（st_dev, st_ino）
+- 最后一行尚未写完（没有换行符）时不消费，下次再读
+- 文件被轮转/重写（标识变化或文件变短）时从新文件开头读
+
+并发：
+- append_event 持有 <log>.lock 的共享锁写入；compaction 替换文件前取排他锁，
+  保证替换期间没有写入落到旧文件上
+
 Event Schema:
 {
     "event_id": "uuid4",
@@ -17,10 +27,25 @@ Event Schema:
 """
 
 import json
+import os
 import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows：不做跨进程锁
+    fcntl = None
+
+
+@dataclass(frozen=True)
+class LogCursor:
+    """event log 的读取位置（字节偏移 + 文件标识）"""
+    offset: int = 0
+    file_id: Optional[Tuple[int, int]] = None
 
 
 class EventLog:
@@ -33,6 +58,24 @@ class EventLog:
         # 如果文件不存在，创建空文件
         if not self.log_path.exists():
             self.log_path.touch()
+        self.lock_path = self.log_path.with_suffix(".lock")
+    
+    @contextmanager
+    def lock(self, exclusive: bool = False):
+        """
+        跨进程锁（flock，进程退出时自动释放）
+        
+        Args:
+            exclusive: False = 追加者共享；True = 替换日志文件时独占
+        """
+        with open(self.lock_path, "a") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
     
     def append_event(self, event_type: str, task_id: str, data: Dict[str, Any] = None) -> str:
         """
@@ -55,8 +98,10 @@ class EventLog:
             "data": data or {}
         }
         
-        with open(self.log_path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self.lock():
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line)
         
         return event_id
     
@@ -67,20 +112,69 @@ class EventLog:
         Returns:
             List of events（按时间顺序）
         """
-        events = []
-        if not self.log_path.exists():
-            return events
+        events, _ = self.read_since(LogCursor())
+        return events
+    
+    def read_since(
+        self, cursor: Union[LogCursor, int, None] = None
+    ) -> Tuple[List[Dict[str, Any]], LogCursor]:
+        """
+        读取 cursor 之后追加的 events（增量 tail）
         
-        with open(self.log_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    try:
-                        events.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue
+        Args:
+            cursor: 上次返回的 LogCursor（或字节偏移）；None 表示从头读
         
-        return events
+        Returns:
+            (新 events, 新 cursor)
+        """
+        if cursor is None:
+            cursor = LogCursor()
+        elif isinstance(cursor, int):
+            cursor = LogCursor(offset=cursor)
+        
+        try:
+            f = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return [], LogCursor()
+        
+        with f:
+            st = os.fstat(f.fileno())
+            file_id = (st.st_dev, st.st_ino)
+            offset = cursor.offset
+            
+            # 轮转/重写：换了文件或文件变短 → 从新文件开头读
+            if (cursor.file_id is not None and cursor.file_id != file_id) or st.st_size < offset:
+                offset = 0
+            
+            if st.st_size == offset:
+                return [], LogCursor(offset, file_id)
+            
+            f.seek(offset)
+            data = f.read(st.st_size - offset)
+        
+        # 只消费完整的行（最后一行可能还在写）
+        end = data.rfind(b"\n")
+        if end < 0:
+            return [], LogCursor(offset, file_id)
+        
+        events = []
+        for line in data[:end].split(b"\n"):
+            line = line.strip()
+            if line:
+                try:
+                    events.append(json.loads(line))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+        
+        return events, LogCursor(offset + end + 1, file_id)
+    
+    def end_cursor(self) -> LogCursor:
+        """当前文件末尾的 cursor"""
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return LogCursor()
+        return LogCursor(st.st_size, (st.st_dev, st.st_ino))
 
 
 # 全局单例
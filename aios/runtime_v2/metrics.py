@@ -6,20 +6,20 @@ Runtime Instrumentation - Telemetry & Metrics
 2. Execution time (task_completed - task_started)
 3. Throughput (tasks / minute)
 4. Worker utilization (running_workers / max_workers)
+
+所有数据来自 StateProjection 增量维护的时间索引与 sketch：
+单任务查询 O(1)，get_all_metrics() 与任务数/日志长度无关。
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
-from collections import defaultdict
+import time
+from typing import Dict, List, Any, Optional
 
-from .event_log import get_event_log
-from .state import get_state
+from .state import StateProjection, get_state
 
 
 class RuntimeMetrics:
-    def __init__(self):
-        self.event_log = get_event_log()
-        self.state = get_state()
+    def __init__(self, state: Optional[StateProjection] = None):
+        self.state = state or get_state()
     
     def get_queue_wait_time(self, task_id: str) -> float:
         """
@@ -28,20 +28,9 @@ class RuntimeMetrics:
         Returns:
             wait_time (seconds) or None
         """
-        events = self.event_log.read_events()
-        
-        task_created_time = None
-        task_started_time = None
-        
-        for event in events:
-            if event["task_id"] == task_id:
-                if event["event_type"] == "task_created":
-                    task_created_time = datetime.fromisoformat(event["timestamp"].replace("Z", ""))
-                elif event["event_type"] == "task_started":
-                    task_started_time = datetime.fromisoformat(event["timestamp"].replace("Z", ""))
-        
-        if task_created_time and task_started_time:
-            return (task_started_time - task_created_time).total_seconds()
+        timings = self.state.get_task_timings(task_id)
+        if timings and timings["created_at"] is not None and timings["started_at"] is not None:
+            return timings["started_at"] - timings["created_at"]
         return None
     
     def get_execution_time(self, task_id: str) -> float:
@@ -51,20 +40,9 @@ class RuntimeMetrics:
         Returns:
             execution_time (seconds) or None
         """
-        events = self.event_log.read_events()
-        
-        task_started_time = None
-        task_completed_time = None
-        
-        for event in events:
-            if event["task_id"] == task_id:
-                if event["event_type"] == "task_started":
-                    task_started_time = datetime.fromisoformat(event["timestamp"].replace("Z", ""))
-                elif event["event_type"] in ["task_completed", "task_failed", "task_timeout"]:
-                    task_completed_time = datetime.fromisoformat(event["timestamp"].replace("Z", ""))
-        
-        if task_started_time and task_completed_time:
-            return (task_completed_time - task_started_time).total_seconds()
+        timings = self.state.get_task_timings(task_id)
+        if timings and timings["started_at"] is not None and timings["finished_at"] is not None:
+            return timings["finished_at"] - timings["started_at"]
         return None
     
     def get_throughput(self, window_minutes: int = 5) -> float:
@@ -72,24 +50,18 @@ class RuntimeMetrics:
         计算吞吐量（tasks / minute）
         
         Args:
-            window_minutes: 时间窗口（分钟）
+            window_minutes: 时间窗口（分钟，按分钟分桶，含当前分钟）
         
         Returns:
             throughput (tasks/min)
         """
-        events = self.event_log.read_events()
-        
-        now = datetime.utcnow()
-        window_start = now - timedelta(minutes=window_minutes)
-        
-        completed_count = 0
-        for event in events:
-            if event["event_type"] in ["task_completed", "task_failed"]:
-                event_time = datetime.fromisoformat(event["timestamp"].replace("Z", ""))
-                if event_time >= window_start:
-                    completed_count += 1
-        
-        return completed_count / window_minutes if window_minutes > 0 else 0
+        self.state._project_state()
+        return self.state.throughput.rate(time.time(), window_minutes)
+    
+    def get_throughput_per_minute(self, window_minutes: int = 60) -> List[int]:
+        """最近 window_minutes 分钟每分钟完成的任务数（从旧到新）"""
+        self.state._project_state()
+        return self.state.throughput.per_minute(time.time(), window_minutes)
     
     def get_worker_utilization(self, max_workers: int = 5) -> float:
         """
@@ -98,8 +70,8 @@ class RuntimeMetrics:
         Returns:
             utilization (0.0 - 1.0)
         """
-        running_tasks = self.state.list_running_tasks()
-        return len(running_tasks) / max_workers if max_workers > 0 else 0
+        running = self.state.count_tasks("running")
+        return running / max_workers if max_workers > 0 else 0
     
     def get_all_metrics(self) -> Dict[str, Any]:
         """
@@ -108,7 +80,13 @@ class RuntimeMetrics:
         Returns:
             {
                 "queue_wait_time_avg": 1.23,
+                "queue_wait_time_p50": 1.0,
+                "queue_wait_time_p95": 3.2,
+                "queue_wait_time_p99": 4.8,
                 "execution_time_avg": 0.45,
+                "execution_time_p50": ...,
+                "execution_time_p95": ...,
+                "execution_time_p99": ...,
                 "throughput": 12.5,
                 "worker_utilization": 0.6,
                 "pending_tasks": 3,
@@ -117,35 +95,25 @@ class RuntimeMetrics:
                 "failed_tasks": 1
             }
         """
-        # 计算平均队列等待时间
-        completed_tasks = self.state.list_completed_tasks()
-        failed_tasks = self.state.list_failed_tasks()
-        all_finished = completed_tasks + failed_tasks
-        
-        wait_times = []
-        exec_times = []
+        self.state._project_state()
+        wait = self.state.wait_sketch.summary()
+        execution = self.state.exec_sketch.summary()
         
-        for task in all_finished:
-            task_id = task["task_id"]
-            
-            wait_time = self.get_queue_wait_time(task_id)
-            if wait_time is not None:
-                wait_times.append(wait_time)
-            
-            exec_time = self.get_execution_time(task_id)
-            if exec_time is not None:
-                exec_times.append(exec_time)
+        metrics = {}
+        for prefix, summary in (("queue_wait_time", wait), ("execution_time", execution)):
+            metrics[f"{prefix}_avg"] = summary["avg"]
+            for q in ("p50", "p95", "p99"):
+                metrics[f"{prefix}_{q}"] = summary[q] or 0
         
-        return {
-            "queue_wait_time_avg": sum(wait_times) / len(wait_times) if wait_times else 0,
-            "execution_time_avg": sum(exec_times) / len(exec_times) if exec_times else 0,
+        metrics.update({
             "throughput": self.get_throughput(window_minutes=5),
             "worker_utilization": self.get_worker_utilization(),
-            "pending_tasks": len(self.state.list_pending_tasks()),
-            "running_tasks": len(self.state.list_running_tasks()),
-            "completed_tasks": len(completed_tasks),
-            "failed_tasks": len(failed_tasks)
-        }
+            "pending_tasks": self.state.count_tasks("pending"),
+            "running_tasks": self.state.count_tasks("running"),
+            "completed_tasks": self.state.count_tasks("completed"),
+            "failed_tasks": self.state.count_tasks("failed")
+        })
+        return metrics
     
     def print_metrics(self):
         """打印所有指标"""
@@ -154,8 +122,12 @@ class RuntimeMetrics:
         print("=" * 60)
         print("Runtime Metrics")
         print("=" * 60)
-        print(f"Queue Wait Time (avg): {metrics['queue_wait_time_avg']:.3f}s")
-        print(f"Execution Time (avg): {metrics['execution_time_avg']:.3f}s")
+        print(f"Queue Wait Time (avg): {metrics['queue_wait_time_avg']:.3f}s  "
+              f"p50={metrics['queue_wait_time_p50']:.3f}s p95={metrics['queue_wait_time_p95']:.3f}s "
+              f"p99={metrics['queue_wait_time_p99']:.3f}s")
+        print(f"Execution Time (avg): {metrics['execution_time_avg']:.3f}s  "
+              f"p50={metrics['execution_time_p50']:.3f}s p95={metrics['execution_time_p95']:.3f}s "
+              f"p99={metrics['execution_time_p99']:.3f}s")
         print(f"Throughput: {metrics['throughput']:.2f} tasks/min")
         print(f"Worker Utilization: {metrics['worker_utilization']:.1%}")
         print()
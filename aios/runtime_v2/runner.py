@@ -2,7 +2,7 @@
 Runtime Runner - Shadow Loop
 
 职责：
-- 运行 dispatcher.tick() 循环
+- 运行 dispatcher.tick() 循环（任务由 dispatcher 的执行器并发执行）
 - 不做任何业务逻辑
 
 运行模式：
@@ -16,13 +16,11 @@ import signal
 import sys
 
 from .dispatcher import get_dispatcher
-from .worker import get_worker
 
 
 class RuntimeRunner:
     def __init__(self, tick_interval: int = 5):
         self.dispatcher = get_dispatcher()
-        self.worker = get_worker()
         self.tick_interval = tick_interval
         self.running = False
     
@@ -49,22 +47,15 @@ class RuntimeRunner:
             print(f"  Pending: {result['pending']}")
             print(f"  Running: {result['running']}")
             print(f"  Spawned: {result['spawned']}")
-            
-            # 如果有 spawned 任务，立即执行（第一版同步执行）
-            # 未来可以改成异步执行
-            if result['spawned'] > 0:
-                from .state import get_state
-                state = get_state()
-                running_tasks = state.list_running_tasks()
-                
-                for task in running_tasks:
-                    # 只执行刚刚 spawned 的任务（last_event 是 task_started）
-                    if task["last_event"]["event_type"] == "task_started":
-                        self.worker.execute(task)
+            print(f"  Finished: {result['finished']}")
+            if result['timed_out']:
+                print(f"  Timed out: {result['timed_out']}")
+            print(f"  Slots: {result['running']}/{result['slots']} ({result['utilization']:.0%})")
             
             print()
             time.sleep(self.tick_interval)
         
+        self.dispatcher.shutdown(wait=True)
         print("[RUNTIME] Runtime loop stopped")
     
     def stop(self):
@@ -75,6 +66,7 @@ class RuntimeRunner:
         """信号处理（Ctrl+C）"""
         print("\n[RUNTIME] Received stop signal, shutting down...")
         self.stop()
+        self.dispatcher.shutdown(wait=False)
         sys.exit(0)
 
 
@@ -0,0 +1,107 @@
+"""
+Scheduling - Pending 任务的优先级/老化索引
+
+Dispatcher 每次 tick 只需要取出 k 个最该执行的任务，不再对全部 pending 排序。
+
+调度分数（越小越优先）：
+    score = priority_level - wait_seconds / aging_seconds
+- priority_level: high=0 / normal=1 / low=2（未知优先级按 normal）
+- 每等待 aging_seconds 提升一个优先级：低优先级任务不会饿死
+- 同分按创建时间（FIFO）
+
+实现：
+- 每个优先级一个按 (创建时间, 到达序号) 排序的最小堆：乱序到达（多进程写入、
+  快照重新播种）也只是 O(log n) 的 heappush
+- 同一优先级里堆顶等待最久，分数一定最小 → 只需比较各优先级的堆顶
+- 取一个任务 O(levels + log n)；任务离开 pending（被其他进程启动等）时惰性删除
+"""
+
+import heapq
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+PRIORITY_LEVELS = {"high": 0, "normal": 1, "low": 2}
+DEFAULT_LEVEL = PRIORITY_LEVELS["normal"]
+
+
+def priority_level(task: Dict[str, Any]) -> int:
+    return PRIORITY_LEVELS.get(task["task_data"].get("priority"), DEFAULT_LEVEL)
+
+
+class PendingIndex:
+    """
+    pending 任务索引
+
+    用法：
+        index = PendingIndex(aging_seconds=60)
+        index.push(task)
+        task = index.pop(is_live=lambda t: t["state"] == "pending")
+    """
+
+    def __init__(self, aging_seconds: float = 60.0, clock: Callable[[], float] = time.time):
+        self.aging_seconds = aging_seconds
+        self._clock = clock
+        # level → heap[(created_at, seq, task)]（seq 唯一，比较不会落到 task dict）
+        self._levels: Dict[int, List[Tuple[float, int, Dict[str, Any]]]] = {
+            level: [] for level in sorted(set(PRIORITY_LEVELS.values()))
+        }
+        self._queued: Set[str] = set()
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._queued
+
+    def push(self, task: Dict[str, Any]) -> None:
+        """加入一个 pending 任务（重复加入忽略）"""
+        task_id = task["task_id"]
+        if task_id in self._queued:
+            return
+        self._queued.add(task_id)
+
+        created_at = task.get("timings", {}).get("created_at")
+        if created_at is None:
+            created_at = self._clock()
+        self._seq += 1
+        heapq.heappush(self._levels[priority_level(task)], (created_at, self._seq, task))
+
+    def pop(self, is_live: Callable[[Dict[str, Any]], bool]) -> Optional[Dict[str, Any]]:
+        """
+        取出分数最小的任务
+
+        Args:
+            is_live: 任务是否仍然可调度（不是则丢弃）
+
+        Returns:
+            task or None
+        """
+        now = self._clock()
+        best_level = None
+        best_key = None
+        for level, heap in self._levels.items():
+            while heap and not is_live(heap[0][2]):
+                self._queued.discard(heapq.heappop(heap)[2]["task_id"])
+            if not heap:
+                continue
+            created_at, seq, _ = heap[0]
+            score = level - (now - created_at) / self.aging_seconds
+            key = (score, created_at, seq)
+            if best_key is None or key < best_key:
+                best_level, best_key = level, key
+        if best_level is None:
+            return None
+        task = heapq.heappop(self._levels[best_level])[2]
+        self._queued.discard(task["task_id"])
+        return task
+
+    def pop_many(self, k: int, is_live: Callable[[Dict[str, Any]], bool]) -> List[Dict[str, Any]]:
+        """取出最多 k 个任务"""
+        tasks = []
+        while len(tasks) < k:
+            task = self.pop(is_live)
+            if task is None:
+                break
+            tasks.append(task)
+        return tasks
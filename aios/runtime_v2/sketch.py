@@ -0,0 +1,147 @@
+"""
+Streaming Sketches - 常数空间的运行时统计
+
+- QuantileSketch: 对数分桶的分位数估计（相对误差 ≤ relative_accuracy），
+  桶数只与数值范围有关（1ms ~ 1 天 约 1000 个桶），与样本数无关
+- MinuteCounter: 按分钟分桶的计数器，只保留最近 retention_minutes 分钟
+
+两者都可以 to_dict() / from_dict()，随投影快照一起持久化。
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+
+class QuantileSketch:
+    """对数分桶分位数 sketch（DDSketch 风格）"""
+
+    # 小于该值的样本（含 0 和时钟回拨导致的负数）计入 zero 桶
+    MIN_VALUE = 1e-6
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: Dict[int, int] = {}
+        self._zero = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        """添加一个样本"""
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value < self.MIN_VALUE:
+            self._zero += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        估计分位数
+
+        Args:
+            q: 0.0 - 1.0
+
+        Returns:
+            估计值；没有样本时返回 None
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self._zero
+        if rank < seen:
+            return max(self.min, 0.0)
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if rank < seen:
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        """count / avg / p50 / p95 / p99"""
+        return {
+            "count": self.count,
+            "avg": self.mean(),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "buckets": {str(k): v for k, v in self._buckets.items()},
+            "zero": self._zero,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data.get("relative_accuracy", 0.01))
+        sketch._buckets = {int(k): v for k, v in data.get("buckets", {}).items()}
+        sketch._zero = data.get("zero", 0)
+        sketch.count = data.get("count", 0)
+        sketch.total = data.get("total", 0.0)
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+
+class MinuteCounter:
+    """按分钟分桶的滑动计数"""
+
+    def __init__(self, retention_minutes: int = 24 * 60):
+        self.retention_minutes = retention_minutes
+        self._counts: Dict[int, int] = {}
+        self._latest = 0
+
+    def add(self, timestamp: float, count: int = 1) -> None:
+        """记录一次事件（timestamp: epoch 秒）"""
+        minute = int(timestamp // 60)
+        if minute <= self._latest - self.retention_minutes:
+            return
+        self._counts[minute] = self._counts.get(minute, 0) + count
+        if minute > self._latest:
+            self._latest = minute
+            if len(self._counts) > self.retention_minutes:
+                cutoff = minute - self.retention_minutes
+                for old in [m for m in self._counts if m <= cutoff]:
+                    del self._counts[old]
+
+    def per_minute(self, now: float, minutes: int) -> List[int]:
+        """最近 minutes 分钟（含当前分钟）每分钟的计数，从旧到新"""
+        current = int(now // 60)
+        return [self._counts.get(m, 0) for m in range(current - minutes + 1, current + 1)]
+
+    def rate(self, now: float, minutes: int) -> float:
+        """最近 minutes 分钟的平均每分钟计数"""
+        if minutes <= 0:
+            return 0
+        return sum(self.per_minute(now, minutes)) / minutes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "retention_minutes": self.retention_minutes,
+            "counts": {str(k): v for k, v in self._counts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MinuteCounter":
+        counter = cls(data.get("retention_minutes", 24 * 60))
+        counter._counts = {int(k): v for k, v in data.get("counts", {}).items()}
+        counter._latest = max(counter._counts, default=0)
+        return counter
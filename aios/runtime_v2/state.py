@@ -8,27 +8,244 @@ State Projection - Event Log → Current State
 
 实现方式：
 events → group by task_id → last event → state
+- 通过 EventLog.read_since(cursor) 只读取新增 events（O(delta)）
+- 按状态分桶，list_*_tasks 只遍历对应状态的任务
+
+快照（snapshot）：
+- 每 snapshot_every 个新 events 把 _state_cache + cursor 写入快照文件：
+  投影线程只复制任务 dict，序列化和写文件在后台线程完成（同一时间最多一个）
+- 启动时加载快照，只回放 cursor 之后的尾部
+- 快照与当前日志文件不匹配（被重写/截断）时改用压缩前的 .prev 快照，
+  都不匹配才丢弃快照，全量回放
+- 已压缩进归档段的终态任务只保留计数（archived_counts），见 compaction.py；
+  压缩之后才到的 task_completed / task_failed（如超时任务的 worker 晚返回）
+  找不到任务时忽略，不会生成空的幽灵任务
+
+时间索引与统计：
+- 每个任务的 task["timings"] = {created_at, started_at, finished_at}（epoch 秒）
+- wait_sketch / exec_sketch：等待时间、执行时间的分位数 sketch
+- throughput：completed/failed 的每分钟计数
+- 统计随快照持久化；快照失效全量回放时，只能从 live log 重建
 
 State Machine:
 task_created → pending
 task_started → running
 task_completed → completed
 task_failed → failed
-task_timeout → timeout
+task_timeout → timeout（最终状态，之后的 completed/failed 忽略）
 """
 
-from typing import Dict, List, Any
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Optional
 from collections import defaultdict
 
-from .event_log import get_event_log
+from .event_log import EventLog, LogCursor, get_event_log
+from .compaction import archive_dir_for, load_archive_counts, recover_archive
+from .sketch import MinuteCounter, QuantileSketch
+
+SNAPSHOT_VERSION = 2
+# 快照记录日志开头若干字节的摘要：inode 可能被复用，单靠文件标识不够
+HEAD_BYTES = 1024
+
+# 状态映射
+STATE_MAP = {
+    "task_created": "pending",
+    "task_started": "running",
+    "task_completed": "completed",
+    "task_failed": "failed",
+    "task_timeout": "timeout",
+}
+
+
+TERMINAL_STATES = ("completed", "failed", "timeout")
+
+
+def parse_timestamp(timestamp: str) -> float:
+    """event 时间戳（ISO + "Z"）→ epoch 秒"""
+    return datetime.fromisoformat(timestamp.rstrip("Z")).replace(tzinfo=timezone.utc).timestamp()
+
+
+def snapshot_path_for(event_log: EventLog) -> Path:
+    """event_log.jsonl → event_log.snapshot.json"""
+    return event_log.log_path.with_suffix(".snapshot.json")
 
 
 class StateProjection:
-    def __init__(self):
-        self.event_log = get_event_log()
+    def __init__(
+        self,
+        event_log: Optional[EventLog] = None,
+        snapshot_path: Optional[Path] = None,
+        snapshot_every: int = 10000,
+    ):
+        self.event_log = event_log or get_event_log()
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else snapshot_path_for(self.event_log)
+        self.snapshot_every = snapshot_every
         # Incremental projection cache
         self._state_cache: Dict[str, Dict[str, Any]] = {}
-        self._last_offset: int = 0  # 上次读取到的 event 数量
+        # state → {task_id: task}（与 _state_cache 共享 task dict）
+        self._by_state: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        self._cursor = LogCursor()  # 上次读取到的字节位置
+        self._events_since_snapshot = 0
+        self._snapshot_thread: Optional[threading.Thread] = None
+        # 状态变化监听：callback(task, old_state)，新任务 old_state 为 None
+        self._listeners: List[Callable[[Dict[str, Any], Optional[str]], None]] = []
+        # 运行时统计（常数空间）
+        self.wait_sketch = QuantileSketch()
+        self.exec_sketch = QuantileSketch()
+        self.throughput = MinuteCounter()
+        # 已归档的终态任务数量（state → count）；先回滚崩溃时未提交的压缩
+        recover_archive(self.event_log)
+        self.archived_counts: Dict[str, int] = load_archive_counts(archive_dir_for(self.event_log))
+        self.load_snapshot()
+    
+    def add_listener(self, callback: Callable[[Dict[str, Any], Optional[str]], None]) -> None:
+        """注册状态变化监听（在 _project_state 应用新 events 时同步调用）"""
+        self._listeners.append(callback)
+    
+    @property
+    def previous_snapshot_path(self) -> Path:
+        """压缩前的快照（压缩在提交前崩溃时回退用）"""
+        return self.snapshot_path.with_suffix(".prev.json")
+    
+    def _head_digest(self, length: int, path: Optional[Path] = None) -> str:
+        try:
+            with open(path or self.event_log.log_path, "rb") as f:
+                return hashlib.sha1(f.read(length)).hexdigest()
+        except FileNotFoundError:
+            return ""
+    
+    def load_snapshot(self) -> bool:
+        """
+        加载快照（cursor 与当前日志文件一致时才生效；不一致时试 .prev 快照）
+        
+        Returns:
+            是否加载成功
+        """
+        return (self._load_snapshot_file(self.snapshot_path)
+                or self._load_snapshot_file(self.previous_snapshot_path))
+    
+    def _load_snapshot_file(self, path: Path) -> bool:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return False
+        cursor = LogCursor(snapshot["offset"], tuple(snapshot["file_id"]))
+        current = self.event_log.end_cursor()
+        if current.file_id != cursor.file_id or current.offset < cursor.offset:
+            return False
+        head_length = min(cursor.offset, HEAD_BYTES)
+        if self._head_digest(head_length) != snapshot.get("head"):
+            return False
+        
+        self._state_cache = snapshot["tasks"]
+        self._by_state = defaultdict(dict)
+        for task_id, task in self._state_cache.items():
+            self._by_state[task["state"]][task_id] = task
+        stats = snapshot.get("stats", {})
+        self.wait_sketch = QuantileSketch.from_dict(stats.get("wait", {}))
+        self.exec_sketch = QuantileSketch.from_dict(stats.get("exec", {}))
+        self.throughput = MinuteCounter.from_dict(stats.get("throughput", {}))
+        self._cursor = cursor
+        self._events_since_snapshot = 0
+        return True
+    
+    def _build_snapshot(
+        self, tasks: Dict[str, Dict[str, Any]], cursor: Optional[LogCursor] = None
+    ) -> Dict[str, Any]:
+        cursor = cursor or self._cursor
+        return {
+            "version": SNAPSHOT_VERSION,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "offset": cursor.offset,
+            "file_id": list(cursor.file_id or (0, 0)),
+            "tasks": tasks,
+            "stats": {
+                "wait": self.wait_sketch.to_dict(),
+                "exec": self.exec_sketch.to_dict(),
+                "throughput": self.throughput.to_dict(),
+            },
+        }
+    
+    def _write_snapshot(
+        self, snapshot: Dict[str, Any], head_path: Optional[Path] = None, keep_previous: bool = False
+    ) -> None:
+        snapshot["head"] = self._head_digest(min(snapshot["offset"], HEAD_BYTES), head_path)
+        if keep_previous and self.snapshot_path.exists():
+            os.replace(self.snapshot_path, self.previous_snapshot_path)
+        tmp_path = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+    
+    def wait_snapshot(self) -> None:
+        """等待后台快照写完"""
+        thread = self._snapshot_thread
+        if thread is not None:
+            thread.join()
+            self._snapshot_thread = None
+    
+    def save_snapshot(
+        self,
+        tasks: Optional[Dict[str, Dict[str, Any]]] = None,
+        cursor: Optional[LogCursor] = None,
+        head_path: Optional[Path] = None,
+        keep_previous: bool = False,
+    ) -> Path:
+        """
+        把当前投影写入快照（先写临时文件再原子替换）
+        
+        压缩在替换 live log 之前调用：tasks / cursor 是替换后的投影，
+        head_path 是即将替换进来的新文件，keep_previous 把旧快照保留为 .prev
+        """
+        self.wait_snapshot()  # 避免较旧的后台快照在之后覆盖本次结果
+        snapshot = self._build_snapshot(self._state_cache if tasks is None else tasks, cursor)
+        self._write_snapshot(snapshot, head_path, keep_previous)
+        self._events_since_snapshot = 0
+        return self.snapshot_path
+    
+    def _save_snapshot_async(self) -> None:
+        """周期快照：复制任务后交给后台线程；上一次还没写完就等下个周期"""
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return
+        # task dict 会被原地更新（state / last_event / timings），需要复制
+        tasks = {
+            task_id: {**task, "timings": dict(task["timings"])}
+            for task_id, task in self._state_cache.items()
+        }
+        snapshot = self._build_snapshot(tasks)
+        self._snapshot_thread = threading.Thread(
+            target=self._write_snapshot, args=(snapshot,),
+            name="state-snapshot", daemon=True,
+        )
+        self._snapshot_thread.start()
+        self._events_since_snapshot = 0
+    
+    def drop_tasks(self, task_ids) -> Dict[str, int]:
+        """
+        从投影中移除任务（压缩归档后调用）
+        
+        Returns:
+            按状态统计的移除数量
+        """
+        dropped: Dict[str, int] = defaultdict(int)
+        for task_id in task_ids:
+            task = self._state_cache.pop(task_id, None)
+            if task is None:
+                continue
+            self._by_state[task["state"]].pop(task_id, None)
+            dropped[task["state"]] += 1
+        for state, count in dropped.items():
+            self.archived_counts[state] = self.archived_counts.get(state, 0) + count
+        return dict(dropped)
     
     def _apply_event(self, event: Dict[str, Any]) -> None:
         """
@@ -36,45 +253,101 @@ class StateProjection:
         """
         task_id = event["task_id"]
         event_type = event["event_type"]
+        task_state = STATE_MAP.get(event_type, "unknown")
 
-        # 状态映射
-        state_map = {
-            "task_created": "pending",
-            "task_started": "running",
-            "task_completed": "completed",
-            "task_failed": "failed",
-            "task_timeout": "timeout",
-        }
-        task_state = state_map.get(event_type, "unknown")
-
-        if task_id not in self._state_cache:
-            self._state_cache[task_id] = {
+        task = self._state_cache.get(task_id)
+        if task is not None and task["state"] == "timeout" and event_type in ("task_completed", "task_failed"):
+            # 超时后 worker 才返回：timeout 是最终状态
+            return
+        if task is None and self.archived_counts and event_type in ("task_completed", "task_failed"):
+            # 任务已在终态时被压缩归档，worker 晚到的结果不再生成新任务
+            return
+        if task is None:
+            task = {
                 "task_id": task_id,
                 "state": task_state,
                 "task_data": {},
-                "last_event": event
+                "last_event": event,
+                "timings": {"created_at": None, "started_at": None, "finished_at": None},
             }
+            self._state_cache[task_id] = task
+            old_state = None
         else:
-            self._state_cache[task_id]["state"] = task_state
-            self._state_cache[task_id]["last_event"] = event
+            old_state = task["state"]
+            self._by_state[old_state].pop(task_id, None)
+            task["state"] = task_state
+            task["last_event"] = event
+        self._by_state[task_state][task_id] = task
 
         # task_created 时保存原始 task_data
         if event_type == "task_created":
-            self._state_cache[task_id]["task_data"] = event.get("data", {})
+            task["task_data"] = event.get("data", {})
+
+        self._record_timing(task, event_type, event.get("timestamp"))
+
+        if old_state != task_state:
+            for callback in self._listeners:
+                callback(task, old_state)
+
+    def _record_timing(self, task: Dict[str, Any], event_type: str, timestamp: Optional[str]) -> None:
+        """更新任务时间索引与统计（每个任务每类时间只记一次，回放幂等）"""
+        if not timestamp:
+            return
+        timings = task["timings"]
+        if event_type == "task_created":
+            if timings["created_at"] is None:
+                timings["created_at"] = parse_timestamp(timestamp)
+        elif event_type == "task_started":
+            if timings["started_at"] is None:
+                timings["started_at"] = parse_timestamp(timestamp)
+                if timings["created_at"] is not None:
+                    self.wait_sketch.add(timings["started_at"] - timings["created_at"])
+        elif event_type in ("task_completed", "task_failed", "task_timeout"):
+            if timings["finished_at"] is None:
+                timings["finished_at"] = parse_timestamp(timestamp)
+                if timings["started_at"] is not None:
+                    self.exec_sketch.add(timings["finished_at"] - timings["started_at"])
+                if event_type != "task_timeout":
+                    self.throughput.add(timings["finished_at"])
 
     def _project_state(self) -> Dict[str, Dict[str, Any]]:
         """
         增量投影：只读取新 events（O(delta) 而非 O(n)）
         """
-        all_events = self.event_log.read_events()
-        new_events = all_events[self._last_offset:]
+        new_events, self._cursor = self.event_log.read_since(self._cursor)
 
         for event in new_events:
             self._apply_event(event)
 
-        self._last_offset = len(all_events)
+        if new_events and self.snapshot_every:
+            self._events_since_snapshot += len(new_events)
+            if self._events_since_snapshot >= self.snapshot_every:
+                self._save_snapshot_async()
+
         return self._state_cache
     
+    def _list(self, state: str) -> List[Dict[str, Any]]:
+        self._project_state()
+        return list(self._by_state[state].values())
+    
+    def count_tasks(self, state: str, include_archived: bool = False) -> int:
+        """某个状态的任务数量（O(1)）"""
+        self._project_state()
+        count = len(self._by_state[state])
+        if include_archived:
+            count += self.archived_counts.get(state, 0)
+        return count
+    
+    def get_task_timings(self, task_id: str) -> Optional[Dict[str, Optional[float]]]:
+        """
+        任务时间索引
+        
+        Returns:
+            {"created_at": ..., "started_at": ..., "finished_at": ...}（epoch 秒）or None
+        """
+        task = self._project_state().get(task_id)
+        return task["timings"] if task else None
+    
     def get_task_state(self, task_id: str) -> Dict[str, Any]:
         """
         获取单个任务的状态
@@ -92,35 +365,19 @@ class StateProjection:
     
     def list_pending_tasks(self) -> List[Dict[str, Any]]:
         """列出所有 pending 任务"""
-        state = self._project_state()
-        return [
-            task for task in state.values()
-            if task["state"] == "pending"
-        ]
+        return self._list("pending")
     
     def list_running_tasks(self) -> List[Dict[str, Any]]:
         """列出所有 running 任务"""
-        state = self._project_state()
-        return [
-            task for task in state.values()
-            if task["state"] == "running"
-        ]
+        return self._list("running")
     
     def list_completed_tasks(self) -> List[Dict[str, Any]]:
         """列出所有 completed 任务"""
-        state = self._project_state()
-        return [
-            task for task in state.values()
-            if task["state"] == "completed"
-        ]
+        return self._list("completed")
     
     def list_failed_tasks(self) -> List[Dict[str, Any]]:
         """列出所有 failed 任务"""
-        state = self._project_state()
-        return [
-            task for task in state.values()
-            if task["state"] == "failed"
-        ]
+        return self._list("failed")
     
     def list_stalled_tasks(self) -> List[Dict[str, Any]]:
         """
@@ -0,0 +1,454 @@
+"""
+AIOS 心跳阶段剖析
+常开、低开销的逐阶段计量 + 按需的采样剖析
+
+每个阶段（with profiler.stage(name)）记录：
+- wall_ms: 墙钟耗时
+- cpu_ms: 当前线程的 CPU 时间（time.thread_time，并行阶段互不干扰）
+- read_bytes / write_bytes: 读写字节数
+  Linux 读 /proc/thread-self/io（按线程，rchar/wchar）；其他平台用 psutil 的进程级计数
+  （并行阶段会互相计入），都不可用时不记录
+详细计量（detailed=True，或设置 AIOS_HEARTBEAT_PROFILE；关闭时不记录）：
+- json_loads: json.load / json.loads 调用次数（有阶段在运行时才给 json.loads 加一层计数，
+  最后一个阶段退出时恢复原函数）
+没有测量的指标不写入记录，统计和报表里显示为 "-"，不会当成 0。
+
+每轮心跳（with profiler.tick()）结束后把本轮所有阶段写成一行，追加到 data/heartbeat_profile.jsonl
+（超过 max_store_bytes 轮转为 .1），内存里保留最近 window 轮供 summary() 使用。
+
+采样剖析（默认关闭）：
+    profiler.enable_sampling(interval_sec=0.005, slowest_n=5)
+    或设置环境变量 AIOS_HEARTBEAT_PROFILE=5
+开启后后台线程每 interval_sec 抓一次正在运行阶段的调用栈，按轮累计；
+最慢的 slowest_n 轮以 collapsed stacks 格式（flamegraph.pl / speedscope 可直接读取）
+写到 data/heartbeat_slowest_ticks.collapsed。
+
+查看：
+    python stage_profiler.py            # 各阶段 p50 / p95 / 最大值（读取 heartbeat_profile.jsonl）
+"""
+import functools
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+AIOS_ROOT = Path(__file__).resolve().parent
+PROFILE_STORE = AIOS_ROOT / "data" / "heartbeat_profile.jsonl"
+COLLAPSED_FILE = AIOS_ROOT / "data" / "heartbeat_slowest_ticks.collapsed"
+
+METRICS = ("wall_ms", "cpu_ms", "read_bytes", "write_bytes", "json_loads")
+
+# 调用栈里这些文件组成的外层帧（线程池 / 阶段执行器 / 本模块）不计入采样
+_WRAPPER_FILES = {"threading.py", "thread.py", "contextlib.py", "heartbeat_stages.py", "stage_profiler.py"}
+
+
+# ── 计数器 ────────────────────────────────────────────────────────────────────
+
+_tls = threading.local()
+_json_lock = threading.Lock()
+_json_users = 0        # 正在计数的阶段数
+_json_loads = None     # 被替换的原始 json.loads
+_json_wrapper = None
+
+
+def _install_json_counter() -> None:
+    """给 json.loads 加一层按线程计数（json.load 内部也走 json.loads）；与 _remove_json_counter 配对"""
+    global _json_users, _json_loads, _json_wrapper
+    with _json_lock:
+        _json_users += 1
+        if _json_users > 1:
+            return
+        original = _json_loads = json.loads
+
+        @functools.wraps(original)
+        def loads(*args, **kwargs):
+            _tls.json_loads = getattr(_tls, "json_loads", 0) + 1
+            return original(*args, **kwargs)
+
+        json.loads = _json_wrapper = loads
+
+
+def _remove_json_counter() -> None:
+    """最后一个计数的阶段退出时恢复 json.loads（期间被别人替换过则不动）"""
+    global _json_users, _json_loads, _json_wrapper
+    with _json_lock:
+        _json_users -= 1
+        if _json_users > 0:
+            return
+        if json.loads is _json_wrapper:
+            json.loads = _json_loads
+        _json_loads = _json_wrapper = None
+
+
+def _thread_json_loads() -> int:
+    return getattr(_tls, "json_loads", 0)
+
+
+_PROC_IO = "/proc/thread-self/io"
+_io_source = None  # "proc" | psutil.Process | False
+
+
+def _io_counters() -> Optional[Tuple[int, int]]:
+    """(读字节, 写字节)；没有可用的计数来源时返回 None"""
+    global _io_source
+    if _io_source is None:
+        if os.path.exists(_PROC_IO):
+            _io_source = "proc"
+        else:
+            try:
+                import psutil
+                process = psutil.Process()
+                process.io_counters()
+                _io_source = process
+            except Exception:
+                _io_source = False
+
+    if _io_source == "proc":
+        fd = os.open(_PROC_IO, os.O_RDONLY)
+        try:
+            data = os.read(fd, 512)
+        finally:
+            os.close(fd)
+        read = write = 0
+        for line in data.split(b"\n"):
+            if line.startswith(b"rchar:"):
+                read = int(line[6:])
+            elif line.startswith(b"wchar:"):
+                write = int(line[6:])
+        return read, write
+    if _io_source:
+        counters = _io_source.io_counters()
+        return counters.read_bytes, counters.write_bytes
+    return None
+
+
+# ── 剖析器 ────────────────────────────────────────────────────────────────────
+
+class _Tick:
+    """一轮心跳"""
+    __slots__ = ("ts", "started", "stages", "stacks", "open")
+
+    def __init__(self):
+        self.ts = datetime.now().isoformat(timespec="seconds")
+        self.started = time.perf_counter()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.stacks: Dict[str, int] = {}
+        self.open = True
+
+
+class StageProfiler:
+    """心跳阶段剖析器"""
+
+    def __init__(
+        self,
+        store_file: Path = PROFILE_STORE,
+        collapsed_file: Path = COLLAPSED_FILE,
+        window: int = 200,
+        max_store_bytes: int = 5 * 1024 * 1024,
+        detailed: bool = False,
+    ):
+        """
+        Args:
+            store_file: 每轮一行的滚动存储
+            collapsed_file: 采样模式下最慢几轮的 collapsed stacks
+            window: 内存里保留的轮数
+            max_store_bytes: store_file 超过该大小时轮转为 .1
+            detailed: 计量 json.loads 次数（阶段运行期间给 json.loads 加一层计数）
+        """
+        self.store_file = Path(store_file)
+        self.detailed = detailed
+        self.collapsed_file = Path(collapsed_file)
+        self.max_store_bytes = max_store_bytes
+        self.ticks = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._tick: Optional[_Tick] = None
+        self._active: Dict[int, str] = {}  # 线程 id → 正在运行的阶段
+
+        self._sampler: Optional[threading.Thread] = None
+        self._sampler_stop = threading.Event()
+        self._sample_interval = 0.005
+        self._slowest_n = 0
+        self._slowest: List[Tuple[float, int, str, Dict[str, int]]] = []  # 小顶堆
+        self._seq = 0
+
+    # ── 计量 ────────────────────────────────────────────────────────────────
+
+    @contextmanager
+    def stage(self, name: str):
+        """计量一个阶段（可直接作为 StageRunner 的 instrument）"""
+        ident = threading.get_ident()
+        with self._lock:
+            tick = self._tick
+            outer = self._active.get(ident)
+            self._active[ident] = name
+        detailed = self.detailed
+        if detailed:
+            _install_json_counter()
+            json0 = _thread_json_loads()
+        io0 = _io_counters()
+        cpu0 = time.thread_time()
+        wall0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall0
+            cpu = time.thread_time() - cpu0
+            sample = {
+                "wall_ms": round(wall * 1000, 2),
+                "cpu_ms": round(cpu * 1000, 2),
+            }
+            io1 = _io_counters()
+            if io0 is not None and io1 is not None:
+                sample.update(read_bytes=io1[0] - io0[0], write_bytes=io1[1] - io0[1])
+            if detailed:
+                sample["json_loads"] = _thread_json_loads() - json0
+                _remove_json_counter()
+            with self._lock:
+                if outer is None:
+                    self._active.pop(ident, None)
+                else:
+                    self._active[ident] = outer
+                # 超时后才返回的阶段：所属的那一轮已经落盘，不再计入
+                if tick is not None and tick.open:
+                    prev = tick.stages.get(name)
+                    if prev:  # 同一轮里重复出现的阶段累加（只累加两次都测到的指标）
+                        sample = {k: round(prev[k] + v, 2) for k, v in sample.items() if k in prev}
+                    tick.stages[name] = sample
+
+    @contextmanager
+    def tick(self):
+        """包住一轮心跳：结束时把本轮各阶段写入滚动存储（嵌套调用并入外层那一轮）"""
+        with self._lock:
+            outer = self._tick
+            if outer is None:
+                tick = self._tick = _Tick()
+        if outer is not None:
+            yield outer
+            return
+        try:
+            yield tick
+        finally:
+            with self._lock:
+                tick.open = False
+                if self._tick is tick:
+                    self._tick = None
+            record = {
+                "ts": tick.ts,
+                "wall_ms": round((time.perf_counter() - tick.started) * 1000, 2),
+                "stages": tick.stages,
+            }
+            self.ticks.append(record)
+            self._append(record)
+            if self._slowest_n and tick.stacks:
+                self._keep_slowest(record, dict(tick.stacks))
+
+    def _append(self, record: dict) -> None:
+        try:
+            self.store_file.parent.mkdir(parents=True, exist_ok=True)
+            if self.store_file.exists() and self.store_file.stat().st_size > self.max_store_bytes:
+                os.replace(self.store_file, self.store_file.with_suffix(".jsonl.1"))
+            with open(self.store_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError:
+            pass  # 剖析数据丢失不影响心跳
+
+    # ── 采样 ────────────────────────────────────────────────────────────────
+
+    def enable_sampling(self, interval_sec: float = 0.005, slowest_n: int = 5) -> None:
+        """开启采样剖析，保留最慢的 slowest_n 轮"""
+        self._sample_interval = interval_sec
+        self._slowest_n = slowest_n
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler_stop.clear()
+            self._sampler = threading.Thread(
+                target=self._sample_loop, name="heartbeat-profiler", daemon=True
+            )
+            self._sampler.start()
+
+    def disable_sampling(self) -> None:
+        self._sampler_stop.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+        self._sampler = None
+
+    def _sample_loop(self) -> None:
+        while not self._sampler_stop.wait(self._sample_interval):
+            frames = sys._current_frames()
+            with self._lock:
+                tick = self._tick
+                active = list(self._active.items())
+            if tick is None:
+                continue
+            for ident, stage in active:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((os.path.basename(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                stack.reverse()
+                while stack and stack[0][0] in _WRAPPER_FILES:
+                    stack.pop(0)
+                key = ";".join([stage] + [f"{func} ({file})" for file, func in stack])
+                tick.stacks[key] = tick.stacks.get(key, 0) + 1
+
+    def _keep_slowest(self, record: dict, stacks: Dict[str, int]) -> None:
+        self._seq += 1
+        item = (record["wall_ms"], self._seq, record["ts"], stacks)
+        if len(self._slowest) < self._slowest_n:
+            heapq.heappush(self._slowest, item)
+        elif item[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+        else:
+            return
+        self.write_collapsed(self.collapsed_file)
+
+    def slowest_ticks(self) -> List[dict]:
+        """采样到的最慢几轮（从慢到快）"""
+        return [
+            {"ts": ts, "wall_ms": wall_ms, "stacks": dict(stacks)}
+            for wall_ms, _, ts, stacks in sorted(self._slowest, reverse=True)
+        ]
+
+    def write_collapsed(self, path: Path) -> int:
+        """
+        写出最慢几轮的 collapsed stacks（每行 "tick;stage;frame;... count"），返回行数
+        """
+        lines = []
+        for tick in self.slowest_ticks():
+            root = f"tick {tick['ts']} ({tick['wall_ms']:.0f}ms)"
+            for stack, count in sorted(tick["stacks"].items()):
+                lines.append(f"{root};{stack} {count}")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+        os.replace(tmp, path)
+        return len(lines)
+
+    # ── 统计 ────────────────────────────────────────────────────────────────
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """内存里最近 window 轮的逐阶段统计，见 summarize_ticks"""
+        return summarize_ticks(list(self.ticks))
+
+    def format_report(self, top: int = 15) -> str:
+        return format_report(list(self.ticks), top)
+
+
+def summarize_ticks(ticks: List[dict]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    各阶段各指标的 count / avg / p50 / p95 / max（只统计测到的值；一次都没测到的指标不出现）
+
+    Returns:
+        {stage: {"wall_ms": {"count", "avg", "p50", "p95", "max"}, "cpu_ms": {...}, ...}}
+    """
+    values: Dict[str, Dict[str, List[float]]] = {}
+    for record in ticks:
+        for stage, sample in record.get("stages", {}).items():
+            per_metric = values.setdefault(stage, {m: [] for m in METRICS})
+            for metric in METRICS:
+                if sample.get(metric) is not None:
+                    per_metric[metric].append(sample[metric])
+
+    summary = {}
+    for stage, per_metric in values.items():
+        summary[stage] = {}
+        for metric, vals in per_metric.items():
+            if not vals:
+                continue
+            vals.sort()
+            summary[stage][metric] = {
+                "count": len(vals),
+                "avg": sum(vals) / len(vals),
+                "p50": vals[len(vals) // 2],
+                "p95": vals[min(len(vals) - 1, int(len(vals) * 0.95))],
+                "max": vals[-1],
+            }
+    return summary
+
+
+def format_report(ticks: List[dict], top: int = 15) -> str:
+    """按 wall p95 从慢到快的阶段表"""
+    summary = summarize_ticks(ticks)
+    rows = sorted(summary.items(), key=lambda kv: kv[1]["wall_ms"]["p95"], reverse=True)[:top]
+    lines = [
+        f"{'stage':<28} {'n':>5} {'wall p50':>9} {'wall p95':>9} {'cpu p95':>8} "
+        f"{'read p95':>10} {'write p95':>10} {'json':>6}"
+    ]
+    for stage, m in rows:
+        read = _p95(m, "read_bytes", _fmt_bytes)
+        write = _p95(m, "write_bytes", _fmt_bytes)
+        loads = _p95(m, "json_loads", lambda n: f"{n:.0f}")
+        lines.append(
+            f"{stage:<28} {m['wall_ms']['count']:>5} {m['wall_ms']['p50']:>7.1f}ms "
+            f"{m['wall_ms']['p95']:>7.1f}ms {m['cpu_ms']['p95']:>6.1f}ms "
+            f"{read:>10} {write:>10} {loads:>6}"
+        )
+    return "\n".join(lines)
+
+
+def _p95(metrics: Dict[str, Dict[str, float]], metric: str, fmt) -> str:
+    """没有测到的指标显示为 -"""
+    return fmt(metrics[metric]["p95"]) if metric in metrics else "-"
+
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f}{unit}"
+        n /= 1024
+    return f"{n:.1f}GB"
+
+
+def read_ticks(store_file: Path = PROFILE_STORE, limit: int = 200) -> List[dict]:
+    """从滚动存储末尾读取最近 limit 轮（只读文件尾部）"""
+    store_file = Path(store_file)
+    if not store_file.exists():
+        return []
+    with open(store_file, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        chunk = min(size, max(64 * 1024, limit * 4096))
+        f.seek(size - chunk)
+        lines = f.read().split(b"\n")
+    if chunk < size:
+        lines = lines[1:]  # 第一行可能不完整
+    ticks = []
+    for line in lines[-limit - 1:]:
+        if line.strip():
+            try:
+                ticks.append(json.loads(line))
+            except ValueError:
+                continue
+    return ticks[-limit:]
+
+
+# 全局剖析器
+_profiler = None
+
+
+def get_profiler() -> StageProfiler:
+    """获取全局剖析器（AIOS_HEARTBEAT_PROFILE=N 时开启详细计量和采样，保留最慢 N 轮）"""
+    global _profiler
+    if _profiler is None:
+        slowest_n = os.environ.get("AIOS_HEARTBEAT_PROFILE")
+        _profiler = StageProfiler(detailed=bool(slowest_n))
+        if slowest_n:
+            _profiler.enable_sampling(slowest_n=int(slowest_n) if slowest_n.isdigit() else 5)
+    return _profiler
+
+
+if __name__ == "__main__":
+    ticks = read_ticks(limit=int(sys.argv[1]) if len(sys.argv) > 1 else 200)
+    print(f"心跳阶段剖析（最近 {len(ticks)} 轮，{PROFILE_STORE}）")
+    print(format_report(ticks))
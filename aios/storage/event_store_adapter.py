@@ -9,10 +9,11 @@ EventStore Adapter for Storage Manager
 import asyncio
 import uuid
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 from .storage_manager import StorageManager
+from .event_writer import BatchedEventWriter, event_to_row
 
 
 class EventStoreAdapter:
@@ -23,18 +24,25 @@ class EventStoreAdapter:
     用于无缝替换 EventBus 中的 EventStore
     """
     
-    def __init__(self, base_dir: Optional[Path] = None, db_path: str = "aios.db"):
+    def __init__(self, base_dir: Optional[Path] = None, db_path: str = "aios.db",
+                 write_behind: bool = False, **writer_options):
         """
         初始化适配器
         
         Args:
             base_dir: 基础目录（兼容 EventStore，实际不使用）
             db_path: SQLite 数据库路径
+            write_behind: 是否启用异步批量写入（见 enable_write_behind）
+            writer_options: 传给 BatchedEventWriter 的参数
         """
         self.db_path = db_path
         self.storage = StorageManager(db_path)
         self._loop = None
         self._initialized = False
+        self._writer: Optional[BatchedEventWriter] = None
+        
+        if write_behind:
+            self.enable_write_behind(**writer_options)
     
     def _ensure_initialized(self):
         """确保 Storage Manager 已初始化"""
@@ -50,6 +58,57 @@ class EventStoreAdapter:
             self._loop.run_until_complete(self.storage.initialize())
             self._initialized = True
     
+    def enable_write_behind(self, **writer_options) -> BatchedEventWriter:
+        """
+        启用异步批量写入（write-behind）
+        
+        启用后 append() 只把事件放入有界队列就返回，
+        由专用写线程按批次提交（队列满时 append 阻塞，形成背压）。
+        
+        Args:
+            writer_options: max_queue / max_batch / poll_interval
+        
+        Returns:
+            BatchedEventWriter 实例
+        """
+        if self._writer is None or not self._writer.running:
+            self._writer = BatchedEventWriter(self.db_path, **writer_options).start()
+        return self._writer
+    
+    @property
+    def write_behind(self) -> bool:
+        """是否处于异步批量写入模式"""
+        return self._writer is not None and self._writer.running
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待异步写入队列落盘（同步模式下直接返回 True）
+        
+        Args:
+            timeout: 最长等待时间（秒）
+        
+        Returns:
+            是否全部落盘
+        """
+        if self._writer is None:
+            return True
+        return self._writer.flush(timeout)
+    
+    def writer_stats(self) -> dict:
+        """异步写入统计（同步模式下返回空字典）"""
+        if self._writer is None:
+            return {}
+        return self._writer.stats()
+    
+    def close(self) -> None:
+        """关闭写线程（先清空队列）和 Storage Manager 连接"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._initialized:
+            self._loop.run_until_complete(self.storage.close())
+            self._initialized = False
+    
     def append(self, event) -> None:
         """
         追加事件（同步接口）
@@ -57,6 +116,10 @@ class EventStoreAdapter:
         Args:
             event: Event 对象
         """
+        if self.write_behind:
+            self._writer.submit(event_to_row(event))
+            return
+        
         self._ensure_initialized()
         
         # 转换为 Storage Manager 格式
@@ -78,21 +141,22 @@ class EventStoreAdapter:
         event_type: Optional[str] = None,
         since: Optional[int] = None,
         until: Optional[int] = None,
-        limit: Optional[int] = None
+        limit: Optional[int] = 100
     ) -> List:
         """
         加载事件（同步接口）
         
         Args:
-            event_type: 事件类型过滤
+            event_type: 事件类型过滤（支持通配符，在 SQLite 中走索引过滤）
             since: 开始时间戳（毫秒）
             until: 结束时间戳（毫秒）
-            limit: 最大数量
+            limit: 最大数量（默认 100；显式传 None 表示不限）
         
         Returns:
             事件列表（Event 对象）
         """
         self._ensure_initialized()
+        self.flush()
         
         # 转换时间戳（毫秒 → 秒）
         start_time = since / 1000 if since else None
@@ -100,23 +164,18 @@ class EventStoreAdapter:
         
         # 异步查询
         # list_events(agent_id, event_type, start_time, end_time, limit, offset)
-        # 注意：Storage Manager 不支持通配符，需要后过滤
+        # 通配符由 Storage Manager 翻译为前缀范围 + GLOB
         events = self._loop.run_until_complete(
             self.storage.list_events(
                 agent_id=None,  # 不过滤 agent
-                event_type=None,  # 先查所有，后过滤
+                event_type=event_type,
                 start_time=start_time,
                 end_time=end_time,
-                limit=limit or 100,
+                limit=limit,
                 offset=0
             )
         )
         
-        # 后过滤（支持通配符）
-        if event_type:
-            import fnmatch
-            events = [e for e in events if fnmatch.fnmatch(e["event_type"], event_type)]
-        
         # 转换为 Event 对象
         from aios.core.event import Event
         result = []
@@ -132,6 +191,34 @@ class EventStoreAdapter:
         
         return result
     
+    def count_events(
+        self,
+        event_type: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None
+    ) -> int:
+        """
+        统计事件数量（同步接口，SELECT COUNT(*)）
+        
+        Args:
+            event_type: 事件类型过滤（支持通配符）
+            since: 开始时间戳（毫秒）
+            until: 结束时间戳（毫秒）
+        
+        Returns:
+            事件数量
+        """
+        self._ensure_initialized()
+        self.flush()
+        
+        return self._loop.run_until_complete(
+            self.storage.count_events(
+                event_type=event_type,
+                start_time=since / 1000 if since else None,
+                end_time=until / 1000 if until else None
+            )
+        )
+    
     def cleanup(self) -> dict:
         """
         清理旧事件（同步接口）
@@ -209,13 +296,25 @@ class EventStoreAdapter:
         return count
 
 
-def get_event_store_adapter() -> EventStoreAdapter:
-    """获取全局 EventStoreAdapter 实例"""
-    global _global_adapter
-    if _global_adapter is None:
-        _global_adapter = EventStoreAdapter()
-    return _global_adapter
+def get_event_store_adapter(write_behind: bool = False, **writer_options) -> EventStoreAdapter:
+    """
+    获取全局 EventStoreAdapter 实例
+    
+    同步写入和异步批量写入各有一个进程级实例：请求 write-behind
+    不会把其他使用同步实例的调用方切换到异步模式。
+    
+    Args:
+        write_behind: 是否获取异步批量写入实例
+        writer_options: 首次创建异步实例时传给 BatchedEventWriter 的参数
+    """
+    adapter = _global_adapters.get(write_behind)
+    if adapter is None:
+        adapter = EventStoreAdapter(write_behind=write_behind, **writer_options)
+        _global_adapters[write_behind] = adapter
+    elif write_behind and not adapter.write_behind:
+        adapter.enable_write_behind(**writer_options)
+    return adapter
 
 
-# 全局单例
-_global_adapter: Optional[EventStoreAdapter] = None
+# 全局单例（False: 同步写入, True: 异步批量写入）
+_global_adapters: Dict[bool, EventStoreAdapter] = {}
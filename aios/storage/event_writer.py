@@ -0,0 +1,140 @@
+"""
+AIOS Batched Event Writer
+EventBus 的异步批量写入路径（write-behind）
+
+设计：
+1. 专用写线程 + 一个持久 SQLite 连接（WAL 模式）
+2. 有界队列：队列满时 submit() 阻塞（背压），而不是无限堆积内存
+3. 组提交：写线程一次取空队列（最多 max_batch 条），
+   用多行 INSERT 在同一个事务里提交
+4. flush()：等待所有已提交事件落盘（读己之写）
+5. close()：停止前清空队列（关闭时不丢事件）
+6. 每批记录 batch_size / batch_latency_ms 指标
+7. 写入失败：指数退避重试；仍失败则把该批放回队首，下一轮优先重写
+   （只有关闭时重试耗尽才丢弃，计入 dropped 指标）
+写线程、队列、flush / close / 重试由 core/batch_writer.BatchWriter 提供，
+这里只负责 SQLite 连接和多行 INSERT。
+
+创建时间：2026-10-16
+版本：v1.0
+"""
+
+import json
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+try:
+    from aios.core.batch_writer import BatchWriter
+except ImportError:
+    from core.batch_writer import BatchWriter
+
+
+# events 表的列顺序（与 sql/schema.sql 保持一致）
+EVENT_COLUMNS = ("event_id", "event_type", "agent_id", "timestamp", "data_json", "severity")
+
+# SQLite 老版本单条语句最多 999 个参数，6 列 × 150 行 = 900
+_ROWS_PER_STATEMENT = 150
+
+
+def event_to_row(event, severity: str = "info") -> Tuple:
+    """
+    把 Event 转成 events 表的一行
+
+    时间戳使用事件自身的 timestamp（发布时刻），而不是落盘时刻，
+    这样异步写入不会让事件时间漂移。
+    """
+    timestamp = (event.timestamp / 1000) if event.timestamp else time.time()
+    return (
+        event.id or str(uuid.uuid4()),
+        event.type,
+        event.source or "unknown",
+        timestamp,
+        json.dumps(event.payload or {}, ensure_ascii=False),
+        severity,
+    )
+
+
+class BatchedEventWriter(BatchWriter):
+    """
+    批量事件写入器
+
+    用法（submit 的背压 / 异常语义见 BatchWriter.submit）：
+        writer = BatchedEventWriter("aios.db")
+        writer.start()
+        writer.submit(event_to_row(event))
+        writer.flush()
+        writer.close()
+    """
+
+    WRITTEN_STAT = "events_written"
+    METRICS_PREFIX = "event_writer"
+    THREAD_NAME = "aios-event-writer"
+
+    def __init__(
+        self,
+        db_path: str = "aios.db",
+        max_queue: int = 10000,
+        max_batch: int = 1000,
+        poll_interval: float = 0.5,
+        max_retries: int = 3,
+        retry_backoff: float = 0.05,
+    ):
+        """
+        初始化写入器
+
+        Args:
+            db_path: SQLite 数据库路径
+            max_queue: 队列上限（超过后 submit 阻塞，形成背压）
+            max_batch: 单个事务最多写入的事件数
+            poll_interval: 写线程空闲时的唤醒间隔（秒）
+            max_retries: 单批写入失败后的重试次数（指数退避）
+            retry_backoff: 第一次重试前的等待（秒），之后每次翻倍
+        """
+        super().__init__(
+            max_queue=max_queue,
+            max_batch=max_batch,
+            poll_interval=poll_interval,
+            max_retries=max_retries,
+            retry_backoff=retry_backoff,
+        )
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    # ==================== 写线程 ====================
+
+    def _open(self) -> None:
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        schema_path = Path(__file__).parent / "sql" / "schema.sql"
+        conn.executescript(schema_path.read_text(encoding="utf-8"))
+        self._conn = conn
+
+    def _close_resources(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _write(self, batch: List[Tuple]) -> None:
+        try:
+            self._conn.execute("BEGIN")
+            for i in range(0, len(batch), _ROWS_PER_STATEMENT):
+                chunk = batch[i:i + _ROWS_PER_STATEMENT]
+                placeholders = ",".join(["(?, ?, ?, ?, ?, ?)"] * len(chunk))
+                params = [value for row in chunk for value in row]
+                self._conn.execute(
+                    f"INSERT OR IGNORE INTO events ({', '.join(EVENT_COLUMNS)}) "
+                    f"VALUES {placeholders}",
+                    params,
+                )
+            self._conn.execute("COMMIT")
+        except sqlite3.Error:
+            try:
+                self._conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            raise
@@ -55,8 +55,12 @@ CREATE TABLE IF NOT EXISTS task_history (
 
 -- 索引
 CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp);
-CREATE INDEX IF NOT EXISTS idx_events_agent_id ON events(agent_id);
-CREATE INDEX IF NOT EXISTS idx_events_type ON events(event_type);
+-- 复合索引：类型/Agent 过滤 + 时间范围（覆盖前缀通配查询，如 task.* 最近一小时）
+CREATE INDEX IF NOT EXISTS idx_events_type_timestamp ON events(event_type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_events_agent_timestamp ON events(agent_id, timestamp);
+-- 单列索引已被复合索引覆盖
+DROP INDEX IF EXISTS idx_events_type;
+DROP INDEX IF EXISTS idx_events_agent_id;
 CREATE INDEX IF NOT EXISTS idx_contexts_agent_id ON contexts(agent_id);
 CREATE INDEX IF NOT EXISTS idx_contexts_expires_at ON contexts(expires_at);
 CREATE INDEX IF NOT EXISTS idx_task_history_agent_id ON task_history(agent_id);
@@ -10,7 +10,45 @@ import json
 import time
 import uuid
 from pathlib import Path
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
+
+_WILDCARD_CHARS = "*?["
+
+
+def event_type_filter(pattern: str) -> Tuple[str, List[Any]]:
+    """
+    把事件类型模式翻译成可走索引的 SQL 条件
+
+    支持 fnmatch 风格通配符（"agent.*" / "*.error" / "*"）：
+    - 无通配符：等值查询
+    - 有固定前缀：前缀范围（event_type >= 'agent.' AND < 'agent/'）+ GLOB 精确过滤
+    - 无前缀：仅 GLOB（需扫描索引，但仍在 SQLite 内完成）
+
+    Args:
+        pattern: 事件类型或通配模式
+
+    Returns:
+        (SQL 条件片段, 参数列表)
+    """
+    if not any(c in pattern for c in _WILDCARD_CHARS):
+        return "event_type = ?", [pattern]
+
+    if pattern == "*":
+        return "1=1", []
+
+    # fnmatch 的 [!x] 对应 GLOB 的 [^x]
+    glob = pattern.replace("[!", "[^")
+    prefix_len = min(
+        (i for i, c in enumerate(pattern) if c in _WILDCARD_CHARS),
+        default=len(pattern)
+    )
+    prefix = pattern[:prefix_len]
+
+    if not prefix:
+        return "event_type GLOB ?", [glob]
+
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return "event_type >= ? AND event_type < ? AND event_type GLOB ?", [prefix, upper, glob]
 
 
 class StorageManager:
@@ -173,9 +211,9 @@ class StorageManager:
                          event_type: Optional[str] = None,
                          start_time: Optional[float] = None,
                          end_time: Optional[float] = None,
-                         limit: int = 100,
+                         limit: Optional[int] = 100,
                          offset: int = 0) -> List[Dict]:
-        """列出事件"""
+        """列出事件（event_type 支持通配符，limit=None 表示不限）"""
         query = "SELECT * FROM events WHERE 1=1"
         params = []
         
@@ -183,8 +221,9 @@ class StorageManager:
             query += " AND agent_id = ?"
             params.append(agent_id)
         if event_type:
-            query += " AND event_type = ?"
-            params.append(event_type)
+            clause, clause_params = event_type_filter(event_type)
+            query += f" AND {clause}"
+            params.extend(clause_params)
         if start_time:
             query += " AND timestamp >= ?"
             params.append(start_time)
@@ -193,7 +232,7 @@ class StorageManager:
             params.append(end_time)
         
         query += " ORDER BY timestamp DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
+        params.extend([-1 if limit is None else limit, offset])
         
         async with self._db.execute(query, params) as cursor:
             rows = await cursor.fetchall()
@@ -208,7 +247,7 @@ class StorageManager:
                           event_type: Optional[str] = None,
                           start_time: Optional[float] = None,
                           end_time: Optional[float] = None) -> int:
-        """统计事件数量"""
+        """统计事件数量（event_type 支持通配符）"""
         query = "SELECT COUNT(*) as count FROM events WHERE 1=1"
         params = []
         
@@ -216,8 +255,9 @@ class StorageManager:
             query += " AND agent_id = ?"
             params.append(agent_id)
         if event_type:
-            query += " AND event_type = ?"
-            params.append(event_type)
+            clause, clause_params = event_type_filter(event_type)
+            query += f" AND {clause}"
+            params.extend(clause_params)
         if start_time:
             query += " AND timestamp >= ?"
             params.append(start_time)
@@ -0,0 +1,115 @@
+"""
+VectorDB Benchmark
+
+Compares the matrix-backed VectorIndex with the previous per-row Python loop:
+- Bulk insert throughput
+- Single-query top-k latency (loop baseline vs matmul + argpartition)
+- Batch query throughput
+- .npy save / memory-mapped load time
+
+Run: python benchmark_vector_db.py [--sizes 10000,100000,1000000] [--dim 128]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+AIOS_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AIOS_ROOT))
+
+from core.vector_index import VectorIndex
+
+
+def fmt(val, unit=""):
+    """Format number with commas."""
+    if isinstance(val, float):
+        return f"{val:,.2f}{unit}"
+    return f"{val:,}{unit}"
+
+
+def loop_search(vectors, query, k):
+    """The old VectorDB.search: per-row norms in Python, full argsort."""
+    similarities = []
+    for vec in vectors:
+        sim = np.dot(query, vec) / (np.linalg.norm(query) * np.linalg.norm(vec) + 1e-8)
+        similarities.append(sim)
+    return np.argsort(similarities)[-k:][::-1]
+
+
+def bench_size(n, dim, k=5, queries=20, batch=256, loop_limit=100_000):
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(n, dim)).astype(np.float32)
+    qs = rng.normal(size=(max(queries, batch), dim)).astype(np.float32)
+    print(f"\n--- {fmt(n)} vectors x {dim} dims ---")
+
+    index = VectorIndex(dim)
+    start = time.perf_counter()
+    for chunk in range(0, n, 10_000):
+        index.add_many(data[chunk:chunk + 10_000])
+    elapsed = time.perf_counter() - start
+    print(f"  Insert:             {fmt(n / elapsed, '/s')} (capacity={fmt(index.capacity)})")
+
+    times = []
+    for q in qs[:queries]:
+        t0 = time.perf_counter()
+        index.search(q, k)
+        times.append((time.perf_counter() - t0) * 1000)
+    p50 = statistics.median(times)
+    print(f"  Query (matrix):     p50={p50:.2f}ms max={max(times):.2f}ms")
+
+    if n <= loop_limit:
+        rows = list(data)
+        loop_times = []
+        for q in qs[:3]:
+            t0 = time.perf_counter()
+            loop_search(rows, q, k)
+            loop_times.append((time.perf_counter() - t0) * 1000)
+        loop_p50 = statistics.median(loop_times)
+        print(f"  Query (old loop):   p50={loop_p50:.2f}ms  -> {loop_p50 / p50:,.0f}x faster")
+    else:
+        print(f"  Query (old loop):   skipped (n > {fmt(loop_limit)})")
+
+    index.search_batch(qs[:batch], k)  # warm-up (first touch of the score buffer)
+    t0 = time.perf_counter()
+    index.search_batch(qs[:batch], k)
+    elapsed = time.perf_counter() - t0
+    print(f"  Batch query:        {fmt(batch / elapsed, '/s')} ({batch} queries in {elapsed * 1000:.1f}ms)")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "vectors.npy"
+        t0 = time.perf_counter()
+        index.save(path)
+        save_ms = (time.perf_counter() - t0) * 1000
+        loaded = VectorIndex(dim)
+        t0 = time.perf_counter()
+        loaded.load(path)
+        load_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        loaded.search(qs[0], k)
+        first_ms = (time.perf_counter() - t0) * 1000
+        print(f"  Save / mmap load:   {save_ms:.1f}ms / {load_ms:.2f}ms (first query {first_ms:.1f}ms)")
+        del loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VectorDB benchmark")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=128)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("AIOS VectorDB Benchmark")
+    print("=" * 60)
+    for n in (int(s) for s in args.sizes.split(",")):
+        bench_size(n, args.dim)
+    print("\n" + "=" * 60)
+    print("Benchmark complete.")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Unit tests for EventStoreAdapter queries
+
+Tests cover:
+- event_type_filter (wildcard → indexed SQL)
+- load_events / count_events with wildcard patterns
+- Composite event indexes
+
+Run with: pytest test_event_store_adapter.py -v
+"""
+
+import fnmatch
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from core.event import Event
+from storage.event_store_adapter import EventStoreAdapter
+from storage.storage_manager import event_type_filter
+
+
+TYPES = [
+    "agent.started", "agent.error", "agent", "agentx.started",
+    "task.done", "task.error", "task.sub.error", "pipeline.error",
+]
+
+
+class TestEventTypeFilter:
+    """Test wildcard pattern translation."""
+
+    def test_exact(self):
+        assert event_type_filter("task.done") == ("event_type = ?", ["task.done"])
+
+    def test_match_all(self):
+        assert event_type_filter("*") == ("1=1", [])
+
+    def test_prefix_range(self):
+        clause, params = event_type_filter("agent.*")
+        assert "event_type >= ?" in clause and "GLOB" in clause
+        assert params == ["agent.", "agent/", "agent.*"]
+
+    def test_suffix_only_glob(self):
+        assert event_type_filter("*.error") == ("event_type GLOB ?", ["*.error"])
+
+    @pytest.mark.parametrize("pattern", ["agent.*", "*.error", "task.*.error", "a*", "?ask.done", "[!p]*.error"])
+    def test_same_semantics_as_fnmatch(self, pattern):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE events (event_type TEXT)")
+        conn.executemany("INSERT INTO events VALUES (?)", [(t,) for t in TYPES])
+        clause, params = event_type_filter(pattern)
+        rows = {r[0] for r in conn.execute(f"SELECT event_type FROM events WHERE {clause}", params)}
+        assert rows == {t for t in TYPES if fnmatch.fnmatchcase(t, pattern)}
+
+
+class TestEventStoreAdapterQueries:
+    """Test load_events / count_events against SQLite."""
+
+    @pytest.fixture
+    def adapter(self, tmp_path):
+        adapter = EventStoreAdapter(db_path=str(tmp_path / "events.db"))
+        for event_type in TYPES:
+            for i in range(60):
+                adapter.append(Event.create(event_type, f"agent-{i % 3}"))
+        return adapter
+
+    def test_load_wildcard_not_capped(self, adapter):
+        events = adapter.load_events(event_type="agent.*", limit=None)
+        assert len(events) == 120
+        assert {e.type for e in events} == {"agent.started", "agent.error"}
+
+    def test_load_limit(self, adapter):
+        assert len(adapter.load_events(event_type="*.error", limit=10)) == 10
+        assert len(adapter.load_events()) == 100  # 默认上限不变
+
+    def test_count(self, adapter):
+        assert adapter.count_events() == 480
+        assert adapter.count_events(event_type="*.error") == 240
+        assert adapter.count_events(event_type="task.*") == 180
+
+    def test_prefix_query_uses_composite_index(self, adapter):
+        clause, params = event_type_filter("task.*")
+        conn = sqlite3.connect(adapter.db_path)
+        plan = conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT COUNT(*) FROM events WHERE {clause} AND timestamp >= ?",
+            params + [0],
+        ).fetchall()
+        conn.close()
+        assert any("idx_events_type_timestamp" in row[-1] for row in plan)
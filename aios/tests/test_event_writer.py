@@ -0,0 +1,148 @@
+"""
+Unit tests for the batched event write path
+
+Tests cover:
+- BatchedEventWriter (group commit, flush, close, backpressure, retry on failure)
+- EventStoreAdapter write-behind mode
+
+Run with: pytest test_event_writer.py -v
+"""
+
+import atexit
+import queue
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from core.event import Event
+from storage.event_writer import BatchedEventWriter, event_to_row
+from storage.event_store_adapter import EventStoreAdapter
+
+
+def _count(db_path) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class TestBatchedEventWriter:
+    """Test BatchedEventWriter."""
+
+    def test_flush_writes_all_events(self, tmp_path):
+        db = str(tmp_path / "events.db")
+        writer = BatchedEventWriter(db, max_batch=50).start()
+        for i in range(500):
+            writer.submit(event_to_row(Event.create("task.done", "test", {"i": i})))
+
+        assert writer.flush(timeout=5)
+        assert _count(db) == 500
+
+        stats = writer.stats()
+        assert stats["events_written"] == 500
+        assert stats["pending"] == 0
+        assert stats["last_batch_size"] <= 50
+        assert stats["batches"] >= 10
+        writer.close()
+
+    def test_wal_mode(self, tmp_path):
+        db = str(tmp_path / "events.db")
+        writer = BatchedEventWriter(db).start()
+        writer.submit(event_to_row(Event.create("a.b", "test")))
+        writer.flush(timeout=5)
+        writer.close()
+
+        conn = sqlite3.connect(db)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+
+    def test_close_drains_queue(self, tmp_path):
+        db = str(tmp_path / "events.db")
+        writer = BatchedEventWriter(db).start()
+        for i in range(200):
+            writer.submit(event_to_row(Event.create("a.b", "test", {"i": i})))
+        writer.close()
+
+        assert _count(db) == 200
+        with pytest.raises(RuntimeError):
+            writer.submit(event_to_row(Event.create("a.b", "test")))
+
+    def test_backpressure_when_queue_full(self, tmp_path):
+        db = str(tmp_path / "events.db")
+        # 未启动写线程：手动构造一个满队列
+        writer = BatchedEventWriter(db, max_queue=1)
+        writer._queue.put(("x",))
+        writer._thread = type("T", (), {"is_alive": lambda self: True})()
+        with pytest.raises(queue.Full):
+            writer.submit(("y",), timeout=0.05)
+        assert writer.pending() == 0
+
+    def test_event_timestamp_preserved(self, tmp_path):
+        db = str(tmp_path / "events.db")
+        event = Event.create("a.b", "test")
+        writer = BatchedEventWriter(db).start()
+        writer.submit(event_to_row(event))
+        writer.close()
+
+        conn = sqlite3.connect(db)
+        ts, event_id = conn.execute("SELECT timestamp, event_id FROM events").fetchone()
+        conn.close()
+        assert event_id == event.id
+        assert ts == pytest.approx(event.timestamp / 1000)
+
+
+    def test_failed_batch_is_retried_not_dropped(self, tmp_path):
+        db = str(tmp_path / "events.db")
+        writer = BatchedEventWriter(db, max_retries=1, retry_backoff=0.01, poll_interval=0.01)
+        real_write = writer._write_batch
+        failures = []
+
+        def flaky(batch):
+            if len(failures) < 3:  # 第一轮重试耗尽 → 放回队首
+                failures.append(len(batch))
+                return False
+            return real_write(batch)
+
+        writer._write_batch = flaky
+        writer.start()
+        for i in range(10):
+            writer.submit(event_to_row(Event.create("a.b", f"s{i}")))
+        assert writer.flush(timeout=5)
+        writer.close()
+
+        stats = writer.stats()
+        assert _count(db) == 10
+        assert stats["requeued"] >= 1 and stats["retries"] >= 1 and stats["dropped"] == 0
+
+    def test_restart_does_not_pile_up_atexit_hooks(self, tmp_path, monkeypatch):
+        hooks = []
+        monkeypatch.setattr(atexit, "register", hooks.append)
+        monkeypatch.setattr(atexit, "unregister", hooks.remove)
+        writer = BatchedEventWriter(str(tmp_path / "events.db"))
+        for _ in range(3):
+            writer.start()
+            writer.close()
+        assert hooks == []
+
+
+class TestEventStoreAdapterWriteBehind:
+    """Test EventStoreAdapter write-behind mode."""
+
+    def test_append_then_load(self, tmp_path):
+        db = str(tmp_path / "events.db")
+        adapter = EventStoreAdapter(db_path=db, write_behind=True, max_batch=20)
+        assert adapter.write_behind
+
+        for i in range(30):
+            adapter.append(Event.create("agent.started", f"agent-{i}"))
+
+        # load_events 先 flush，保证读己之写
+        events = adapter.load_events(event_type="agent.*")
+        assert len(events) == 30
+        assert adapter.writer_stats()["events_written"] == 30
+        adapter.close()
+        assert not adapter.write_behind
@@ -6,6 +6,7 @@ Tests cover:
 - SimpleEmbedding
 - VectorDB
 - MemoryManager
+- MemoryLog (append-only long-term persistence)
 
 Run with: pytest test_memory.py -v
 """
@@ -14,6 +15,7 @@ import pytest
 import tempfile
 import time
 import json
+import os
 from pathlib import Path
 from unittest.mock import Mock, patch
 import numpy as np
@@ -25,6 +27,7 @@ from core.memory_refactored import (
     Memory, MemoryType, MemorySource, MemoryConfig,
     SimpleEmbedding, VectorDB, MemoryManager
 )
+from core.memory_log import MemoryLog
 
 
 class TestMemory:
@@ -318,6 +321,104 @@ class TestVectorDB:
             assert len(db2.memories) == 1
             assert db2.memories[0].content == "Test content"
 
+    def _filled_db(self, n=200, dim=32, seed=0):
+        rng = np.random.default_rng(seed)
+        vectors = rng.normal(size=(n, dim))
+        db = VectorDB(dim=dim)
+        for i, vec in enumerate(vectors):
+            db.add(vec.tolist(), Memory(
+                id=f"m{i}", content=f"M {i}", type=MemoryType.LONG_TERM.value,
+                importance=0.5, timestamp=time.time(), source=MemorySource.USER.value,
+            ))
+        return db, vectors, rng
+    
+    def test_vectordb_search_matches_brute_force(self):
+        """Test top-k against a full cosine sort, including batch search."""
+        db, vectors, rng = self._filled_db()
+        queries = rng.normal(size=(5, 32))
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        
+        batch = db.search_batch(queries.tolist(), k=7, min_similarity=-1.0)
+        for query, hits in zip(queries, batch):
+            sims = unit @ (query / np.linalg.norm(query))
+            expected = [f"m{i}" for i in np.argsort(-sims)[:7]]
+            assert [m.id for m in hits] == expected
+            assert [m.id for m in db.search(query.tolist(), k=7, min_similarity=-1.0)] == expected
+        
+        assert db.index.capacity >= 200 and db.vectors.dtype == np.float32
+        assert np.allclose(np.linalg.norm(db.vectors, axis=1), 1.0, atol=1e-5)
+        assert db.search_batch([], k=3) == []
+    
+    def test_vectordb_npy_roundtrip_and_legacy(self):
+        """Test binary .npy persistence (memory-mapped load) and old inline-JSON files."""
+        db, vectors, rng = self._filled_db(n=20)
+        query = rng.normal(size=32).tolist()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "long_term.json"
+            db.save(path)
+            header = json.loads(path.read_text(encoding="utf-8"))
+            assert (path.parent / header["vectors_file"]).exists()
+            assert "vectors" not in header
+            
+            db2 = VectorDB(dim=32)
+            db2.load(path)
+            assert isinstance(db2.index.vectors, np.memmap)
+            assert [m.id for m in db2.search(query, k=5)] == [m.id for m in db.search(query, k=5)]
+            db2.add([1.0] * 32, db.memories[0])  # grows out of the read-only mapping
+            db2.save(path)
+            assert len(db2.vectors) == 21
+            
+            legacy = Path(tmpdir) / "legacy.json"
+            legacy.write_text(json.dumps({
+                "vectors": vectors.tolist(),
+                "memories": [m.to_dict() for m in db.memories],
+            }), encoding="utf-8")
+            db3 = VectorDB(dim=32)
+            db3.load(legacy)
+            assert [m.id for m in db3.search(query, k=5)] == [m.id for m in db.search(query, k=5)]
+    
+    def test_vectordb_save_commits_on_json_replace(self, monkeypatch):
+        """Each save writes a new .npy; the old snapshot stays intact until the JSON is replaced."""
+        db, _, _ = self._filled_db(n=10)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "long_term.json"
+            db.save(path, extra={"log_seq": 3})
+            first = json.loads(path.read_text(encoding="utf-8"))["vectors_file"]
+            assert first.startswith("long_term.3.")
+            
+            db.add([1.0] * 32, db.memories[0])
+            real_replace = os.replace
+            
+            def crash_on_json(src, dst):
+                if str(dst) == str(path):
+                    raise OSError("crash before commit")
+                real_replace(src, dst)
+            
+            monkeypatch.setattr(os, "replace", crash_on_json)
+            with pytest.raises(IOError):
+                db.save(path, extra={"log_seq": 4})
+            monkeypatch.setattr(os, "replace", real_replace)
+            
+            loaded = VectorDB(dim=32)
+            assert loaded.load(path) == {"log_seq": 3}
+            assert len(loaded.memories) == len(loaded.vectors) == 10
+            
+            db.save(path, extra={"log_seq": 4})
+            current = json.loads(path.read_text(encoding="utf-8"))["vectors_file"]
+            assert sorted(p.name for p in Path(tmpdir).glob("*.npy")) == [current]
+    
+    def test_vectordb_load_rejects_count_mismatch(self):
+        """A vector file that does not match the memories is an error, not a silent misalignment."""
+        db, _, _ = self._filled_db(n=5)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "long_term.json"
+            db.save(path)
+            header = json.loads(path.read_text(encoding="utf-8"))
+            header["memories"] = header["memories"][:4]
+            path.write_text(json.dumps(header), encoding="utf-8")
+            with pytest.raises(ValueError):
+                VectorDB(dim=32).load(path)
+
 
 class TestMemoryManager:
     """Test MemoryManager class."""
@@ -454,6 +555,113 @@ class TestMemoryManager:
         assert stats["total_memories"] > 0
 
 
+    def test_manager_store_appends_to_log(self, temp_workspace):
+        """Test that store() appends to the log instead of rewriting the snapshot."""
+        manager = MemoryManager(temp_workspace)
+        snapshot = temp_workspace / "memory" / "long_term.json"
+        before = snapshot.read_bytes()
+        base = len(manager.long_term.memories)
+        
+        for i in range(3):
+            manager.store(f"Important decision {i}", importance=0.9)
+        manager.close()
+        
+        assert snapshot.read_bytes() == before
+        log = temp_workspace / "memory" / "long_term.log"
+        assert len(log.read_text(encoding="utf-8").splitlines()) == 3
+        
+        reloaded = MemoryManager(temp_workspace)
+        assert len(reloaded.long_term.memories) == base + 3
+        assert reloaded.long_term.memories[-1].content == "Important decision 2"
+        assert np.allclose(reloaded.long_term.vectors, manager.long_term.vectors, atol=1e-6)
+    
+    def test_manager_background_compaction(self, temp_workspace):
+        """Test that the log is folded into the snapshot every compact_threshold records."""
+        config = MemoryConfig(compact_threshold=5, log_fsync="always")
+        manager = MemoryManager(temp_workspace, config)
+        base = len(manager.long_term.memories)
+        for i in range(12):
+            manager.store(f"Important decision {i}", importance=0.9)
+        manager.close()
+        
+        assert manager.log.pending < 5
+        header = json.loads((temp_workspace / "memory" / "long_term.json").read_text(encoding="utf-8"))
+        assert header["log_seq"] >= 5
+        
+        reloaded = MemoryManager(temp_workspace, config)
+        contents = [m.content for m in reloaded.long_term.memories]
+        assert len(contents) == base + 12 and contents[-12:] == [f"Important decision {i}" for i in range(12)]
+    
+    def test_manager_recovers_from_crash(self, temp_workspace):
+        """Test replay after a crash: covered records are skipped, a torn tail is cut."""
+        manager = MemoryManager(temp_workspace)
+        base = len(manager.long_term.memories)
+        manager.store("Before snapshot", importance=0.9)
+        # Crash after the snapshot was written but before the log was truncated
+        manager.long_term.save(
+            temp_workspace / "memory" / "long_term.json", extra={"log_seq": manager.log.seq}
+        )
+        manager.store("After snapshot", importance=0.9)
+        manager.close()
+        log = temp_workspace / "memory" / "long_term.log"
+        with open(log, "ab") as f:
+            f.write(b'{"seq": 3, "record": {"content": "torn')
+        
+        reloaded = MemoryManager(temp_workspace)
+        contents = [m.content for m in reloaded.long_term.memories]
+        assert contents[base:] == ["Before snapshot", "After snapshot"]
+        assert log.read_bytes().endswith(b"\n")
+        assert reloaded.log.seq == 2  # new appends continue after the last intact record
+    
+    def test_manager_failed_load_is_fatal(self, temp_workspace):
+        """A snapshot that cannot be loaded raises instead of being compacted over."""
+        manager = MemoryManager(temp_workspace)
+        manager.store("Important decision", importance=0.9)
+        manager._save_long_term()
+        manager.close()
+        snapshot = temp_workspace / "memory" / "long_term.json"
+        header = json.loads(snapshot.read_text(encoding="utf-8"))
+        (snapshot.parent / header["vectors_file"]).unlink()
+        before = snapshot.read_bytes()
+        
+        with pytest.raises(IOError):
+            MemoryManager(temp_workspace)
+        assert snapshot.read_bytes() == before
+    
+    def test_manager_skips_snapshot_while_compacting(self, temp_workspace):
+        """Appends past the threshold do not copy the DB while a compaction is running."""
+        manager = MemoryManager(temp_workspace, MemoryConfig(compact_threshold=1))
+        copies = []
+        real_snapshot = manager.long_term.snapshot
+        manager.long_term.snapshot = lambda: copies.append(1) or real_snapshot()
+        with patch.object(MemoryLog, "compacting", new_callable=lambda: property(lambda self: True)):
+            for i in range(3):
+                manager.store(f"Important decision {i}", importance=0.9)
+        assert copies == []
+        manager.store("Important decision 3", importance=0.9)
+        manager.close()
+        assert copies == [1]
+
+
+class TestMemoryLog:
+    """Test MemoryLog class."""
+    
+    def test_log_replay_and_policies(self, tmp_path):
+        """Test sequence numbers, replay filtering and fsync policy validation."""
+        with pytest.raises(ValueError):
+            MemoryLog(tmp_path / "x.log", fsync="sometimes")
+        
+        log = MemoryLog(tmp_path / "x.log", fsync="never")
+        assert [log.append({"n": i}) for i in range(4)] == [1, 2, 3, 4]
+        log.compact(lambda seq: None, wait=True)  # snapshot covering seq 1-4
+        log.append({"n": 4})
+        log.close()
+        
+        reopened = MemoryLog(tmp_path / "x.log")
+        assert reopened.replay(after_seq=4) == [{"n": 4}]
+        assert reopened.pending == 1 and reopened.append({"n": 5}) == 6
+
+
 class TestMemoryConfig:
     """Test MemoryConfig dataclass."""
     
@@ -0,0 +1,308 @@
+"""
+Unit tests for core.model_router_v2 against a local stub Ollama server
+
+Tests cover:
+- Routing needs no extra health round trip; calls reuse one keep-alive connection
+- Connection failure marks the provider down and falls back
+- Streaming yields tokens as they arrive and records time-to-first-token
+- Response cache: exact hits skip the model, survive restarts, LRU byte budget, semantic tier
+- Metrics stay in memory and the call log is buffered; flush() writes both atomically
+- Metric snapshots merge into the shared file across restarts; the writer thread starts lazily
+
+Run with: pytest test_model_router.py -v
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from core import model_router_v2
+from core.buffered_appender import BufferedAppender
+from core.model_router_v2 import ModelRouter, ProviderHealth
+from core.response_cache import ResponseCache
+
+
+class _StubOllama(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests_seen = []
+    token_delay = 0.05
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, self.client_address[1]))
+        self._send_json({"models": []})
+
+    def do_POST(self):
+        self.requests_seen.append((self.path, self.client_address[1]))
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not body.get("stream"):
+            self._send_json({"response": "pong", "done": True})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(["a", "b", "c"]):
+            line = json.dumps({"response": token, "done": i == 2}).encode() + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+@pytest.fixture
+def stub_router(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_router_v2, "METRICS_FILE", tmp_path / "router_metrics.json")
+    monkeypatch.setattr(model_router_v2, "LOG_FILE", tmp_path / "router_calls.jsonl")
+    monkeypatch.setattr(model_router_v2, "CACHE_FILE", tmp_path / "router_cache.json")
+    _StubOllama.requests_seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    config = tmp_path / "router_config.json"
+    config.write_text(json.dumps({
+        **ModelRouter._default_config(),
+        "ollama_url": f"http://127.0.0.1:{server.server_address[1]}",
+        "monitoring": {"log_all_calls": True, "flush_interval_sec": 60, "snapshot_interval_sec": 60},
+    }))
+    router = ModelRouter(config_path=config)
+    router.ollama_health.mark(True)
+    yield router
+    router.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_route_reuses_connection_without_probe(stub_router):
+    for i in range(3):
+        result = stub_router.route("simple_qa", f"ping {i}")
+        assert result["provider"] == "ollama" and result["response"] == "pong"
+
+    paths = [path for path, _ in _StubOllama.requests_seen]
+    assert paths == ["/api/generate"] * 3
+    assert len({port for _, port in _StubOllama.requests_seen}) == 1
+
+
+def test_connection_failure_marks_down_and_falls_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_router_v2, "METRICS_FILE", tmp_path / "router_metrics.json")
+    monkeypatch.setattr(model_router_v2, "LOG_FILE", tmp_path / "router_calls.jsonl")
+    monkeypatch.setattr(model_router_v2, "CACHE_FILE", tmp_path / "router_cache.json")
+    router = ModelRouter(config_path=tmp_path / "missing.json")
+    router.ollama_url = "http://127.0.0.1:9"  # discard 端口，连接被拒绝
+    router.ollama_health.mark(True)
+
+    try:
+        result = router.route("simple_qa", "ping")
+        assert result["fallback"] and result["provider"] == "claude"
+        assert not router._is_ollama_available()
+        assert router.route("simple_qa", "ping")["reason"] == "simple_task_fallback"
+    finally:
+        router.close()
+    assert json.loads((tmp_path / "router_metrics.json").read_text())["total_calls"] == 2
+
+
+def test_stream_yields_tokens_and_records_ttft(stub_router):
+    start = time.monotonic()
+    stream = stub_router.route_stream("simple_qa", "ping")
+    first = next(stream)
+    first_at = time.monotonic() - start
+    rest = []
+    try:
+        while True:
+            rest.append(next(stream))
+    except StopIteration as stop:
+        result = stop.value
+
+    assert [first] + rest == ["a", "b", "c"]
+    assert first_at < 2 * _StubOllama.token_delay
+    assert result["response"] == "abc" and result["streamed"]
+    assert result["ttft_ms"] < result["latency_ms"]
+    assert stub_router.flush()
+    log = [json.loads(l) for l in model_router_v2.LOG_FILE.read_text().splitlines()]
+    assert log[-1]["ttft_ms"] == result["ttft_ms"]
+
+
+def test_health_cache_refreshes_in_background():
+    now = [0.0]
+    probes = []
+    health = ProviderHealth(lambda: probes.append(1) or False, ttl_sec=10, clock=lambda: now[0])
+    assert health.is_available()  # 未探测：乐观 + 后台探测
+    for _ in range(100):
+        if probes and not health._refreshing:
+            break
+        time.sleep(0.01)
+    assert not health.is_available() and len(probes) == 1
+    now[0] = 20
+    health.mark(True)
+    assert health.is_available() and len(probes) == 1
+
+
+def test_exact_cache_hit_skips_model_and_counts_metrics(stub_router):
+    first = stub_router.route("simple_qa", "ping")
+    second = stub_router.route("simple_qa", "  ping\n")
+    assert first["cached"] is False
+    assert second["cached"] and second["cache_tier"] == "exact" and second["response"] == "pong"
+    assert [path for path, _ in _StubOllama.requests_seen] == ["/api/generate"]
+    assert stub_router.route("simple_qa", "ping", use_cache=False)["response"] == "pong"
+    assert len(_StubOllama.requests_seen) == 2
+
+    metrics = stub_router.get_metrics()
+    assert metrics["cache_hits"] == 1 and metrics["cache_misses"] == 1
+    assert metrics["cache_exact_hits"] == 1 and "cache_saved_latency_ms" in metrics
+
+
+def test_cache_survives_restart(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = ResponseCache(path=path)
+    cache.put("ollama", "m", "hello", "simple_qa", "world", latency_ms=500)
+    cache.save()
+    assert ResponseCache(path=path).get("ollama", "m", "hello", "simple_qa")["response"] == "world"
+    assert ResponseCache(path=path).get("ollama", "m", "hello", "reasoning") is None
+
+
+def test_cache_ttl_and_byte_budget():
+    now = [0.0]
+    cache = ResponseCache(ttl_sec=10, max_bytes=3 * 300, clock=lambda: now[0])
+    for i in range(3):
+        cache.put("ollama", "m", f"p{i}", "t", "x" * 150)
+    assert cache.get("ollama", "m", "p0", "t") is not None  # p0 变为最新
+    cache.put("ollama", "m", "p3", "t", "x" * 150)
+    assert cache.get("ollama", "m", "p1", "t") is None
+    assert cache.get("ollama", "m", "p0", "t") is not None
+    assert cache.size_bytes <= cache.max_bytes
+    now[0] = 10
+    assert cache.get("ollama", "m", "p3", "t") is None and len(cache) <= 2
+
+
+def test_semantic_tier_matches_similar_prompts():
+    vectors = {"summarize the heartbeat": [1.0, 0.0], "summarise the heartbeat": [0.99, 0.05], "unrelated": [0.0, 1.0]}
+    cache = ResponseCache(embed=vectors.get, similarity_threshold=0.95)
+    cache.put("ollama", "m", "summarize the heartbeat", "summarize_short", "all good")
+    hit = cache.get("ollama", "m", "summarise the heartbeat", "summarize_short")
+    assert hit["tier"] == "semantic" and hit["response"] == "all good"
+    assert cache.get("ollama", "m", "unrelated", "summarize_short") is None
+    assert cache.get("claude", "m", "summarise the heartbeat", "summarize_short") is None
+
+
+def test_semantic_miss_embeds_once_and_evicts_from_matrix():
+    calls = []
+
+    def embed(text):
+        calls.append(text)
+        return {"a": [1.0, 0.0], "b": [0.0, 1.0], "a2": [0.99, 0.05]}.get(text)
+
+    now = [0.0]
+    cache = ResponseCache(embed=embed, ttl_sec=10, clock=lambda: now[0])
+    hit, embedding = cache.lookup("ollama", "m", "a", "t")
+    assert hit is None and embedding == [1.0, 0.0]
+    cache.put("ollama", "m", "a", "t", "resp-a", embedding=embedding)
+    assert calls == ["a"]
+
+    cache.put("ollama", "m", "b", "t", "resp-b")
+    assert cache.get("ollama", "m", "b", "t")["tier"] == "exact"
+    assert cache.invalidate("ollama", "m", "b", "t")
+    assert cache.lookup("ollama", "m", "b", "t") == (None, [0.0, 1.0])
+    hit, _ = cache.lookup("ollama", "m", "  a ", "t")
+    assert hit["tier"] == "exact"
+
+    assert cache.get("ollama", "m", "a2", "t")["tier"] == "semantic"
+    now[0] = 10  # 过期条目不会从语义层命中，并被移出矩阵
+    assert cache.get("ollama", "m", "a2", "t") is None
+    assert len(cache) == 0 and not cache._groups
+
+
+def test_hot_path_does_no_file_io_until_flush(stub_router):
+    for i in range(5):
+        stub_router.route("simple_qa", f"ping {i}")
+    stub_router.route("reasoning", "plan")
+    assert not model_router_v2.LOG_FILE.exists() and not model_router_v2.METRICS_FILE.exists()
+
+    metrics = stub_router.get_metrics()
+    assert metrics["total_calls"] == 6 and metrics["ollama_calls"] == 5 and metrics["claude_calls"] == 1
+    assert metrics["latency_ms"]["ollama"]["count"] == 5
+    assert metrics["call_log"]["pending"] == 6
+
+    assert stub_router.flush()
+    assert len(model_router_v2.LOG_FILE.read_text().splitlines()) == 6
+    snapshot = json.loads(model_router_v2.METRICS_FILE.read_text())
+    assert snapshot["total_calls"] == 6 and snapshot["call_log"]["written"] == 6
+    assert model_router_v2.CACHE_FILE.exists()
+
+
+def test_metrics_file_accumulates_across_restarts(stub_router):
+    stub_router.route("simple_qa", "ping 0")
+    assert stub_router.flush()
+    stub_router.route("simple_qa", "ping 1")
+    assert stub_router.flush()  # 只合并增量，不会重复计数
+
+    router = ModelRouter(config_path=stub_router.config_path)
+    router.ollama_health.mark(True)
+    router.route("reasoning", "plan")
+    router.close()
+
+    snapshot = json.loads(model_router_v2.METRICS_FILE.read_text())
+    assert snapshot["total_calls"] == 3 and snapshot["ollama_calls"] == 2 and snapshot["claude_calls"] == 1
+    assert snapshot["latency_ms"]["ollama"]["count"] == 2
+    assert router.get_metrics()["total_calls"] == 1
+
+
+def test_legacy_flat_metrics_file_is_seeded(stub_router):
+    model_router_v2.METRICS_FILE.write_text(json.dumps({
+        "total_calls": 10, "ollama_calls": 7, "claude_calls": 3,
+        "fallback_count": 2, "total_cost": 0.03, "last_updated": "2026-01-01T00:00:00",
+    }))
+    stub_router.route("simple_qa", "ping")
+    assert stub_router.flush()
+
+    snapshot = json.loads(model_router_v2.METRICS_FILE.read_text())
+    assert snapshot["total_calls"] == 11 and snapshot["ollama_calls"] == 8
+    assert snapshot["claude_calls"] == 3 and snapshot["fallback_count"] == 2
+    assert snapshot["total_cost"] == pytest.approx(0.03)
+    assert "registry" in snapshot
+
+
+def test_background_thread_starts_on_first_call(stub_router):
+    assert not stub_router._call_log.running
+    stub_router.route("simple_qa", "ping")
+    assert stub_router._call_log.running
+    stub_router.close()
+    assert not stub_router._call_log.running
+
+
+def test_appender_retries_failed_write(tmp_path, monkeypatch):
+    appender = BufferedAppender(tmp_path / "calls.jsonl", flush_interval=0.01)
+    appender.retry_backoff = 0.001
+    failures = [OSError("disk full")] * 5  # 超过一轮重试，整批放回队首
+    write = appender._write
+
+    def flaky(batch):
+        if failures:
+            raise failures.pop()
+        write(batch)
+
+    monkeypatch.setattr(appender, "_write", flaky)
+    appender.start()
+    for i in range(3):
+        assert appender.append({"i": i})
+    assert appender.flush(timeout=5)
+    appender.close()
+
+    assert [json.loads(l)["i"] for l in (tmp_path / "calls.jsonl").read_text().splitlines()] == [0, 1, 2]
+    stats = appender.stats()
+    assert stats["requeued"] >= 1 and stats["dropped"] == 0 and stats["written"] == 3
@@ -0,0 +1,298 @@
+"""
+Unit tests for AIOS resource queues
+
+Tests cover:
+- HeapIndex / RoundRobinIndex
+- LLMQueue priority + FIFO
+- MemoryQueue SJF / RR / EDF and runtime policy switch
+- StorageQueue reads-first and batch coalescing
+- cancel() lazy deletion and bounded completed history
+- Blocking dequeue, max_concurrency and queue-bound ThreadPool workers
+
+Run with: pytest test_queues.py -v
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from core.queues import LLMQueue, MemoryQueue, StorageQueue, QueueRequest, SchedulingPolicy
+from core.queues.base import HeapIndex, RequestPriority, RequestState, RoundRobinIndex, sjf_key
+from core.queues.thread_pool import ThreadPool
+
+
+class _Bus:
+    """Minimal EventBus stand-in."""
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+def _req(name, **kwargs):
+    return QueueRequest(name=name, **kwargs)
+
+
+def _drain(queue):
+    names = []
+    while True:
+        req = queue.dequeue()
+        if req is None:
+            return names
+        names.append(req.name)
+
+
+class TestIndexes:
+    """Test HeapIndex / RoundRobinIndex directly."""
+
+    def test_heap_skips_dead_entries(self):
+        index = HeapIndex(sjf_key)
+        a, b = _req("a", estimated_cost=1), _req("b", estimated_cost=2)
+        index.push(a)
+        index.push(b)
+        assert index.pop(lambda r: r is not a) is b
+
+    def test_round_robin_rotates(self):
+        index = RoundRobinIndex()
+        for name, agent in [("a1", "a"), ("a2", "a"), ("b1", "b"), ("d1", None)]:
+            index.push(_req(name, agent_id=agent))
+        order = [index.pop(lambda r: True).name for _ in range(4)]
+        assert order == ["a1", "b1", "d1", "a2"]
+        assert index.pop(lambda r: True) is None
+
+
+class TestLLMQueue:
+    """Test priority scheduling."""
+
+    def test_priority_then_fifo(self):
+        q = LLMQueue(bus=_Bus())
+        q.enqueue(_req("low", priority=RequestPriority.LOW))
+        q.enqueue(_req("n1"))
+        q.enqueue(_req("crit", priority=RequestPriority.CRITICAL))
+        q.enqueue(_req("n2"))
+        assert _drain(q) == ["crit", "n1", "n2", "low"]
+
+    def test_rate_limit_blocks_dequeue(self):
+        q = LLMQueue(bus=_Bus(), rate_limit_rps=1)
+        q.enqueue(_req("a"))
+        q.enqueue(_req("b"))
+        assert q.dequeue().name == "a"
+        assert q.dequeue() is None
+        assert q.pending_count() == 1
+
+    def test_empty_dequeue_keeps_rate_slot(self):
+        q = LLMQueue(bus=_Bus(), rate_limit_rps=1)
+        assert q.dequeue() is None
+        q.enqueue(_req("a"))
+        assert q.dequeue().name == "a"
+
+
+class TestMemoryQueue:
+    """Test SJF / RR / EDF."""
+
+    def test_sjf(self):
+        q = MemoryQueue(bus=_Bus())
+        for name, cost in [("big", 9), ("small", 1), ("mid", 5)]:
+            q.enqueue(_req(name, estimated_cost=cost))
+        assert _drain(q) == ["small", "mid", "big"]
+
+    def test_edf_deadlines_first(self):
+        q = MemoryQueue(bus=_Bus(), policy=SchedulingPolicy.EDF)
+        now = time.monotonic()
+        q.enqueue(_req("none"))
+        q.enqueue(_req("late", deadline=now + 10))
+        q.enqueue(_req("soon", deadline=now + 1))
+        assert _drain(q) == ["soon", "late", "none"]
+
+    def test_rr_sets_quantum(self):
+        q = MemoryQueue(bus=_Bus(), policy=SchedulingPolicy.RR, rr_quantum=3.0)
+        q.enqueue(_req("x", agent_id="a"))
+        assert q.dequeue().remaining_quantum == 3.0
+
+    def test_switch_policy_reindexes_pending(self):
+        q = MemoryQueue(bus=_Bus(), policy=SchedulingPolicy.SJF)
+        q.enqueue(_req("a1", agent_id="a", estimated_cost=1))
+        q.enqueue(_req("a2", agent_id="a", estimated_cost=2))
+        q.enqueue(_req("b1", agent_id="b", estimated_cost=9))
+        q.set_policy(SchedulingPolicy.RR)
+        assert _drain(q) == ["a1", "b1", "a2"]
+
+    def test_invalid_policy(self):
+        with pytest.raises(ValueError):
+            MemoryQueue(bus=_Bus()).set_policy(SchedulingPolicy.PRIORITY)
+
+
+class TestStorageQueue:
+    """Test reads-first lanes and batching."""
+
+    def test_reads_first(self):
+        q = StorageQueue(bus=_Bus())
+        q.enqueue(_req("w1", payload={"op": "write"}, estimated_cost=1))
+        q.enqueue(_req("r1", payload={"op": "read"}, estimated_cost=5))
+        q.enqueue(_req("r2", payload={"op": "read"}, estimated_cost=2))
+        assert _drain(q) == ["r2", "r1", "w1"]
+
+    def test_try_batch_groups_same_path(self):
+        q = StorageQueue(bus=_Bus(), batch_window_sec=0.0, batch_size=2)
+        for i in range(3):
+            q.enqueue(_req(f"w{i}", payload={"op": "write", "path": "/a"}))
+        q.enqueue(_req("other", payload={"op": "write", "path": "/b"}))
+
+        batch = q.try_batch()
+        assert [r.name for r in batch] == ["w0", "w1"]
+        assert q.running_count() == 2
+        assert _drain(q) == ["w2", "other"]
+
+    def test_try_batch_respects_max_concurrency(self):
+        q = StorageQueue(bus=_Bus(), max_concurrency=3, batch_window_sec=0.0)
+        q.enqueue(_req("x", payload={"op": "read", "path": "/x"}))
+        assert q.dequeue().name == "x"
+        for i in range(4):
+            q.enqueue(_req(f"w{i}", payload={"op": "write", "path": "/a"}))
+
+        assert [r.name for r in q.try_batch()] == ["w0", "w1"]  # 2 free slots
+        assert q.running_count() == 3
+        assert q.try_batch() is None
+
+
+class TestCancelAndHistory:
+    """Test lazy deletion and bounded history."""
+
+    def test_cancel_skipped_by_dequeue(self):
+        q = LLMQueue(bus=_Bus())
+        ids = [q.enqueue(_req(f"r{i}")) for i in range(3)]
+        assert q.cancel(ids[0])
+        assert not q.cancel(ids[0])
+        assert _drain(q) == ["r1", "r2"]
+
+    def test_cancel_compacts_heap(self):
+        q = MemoryQueue(bus=_Bus())
+        ids = [q.enqueue(_req(f"r{i}")) for i in range(500)]
+        for req_id in ids[:-1]:
+            q.cancel(req_id)
+        assert len(q._index) <= 2 * q.pending_count() + 64 + 1
+        assert _drain(q) == ["r499"]
+
+    def test_completed_history_is_bounded(self):
+        q = LLMQueue(bus=_Bus(), completed_history=10)
+        for i in range(50):
+            q.enqueue(_req(f"r{i}"))
+            req = q.dequeue()
+            q.complete(req.id, result=i)
+        assert len(q._completed) == 10
+        assert q._completed[-1].state == RequestState.COMPLETED
+        assert q.stats()["total_completed"] == 50
+
+
+class TestBlockingDequeue:
+    """Test dequeue(block=True) and concurrency limits."""
+
+    def test_wakes_on_enqueue(self):
+        q = LLMQueue(bus=_Bus())
+        got = []
+        t = threading.Thread(target=lambda: got.append(q.dequeue(block=True, timeout=5)))
+        t.start()
+        time.sleep(0.05)
+        q.enqueue(_req("a"))
+        t.join(2)
+        assert got and got[0].name == "a"
+
+    def test_timeout(self):
+        q = LLMQueue(bus=_Bus())
+        t0 = time.monotonic()
+        assert q.dequeue(block=True, timeout=0.05) is None
+        assert time.monotonic() - t0 >= 0.05
+
+    def test_max_concurrency(self):
+        q = MemoryQueue(bus=_Bus(), max_concurrency=1)
+        q.enqueue(_req("a"))
+        q.enqueue(_req("b"))
+        first = q.dequeue()
+        assert q.dequeue() is None
+        assert q.dequeue(block=True, timeout=0.05) is None
+
+        threading.Timer(0.05, q.complete, args=(first.id,)).start()
+        assert q.dequeue(block=True, timeout=2).name == "b"
+
+    def test_rate_limited_blocking_dequeue(self):
+        q = LLMQueue(bus=_Bus(), rate_limit_rps=20)
+        q.enqueue(_req("a"))
+        q.enqueue(_req("b"))
+        q.complete(q.dequeue().id)
+        assert q.dequeue(block=True, timeout=1).name == "b"
+
+    def test_wake_waiters(self):
+        q = LLMQueue(bus=_Bus())
+        got = []
+        t = threading.Thread(target=lambda: got.append(q.dequeue(block=True)))
+        t.start()
+        time.sleep(0.05)
+        q.wake_waiters()
+        t.join(2)
+        assert got == [None]
+
+
+class TestBoundThreadPool:
+    """Test ThreadPool workers consuming a queue."""
+
+    def test_runs_requests_within_concurrency(self):
+        q = StorageQueue(bus=_Bus(), max_concurrency=2)
+        lock = threading.Lock()
+        active, peak = [0], [0]
+
+        def handler(req):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            return req.name.upper()
+
+        pool = ThreadPool("storage", size=4, queue=q, handler=handler)
+        pool.start()
+        for i in range(20):
+            q.enqueue(_req(f"r{i}"))
+
+        deadline = time.monotonic() + 5
+        while q.stats()["total_completed"] < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pool.stop()
+
+        assert q.stats()["total_completed"] == 20
+        assert peak[0] == 2
+        assert not any(w["alive"] for w in pool.stats()["workers"])
+
+    def test_handler_error_fails_request(self):
+        q = LLMQueue(bus=_Bus())
+
+        def handler(req):
+            raise RuntimeError("boom")
+
+        pool = ThreadPool("llm", size=1, queue=q, handler=handler)
+        pool.start()
+        q.enqueue(_req("x"))
+        deadline = time.monotonic() + 2
+        while q.stats()["total_failed"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pool.stop()
+        assert q._completed[-1].error == "boom"
+
+    def test_bound_pool_rejects_submit(self):
+        pool = ThreadPool("llm", size=1, queue=LLMQueue(bus=_Bus()), handler=lambda r: None)
+        with pytest.raises(RuntimeError):
+            pool.submit(lambda: None)
+
+    def test_unbound_pool_submit(self):
+        pool = ThreadPool("misc", size=2)
+        pool.start()
+        done = threading.Event()
+        pool.submit(done.set)
+        assert done.wait(2)
+        pool.stop()
@@ -0,0 +1,526 @@
+"""
+Unit tests for runtime_v2 event log tailing
+
+Tests cover:
+- EventLog.read_since (partial last line, rotation)
+- StateProjection incremental projection
+- RuntimeMetrics delta consumption
+- Snapshots and compaction
+- Timing index and streaming sketches
+- Dispatcher executor (concurrency, timeouts, process pool)
+- Priority / aging pending index
+
+Run with: pytest test_runtime_v2.py -v
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from runtime_v2.compaction import LOCK_NAME, archive_dir_for, compact_event_log, iter_archived_tasks
+from runtime_v2.dispatcher import Dispatcher
+from runtime_v2.event_log import EventLog, LogCursor
+from runtime_v2.metrics import RuntimeMetrics
+from runtime_v2.scheduling import PendingIndex
+from runtime_v2.sketch import MinuteCounter, QuantileSketch
+from runtime_v2.state import StateProjection
+from runtime_v2.worker import get_worker
+
+
+@pytest.fixture
+def log(tmp_path):
+    return EventLog(log_path=tmp_path / "event_log.jsonl")
+
+
+def _submit(log, task_id, *events, task_type="code", priority="normal"):
+    log.append_event("task_created", task_id, {
+        "task_id": task_id, "type": task_type, "priority": priority,
+        "created_at": f"2026-01-01T00:00:00.{len(task_id):06d}",
+    })
+    for event_type in events:
+        log.append_event(event_type, task_id, {})
+
+
+class TestReadSince:
+    """Test the byte-offset tail reader."""
+
+    def test_returns_only_new_events(self, log):
+        _submit(log, "t1")
+        events, cursor = log.read_since(None)
+        assert [e["task_id"] for e in events] == ["t1"]
+
+        assert log.read_since(cursor) == ([], cursor)
+
+        _submit(log, "t2")
+        events, cursor2 = log.read_since(cursor)
+        assert [e["task_id"] for e in events] == ["t2"]
+        assert cursor2.offset == log.log_path.stat().st_size
+        assert log.end_cursor() == cursor2
+
+    def test_partial_last_line_not_consumed(self, log):
+        _submit(log, "t1")
+        line = json.dumps({"event_type": "task_created", "task_id": "t2", "data": {}})
+        with open(log.log_path, "a", encoding="utf-8") as f:
+            f.write(line[:10])
+
+        events, cursor = log.read_since(None)
+        assert [e["task_id"] for e in events] == ["t1"]
+
+        with open(log.log_path, "a", encoding="utf-8") as f:
+            f.write(line[10:] + "\n")
+        events, _ = log.read_since(cursor)
+        assert [e["task_id"] for e in events] == ["t2"]
+
+    def test_rotation_restarts_from_new_file(self, log):
+        _submit(log, "t1", "task_started")
+        _, cursor = log.read_since(None)
+
+        log.log_path.rename(log.log_path.with_suffix(".old"))
+        _submit(log, "t2")
+        events, _ = log.read_since(cursor)
+        assert [e["task_id"] for e in events] == ["t2"]
+
+    def test_truncation_detected_by_size(self, log):
+        _submit(log, "t1", "task_started", "task_completed")
+        _, cursor = log.read_since(None)
+        log.log_path.write_text("")
+        _submit(log, "t2")
+        events, _ = log.read_since(LogCursor(cursor.offset))
+        assert [e["task_id"] for e in events] == ["t2"]
+
+    def test_missing_file(self, tmp_path):
+        log = EventLog(log_path=tmp_path / "none" / "log.jsonl")
+        log.log_path.unlink(missing_ok=True)
+        assert log.read_since(None) == ([], LogCursor())
+
+
+class TestStateProjection:
+    """Test incremental projection."""
+
+    def test_state_buckets(self, log):
+        state = StateProjection(event_log=log)
+        _submit(log, "t1")
+        _submit(log, "t2", "task_started")
+        assert [t["task_id"] for t in state.list_pending_tasks()] == ["t1"]
+        assert state.count_tasks("running") == 1
+
+        log.append_event("task_completed", "t2", {})
+        assert state.list_running_tasks() == []
+        assert state.get_task_state("t2")["state"] == "completed"
+        assert state.get_task_state("t1")["task_data"]["priority"] == "normal"
+
+    def test_projection_reads_only_delta(self, log, monkeypatch):
+        state = StateProjection(event_log=log)
+        for i in range(50):
+            _submit(log, f"t{i}", "task_started", "task_completed")
+        assert state.count_tasks("completed") == 50
+
+        monkeypatch.setattr(log, "read_events", lambda: pytest.fail("full reread"))
+        _submit(log, "new")
+        assert state.count_tasks("pending") == 1
+
+
+class TestRuntimeMetrics:
+    """Test metrics over the tailed log."""
+
+    def test_timings_and_counts(self, log):
+        state = StateProjection(event_log=log)
+        metrics = RuntimeMetrics(state=state)
+        _submit(log, "t1", "task_started", "task_completed")
+        _submit(log, "t2", "task_started")
+
+        assert metrics.get_queue_wait_time("t1") >= 0
+        assert metrics.get_execution_time("t1") >= 0
+        assert metrics.get_execution_time("t2") is None
+        assert metrics.get_throughput(window_minutes=1) == 1
+
+        all_metrics = metrics.get_all_metrics()
+        assert all_metrics["completed_tasks"] == 1
+        assert all_metrics["running_tasks"] == 1
+        assert all_metrics["execution_time_p99"] >= 0
+
+    def test_timing_index_from_timestamps(self, log):
+        state = StateProjection(event_log=log)
+        metrics = RuntimeMetrics(state=state)
+        with open(log.log_path, "w", encoding="utf-8") as f:
+            for event_type, ts in [("task_created", "00:00"), ("task_started", "00:03"),
+                                   ("task_completed", "00:10")]:
+                f.write(json.dumps({"event_type": event_type, "task_id": "t1", "data": {},
+                                    "timestamp": f"2026-01-01T00:{ts}.000000Z"}) + "\n")
+
+        timings = state.get_task_timings("t1")
+        assert timings["finished_at"] - timings["created_at"] == 10
+        assert metrics.get_queue_wait_time("t1") == 3
+        assert metrics.get_execution_time("t1") == 7
+        assert state.wait_sketch.count == 1
+
+    def test_stats_survive_snapshot(self, log):
+        state = StateProjection(event_log=log)
+        _submit(log, "t1", "task_started", "task_completed")
+        state.count_tasks("completed")
+        state.save_snapshot()
+
+        restarted = StateProjection(event_log=log)
+        assert restarted.exec_sketch.count == 1
+        assert RuntimeMetrics(state=restarted).get_throughput(window_minutes=1) == 1
+
+
+class TestSketches:
+    """Test QuantileSketch / MinuteCounter."""
+
+    def test_quantiles_within_relative_error(self):
+        rng = random.Random(7)
+        values = [rng.expovariate(1.0) for _ in range(20000)]
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for v in values:
+            sketch.add(v)
+
+        values.sort()
+        for q in (0.5, 0.95, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            assert sketch.quantile(q) == pytest.approx(exact, rel=0.03)
+        assert len(sketch._buckets) < 2000
+
+    def test_zero_and_roundtrip(self):
+        sketch = QuantileSketch()
+        assert sketch.quantile(0.5) is None
+        for v in (0.0, 0.0, 2.0):
+            sketch.add(v)
+        assert sketch.quantile(0.5) == 0.0
+        restored = QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+        assert restored.summary() == sketch.summary()
+
+    def test_minute_counter(self):
+        counter = MinuteCounter(retention_minutes=10)
+        for minute in range(20):
+            counter.add(minute * 60 + 1, count=minute)
+        assert counter.per_minute(19 * 60, 3) == [17, 18, 19]
+        assert counter.rate(19 * 60, 2) == 18.5
+        assert len(counter._counts) <= 11
+        counter.add(0)  # 超出保留窗口，忽略
+        assert counter.per_minute(19 * 60, 20)[0] == 0
+
+
+class TestSnapshotAndCompaction:
+    """Test snapshot load and log compaction."""
+
+    def test_snapshot_then_tail(self, log, monkeypatch):
+        state = StateProjection(event_log=log)
+        _submit(log, "t1", "task_started")
+        state.count_tasks("running")
+        state.save_snapshot()
+        _submit(log, "t2")
+
+        monkeypatch.setattr(log, "read_events", lambda: pytest.fail("full reread"))
+        restarted = StateProjection(event_log=log)
+        assert restarted._cursor.offset < log.end_cursor().offset
+        assert restarted.count_tasks("running") == 1
+        assert restarted.count_tasks("pending") == 1
+
+    def test_stale_snapshot_ignored(self, log):
+        state = StateProjection(event_log=log)
+        _submit(log, "t1")
+        state.count_tasks("pending")
+        state.save_snapshot()
+
+        log.log_path.unlink()
+        _submit(log, "t2")
+        restarted = StateProjection(event_log=log)
+        assert [t["task_id"] for t in restarted.list_pending_tasks()] == ["t2"]
+
+    def test_periodic_snapshot(self, log):
+        state = StateProjection(event_log=log, snapshot_every=5)
+        for i in range(3):
+            _submit(log, f"t{i}", "task_started")
+        state.count_tasks("running")
+        state.wait_snapshot()
+        assert state.snapshot_path.exists()
+        assert StateProjection(event_log=log).count_tasks("running") == 3
+
+    def test_compact_archives_terminal_tasks(self, log):
+        state = StateProjection(event_log=log)
+        for i in range(10):
+            _submit(log, f"done{i}", "task_started", "task_completed")
+        _submit(log, "failed", "task_started", "task_failed")
+        _submit(log, "live", "task_started")
+        _submit(log, "queued")
+
+        result = compact_event_log(state)
+        assert result["archived_tasks"] == 11
+        assert result["archived_states"] == {"completed": 10, "failed": 1}
+        assert result["bytes_after"] < result["bytes_before"]
+
+        assert {e["task_id"] for e in log.read_events()} == {"live", "queued"}
+        archived = list(iter_archived_tasks(archive_dir_for(log)))
+        assert len(archived) == 11 and archived[-1]["state"] == "failed"
+
+        # 压缩后继续追加，当前实例与新启动实例一致
+        log.append_event("task_completed", "live", {})
+        for projection in (state, StateProjection(event_log=log)):
+            assert projection.count_tasks("completed") == 1
+            assert projection.count_tasks("completed", include_archived=True) == 11
+            assert projection.count_tasks("failed", include_archived=True) == 1
+            assert [t["task_id"] for t in projection.list_pending_tasks()] == ["queued"]
+
+    def test_compact_keeps_append_racing_replace(self, log, monkeypatch):
+        state = StateProjection(event_log=log)
+        _submit(log, "done", "task_started", "task_completed")
+        real_lock = log.lock
+        appenders = []
+
+        @contextmanager
+        def lock(exclusive=False):
+            with real_lock(exclusive):
+                if exclusive and not appenders:
+                    # 替换过程中另一个写者追加：必须等锁释放后写到新文件
+                    t = threading.Thread(target=_submit, args=(log, "late"))
+                    t.start()
+                    appenders.append(t)
+                    time.sleep(0.05)
+                yield
+
+        monkeypatch.setattr(log, "lock", lock)
+        compact_event_log(state)
+        appenders[0].join()
+        assert [e["task_id"] for e in log.read_events()] == ["late"]
+        assert state.count_tasks("pending") == 1
+
+    def test_compact_crash_before_replace_rolls_back(self, log, monkeypatch):
+        state = StateProjection(event_log=log)
+        _submit(log, "done", "task_started", "task_completed")
+        _submit(log, "queued")
+        state.save_snapshot()
+        real_replace = os.replace
+
+        def crash(src, dst):
+            if Path(dst) == log.log_path:
+                raise OSError("crash before commit")
+            real_replace(src, dst)
+
+        monkeypatch.setattr(os, "replace", crash)
+        with pytest.raises(OSError):
+            compact_event_log(state)
+        monkeypatch.setattr(os, "replace", real_replace)
+
+        # 新快照指向未提交的文件：从 .prev 快照恢复，manifest 回滚
+        monkeypatch.setattr(log, "read_events", lambda: pytest.fail("full reread"))
+        restarted = StateProjection(event_log=log)
+        assert restarted.count_tasks("completed") == 1 and restarted.archived_counts == {}
+        assert list(iter_archived_tasks(archive_dir_for(log))) == []
+        assert compact_event_log(restarted)["archived_tasks"] == 1
+        assert restarted.count_tasks("completed", include_archived=True) == 1
+
+    def test_compacted_snapshot_keeps_stats(self, log, monkeypatch):
+        state = StateProjection(event_log=log)
+        _submit(log, "done", "task_started", "task_completed")
+        _submit(log, "live", "task_started")
+        state.count_tasks("running")
+        compact_event_log(state)
+
+        monkeypatch.setattr(log, "read_events", lambda: pytest.fail("full reread"))
+        restarted = StateProjection(event_log=log)
+        assert restarted.count_tasks("completed", include_archived=True) == 1
+        assert restarted.exec_sketch.to_dict() == state.exec_sketch.to_dict()
+        assert restarted.throughput.to_dict() == state.throughput.to_dict()
+
+    def test_late_completion_of_archived_task_ignored(self, log):
+        state = StateProjection(event_log=log)
+        _submit(log, "slow", "task_started", "task_timeout")
+        compact_event_log(state)
+        log.append_event("task_completed", "slow", {})  # worker 在归档之后才返回
+        for projection in (state, StateProjection(event_log=log)):
+            assert projection.get_task_state("slow") is None
+            assert projection.count_tasks("completed") == 0
+
+    def test_compact_ignores_stale_lock_file(self, log):
+        state = StateProjection(event_log=log)
+        _submit(log, "done", "task_started", "task_completed")
+        archive_dir = archive_dir_for(log)
+        archive_dir.mkdir()
+        (archive_dir / LOCK_NAME).write_text("")  # 上次压缩崩溃留下的文件
+        assert compact_event_log(state)["archived_tasks"] == 1
+
+    def test_compact_nothing(self, log):
+        _submit(log, "t1")
+        result = compact_event_log(StateProjection(event_log=log))
+        assert result["archived_tasks"] == 0
+        assert not archive_dir_for(log).exists()
+
+
+class _SleepWorker:
+    """Test worker: sleeps, then writes task_completed."""
+
+    def __init__(self, log, seconds):
+        self.event_log = log
+        self.seconds = seconds
+
+    def execute(self, task):
+        time.sleep(self.seconds)
+        self.event_log.append_event("task_completed", task["task_id"], {})
+        return True
+
+
+def _run_until_idle(dispatcher, state, deadline=5.0):
+    end = time.monotonic() + deadline
+    while time.monotonic() < end:
+        dispatcher.tick()
+        if not dispatcher._slots and state.count_tasks("pending") == 0:
+            return
+        time.sleep(0.01)
+    raise AssertionError("dispatcher did not drain")
+
+
+class TestDispatcherExecutor:
+    """Test the dispatcher-owned executor."""
+
+    def test_runs_tasks_concurrently(self, log):
+        state = StateProjection(event_log=log)
+        worker = _SleepWorker(log, 0.2)
+        dispatcher = Dispatcher(max_workers=5, worker_factory=lambda: worker,
+                                state=state, event_log=log)
+        for i in range(10):
+            _submit(log, f"t{i}")
+
+        t0 = time.monotonic()
+        result = dispatcher.tick()
+        assert result["spawned"] == 5
+        assert result["utilization"] == 1.0
+        _run_until_idle(dispatcher, state)
+        dispatcher.shutdown()
+
+        assert time.monotonic() - t0 < 1.0
+        assert state.count_tasks("completed") == 10
+        stats = dispatcher.slot_stats()
+        assert stats["finished"] == 10 and stats["busy"] == 0
+        assert 0 < stats["avg_utilization"] <= 1
+
+    def test_timeout_is_final(self, log):
+        state = StateProjection(event_log=log)
+        worker = _SleepWorker(log, 0.3)
+        dispatcher = Dispatcher(max_workers=1, worker_factory=lambda: worker,
+                                timeouts={"code": 0.05}, state=state, event_log=log)
+        _submit(log, "slow")
+        dispatcher.tick()
+        time.sleep(0.1)
+        assert dispatcher.tick()["timed_out"] == 1
+        # 超时任务仍占用 slot，直到 worker 返回
+        assert dispatcher.slot_stats()["busy"] == 1
+        dispatcher.shutdown()
+
+        task = state.get_task_state("slow")
+        assert task["state"] == "timeout"
+        assert task["last_event"]["data"]["timeout_s"] == 0.05
+
+    def test_process_pool_per_type(self, log):
+        state = StateProjection(event_log=log)
+        dispatcher = Dispatcher(max_workers=2, worker_factory=get_worker,
+                                executor_types={"analysis": "process"},
+                                state=state, event_log=log)
+        _submit(log, "p1", task_type="analysis")
+        _submit(log, "t1", task_type="monitor")
+        _run_until_idle(dispatcher, state, deadline=20)
+        dispatcher.shutdown()
+
+        assert state.count_tasks("completed") == 2
+        workers = {e["task_id"]: e["data"]["worker_id"]
+                   for e in log.read_events() if e["event_type"] == "task_started"}
+        assert workers == {"p1": "process-worker-p1", "t1": "thread-worker-t1"}
+
+    def test_invalid_executor_kind(self, log):
+        with pytest.raises(ValueError):
+            Dispatcher(executor_types={"code": "fiber"}, state=StateProjection(event_log=log),
+                       event_log=log)
+
+
+def _pending(task_id, priority, created_at):
+    return {"task_id": task_id, "state": "pending", "task_data": {"priority": priority},
+            "timings": {"created_at": created_at}}
+
+
+class TestPendingIndex:
+    """Test priority + aging selection."""
+
+    def _pop_all(self, index):
+        return [t["task_id"] for t in index.pop_many(100, lambda t: t["state"] == "pending")]
+
+    def test_priority_then_fifo(self):
+        index = PendingIndex(aging_seconds=1e9, clock=lambda: 100.0)
+        for task_id, priority, created in [("n1", "normal", 1), ("l1", "low", 2), ("h1", "high", 3),
+                                           ("n2", "normal", 4), ("h2", "high", 5), ("x", "???", 0)]:
+            index.push(_pending(task_id, priority, created))
+        assert self._pop_all(index) == ["h1", "h2", "x", "n1", "n2", "l1"]
+
+    def test_aging_prevents_starvation(self):
+        now = [1000.0]
+        index = PendingIndex(aging_seconds=60, clock=lambda: now[0])
+        index.push(_pending("old-low", "low", 1000.0 - 150))
+        index.push(_pending("new-high", "high", 1000.0))
+        # low 等待 150s → 提升 2.5 级，分数 -0.5 < high 的 0
+        assert self._pop_all(index) == ["old-low", "new-high"]
+
+    def test_lazy_delete_and_dedupe(self):
+        index = PendingIndex(clock=lambda: 0.0)
+        a, b = _pending("a", "high", 1), _pending("b", "high", 2)
+        index.push(a)
+        index.push(a)
+        index.push(b)
+        a["state"] = "running"
+        assert self._pop_all(index) == ["b"]
+        assert len(index) == 0
+
+    def test_out_of_order_arrival(self):
+        index = PendingIndex(aging_seconds=1e9, clock=lambda: 0.0)
+        for task_id, created in [("t2", 2), ("t3", 3), ("t1", 1)]:
+            index.push(_pending(task_id, "normal", created))
+        assert self._pop_all(index) == ["t1", "t2", "t3"]
+
+    def test_shuffled_arrival_keeps_fifo(self):
+        index = PendingIndex(aging_seconds=1e9, clock=lambda: 0.0)
+        created = list(range(500))
+        random.Random(7).shuffle(created)
+        for c in created:
+            index.push(_pending(f"t{c:03d}", "normal", c))
+        popped = [t["task_id"] for t in index.pop_many(500, lambda t: t["state"] == "pending")]
+        assert popped == [f"t{c:03d}" for c in range(500)]
+
+
+class TestDispatcherScheduling:
+    """Test dispatcher selection through the pending index."""
+
+    def test_high_priority_jumps_queue(self, log):
+        state = StateProjection(event_log=log)
+        worker = _SleepWorker(log, 0)
+        _submit(log, "low-seeded", priority="low")
+        dispatcher = Dispatcher(max_workers=1, worker_factory=lambda: worker,
+                                state=state, event_log=log)
+        _submit(log, "normal", priority="normal")
+        _submit(log, "high", priority="high")
+
+        order = []
+        for _ in range(3):
+            dispatcher.tick()
+            order.extend(dispatcher._slots)
+            while dispatcher._slots:
+                time.sleep(0.01)
+                dispatcher._reap()
+        dispatcher.shutdown()
+        assert order == ["high", "normal", "low-seeded"]
+
+    def test_tick_does_not_scan_pending(self, log, monkeypatch):
+        state = StateProjection(event_log=log)
+        dispatcher = Dispatcher(max_workers=2, worker_factory=lambda: _SleepWorker(log, 0),
+                                state=state, event_log=log)
+        for i in range(20):
+            _submit(log, f"t{i}")
+        monkeypatch.setattr(state, "list_pending_tasks", lambda: pytest.fail("full scan"))
+        result = dispatcher.tick()
+        dispatcher.shutdown()
+        assert result["pending"] == 20 and result["spawned"] == 2
@@ -0,0 +1,112 @@
+"""
+Unit tests for stage_profiler
+
+Tests cover:
+- Per-stage wall / CPU / IO / json.loads counters and the rolling store
+- json.loads is only wrapped while a detailed stage is running
+- Unmeasured metrics are left out of the record and shown as "-" in the report
+- Sampling mode: collapsed stacks for the slowest ticks
+
+Run with: pytest test_stage_profiler.py -v
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import stage_profiler
+from stage_profiler import StageProfiler, format_report, read_ticks, summarize_ticks
+
+
+def test_stage_counters_and_store(tmp_path):
+    store = tmp_path / "profile.jsonl"
+    profiler = StageProfiler(store_file=store, collapsed_file=tmp_path / "slow.collapsed", detailed=True)
+    data = tmp_path / "data.json"
+
+    for _ in range(3):
+        with profiler.tick():
+            with profiler.stage("write"):
+                data.write_text(json.dumps({"x": "y" * 4096}))
+            with profiler.stage("parse"):
+                with open(data) as f:
+                    json.load(f)
+                json.loads("[1, 2]")
+            with profiler.stage("parse"):  # 同一轮重复的阶段累加
+                json.loads("{}")
+
+    ticks = read_ticks(store)
+    assert len(ticks) == 3 and list(profiler.ticks) == ticks
+    stages = ticks[-1]["stages"]
+    assert stages["parse"]["json_loads"] == 3
+    assert stages["write"]["json_loads"] == 0
+    if sys.platform.startswith("linux"):
+        assert stages["write"]["write_bytes"] >= 4096
+        assert stages["parse"]["read_bytes"] >= 4096
+
+    summary = summarize_ticks(ticks)
+    assert summary["parse"]["json_loads"]["count"] == 3
+    assert profiler.summary()["write"]["wall_ms"]["max"] >= 0
+    assert "parse" in profiler.format_report()
+
+
+def test_json_counter_scoped_to_detailed_stages(tmp_path):
+    original = json.loads
+    plain = StageProfiler(store_file=tmp_path / "plain.jsonl")
+    with plain.tick():
+        with plain.stage("parse"):
+            assert json.loads is original
+            json.loads("{}")
+    sample = plain.ticks[-1]["stages"]["parse"]
+    assert "json_loads" not in sample  # 没有计数，不写 0
+    if sys.platform.startswith("linux"):
+        assert "read_bytes" in sample and "write_bytes" in sample  # IO 计数默认开启
+
+    detailed = StageProfiler(store_file=tmp_path / "detailed.jsonl", detailed=True)
+    with detailed.tick():
+        with detailed.stage("outer"):
+            with detailed.stage("inner"):
+                assert json.loads is not original
+            assert json.loads is not original  # 外层阶段仍在计数
+    assert json.loads is original
+
+
+def test_unmeasured_metrics_not_reported_as_zero(tmp_path, monkeypatch):
+    monkeypatch.setattr(stage_profiler, "_io_counters", lambda: None)
+    profiler = StageProfiler(store_file=tmp_path / "profile.jsonl")
+    for _ in range(2):
+        with profiler.tick():
+            with profiler.stage("plain"):
+                pass
+            with profiler.stage("plain"):
+                pass
+
+    sample = profiler.ticks[-1]["stages"]["plain"]
+    assert set(sample) == {"wall_ms", "cpu_ms"}
+    summary = profiler.summary()["plain"]
+    assert "read_bytes" not in summary and "json_loads" not in summary
+    row = format_report(list(profiler.ticks)).splitlines()[1]
+    assert row.split()[-3:] == ["-", "-", "-"]
+
+
+def test_sampling_keeps_slowest_ticks(tmp_path):
+    collapsed = tmp_path / "slow.collapsed"
+    profiler = StageProfiler(store_file=tmp_path / "profile.jsonl", collapsed_file=collapsed)
+    profiler.enable_sampling(interval_sec=0.001, slowest_n=2)
+    try:
+        for duration in (0.05, 0.15, 0.1):
+            with profiler.tick():
+                with profiler.stage("busy"):
+                    end = time.perf_counter() + duration
+                    while time.perf_counter() < end:
+                        pass
+    finally:
+        profiler.disable_sampling()
+
+    slowest = profiler.slowest_ticks()
+    assert len(slowest) == 2
+    assert slowest[0]["wall_ms"] > slowest[1]["wall_ms"] >= 90
+    lines = collapsed.read_text().splitlines()
+    assert lines and all(";busy;" in line and line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("test_sampling_keeps_slowest_ticks" in line for line in lines)
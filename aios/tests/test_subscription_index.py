@@ -0,0 +1,101 @@
+"""
+Unit tests for SubscriptionIndex
+
+Tests cover:
+- Segment wildcards ("agent.*", "*.error", "*")
+- In-segment wildcards (fnmatch fallback)
+- Incremental add/remove
+- Equivalence with fnmatch on random patterns
+
+Run with: pytest test_subscription_index.py -v
+"""
+
+import fnmatch
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from core.subscription_index import SubscriptionIndex
+
+
+def _index(*patterns):
+    index = SubscriptionIndex()
+    for p in patterns:
+        index.add(p)
+    return index
+
+
+class TestMatch:
+    """Test pattern matching."""
+
+    def test_exact(self):
+        assert _index("agent.started").match("agent.started") == ["agent.started"]
+        assert _index("agent.started").match("agent.stopped") == []
+
+    def test_star_spans_segments(self):
+        index = _index("agent.*")
+        assert index.match("agent.started") == ["agent.*"]
+        assert index.match("agent.task.started") == ["agent.*"]
+        assert index.match("agent") == []
+
+    def test_suffix_and_global(self):
+        index = _index("*.error", "*")
+        assert index.match("a.b.error") == ["*.error", "*"]
+        assert index.match("task") == ["*"]
+
+    def test_in_segment_wildcard_fallback(self):
+        index = _index("agent*", "task.err?r")
+        assert index.match("agentx.started") == ["agent*"]
+        assert index.match("task.error") == ["task.err?r"]
+
+    def test_registration_order(self):
+        index = _index("*", "task.*", "task.done")
+        assert index.match("task.done") == ["*", "task.*", "task.done"]
+
+
+class TestIncrementalUpdate:
+    """Test add/remove without rebuilding."""
+
+    def test_remove_prunes(self):
+        index = _index("agent.*", "agent.task.*")
+        index.remove("agent.task.*")
+        assert index.match("agent.task.done") == ["agent.*"]
+        index.remove("agent.*")
+        assert index.match("agent.task.done") == []
+        assert len(index) == 0
+        assert index._root.is_empty()
+
+    def test_remove_keeps_siblings(self):
+        index = _index("a.b", "a.b.c")
+        index.remove("a.b.c")
+        assert index.match("a.b") == ["a.b"]
+
+    def test_remove_unknown_is_noop(self):
+        index = _index("a.b")
+        index.remove("x.y")
+        assert "a.b" in index
+
+
+class TestFnmatchEquivalence:
+    """Randomized comparison with fnmatch."""
+
+    def test_random_patterns(self):
+        rng = random.Random(42)
+        words = ["agent", "task", "error", "done", "x", ""]
+
+        def segment():
+            r = rng.random()
+            if r < 0.3:
+                return "*"
+            if r < 0.35:
+                return rng.choice(words) + "*"
+            return rng.choice(words)
+
+        patterns = {".".join(segment() for _ in range(rng.randint(1, 4))) for _ in range(300)}
+        index = _index(*patterns)
+
+        for _ in range(2000):
+            event_type = ".".join(rng.choice(words) for _ in range(rng.randint(1, 5)))
+            expected = {p for p in patterns if fnmatch.fnmatchcase(event_type, p)}
+            assert set(index.match(event_type)) == expected, event_type
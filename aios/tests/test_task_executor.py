@@ -0,0 +1,295 @@
+"""
+Unit tests for TaskExecutor.execute_batch concurrency
+
+Tests cover:
+- Tasks overlap up to the concurrency limit and the batch reports saved wall time
+- Per task-type limits
+- Per-task deadlines fail the task once; the late worker does not touch the ledger,
+  queue status or execution log, and keeps its per-type slot until it returns
+- Ledger transitions stay ordered per action
+- Memory contexts / feedback for a batch use one request each over one keep-alive connection;
+  without the server, contexts fall back to one direct query_batch call
+- A dropped connection resends only read-only /query* requests; feedback falls back to
+  one direct feedback_batch only when the request never reached the server
+
+Run with: pytest test_task_executor.py -v
+"""
+
+import json
+import socket
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import core.task_executor as task_executor
+from core.task_executor import TaskExecutor
+
+
+class _SleepyExecutor(TaskExecutor):
+    def __init__(self):
+        self._log_lock = threading.Lock()
+        self.last_batch_stats = {}
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+        self.logged = []
+
+    def execute_task(self, task, retry_count=0, deadline=None, mem_ctx=None, feedback_sink=None, slot=None):
+        task_type = task["type"]
+        with self.lock:
+            self.running[task_type] = self.running.get(task_type, 0) + 1
+            self.peak[task_type] = max(self.peak.get(task_type, 0), self.running[task_type])
+        time.sleep(task.get("sleep", 0.2))
+        with self.lock:
+            self.running[task_type] -= 1
+        result = {"success": True, "output": task["id"], "duration": task.get("sleep", 0.2)}
+        if slot is None or slot.finalize("worker"):
+            task_executor.update_task_status(task["id"], "completed", result=result)
+            self._log_execution(task, result)
+        return result
+
+    def _log_execution(self, task, result, retry_count=0):
+        self.logged.append(task["id"])
+
+
+@pytest.fixture(autouse=True)
+def no_memory(monkeypatch):
+    monkeypatch.setenv("MEMORY_RETRIEVAL_ENABLED", "false")
+
+
+@pytest.fixture(autouse=True)
+def statuses(monkeypatch):
+    calls = []
+    monkeypatch.setattr(task_executor, "update_task_status",
+                        lambda task_id, status, result=None: calls.append((task_id, status)) or True)
+    return calls
+
+
+@pytest.fixture
+def ledger(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def transition_action(action_id, event_type, actor=None, payload=None):
+        with lock:
+            calls.append((action_id, event_type))
+
+    module = types.ModuleType("reality_ledger")
+    module.transition_action = transition_action
+    monkeypatch.setitem(sys.modules, "reality_ledger", module)
+    return calls
+
+
+def _tasks(n, task_type="code", **extra):
+    return [{"id": f"{task_type}-{i}", "type": task_type, "action_id": f"act-{task_type}-{i}", **extra}
+            for i in range(n)]
+
+
+def test_batch_runs_concurrently_and_reports_savings(ledger):
+    executor = _SleepyExecutor()
+    tasks = _tasks(4)
+    results = executor.execute_batch(tasks, max_tasks=4, concurrency=4)
+
+    assert [r["output"] for r in results] == [t["id"] for t in tasks]
+    stats = executor.last_batch_stats
+    assert stats["wall_ms"] < 600 and stats["saved_ms"] > 400
+    assert executor.peak["code"] == 4
+    for t in tasks:
+        assert [e for a, e in ledger if a == t["action_id"]] == ["executing", "completed"]
+
+
+def test_per_type_limit(ledger):
+    executor = _SleepyExecutor()
+    tasks = _tasks(3, "deploy", sleep=0.05) + _tasks(3, "code", sleep=0.05)
+    executor.execute_batch(tasks, max_tasks=6, concurrency=4)
+    assert executor.peak["deploy"] == 1
+    assert executor.peak["code"] == 3
+
+
+def test_deadline_fails_task_once(ledger, statuses):
+    executor = _SleepyExecutor()
+    tasks = _tasks(1, "code", sleep=0.5) + _tasks(1, "analysis", sleep=0.01)
+    start = time.monotonic()
+    results = executor.execute_batch(tasks, max_tasks=2, concurrency=2, deadline_s=0.1)
+
+    assert time.monotonic() - start < 0.4
+    assert not results[0]["success"] and results[0]["deadline_exceeded"]
+    assert results[1]["success"]
+    assert executor.last_batch_stats["deadline_exceeded"] == 1
+
+    time.sleep(0.6)  # 被放弃的 worker 跑完后不能再写终态
+    assert [e for a, e in ledger if a == "act-code-0"] == ["executing", "failed"]
+    assert [s for t, s in statuses if t == "code-0"] == ["failed"]
+    assert executor.logged.count("code-0") == 1
+
+
+def test_abandoned_worker_holds_type_slot(ledger):
+    executor = _SleepyExecutor()
+    tasks = _tasks(1, "deploy", sleep=0.3) + _tasks(1, "deploy", sleep=0.01, deadline_s=1.0)
+    results = executor.execute_batch(tasks, max_tasks=2, concurrency=2, deadline_s=0.1)
+
+    assert results[0]["deadline_exceeded"] and results[1]["success"]
+    assert executor.peak["deploy"] == 1  # 第二个 deploy 等第一个真正返回后才开始
+
+
+def test_task_blocked_by_abandoned_worker_times_out(ledger):
+    executor = _SleepyExecutor()
+    tasks = _tasks(2, "deploy", sleep=0.5)
+    start = time.monotonic()
+    results = executor.execute_batch(tasks, max_tasks=2, concurrency=2, deadline_s=0.1)
+
+    assert time.monotonic() - start < 0.4
+    assert all(r["deadline_exceeded"] for r in results)
+    assert "abandoned deploy task" in results[1]["error"]
+    assert executor.peak["deploy"] == 1
+    time.sleep(0.5)
+    assert executor.logged == ["deploy-0", "deploy-1"]
+
+
+@pytest.fixture
+def memory_server(tmp_path, monkeypatch):
+    requests, connections = [], set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            requests.append((self.path, body))
+            connections.add(self.client_address)
+            if self.path == "/query_batch":
+                data = {"results": [[{"id": f"m-{q['text']}", "outcome": "success", "_score": 0.9,
+                                      "text": q["text"]}] for q in body["queries"]]}
+            else:
+                data = {"ok": [True] * len(body["items"])}
+            payload = json.dumps(data).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("MEMORY_RETRIEVAL_ENABLED", "true")
+    monkeypatch.setattr(task_executor, "_memory_client",
+                        task_executor._MemoryServerClient(f"http://127.0.0.1:{server.server_address[1]}"))
+    monkeypatch.setattr(task_executor, "AIOS_ROOT", tmp_path)
+    (tmp_path / "agent_system").mkdir()
+    yield requests, connections
+    server.shutdown()
+    server.server_close()
+
+
+def test_batch_memory_round_trips(memory_server):
+    requests, connections = memory_server
+    executor = _SleepyExecutor()
+    tasks = [{"id": f"t{i}", "type": "code", "description": f"d{i}"} for i in range(3)]
+
+    contexts = executor._build_memory_contexts(tasks)
+    assert [c["memory_ids"] for c in contexts] == [["m-d0"], ["m-d1"], ["m-d2"]]
+    assert not any(c["degraded"] for c in contexts)
+
+    executor._write_memory_feedback_batch([
+        (t["id"], ctx, {"success": i != 1}) for i, (t, ctx) in enumerate(zip(tasks, contexts))
+    ])
+    assert [path for path, _ in requests] == ["/query_batch", "/feedback_batch"]
+    assert [i["helpful"] for i in requests[1][1]["items"]] == [True, False, True]
+    assert len(connections) == 1  # keep-alive
+
+    log = task_executor.AIOS_ROOT / "agent_system" / "memory_retrieval_log.jsonl"
+    assert [json.loads(l)["task_id"] for l in log.read_text(encoding="utf-8").splitlines()] == ["t0", "t1", "t2"]
+
+
+def test_batch_memory_falls_back_to_one_direct_query_batch(monkeypatch):
+    monkeypatch.setenv("MEMORY_RETRIEVAL_ENABLED", "true")
+    calls = []
+    monkeypatch.setattr(task_executor, "_query_batch_via_server", lambda queries, timeout_s: None)
+    monkeypatch.setattr(task_executor, "_query_via_server", lambda *a: calls.append("server") or None)
+    monkeypatch.setattr(task_executor, "_ensure_memory_loaded", lambda: True)
+    monkeypatch.setattr(task_executor, "_mem_loaded", True)
+    monkeypatch.setattr(task_executor, "_mem_query_fn", lambda *a, **k: calls.append("query") or [])
+    monkeypatch.setattr(task_executor, "_mem_query_batch_fn", lambda queries: calls.append("query_batch") or [
+        [{"id": f"m-{q['text']}", "outcome": "success", "_score": 0.9, "text": q["text"]}] for q in queries
+    ])
+
+    tasks = [{"id": f"t{i}", "type": "code", "description": f"d{i}"} for i in range(3)]
+    contexts = _SleepyExecutor()._build_memory_contexts(tasks)
+    assert calls == ["query_batch"]
+    assert [c["memory_ids"] for c in contexts] == [["m-d0"], ["m-d1"], ["m-d2"]]
+
+
+def _dropping_server(requests):
+    """Reads each request, then closes the connection without answering."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            requests.append(self.path)
+            self.close_connection = True
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_memory_client_resends_only_read_only_posts():
+    requests = []
+    server = _dropping_server(requests)
+    client = task_executor._MemoryServerClient(f"http://127.0.0.1:{server.server_address[1]}")
+    try:
+        with pytest.raises(ConnectionError) as excinfo:
+            client.post("/feedback_batch", {"items": []}, 1.0)
+        assert not isinstance(excinfo.value, task_executor._RequestNotSent)
+        assert requests == ["/feedback_batch"]  # 已送达的写请求不重发
+
+        with pytest.raises(ConnectionError):
+            client.post("/query_batch", {"queries": []}, 1.0)
+        assert requests == ["/feedback_batch", "/query_batch", "/query_batch"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_feedback_falls_back_only_when_not_sent(monkeypatch, tmp_path):
+    monkeypatch.setenv("MEMORY_RETRIEVAL_ENABLED", "true")
+    monkeypatch.setattr(task_executor, "AIOS_ROOT", tmp_path)
+    (tmp_path / "agent_system").mkdir()
+    direct = []
+    monkeypatch.setattr(task_executor, "_mem_feedback_batch_fn", direct.append)
+    entries = [("t0", {"memory_ids": ["m1", "m2"]}, {"success": True})]
+
+    # 连接被拒绝：请求没发出去，直接调用一次 feedback_batch
+    probe = socket.socket()
+    probe.bind(("127.0.0.1", 0))
+    closed_port = probe.getsockname()[1]
+    probe.close()
+    monkeypatch.setattr(task_executor, "_memory_client",
+                        task_executor._MemoryServerClient(f"http://127.0.0.1:{closed_port}"))
+    _SleepyExecutor()._write_memory_feedback_batch(entries)
+    assert direct == [[("m1", True), ("m2", True)]]
+
+    # 请求已送达、没拿到响应：不再直接写一遍
+    requests = []
+    server = _dropping_server(requests)
+    monkeypatch.setattr(task_executor, "_memory_client",
+                        task_executor._MemoryServerClient(f"http://127.0.0.1:{server.server_address[1]}"))
+    try:
+        _SleepyExecutor()._write_memory_feedback_batch(entries)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert requests == ["/feedback_batch"] and len(direct) == 1